@@ -42,12 +42,24 @@ def create_app():
     # 初始化应用配置（包括日志）
     Config.init_app(app)
     
+    # 配置后台作业调度器
+    setup_task_dispatcher(app)
+    
     # 创建数据库表
     with app.app_context():
         db.create_all()
     
     return app
 
+def setup_task_dispatcher(app):
+    """local模式下随请求懒启动作业调度器，进程重启后可回收未完成的作业"""
+    from app.services.task_job_service import TaskJobService
+    
+    @app.before_request
+    def start_task_dispatcher():
+        if not app.config.get('TESTING'):
+            TaskJobService.ensure_local_dispatcher(app)
+
 def setup_jwt_error_handlers(app):
     """设置JWT错误处理器"""
     from flask import jsonify
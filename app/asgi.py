@@ -0,0 +1,354 @@
+"""
+ASGI应用模块
+- Dify聊天流式接口（POST /api/dify/v2/<scenario>/chat-simple 及兼容路由 /api/dify/v2/chat-simple）由 asyncio 直接代理：
+  JWT和用户校验在线程中完成后立即释放线程，SSE流在事件循环中转发，每个打开的聊天只占用一个协程而不是一个工作线程
+- 其余请求交给 Flask 应用，在 ASGI_WSGI_THREADS 大小的线程池中并发执行，行为与多线程WSGI部署一致
+"""
+
+import re
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import Response, jsonify
+from flask_jwt_extended import verify_jwt_in_request
+from werkzeug.test import EnvironBuilder
+from app.routes.dify_v2 import CHAT_STREAM_HEADERS, prepare_chat_request
+from app.services.dify_app_service import DifyAppService
+from app.services.dify_async_client import DifyAsyncClient
+from app.services.dify_client import DifyClient, DifyCircuitOpenError
+from app.config.config import Config
+from app.utils.sse import SSERelay, ChatStreamMetrics, aiter_with_heartbeat
+
+# 异步代理的聊天接口路径，未指定场景的兼容路由转发到 multilingual_qa
+CHAT_PATH_RE = re.compile(r'^/api/dify/v2/(?:(?P<scenario>[^/]+)/)?chat-simple/?$')
+LEGACY_CHAT_SCENARIO = 'multilingual_qa'
+
+# 聊天请求体大小上限（字节）
+MAX_CHAT_BODY_SIZE = 1024 * 1024
+
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    """
+    在线程池中运行WSGI应用的 WsgiToAsgi
+
+    asgiref 的 WsgiToAsgi 使用 thread_sensitive=True，同一进程的所有WSGI请求在同一个线程中串行执行，
+    一个慢请求（上传、导出、阻塞任务）会阻塞其他接口；这里改为在有上限的线程池中并发执行
+    """
+
+    def __init__(self, wsgi_application, max_workers):
+        super().__init__(wsgi_application)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        await _ThreadPoolWsgiInstance(self.wsgi_application, self.executor)(scope, receive, send)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class _ThreadPoolWsgiInstance(WsgiToAsgiInstance):
+    """单个请求的WSGI调用，在指定线程池中执行"""
+
+    # asgiref 中 run_wsgi_app 被 @sync_to_async 包装，取出原始同步函数
+    _run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        self.executor = executor
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=self.executor)(body)
+
+
+class DifyChatStreamProxy:
+    """Dify聊天异步流式代理"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        # 后台任务（停止生成）的引用，避免任务未完成时被回收
+        self._tasks = set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _stop_generation(self, scenario, prepared, task_id):
+        """客户端断开后调用Dify停止生成接口"""
+        url = DifyAppService.get_stop_url(prepared['url'], task_id)
+        try:
+            response = await DifyAsyncClient.get_client(url).post(
+                url,
+                headers=prepared['upstream_headers'],
+                json={'user': prepared['data'].get('user')},
+                timeout=DifyAsyncClient.get_timeout('chat_stop')
+            )
+            success = response.is_success
+            if not success:
+                self.flask_app.logger.warning(
+                    f"[{prepared['name']}-停止生成失败] task_id: {task_id} - 状态码: {response.status_code} - 响应: {response.text[:200]}"
+                )
+        except httpx.HTTPError as e:
+            success = False
+            self.flask_app.logger.warning(f"[{prepared['name']}-停止生成失败] task_id: {task_id} - 错误: {str(e)}")
+        ChatStreamMetrics.record_stop(scenario, success)
+
+    @staticmethod
+    async def _read_body(receive):
+        """读取请求体，客户端已断开时返回 None，超过大小上限时返回 False"""
+        body = b''
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body += message.get('body', b'')
+            if len(body) > MAX_CHAT_BODY_SIZE:
+                return False
+            if not message.get('more_body'):
+                return body
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        """等待客户端断开连接"""
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+
+    @staticmethod
+    def _asgi_headers(headers):
+        return [(key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers.items()]
+
+    @staticmethod
+    async def _send_json(send, status, headers, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = [(key, value) for key, value in headers if key not in (b'content-type', b'content-length')]
+        headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('latin-1'))]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _build_environ(self, scope, body):
+        headers = [(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope['headers']]
+        content_type = next((value for key, value in headers if key.lower() == 'content-type'), None)
+        client = scope.get('client') or ('', 0)
+        return EnvironBuilder(
+            path=scope['path'],
+            method=scope['method'],
+            headers=[(key, value) for key, value in headers if key.lower() not in ('content-type', 'content-length')],
+            content_type=content_type,
+            data=body,
+            query_string=scope.get('query_string', b'').decode('latin-1'),
+            environ_overrides={'REMOTE_ADDR': client[0], 'wsgi.url_scheme': scope.get('scheme', 'http')}
+        ).get_environ()
+
+    def _prepare(self, scope, body, scenario):
+        """
+        在Flask请求上下文中完成JWT、用户和场景校验（阻塞操作，在线程中执行）
+
+        Returns:
+            dict: 校验失败时包含 status/headers/body，成功时包含上游请求参数和响应头
+        """
+        with self.flask_app.request_context(self._build_environ(scope, body)):
+            prepared = None
+            try:
+                if scenario == LEGACY_CHAT_SCENARIO and scope['path'].rstrip('/') == '/api/dify/v2/chat-simple':
+                    self.flask_app.logger.warning("[Dify兼容路由] 使用了旧路由 /api/dify/v2/chat-simple，建议使用场景路由")
+                verify_jwt_in_request()
+                prepared, error_response = prepare_chat_request(scenario)
+                if error_response is None:
+                    config = DifyAppService.get_app_config(scenario, 'chat')
+            except Exception as e:
+                prepared = None
+                try:
+                    error_response = self.flask_app.handle_user_exception(e)
+                except Exception:
+                    self.flask_app.logger.error(f"[Dify V2系统错误] 场景: {scenario} - 错误: {str(e)}", exc_info=True)
+                    error_response = (jsonify({
+                        'success': False,
+                        'message': f'系统错误: {str(e)}'
+                    }), 500)
+
+            if prepared is None:
+                response = self.flask_app.process_response(self.flask_app.make_response(error_response))
+                return {
+                    'status': response.status_code,
+                    'headers': self._asgi_headers(response.headers),
+                    'body': response.get_data()
+                }
+
+            # 经 after_request 处理（CORS等）后取流式响应头
+            response = self.flask_app.process_response(
+                Response(content_type='text/event-stream', headers=CHAT_STREAM_HEADERS)
+            )
+            response.headers.pop('Content-Length', None)
+            user_info, data = prepared
+            return {
+                'url': config['api_url'],
+                'upstream_headers': config['headers'],
+                'data': data,
+                'user_name': user_info['username'],
+                'name': config['name'],
+                'headers': self._asgi_headers(response.headers)
+            }
+
+    async def _stream(self, send, scenario, prepared, start_time):
+        """请求Dify并逐块转发SSE流"""
+        logger = self.flask_app.logger
+        url = prepared['url']
+        try:
+            # 与同步请求共用（场景, 主机）熔断器，熔断打开时直接返回503
+            breaker, permit = DifyClient.check_breaker(scenario, url)
+        except DifyCircuitOpenError as e:
+            logger.warning(f"[{prepared['name']}-chat熔断] 用户: {prepared['user_name']} - {str(e)}")
+            await self._send_json(send, 503, prepared['headers'], {
+                'success': False,
+                'message': 'Dify API请求失败: 503',
+                'details': {'error': str(e)}
+            })
+            return
+        # 熔断统计结果：None 表示未得到上游响应（客户端断开等），不计入
+        outcome = None
+        breaker_recorded = False
+        client = DifyAsyncClient.get_client(url)
+        DifyAsyncClient.record(url, start=True)
+        relay = SSERelay(scenario, start_time)
+        started = False
+        error = False
+        cancelled = False
+        try:
+            async with client.stream('POST', url, headers=prepared['upstream_headers'], json=prepared['data']) as upstream:
+                elapsed_time = round((time.time() - start_time) * 1000, 2)
+                # 收到响应头即记录熔断结果，流式转发期间不占用半开探测名额
+                outcome = upstream.status_code < 500
+                if breaker is not None:
+                    breaker.record(outcome, permit)
+                breaker_recorded = True
+                if upstream.status_code >= 400:
+                    error = upstream.status_code >= 500
+                    content = await upstream.aread()
+                    logger.error(
+                        f"[{prepared['name']}-chat流式失败] 状态码: {upstream.status_code} - "
+                        f"响应: {content[:200].decode('utf-8', 'replace')}"
+                    )
+                    try:
+                        details = json.loads(content)
+                    except ValueError:
+                        details = {'error': f'API返回错误: {upstream.status_code}', 'detail': content[:200].decode('utf-8', 'replace')}
+                    await self._send_json(send, upstream.status_code, prepared['headers'], {
+                        'success': False,
+                        'message': f'Dify API请求失败: {upstream.status_code}',
+                        'details': details
+                    })
+                    return
+
+                logger.info(f"[{prepared['name']}-chat流式开始] 用户: {prepared['user_name']} - 异步代理 - 耗时: {elapsed_time}ms")
+                await send({'type': 'http.response.start', 'status': 200, 'headers': prepared['headers']})
+                started = True
+                # 按事件边界转发Dify原始事件：完整事件立即发送，长时间没有数据时发送心跳
+                async for chunk in aiter_with_heartbeat(upstream.aiter_bytes(), Config.SSE_HEARTBEAT_INTERVAL):
+                    body = relay.heartbeat() if chunk is None else b''.join(relay.feed(chunk))
+                    if body:
+                        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                remaining = relay.flush()
+                if remaining:
+                    await send({'type': 'http.response.body', 'body': remaining, 'more_body': True})
+        except asyncio.CancelledError:
+            # 客户端断开，退出 client.stream 时上游连接随之关闭
+            cancelled = True
+            raise
+        except httpx.HTTPError as e:
+            error = True
+            if not breaker_recorded:
+                outcome = False
+            logger.error(f"[Dify V2流式错误] 场景: {scenario} - 用户: {prepared['user_name']} - 错误: {str(e)}")
+            if not started:
+                await self._send_json(send, 500, prepared['headers'], {
+                    'success': False,
+                    'message': 'Dify API请求失败: 500',
+                    'details': {'error': f'网络请求失败: {str(e)}'}
+                })
+        finally:
+            DifyAsyncClient.record(url, error=error)
+            if breaker is not None and not breaker_recorded:
+                breaker.record(outcome, permit)
+            if cancelled and relay.generating:
+                logger.info(f"[Dify V2客户端断开] 场景: {scenario} - 用户: {prepared['user_name']} - 停止生成 task_id: {relay.task_id}")
+                self._spawn(self._stop_generation(scenario, prepared, relay.task_id))
+            elif started and not cancelled:
+                await send({'type': 'http.response.body', 'body': b''})
+            if started or cancelled:
+                summary = relay.finish('cancelled' if cancelled else 'error' if error else 'completed')
+                logger.info(
+                    f"[Dify V2请求完成] 场景: {scenario} - 用户: {prepared['user_name']} - 异步代理 - 首字节: {summary['ttfb_ms']}ms - "
+                    f"tokens: {summary['tokens']} - 速度: {summary['tokens_per_second']}tokens/s - 心跳: {summary['heartbeats']} - 耗时: {summary['elapsed_ms']}ms"
+                )
+
+    async def __call__(self, scope, receive, send, scenario):
+        start_time = time.time()
+
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        if body is False:
+            await self._send_json(send, 413, [], {'success': False, 'message': '请求数据过大'})
+            return
+
+        prepared = await sync_to_async(self._prepare, thread_sensitive=False)(scope, body, scenario)
+        if 'body' in prepared:
+            await send({'type': 'http.response.start', 'status': prepared['status'], 'headers': prepared['headers']})
+            await send({'type': 'http.response.body', 'body': prepared['body']})
+            return
+
+        # 客户端断开时取消转发，关闭上游连接
+        stream_task = asyncio.ensure_future(self._stream(send, scenario, prepared, start_time))
+        disconnect_task = asyncio.ensure_future(self._wait_disconnect(receive))
+        done, _ = await asyncio.wait({stream_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+        if stream_task not in done:
+            stream_task.cancel()
+        else:
+            disconnect_task.cancel()
+        try:
+            await stream_task
+        except asyncio.CancelledError:
+            if not stream_task.cancelled():
+                raise
+
+
+def create_asgi_app(flask_app):
+    """
+    创建ASGI应用：聊天流式接口走异步代理，其余请求交给Flask
+
+    Args:
+        flask_app: create_app() 创建的Flask应用
+
+    Returns:
+        ASGI应用
+    """
+    wsgi_app = ThreadPoolWsgiToAsgi(flask_app, Config.ASGI_WSGI_THREADS)
+    chat_proxy = DifyChatStreamProxy(flask_app)
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await DifyAsyncClient.close()
+                    wsgi_app.shutdown()
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] == 'http' and scope['method'] == 'POST':
+            match = CHAT_PATH_RE.match(scope['path'])
+            if match:
+                await chat_proxy(scope, receive, send, match.group('scenario') or LEGACY_CHAT_SCENARIO)
+                return
+
+        await wsgi_app(scope, receive, send)
+
+    return application
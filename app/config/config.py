@@ -126,6 +126,77 @@ class Config:
     LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', '10485760'))  # 10MB
     LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '10'))
     
+    # 标准处理后台线程池配置
+    TASK_WORKER_COUNT = int(os.getenv('TASK_WORKER_COUNT', '8'))  # 同时执行的Dify请求数
+    TASK_QUEUE_MAX_SIZE = int(os.getenv('TASK_QUEUE_MAX_SIZE', '500'))  # 等待队列上限，超出后拒绝提交
+    # 按任务类型限制并发，格式: standard_review:2,standard_compliance:2
+    TASK_TYPE_CONCURRENCY = os.getenv('TASK_TYPE_CONCURRENCY', '')
+    TASK_WORKER_DRAIN_TIMEOUT = int(os.getenv('TASK_WORKER_DRAIN_TIMEOUT', '30'))  # 进程退出时等待排空的秒数
+
+    # 多文件上传配置
+    UPLOAD_MAX_FILES = int(os.getenv('UPLOAD_MAX_FILES', '10'))  # 单次多文件上传允许的最大文件数
+    UPLOAD_WORKER_COUNT = int(os.getenv('UPLOAD_WORKER_COUNT', '4'))  # 并行执行本地保存和Dify上传的线程数，1表示依次上传
+    MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', str(50 * 1024 * 1024)))  # 单个文件最大字节数，读取上传流时实时校验
+    # 边保存边上传到Dify：一次读取同时写入本地文件和Dify上传请求，关闭时先保存到本地再上传
+    DIFY_STREAMING_UPLOAD = os.getenv('DIFY_STREAMING_UPLOAD', 'False').lower() == 'true'
+    # 分片断点续传上传配置
+    CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))  # 单个分片请求的最大字节数
+    CHUNKED_UPLOAD_TTL = int(os.getenv('CHUNKED_UPLOAD_TTL', '86400'))  # 上传会话无活动后保留的秒数，过期后清理未完成的分片
+    # 导出文件缓存总大小上限（字节），超出后按最近访问时间淘汰，0表示不缓存
+    EXPORT_CACHE_MAX_SIZE = int(os.getenv('EXPORT_CACHE_MAX_SIZE', str(1024 * 1024 * 1024)))
+    # 导出渲染进程池配置（PDF/Excel等CPU密集渲染在独立进程中执行，不占用Web进程的GIL）
+    EXPORT_PROCESS_WORKERS = int(os.getenv('EXPORT_PROCESS_WORKERS', '2'))  # 渲染进程数
+    EXPORT_PROCESS_MAX_TASKS_PER_CHILD = int(os.getenv('EXPORT_PROCESS_MAX_TASKS_PER_CHILD', '50'))  # 每个渲染进程执行多少次后重建，防止内存增长
+    EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', '120'))  # 单次渲染超时秒数
+    EXPORT_JOBS_PER_USER = int(os.getenv('EXPORT_JOBS_PER_USER', '2'))  # 每个用户同时进行的导出任务数
+    # 文件预览缓存总大小上限（字节），超出后按最近访问时间淘汰，0表示不缓存
+    PREVIEW_CACHE_MAX_SIZE = int(os.getenv('PREVIEW_CACHE_MAX_SIZE', str(256 * 1024 * 1024)))
+    # 上传后后台提取预览文本、页数和缩略图的线程数，0表示不预处理（首次预览时提取）
+    FILE_ARTIFACT_WORKER_COUNT = int(os.getenv('FILE_ARTIFACT_WORKER_COUNT', '2'))
+    # 文件下载卸载模式：off(Python发送) / x-accel(nginx X-Accel-Redirect) / x-sendfile(Apache、lighttpd X-Sendfile)
+    DOWNLOAD_OFFLOAD_MODE = os.getenv('DOWNLOAD_OFFLOAD_MODE', 'off').lower()
+    # x-accel 模式下映射到数据根目录的nginx内部location前缀
+    DOWNLOAD_ACCEL_PREFIX = os.getenv('DOWNLOAD_ACCEL_PREFIX', '/protected-data/')
+
+    # 持久化作业队列配置
+    # local: Web进程内调度执行；external: Web进程只入队，由独立的 worker.py 进程执行
+    TASK_QUEUE_MODE = os.getenv('TASK_QUEUE_MODE', 'local').lower()
+    TASK_JOB_LEASE_SECONDS = int(os.getenv('TASK_JOB_LEASE_SECONDS', '120'))  # 租约时长，超时未续约则重新入队
+    TASK_JOB_HEARTBEAT_INTERVAL = int(os.getenv('TASK_JOB_HEARTBEAT_INTERVAL', '30'))  # 心跳续约间隔
+    TASK_JOB_POLL_INTERVAL = float(os.getenv('TASK_JOB_POLL_INTERVAL', '2'))  # 空闲时轮询队列的间隔
+    TASK_JOB_MAX_ATTEMPTS = int(os.getenv('TASK_JOB_MAX_ATTEMPTS', '3'))  # 租约过期后最多重新执行的次数
+    # 用户任务计数与任务表核对的间隔（秒），0表示不自动核对
+    TASK_COUNTER_RECONCILE_INTERVAL = int(os.getenv('TASK_COUNTER_RECONCILE_INTERVAL', '3600'))
+
+    # Dify HTTP连接池配置
+    DIFY_HTTP_POOL_MAXSIZE = int(os.getenv('DIFY_HTTP_POOL_MAXSIZE', '20'))  # 每个Dify主机保持的最大连接数
+    DIFY_HTTP_POOL_SIZES = os.getenv('DIFY_HTTP_POOL_SIZES', '')  # 按主机覆盖，格式: 10.100.100.93=50,dify.example.com=20
+    # 按API类型覆盖超时（连接/读取秒数），格式: chat=10/300,file_upload=10/120
+    DIFY_HTTP_TIMEOUTS = os.getenv('DIFY_HTTP_TIMEOUTS', '')
+    # 按API类型覆盖最大尝试次数（含首次，1表示不重试），格式: conversations=3,file_upload=1
+    DIFY_HTTP_RETRIES = os.getenv('DIFY_HTTP_RETRIES', '')
+    DIFY_RETRY_BACKOFF_BASE = float(os.getenv('DIFY_RETRY_BACKOFF_BASE', '0.5'))  # 重试退避基数（秒），第n次重试最多等待 基数*2^(n-1)
+    DIFY_RETRY_BACKOFF_MAX = float(os.getenv('DIFY_RETRY_BACKOFF_MAX', '8'))  # 单次重试等待上限（秒）
+    DIFY_RETRY_AFTER_MAX = float(os.getenv('DIFY_RETRY_AFTER_MAX', '30'))  # Retry-After 超过该秒数时不再重试，直接返回上游响应
+    # 重试预算：每个请求积累的重试额度及每秒保底额度（每个Dify主机），防止上游故障时重试放大流量
+    DIFY_RETRY_BUDGET_RATIO = float(os.getenv('DIFY_RETRY_BUDGET_RATIO', '0.2'))
+    DIFY_RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv('DIFY_RETRY_BUDGET_MIN_PER_SECOND', '1'))
+    # 熔断：按（应用场景/任务类型, Dify主机）统计，窗口内失败率达到阈值后快速失败，打开一段时间后放行探测请求
+    DIFY_CIRCUIT_BREAKER_ENABLED = os.getenv('DIFY_CIRCUIT_BREAKER_ENABLED', 'True').lower() == 'true'
+    DIFY_CIRCUIT_FAILURE_RATE = float(os.getenv('DIFY_CIRCUIT_FAILURE_RATE', '0.5'))  # 打开熔断的失败率阈值（0~1）
+    DIFY_CIRCUIT_MIN_CALLS = int(os.getenv('DIFY_CIRCUIT_MIN_CALLS', '10'))  # 计算失败率所需的最少请求数
+    DIFY_CIRCUIT_WINDOW_SECONDS = float(os.getenv('DIFY_CIRCUIT_WINDOW_SECONDS', '60'))  # 失败率统计窗口（秒）
+    DIFY_CIRCUIT_OPEN_SECONDS = float(os.getenv('DIFY_CIRCUIT_OPEN_SECONDS', '30'))  # 熔断打开后多久进入半开状态（秒）
+    DIFY_CIRCUIT_HALF_OPEN_PROBES = int(os.getenv('DIFY_CIRCUIT_HALF_OPEN_PROBES', '1'))  # 半开状态同时放行的探测请求数
+    # ASGI入口（asgi.py）下每个Dify主机同时打开的聊天流上限（每个工作进程）
+    DIFY_ASYNC_MAX_STREAMS = int(os.getenv('DIFY_ASYNC_MAX_STREAMS', '1000'))
+    # ASGI入口下处理其余（Flask）请求的线程数（每个工作进程），慢请求之间互不阻塞
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '40'))
+    # 聊天流式转发时上游超过该秒数没有数据则向客户端发送心跳注释行，0表示不发送
+    SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+    # 相同内容文件复用Dify文件ID的有效期（秒），0表示每次都重新上传
+    DIFY_FILE_REUSE_TTL = int(os.getenv('DIFY_FILE_REUSE_TTL', '86400'))
+    
     # 会话列表专用Dify API配置（独立管理）
     DIFY_CONVERSATIONS_API_URL = os.getenv('DIFY_CONVERSATIONS_API_URL', 'http://10.100.100.93/v1/conversations')
     DIFY_CONVERSATIONS_API_KEY = os.getenv('DIFY_CONVERSATIONS_API_KEY', 'app-conversations-key')
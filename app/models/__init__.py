@@ -5,12 +5,16 @@
 # 数据模型模块
 from app.models.user import User
 from app.models.conversation import Conversation
-from app.models.task import Task, TaskFile, TaskResult
+from app.models.task import Task, TaskFile, TaskResult, TaskResultItem, TaskJob, ExportJob, UserTaskCounter
 
 __all__ = [
     'User',
     'Conversation',
     'Task',
     'TaskFile',
-    'TaskResult'
+    'TaskResult',
+    'TaskResultItem',
+    'TaskJob',
+    'ExportJob',
+    'UserTaskCounter'
 ]
\ No newline at end of file
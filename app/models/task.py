@@ -2,6 +2,7 @@ from app import db
 from datetime import datetime
 import uuid
 import json
+from app.utils.cursor_pagination import keyset_paginate
 
 class Task(db.Model):
     """任务模型 - 管理六种标准处理任务"""
@@ -27,8 +28,14 @@ class Task(db.Model):
     # 关联关系
     files = db.relationship('TaskFile', backref='task', lazy='dynamic', cascade='all, delete-orphan')
     results = db.relationship('TaskResult', backref='task', lazy='dynamic', cascade='all, delete-orphan')
+    jobs = db.relationship('TaskJob', backref='task', lazy='dynamic', cascade='all, delete-orphan')
     user = db.relationship('User', backref='tasks')
     
+    __table_args__ = (
+        # 任务列表按创建时间倒序的游标分页
+        db.Index('idx_tasks_user_created_id', 'user_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self, include_relations=False):
         """转换为字典格式"""
         data = {
@@ -52,19 +59,36 @@ class Task(db.Model):
         return data
     
     def update_status(self, status):
-        """更新任务状态"""
+        """更新任务状态，同一事务内同步更新用户任务计数"""
+        old_status = self.status
         self.status = status
         self.updated_at = datetime.utcnow()
+        if old_status != status:
+            db.session.flush()
+            UserTaskCounter.apply_deltas(self.user_id, {old_status: -1, status: 1})
         db.session.commit()
     
     def save(self):
-        """保存任务到数据库"""
+        """保存任务到数据库，同一事务内同步更新用户任务计数"""
+        state = db.inspect(self)
+        is_new = state.transient or state.pending
+        status_history = state.attrs.status.history
+        
         db.session.add(self)
+        db.session.flush()
+        
+        if is_new:
+            UserTaskCounter.apply_deltas(self.user_id, {'total': 1, self.status: 1, self.task_type: 1})
+        elif status_history.deleted and status_history.deleted[0] != self.status:
+            UserTaskCounter.apply_deltas(self.user_id, {status_history.deleted[0]: -1, self.status: 1})
         db.session.commit()
     
     def delete(self):
-        """从数据库删除任务"""
+        """从数据库删除任务，同一事务内同步更新用户任务计数"""
+        user_id, status, task_type = self.user_id, self.status, self.task_type
         db.session.delete(self)
+        db.session.flush()
+        UserTaskCounter.apply_deltas(user_id, {'total': -1, status: -1, task_type: -1})
         db.session.commit()
     
     @staticmethod
@@ -73,8 +97,8 @@ class Task(db.Model):
         return Task.query.get(task_id)
     
     @staticmethod
-    def find_by_user_id(user_id, status=None, task_type=None, page=1, per_page=20):
-        """根据用户ID查找任务，支持状态和类型筛选（支持多状态查询）"""
+    def _query_by_user_id(user_id, status=None, task_type=None):
+        """构建按用户查询任务的基础查询，支持状态和类型筛选（支持多状态查询）"""
         query = Task.query.filter_by(user_id=user_id)
         if status:
             # 支持多状态查询，用逗号分隔
@@ -85,10 +109,22 @@ class Task(db.Model):
                 query = query.filter_by(status=status)
         if task_type:
             query = query.filter_by(task_type=task_type)
+        return query
+    
+    @staticmethod
+    def find_by_user_id(user_id, status=None, task_type=None, page=1, per_page=20):
+        """根据用户ID查找任务，支持状态和类型筛选（支持多状态查询）"""
+        query = Task._query_by_user_id(user_id, status, task_type)
         return query.order_by(Task.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
     
+    @staticmethod
+    def find_by_user_id_cursor(user_id, status=None, task_type=None, cursor=None, per_page=20, with_total=False):
+        """根据用户ID按游标分页查找任务，使用 (user_id, created_at, id) 复合索引，不执行OFFSET扫描"""
+        query = Task._query_by_user_id(user_id, status, task_type)
+        return keyset_paginate(query, Task.created_at, Task.id, cursor=cursor, per_page=per_page, with_total=with_total)
+    
     def get_task_type_display(self):
         """获取任务类型的中文显示名称"""
         type_mapping = {
@@ -145,10 +181,12 @@ class TaskFile(db.Model):
     file_size = db.Column(db.BigInteger, nullable=False, comment='文件大小（字节）')
     file_type = db.Column(db.String(100), nullable=False, comment='文件类型/MIME类型')
     file_extension = db.Column(db.String(20), nullable=True, comment='文件扩展名')
+    content_hash = db.Column(db.String(64), nullable=True, comment='文件内容SHA-256哈希')
     
     # Dify相关信息
     dify_file_id = db.Column(db.String(100), nullable=True, index=True, comment='Dify返回的文件ID')
     dify_response_data = db.Column(db.Text, nullable=True, comment='Dify返回的完整信息（JSON格式）')
+    dify_key_fingerprint = db.Column(db.String(64), nullable=True, comment='上传所用Dify应用密钥指纹')
     
     # 状态信息
     upload_status = db.Column(db.Enum('pending', 'uploading', 'uploaded', 'failed'), 
@@ -161,6 +199,13 @@ class TaskFile(db.Model):
     # 关联关系
     user = db.relationship('User', backref='task_files')
     
+    __table_args__ = (
+        # 相同内容复用Dify文件ID的查找
+        db.Index('idx_task_files_hash_key', 'content_hash', 'dify_key_fingerprint'),
+        # 删除文件前检查共享引用
+        db.Index('idx_task_files_file_path', 'file_path'),
+    )
+    
     def to_dict(self, include_relations=False):
         """转换为字典格式"""
         # 生成文件下载URL
@@ -176,6 +221,7 @@ class TaskFile(db.Model):
             'file_size': self.file_size,
             'file_type': self.file_type,
             'file_extension': self.file_extension,
+            'content_hash': self.content_hash,
             'dify_file_id': self.dify_file_id,
             'upload_status': self.upload_status,
             'upload_error': self.upload_error,
@@ -205,9 +251,11 @@ class TaskFile(db.Model):
         self.updated_at = datetime.utcnow()
         db.session.commit()
     
-    def set_dify_info(self, dify_file_id, dify_response):
+    def set_dify_info(self, dify_file_id, dify_response, key_fingerprint=None):
         """设置Dify相关信息"""
         self.dify_file_id = dify_file_id
+        if key_fingerprint:
+            self.dify_key_fingerprint = key_fingerprint
         if isinstance(dify_response, dict):
             self.dify_response_data = json.dumps(dify_response, ensure_ascii=False)
         else:
@@ -235,6 +283,64 @@ class TaskFile(db.Model):
         """根据任务ID查找文件"""
         return TaskFile.query.filter_by(task_id=task_id).all()
     
+    @staticmethod
+    def count_by_file_path(file_path):
+        """统计引用指定本地文件的记录数（内容寻址存储下文件可能被共享）"""
+        return TaskFile.query.filter_by(file_path=file_path).count()
+    
+    @staticmethod
+    def find_reusable_dify_upload(content_hash, key_fingerprint, user_id, since):
+        """查找同一内容、同一Dify应用、同一用户在指定时间之后成功上传的文件记录"""
+        if not content_hash or not key_fingerprint:
+            return None
+        return TaskFile.query.filter(
+            TaskFile.content_hash == content_hash,
+            TaskFile.dify_key_fingerprint == key_fingerprint,
+            TaskFile.user_id == user_id,
+            TaskFile.upload_status == 'uploaded',
+            TaskFile.dify_file_id.isnot(None),
+            TaskFile.created_at >= since
+        ).order_by(TaskFile.created_at.desc()).first()
+    
+    @staticmethod
+    def invalidate_dify_upload(dify_file_id):
+        """Dify已不再接受该文件ID（过期或被清理）时，清除所有引用它的记录的密钥指纹，使其不再被复用"""
+        if not dify_file_id:
+            return 0
+        invalidated = TaskFile.query.filter(
+            TaskFile.dify_file_id == dify_file_id,
+            TaskFile.dify_key_fingerprint.isnot(None)
+        ).update({'dify_key_fingerprint': None, 'updated_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return invalidated
+    
+    @staticmethod
+    def find_by_task_ids(task_ids):
+        """根据多个任务ID批量查找文件，一次查询返回 {task_id: [文件列表]}"""
+        files_by_task = {task_id: [] for task_id in task_ids}
+        if not task_ids:
+            return files_by_task
+        files = TaskFile.query.filter(TaskFile.task_id.in_(task_ids)).order_by(TaskFile.created_at.asc()).all()
+        for file in files:
+            files_by_task[file.task_id].append(file)
+        return files_by_task
+    
+    @staticmethod
+    def count_by_task_ids(task_ids):
+        """根据多个任务ID批量统计文件数量，一次查询返回 {task_id: 文件数}"""
+        from sqlalchemy import func
+        counts = {task_id: 0 for task_id in task_ids}
+        if not task_ids:
+            return counts
+        rows = (
+            db.session.query(TaskFile.task_id, func.count(TaskFile.id))
+            .filter(TaskFile.task_id.in_(task_ids))
+            .group_by(TaskFile.task_id)
+            .all()
+        )
+        counts.update(dict(rows))
+        return counts
+    
     def __repr__(self):
         return f'<TaskFile {self.original_filename} ({self.upload_status})>'
 
@@ -262,6 +368,8 @@ class TaskResult(db.Model):
     
     # 关联关系
     user = db.relationship('User', backref='task_results')
+    # 条目由数据库外键级联删除，避免删除结果时逐条加载
+    items = db.relationship('TaskResultItem', backref='result', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
     
     def to_dict(self, include_relations=False):
         """转换为字典格式"""
@@ -314,5 +422,507 @@ class TaskResult(db.Model):
         """根据用户ID和任务ID查找结果"""
         return TaskResult.query.filter_by(user_id=user_id, task_id=task_id).order_by(TaskResult.created_at.desc()).all()
     
+    @staticmethod
+    def find_latest_by_user_and_task(user_id, task_id):
+        """根据用户ID和任务ID查找最新的一条结果"""
+        return TaskResult.query.filter_by(user_id=user_id, task_id=task_id).order_by(TaskResult.created_at.desc()).first()
+    
     def __repr__(self):
-        return f'<TaskResult {self.task_id} ({self.created_at})>' 
\ No newline at end of file
+        return f'<TaskResult {self.task_id} ({self.created_at})>'
+
+
+class TaskResultItem(db.Model):
+    """任务结果条目模型 - 将分页类任务的结果列表按条目拆分存储，分页、排序和计数直接在数据库中完成"""
+    
+    __tablename__ = 'task_result_items'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()), comment='条目唯一标识符')
+    result_id = db.Column(db.String(36), db.ForeignKey('task_results.id', ondelete='CASCADE'), nullable=False, comment='任务结果ID')
+    task_id = db.Column(db.String(36), db.ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False, index=True, comment='任务ID')
+    
+    # 排序字段：sn为条目序号（非数字时为空），position为条目在原始结果中的位置
+    sn = db.Column(db.Integer, nullable=True, comment='条目序号')
+    position = db.Column(db.Integer, nullable=False, comment='条目在原始结果中的位置')
+    
+    # 筛选字段：从条目内容中提取，用于服务端筛选
+    is_compliant = db.Column(db.String(20), nullable=True, comment='是否符合（isCompliant）')
+    issue_location = db.Column(db.String(255), nullable=True, comment='问题位置（issueLocation）')
+    reference_standard = db.Column(db.String(255), nullable=True, comment='引用标准（referenceStandard）')
+    search_text = db.Column(db.Text, nullable=True, comment='全文检索内容（originalText + issueDescription）')
+    
+    # 条目完整内容
+    data = db.Column(db.Text, nullable=False, comment='条目内容（JSON格式）')
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, comment='创建时间')
+    
+    __table_args__ = (
+        db.Index('idx_task_result_items_result_sn', 'result_id', 'sn', 'position'),
+        db.UniqueConstraint('result_id', 'position', name='uq_task_result_items_result_position'),
+        db.Index('idx_task_result_items_result_compliant', 'result_id', 'is_compliant'),
+        db.Index('idx_task_result_items_result_location', 'result_id', 'issue_location'),
+        db.Index('idx_task_result_items_result_reference', 'result_id', 'reference_standard'),
+        # MySQL使用ngram分词的全文索引支持中文检索，其他数据库忽略该索引选项
+        db.Index('ft_task_result_items_search_text', 'search_text', mysql_prefix='FULLTEXT', mysql_with_parser='ngram'),
+    )
+    
+    # 条目内容字段与筛选列的对应关系
+    FILTER_FIELDS = {
+        'is_compliant': 'isCompliant',
+        'issue_location': 'issueLocation',
+        'reference_standard': 'referenceStandard'
+    }
+    
+    # 参与全文检索的条目字段
+    SEARCH_FIELDS = ['originalText', 'issueDescription']
+    
+    # ngram全文索引的最小分词长度（MySQL默认 ngram_token_size=2），更短的关键词使用LIKE匹配
+    FULLTEXT_MIN_LENGTH = 2
+    
+    @staticmethod
+    def _normalize_filter_value(value, max_length=255):
+        """将条目字段值转换为可索引的字符串"""
+        if value is None:
+            return None
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value, ensure_ascii=False)
+        value = str(value).strip()
+        return value[:max_length] if value else None
+    
+    @classmethod
+    def extract_columns(cls, item):
+        """从条目内容中提取筛选列和全文检索内容"""
+        if not isinstance(item, dict):
+            return {'is_compliant': None, 'issue_location': None, 'reference_standard': None, 'search_text': None}
+        
+        columns = {
+            column: cls._normalize_filter_value(
+                item.get(field),
+                max_length=cls.__table__.c[column].type.length
+            )
+            for column, field in cls.FILTER_FIELDS.items()
+        }
+        search_parts = [str(item.get(field)).strip() for field in cls.SEARCH_FIELDS if item.get(field)]
+        columns['search_text'] = '\n'.join(search_parts) or None
+        return columns
+    
+    def get_data(self):
+        """解析条目内容"""
+        try:
+            return json.loads(self.data)
+        except:
+            return None
+    
+    @staticmethod
+    def count_by_result_id(result_id):
+        """统计结果的条目数量"""
+        return TaskResultItem.query.filter_by(result_id=result_id).count()
+    
+    @classmethod
+    def build_query(cls, result_id, filters=None):
+        """
+        构建带筛选条件的条目查询
+        
+        Args:
+            result_id (str): 任务结果ID
+            filters (dict): 筛选条件，支持 is_compliant（精确匹配）、issue_location / reference_standard（前缀匹配）、
+                            search（在 originalText / issueDescription 中检索）
+        """
+        query = cls.query.filter_by(result_id=result_id)
+        filters = filters or {}
+        
+        if filters.get('is_compliant'):
+            query = query.filter(cls.is_compliant == filters['is_compliant'])
+        
+        # 前缀匹配可以使用 (result_id, 字段) 复合索引
+        for column in ('issue_location', 'reference_standard'):
+            if filters.get(column):
+                query = query.filter(getattr(cls, column).like(cls._escape_like(filters[column]) + '%', escape='\\'))
+        
+        search = (filters.get('search') or '').strip()
+        if search:
+            if db.engine.dialect.name == 'mysql' and len(search) >= cls.FULLTEXT_MIN_LENGTH:
+                # 布尔模式下按短语匹配，去掉会被解析为运算符的双引号
+                phrase = '"' + search.replace('"', ' ') + '"'
+                query = query.filter(cls.search_text.match(phrase))
+            else:
+                query = query.filter(cls.search_text.like('%' + cls._escape_like(search) + '%', escape='\\'))
+        
+        return query
+    
+    @staticmethod
+    def _escape_like(value):
+        """转义LIKE模式中的通配符"""
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    
+    @classmethod
+    def find_page(cls, query, offset, limit, sort_by='sn', sort_order='asc'):
+        """对条目查询排序并分页，sn相同（或为空）时按原始位置排序"""
+        if sort_by == 'sn':
+            sn_order = cls.sn.desc() if sort_order.lower() == 'desc' else cls.sn.asc()
+            query = query.order_by(sn_order, cls.position.asc())
+        else:
+            query = query.order_by(cls.position.asc())
+        return query.offset(offset).limit(limit).all()
+
+    @classmethod
+    def iter_data(cls, query, sort_by='sn', sort_order='asc', batch_size=500):
+        """按排序分批读取条目内容，逐条产出，用于导出全部条目时不一次性加载到内存"""
+        offset = 0
+        while True:
+            batch = cls.find_page(query, offset=offset, limit=batch_size, sort_by=sort_by, sort_order=sort_order)
+            for item in batch:
+                data = item.get_data()
+                if data is not None:
+                    yield data
+            if len(batch) < batch_size:
+                break
+            offset += batch_size
+
+    def __repr__(self):
+        return f'<TaskResultItem {self.result_id} (sn={self.sn})>'
+
+
+class TaskJob(db.Model):
+    """任务作业模型 - 标准处理请求的持久化队列，支持租约认领、心跳和过期重新入队"""
+    
+    __tablename__ = 'task_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()), comment='作业唯一标识符')
+    task_id = db.Column(db.String(36), db.ForeignKey('tasks.id'), nullable=False, index=True, comment='任务ID')
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True, comment='用户ID')
+    task_type = db.Column(db.String(50), nullable=True, index=True, comment='任务类型（用于按类型限制并发）')
+    
+    # 转发给Dify的原始请求参数
+    request_data = db.Column(db.Text, nullable=True, comment='Dify请求参数（JSON格式）')
+    
+    # 作业状态: queued(排队中), running(执行中), completed(已完成), failed(失败)
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed'), 
+                      default='queued', nullable=False, index=True, comment='作业状态')
+    attempts = db.Column(db.Integer, default=0, nullable=False, comment='已认领执行次数')
+    max_attempts = db.Column(db.Integer, default=3, nullable=False, comment='最大执行次数')
+    
+    # 租约信息
+    lease_owner = db.Column(db.String(100), nullable=True, comment='持有租约的工作进程标识')
+    lease_expires_at = db.Column(db.DateTime, nullable=True, index=True, comment='租约过期时间')
+    heartbeat_at = db.Column(db.DateTime, nullable=True, comment='最近心跳时间')
+    last_error = db.Column(db.Text, nullable=True, comment='最近一次错误信息')
+    available_at = db.Column(db.DateTime, nullable=True, comment='最早可认领时间（延迟重新入队，为空表示立即可认领）')
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, comment='创建时间')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, comment='更新时间')
+    started_at = db.Column(db.DateTime, nullable=True, comment='最近一次开始执行时间')
+    finished_at = db.Column(db.DateTime, nullable=True, comment='结束时间')
+    
+    __table_args__ = (
+        db.Index('idx_task_jobs_status_created', 'status', 'created_at'),
+    )
+    
+    def to_dict(self):
+        """转换为字典格式"""
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'user_id': self.user_id,
+            'task_type': self.task_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'last_error': self.last_error,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def get_request_data(self):
+        """解析请求参数"""
+        if not self.request_data:
+            return {}
+        try:
+            return json.loads(self.request_data)
+        except:
+            return {}
+    
+    def save(self):
+        """保存作业到数据库"""
+        db.session.add(self)
+        db.session.commit()
+    
+    @staticmethod
+    def find_by_id(job_id):
+        """根据ID查找作业"""
+        return TaskJob.query.get(job_id)
+    
+    @staticmethod
+    def count_by_status():
+        """按状态统计作业数量"""
+        from sqlalchemy import func
+        return dict(
+            db.session.query(TaskJob.status, func.count(TaskJob.id))
+            .group_by(TaskJob.status)
+            .all()
+        )
+    
+    def __repr__(self):
+        return f'<TaskJob {self.task_id} ({self.status})>'
+
+
+class ExportJob(db.Model):
+    """异步导出任务模型 - 任务状态保存在数据库中，多个工作进程都可以查询和下载"""
+    
+    __tablename__ = 'export_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: uuid.uuid4().hex, comment='导出任务ID')
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True, comment='用户ID')
+    task_id = db.Column(db.String(36), nullable=False, comment='任务ID')
+    result_id = db.Column(db.String(36), nullable=False, comment='任务结果ID')
+    format = db.Column(db.String(30), nullable=False, comment='导出格式')
+    
+    # 状态: queued(排队中), running(渲染中), completed(已完成), failed(失败)
+    status = db.Column(db.Enum('queued', 'running', 'completed', 'failed'),
+                      default='queued', nullable=False, index=True, comment='导出状态')
+    error = db.Column(db.Text, nullable=True, comment='错误信息')
+    file_path = db.Column(db.String(500), nullable=True, comment='导出文件路径（导出缓存中）')
+    owner = db.Column(db.String(100), nullable=True, comment='负责渲染的工作进程标识')
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, comment='创建时间')
+    finished_at = db.Column(db.DateTime, nullable=True, index=True, comment='结束时间')
+    
+    __table_args__ = (
+        db.Index('idx_export_jobs_user_status', 'user_id', 'status'),
+    )
+    
+    ACTIVE_STATUSES = ('queued', 'running')
+    
+    def save(self):
+        """保存导出任务到数据库"""
+        db.session.add(self)
+        db.session.commit()
+    
+    @staticmethod
+    def find_by_id(job_id):
+        """根据ID查找导出任务"""
+        return ExportJob.query.get(job_id)
+    
+    @staticmethod
+    def find_active_by_user(user_id):
+        """查找用户进行中的导出任务"""
+        return ExportJob.query.filter(
+            ExportJob.user_id == user_id,
+            ExportJob.status.in_(ExportJob.ACTIVE_STATUSES)
+        ).order_by(ExportJob.created_at.asc()).all()
+    
+    @staticmethod
+    def count_by_status():
+        """按状态统计导出任务数量"""
+        from sqlalchemy import func
+        return dict(
+            db.session.query(ExportJob.status, func.count(ExportJob.id))
+            .group_by(ExportJob.status)
+            .all()
+        )
+    
+    def __repr__(self):
+        return f'<ExportJob {self.id} ({self.status})>'
+
+
+class UserTaskCounter(db.Model):
+    """用户任务计数模型 - 按状态和类型预先汇总的任务数量，仪表板直接读取单行，不再对任务历史做聚合"""
+    
+    __tablename__ = 'user_task_counters'
+    
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, comment='用户ID')
+    total_count = db.Column(db.Integer, default=0, nullable=False, comment='任务总数')
+    
+    # 按状态计数
+    pending_count = db.Column(db.Integer, default=0, nullable=False, comment='待处理任务数')
+    uploading_count = db.Column(db.Integer, default=0, nullable=False, comment='上传中任务数')
+    uploaded_count = db.Column(db.Integer, default=0, nullable=False, comment='上传完成任务数')
+    processing_count = db.Column(db.Integer, default=0, nullable=False, comment='处理中任务数')
+    completed_count = db.Column(db.Integer, default=0, nullable=False, comment='已完成任务数')
+    failed_count = db.Column(db.Integer, default=0, nullable=False, comment='失败任务数')
+    
+    # 按类型计数
+    standard_interpretation_count = db.Column(db.Integer, default=0, nullable=False, comment='标准解读任务数')
+    standard_recommendation_count = db.Column(db.Integer, default=0, nullable=False, comment='标准推荐任务数')
+    standard_comparison_count = db.Column(db.Integer, default=0, nullable=False, comment='标准对比任务数')
+    standard_international_count = db.Column(db.Integer, default=0, nullable=False, comment='标准国际化辅助任务数')
+    standard_compliance_count = db.Column(db.Integer, default=0, nullable=False, comment='标准符合性检查任务数')
+    standard_review_count = db.Column(db.Integer, default=0, nullable=False, comment='标准审查任务数')
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, comment='更新时间')
+    reconciled_at = db.Column(db.DateTime, nullable=True, index=True, comment='最近一次与任务表核对的时间')
+    
+    STATUSES = ['pending', 'uploading', 'uploaded', 'processing', 'completed', 'failed']
+    TASK_TYPES = ['standard_interpretation', 'standard_recommendation', 'standard_comparison',
+                  'standard_international', 'standard_compliance', 'standard_review']
+    
+    @staticmethod
+    def _column_for(key):
+        """状态/类型名称对应的计数列，'total' 对应总数列"""
+        return f'{key}_count'
+    
+    @classmethod
+    def compute(cls, user_id=None):
+        """
+        按任务表聚合计数
+        
+        Returns:
+            dict: {user_id: {计数列: 数量}}，指定 user_id 时只统计该用户
+        """
+        from sqlalchemy import func
+        
+        counts = {}
+        status_query = db.session.query(Task.user_id, Task.status, func.count(Task.id))
+        type_query = db.session.query(Task.user_id, Task.task_type, func.count(Task.id))
+        if user_id:
+            status_query = status_query.filter(Task.user_id == user_id)
+            type_query = type_query.filter(Task.user_id == user_id)
+        
+        for uid, status, count in status_query.group_by(Task.user_id, Task.status).all():
+            user_counts = counts.setdefault(uid, cls._empty_counts())
+            user_counts[cls._column_for(status)] = count
+            user_counts['total_count'] += count
+        for uid, task_type, count in type_query.group_by(Task.user_id, Task.task_type).all():
+            counts.setdefault(uid, cls._empty_counts())[cls._column_for(task_type)] = count
+        
+        if user_id and user_id not in counts:
+            counts[user_id] = cls._empty_counts()
+        return counts
+    
+    @classmethod
+    def _empty_counts(cls):
+        columns = ['total'] + cls.STATUSES + cls.TASK_TYPES
+        return {cls._column_for(key): 0 for key in columns}
+    
+    @classmethod
+    def apply_deltas(cls, user_id, deltas):
+        """
+        在当前事务中原子累加计数（调用方负责提交）
+        
+        计数行不存在时按任务表重建（调用前已flush，当前变更已包含在聚合结果中）
+        
+        Args:
+            user_id (str): 用户ID
+            deltas (dict): {状态/类型/'total': 增量}
+        """
+        from sqlalchemy.exc import IntegrityError
+        
+        table = cls.__table__
+        values = {}
+        for key, delta in deltas.items():
+            column = cls._column_for(key)
+            if delta and column in table.c:
+                values[column] = table.c[column] + delta
+        if not values:
+            return
+        values['updated_at'] = datetime.utcnow()
+        
+        update_stmt = table.update().where(table.c.user_id == user_id).values(**values)
+        if db.session.execute(update_stmt).rowcount:
+            return
+        
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert().values(
+                    user_id=user_id,
+                    updated_at=datetime.utcnow(),
+                    **cls.compute(user_id)[user_id]
+                ))
+        except IntegrityError:
+            # 并发请求已创建计数行（不包含本事务未提交的变更），改为累加
+            db.session.execute(update_stmt)
+    
+    @classmethod
+    def get_or_rebuild(cls, user_id):
+        """获取用户计数行，不存在时按任务表重建"""
+        from sqlalchemy.exc import IntegrityError
+        
+        counter = cls.query.get(user_id)
+        if counter:
+            return counter
+        
+        counter = cls(user_id=user_id, reconciled_at=datetime.utcnow(), **cls.compute(user_id)[user_id])
+        db.session.add(counter)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            counter = cls.query.get(user_id)
+        return counter
+    
+    @classmethod
+    def reconcile_all(cls):
+        """
+        将所有用户的计数与任务表核对并修正偏差
+        
+        每个用户单独一个事务，锁定计数行后再聚合任务表（见 reconcile_user），核对期间提交的增量不会被覆盖
+        
+        Returns:
+            dict: {'users': 核对用户数, 'corrected': 修正用户数}
+        """
+        user_ids = {user_id for user_id, in db.session.query(Task.user_id).distinct()}
+        user_ids |= {user_id for user_id, in db.session.query(cls.user_id)}
+        db.session.commit()
+        
+        corrected = sum(1 for user_id in user_ids if cls.reconcile_user(user_id))
+        return {'users': len(user_ids), 'corrected': corrected}
+    
+    @classmethod
+    def reconcile_user(cls, user_id):
+        """
+        在单独的事务中核对并修正一个用户的计数
+        
+        先以 SELECT ... FOR UPDATE 锁定计数行，再聚合任务表：锁定前已提交的 apply_deltas 包含在聚合结果中，
+        之后的 apply_deltas 等待本事务提交后在修正值上累加
+        
+        Returns:
+            bool: 是否修正了计数
+        """
+        from sqlalchemy.exc import IntegrityError
+        
+        now = datetime.utcnow()
+        counter = cls.query.filter_by(user_id=user_id).with_for_update().populate_existing().first()
+        counts = cls.compute(user_id)[user_id]
+        if counter is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(cls(user_id=user_id, reconciled_at=now, **counts))
+            except IntegrityError:
+                # 并发请求已按任务表创建计数行
+                db.session.rollback()
+                return False
+            db.session.commit()
+            return True
+        
+        drift = {column: value for column, value in counts.items() if getattr(counter, column) != value}
+        for column, value in drift.items():
+            setattr(counter, column, value)
+        counter.reconciled_at = now
+        db.session.commit()
+        return bool(drift)
+    
+    @classmethod
+    def last_reconciled_at(cls):
+        """最近一次核对时间"""
+        from sqlalchemy import func
+        return db.session.query(func.max(cls.reconciled_at)).scalar()
+    
+    def to_stats(self):
+        """转换为仪表板统计格式（只包含数量大于0的状态和类型）"""
+        status_stats = {status: getattr(self, self._column_for(status)) for status in self.STATUSES}
+        type_stats = {task_type: getattr(self, self._column_for(task_type)) for task_type in self.TASK_TYPES}
+        return {
+            'total_tasks': self.total_count,
+            'status_stats': {key: value for key, value in status_stats.items() if value},
+            'type_stats': {key: value for key, value in type_stats.items() if value}
+        }
+    
+    def __repr__(self):
+        return f'<UserTaskCounter {self.user_id} ({self.total_count})>'
+
@@ -1,12 +1,24 @@
 from flask import Blueprint, request, Response, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import time
+import threading
 from app.models.user import User
 from app.services.dify_app_service import DifyAppService
+from app.services.dify_client import DifyClient, DifyCircuitOpenError
+from app.config.config import Config
+from app.utils.sse import SSERelay, ChatStreamMetrics, iter_upstream_chunks, iter_with_heartbeat
 
 # 创建Dify V2 API转发蓝图 - 支持应用场景参数
 dify_v2_bp = Blueprint('dify_v2', __name__)
 
+# 聊天流式响应头（同步接口和ASGI异步代理共用）
+CHAT_STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+}
+
 # 新增：为向后兼容，添加旧的路由到新的 V2 接口
 @dify_v2_bp.route('/chat-simple', methods=['POST'])
 @jwt_required()
@@ -48,28 +60,31 @@ def get_config_legacy():
     current_app.logger.warning("[Dify兼容路由] 使用了旧路由 /api/dify/v2/config，建议使用   场景路由")
     return get_scenarios()
 
-@dify_v2_bp.route('/<scenario>/chat-simple', methods=['POST'])
-@jwt_required()
-def chat_simple_v2(scenario):
+def _stop_generation(app, scenario, task_id, user):
+    """后台线程：客户端断开后停止Dify生成"""
+    with app.app_context():
+        ChatStreamMetrics.record_stop(scenario, DifyAppService.stop_generation(scenario, task_id, user))
+
+def prepare_chat_request(scenario):
     """
-    Dify聊天接口 V2 - 支持应用场景参数
+    校验聊天请求的应用场景、用户和请求数据（需在已通过JWT校验的请求上下文中调用）
     
-    URL示例:
-    - POST /api/dify/v2/multilingual_qa/chat-simple  (多语言问答)
-    - POST /api/dify/v2/standard_query/chat-simple   (标准查询)
+    同步接口和ASGI入口的异步流式代理共用
+    
+    Returns:
+        tuple: ((用户信息, 请求数据), None) 或 (None, 错误响应)
     """
-    start_time = time.time()
     client_ip = request.remote_addr
     
     # 验证应用场景
     valid_scenarios = [s['key'] for s in DifyAppService.get_all_scenarios()]
     if scenario not in valid_scenarios:
         current_app.logger.error(f"不支持的应用场景: {scenario}，支持的场景: {valid_scenarios}")
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'message': f'不支持的应用场景: {scenario}',
             'valid_scenarios': valid_scenarios
-        }), 400
+        }), 400)
     
     # 获取当前用户信息
     current_user_id = get_jwt_identity()
@@ -77,36 +92,55 @@ def chat_simple_v2(scenario):
     
     if not user:
         current_app.logger.warning(f"Dify V2聊天请求失败 - 用户不存在 - 用户ID: {current_user_id} - IP: {client_ip}")
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'message': '用户不存在'
-        }), 200
+        }), 200)
     
     if not user.is_active:
         current_app.logger.warning(f"Dify V2聊天请求失败 - 用户已被禁用 - 用户ID: {current_user_id} - IP: {client_ip}")
-        return jsonify({
+        return None, (jsonify({
             'success': False,
             'message': '账户已被禁用'
-        }), 403
+        }), 403)
     
     current_app.logger.info(f"[Dify V2聊天请求] 场景: {scenario} - 用户: {user.username or user.email} (ID: {user.id}) - IP: {client_ip}")
     
+    data = request.get_json(silent=True)
+    if not data:
+        return None, (jsonify({
+            'success': False,
+            'message': '请提供有效的JSON数据'
+        }), 400)
+    
+    # 准备用户信息
+    user_info = {
+        'id': user.id,
+        'username': user.username or user.email,
+        'email': user.email
+    }
+    return (user_info, data), None
+
+@dify_v2_bp.route('/<scenario>/chat-simple', methods=['POST'])
+@jwt_required()
+def chat_simple_v2(scenario):
+    """
+    Dify聊天接口 V2 - 支持应用场景参数
+    
+    URL示例:
+    - POST /api/dify/v2/multilingual_qa/chat-simple  (多语言问答)
+    - POST /api/dify/v2/standard_query/chat-simple   (标准查询)
+    
+    通过 asgi.py 部署时该接口由 app/asgi.py 的异步流式代理处理，不占用工作线程
+    """
+    start_time = time.time()
+    
+    prepared, error_response = prepare_chat_request(scenario)
+    if error_response:
+        return error_response
+    user_info, data = prepared
+    
     try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({
-                'success': False,
-                'message': '请提供有效的JSON数据'
-            }), 400
-        
-        # 准备用户信息
-        user_info = {
-            'id': user.id,
-            'username': user.username or user.email,
-            'email': user.email
-        }
-        
         # 使用DifyAppService转发请求
         success, response, status_code = DifyAppService.forward_request(
             scenario=scenario,
@@ -125,33 +159,59 @@ def chat_simple_v2(scenario):
                 'details': response
             }), status_code
         
+        # 生成器在响应返回后执行，此时已没有应用上下文
+        app = current_app._get_current_object()
+        logger = app.logger
+        heartbeat_interval = Config.SSE_HEARTBEAT_INTERVAL
+        relay = SSERelay(scenario, start_time)
+        
         def generate():
+            status = 'completed'
             try:
-                # 直接转发Dify原始响应，不做任何处理
-                for chunk in response.iter_content(chunk_size=8192, decode_unicode=False):
-                    if chunk:
-                        yield chunk
+                # 按事件边界转发Dify原始事件：完整事件立即发送，长时间没有数据时发送心跳
+                for chunk in iter_with_heartbeat(iter_upstream_chunks(response.raw), heartbeat_interval):
+                    if chunk is None:
+                        yield relay.heartbeat()
+                        continue
+                    events = relay.feed(chunk)
+                    if events:
+                        yield b''.join(events)
+                remaining = relay.flush()
+                if remaining:
+                    yield remaining
+            except GeneratorExit:
+                # 客户端断开：WSGI服务器写入失败（最迟在下一次心跳时）后关闭生成器
+                status = 'cancelled'
             except Exception as e:
-                current_app.logger.error(f"[Dify V2流式错误] 场景: {scenario} - 用户: {user.username or user.email} - 错误: {str(e)}")
+                status = 'error'
+                logger.error(f"[Dify V2流式错误] 场景: {scenario} - 用户: {user_info['username']} - 错误: {str(e)}")
                 # 只记录错误，不注入到响应流中
             finally:
-                elapsed_time = round((time.time() - start_time) * 1000, 2)
-                current_app.logger.info(f"[Dify V2请求完成] 场景: {scenario} - 用户: {user.username or user.email} - 耗时: {elapsed_time}ms")
+                # 关闭上游连接（客户端断开时Dify的流随之中断，连接不会放回连接池）
+                response.close()
+                if status == 'cancelled' and relay.generating:
+                    logger.info(f"[Dify V2客户端断开] 场景: {scenario} - 用户: {user_info['username']} - 停止生成 task_id: {relay.task_id}")
+                    threading.Thread(
+                        target=_stop_generation,
+                        args=(app, scenario, relay.task_id, data.get('user')),
+                        name='dify-stop',
+                        daemon=True
+                    ).start()
+                summary = relay.finish(status)
+                logger.info(
+                    f"[Dify V2请求完成] 场景: {scenario} - 用户: {user_info['username']} - 首字节: {summary['ttfb_ms']}ms - "
+                    f"tokens: {summary['tokens']} - 速度: {summary['tokens_per_second']}tokens/s - 心跳: {summary['heartbeats']} - 耗时: {summary['elapsed_ms']}ms"
+                )
         
         return Response(
             generate(),
             content_type='text/event-stream',
-            headers={
-                'Cache-Control': 'no-cache',
-                'Connection': 'keep-alive',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-            }
+            headers=CHAT_STREAM_HEADERS
         )
         
     except Exception as e:
         elapsed_time = round((time.time() - start_time) * 1000, 2)
-        current_app.logger.error(f"[Dify V2系统错误] 场景: {scenario} - 用户: {user.username or user.email} - 错误: {str(e)} - 耗时: {elapsed_time}ms", exc_info=True)
+        current_app.logger.error(f"[Dify V2系统错误] 场景: {scenario} - 用户: {user_info['username']} - 错误: {str(e)} - 耗时: {elapsed_time}ms", exc_info=True)
         return jsonify({
             'success': False,
             'message': f'系统错误: {str(e)}'
@@ -516,10 +576,9 @@ def rename_conversation_v2(scenario, conversation_id):
         base_config = DifyAppService.get_app_config(scenario, 'conversation_ops')
         api_url = f"{base_config['api_url']}/{conversation_id}/name"
         
-        # 直接发送POST请求到Dify API
-        import requests
+        # 通过共享连接池发送POST请求到Dify API
         headers = base_config['headers']
-        response = requests.post(api_url, json=data, headers=headers, timeout=60)
+        response = DifyClient.post(api_url, api_type='conversation_ops', circuit=scenario, json=data, headers=headers)
         
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         
@@ -550,6 +609,12 @@ def rename_conversation_v2(scenario, conversation_id):
             except:
                 return jsonify({'error': f'API返回错误: {response.status_code}', 'detail': response.text[:200]}), response.status_code
             
+    except DifyCircuitOpenError as e:
+        current_app.logger.warning(f"[Dify V2会话重命名熔断] 场景: {scenario} - 会话ID: {conversation_id} - {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 503
     except Exception as e:
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         current_app.logger.error(
@@ -616,14 +681,13 @@ def delete_conversation_v2(scenario, conversation_id):
         base_config = DifyAppService.get_app_config(scenario, 'conversation_ops')
         api_url = f"{base_config['api_url']}/{conversation_id}"
         
-        # 直接发送DELETE请求到Dify API
-        import requests
+        # 通过共享连接池发送DELETE请求到Dify API
         headers = base_config['headers']
-        kwargs = {'headers': headers, 'timeout': 60}
+        kwargs = {'headers': headers}
         if data:
             kwargs['json'] = data
         
-        response = requests.delete(api_url, **kwargs)
+        response = DifyClient.delete(api_url, api_type='conversation_ops', circuit=scenario, **kwargs)
         
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         
@@ -677,6 +741,12 @@ def delete_conversation_v2(scenario, conversation_id):
             except:
                 return jsonify({'error': f'API返回错误: {response.status_code}', 'detail': response.text[:200]}), response.status_code
             
+    except DifyCircuitOpenError as e:
+        current_app.logger.warning(f"[Dify V2删除会话熔断] 场景: {scenario} - 会话ID: {conversation_id} - {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 503
     except Exception as e:
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         current_app.logger.error(
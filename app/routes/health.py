@@ -7,16 +7,22 @@
 from flask import Blueprint, jsonify
 from datetime import datetime
 import time
+from app.services.dify_client import DifyClient
+from app.services.dify_async_client import DifyAsyncClient
+from app.utils.sse import ChatStreamMetrics
+from app.services.export_job_service import ExportJobService
+from app.services.font_service import FontService
 
 health_bp = Blueprint('health', __name__)
 
 @health_bp.route('/health', methods=['GET'])
 def health_check():
-    """健康检查接口"""
+    """健康检查接口（附带各Dify熔断器状态）"""
     try:
         return jsonify({
             'status': 'healthy',
             'message': '系统运行正常',
+            'dify_circuits': DifyClient.get_circuit_states(),
             'timestamp': datetime.utcnow().isoformat(),
             'server_time': time.time()
         }), 200
@@ -43,4 +49,48 @@ def status():
         'version': '1.0.0',
         'message': '用户管理系统 API 服务正在运行',
         'timestamp': datetime.utcnow().isoformat()
-    }), 200 
\ No newline at end of file
+    }), 200
+
+@health_bp.route('/health/dify', methods=['GET'])
+def dify_connection_stats():
+    """Dify连接池状态接口 - 各主机的请求数、在途请求、连接复用率、熔断器状态等"""
+    try:
+        return jsonify({
+            'status': 'healthy',
+            'dify_http': DifyClient.get_stats(),
+            'dify_circuits': DifyClient.get_circuit_states(),
+            'dify_async_streams': DifyAsyncClient.get_stats(),
+            'chat_streams': ChatStreamMetrics.get_stats(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'unhealthy',
+            'message': f'获取连接池状态失败: {str(e)}',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+@health_bp.route('/health/exports', methods=['GET'])
+def export_job_stats():
+    """导出渲染进程池状态接口 - 各状态的导出任务数"""
+    return jsonify({
+        'status': 'healthy',
+        'exports': ExportJobService.get_stats(),
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200
+
+@health_bp.route('/health/fonts', methods=['GET'])
+def font_diagnostics():
+    """PDF导出字体诊断接口 - 本进程已缓存的中文字体文件、ReportLab注册字体及weasyprint可用性（不触发字体查找）"""
+    try:
+        return jsonify({
+            'status': 'healthy',
+            'fonts': FontService.get_diagnostics(),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'status': 'unhealthy',
+            'message': f'获取字体信息失败: {str(e)}',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
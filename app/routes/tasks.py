@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app, Response, send_file
+from flask import Blueprint, request, jsonify, current_app, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.user import User
-from app.models.task import Task, TaskFile, TaskResult
+from app.models.task import Task, TaskFile, TaskResult, UserTaskCounter
 from app.services.task_service import TaskService
 from app.services.standard_config_service import StandardConfigService
 from app.services.document_service import DocumentService
+from app.services.chunked_upload_service import ChunkedUploadService, UploadSessionNotFoundError, UploadOffsetMismatchError, UploadInProgressError
+from app.services.export_cache_service import ExportCacheService
+from app.services.export_job_service import ExportJobService, ExportJobLimitError
+from app.services.preview_cache_service import PreviewCacheService
+from app.utils.worker_pool import WorkerPoolFullError
+from app.utils.cursor_pagination import InvalidCursorError
+from app.utils.file_download import send_local_file
 import json
 import time
 import os
@@ -12,6 +19,15 @@ import os
 # 创建任务管理蓝图
 tasks_bp = Blueprint('tasks', __name__)
 
+def _export_not_modified(etag):
+    """客户端已缓存相同导出文件时返回304，无需重新生成"""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return None
+
 @tasks_bp.route('/upload', methods=['POST'])
 @jwt_required()
 def upload_file():
@@ -121,15 +137,19 @@ def upload_multiple_files():
                 'message': f'无效的任务类型。支持的类型: {", ".join(valid_types)}'
             }), 400
         
-        # 获取上传的文件列表
+        # 获取上传的文件列表：支持 file1..fileN 字段（按序号排序）以及同名的 files 字段
         uploaded_files = []
-        file_keys = ['file1', 'file2']  # 支持最多两个文件
-        
-        for file_key in file_keys:
-            if file_key in request.files:
-                file = request.files[file_key]
-                if file and file.filename:  # 确保文件存在且有文件名
-                    uploaded_files.append(file)
+        numbered_keys = sorted(
+            (key for key in request.files.keys() if key.startswith('file') and key[4:].isdigit()),
+            key=lambda key: int(key[4:])
+        )
+        for file_key in numbered_keys:
+            file = request.files[file_key]
+            if file and file.filename:  # 确保文件存在且有文件名
+                uploaded_files.append(file)
+        for file in request.files.getlist('files'):
+            if file and file.filename:
+                uploaded_files.append(file)
         
         if len(uploaded_files) == 0:
             return jsonify({
@@ -137,6 +157,13 @@ def upload_multiple_files():
                 'message': '至少需要上传一个文件'
             }), 400
         
+        max_files = current_app.config.get('UPLOAD_MAX_FILES', 10)
+        if len(uploaded_files) > max_files:
+            return jsonify({
+                'success': False,
+                'message': f'单次最多上传 {max_files} 个文件'
+            }), 400
+        
         # 对于标准对比，检查是否上传了两个文件
         if task_type == 'standard_comparison' and len(uploaded_files) != 2:
             return jsonify({
@@ -148,27 +175,14 @@ def upload_multiple_files():
         task = TaskService.create_task(user.id, task_type)
         current_app.logger.info(f"创建任务成功 - 任务ID: {task.id} - 类型: {task_type}")
         
-        # 2. 依次上传所有文件到同一个任务
-        task_files = []
-        failed_files = []
-        
-        for i, file in enumerate(uploaded_files):
-            try:
-                current_app.logger.info(f"开始上传文件 {i+1}/{len(uploaded_files)} - 文件名: {file.filename}")
-                task_file = TaskService.upload_file_to_task(task.id, file, user.id)
-                task_files.append(task_file)
-                current_app.logger.info(f"文件上传成功 - 文件ID: {task_file.id} - Dify文件ID: {task_file.dify_file_id}")
-            except Exception as file_error:
-                current_app.logger.error(f"文件上传失败 - 文件: {file.filename} - 错误: {str(file_error)}")
-                failed_files.append({
-                    'filename': file.filename,
-                    'error': str(file_error)
-                })
+        # 2. 并行上传所有文件到同一个任务
+        task_files, failed_files = TaskService.upload_files_to_task(task.id, uploaded_files, user.id)
+        for task_file in task_files:
+            current_app.logger.info(f"文件上传成功 - 文件ID: {task_file.id} - Dify文件ID: {task_file.dify_file_id}")
         
         # 检查上传结果
         if len(failed_files) > 0:
-            # 如果有文件上传失败，标记任务为失败
-            task.update_status('failed')
+            # 有文件上传失败时任务已标记为失败
             return jsonify({
                 'success': False,
                 'message': '部分文件上传失败',
@@ -202,6 +216,231 @@ def upload_multiple_files():
             'message': f'多文件上传失败: {str(e)}'
         }), 500
 
+@tasks_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_chunked_upload():
+    """创建分片上传会话 - 大文件分片断点续传"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        data = request.get_json() or {}
+        upload = ChunkedUploadService.create_upload(
+            user.id,
+            data.get('filename'),
+            data.get('file_size'),
+            data.get('content_type')
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': '上传会话创建成功',
+            'data': upload
+        }), 201
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"创建分片上传会话失败 - 用户: {user.username or user.email} - 错误: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': f'创建上传会话失败: {str(e)}'
+        }), 500
+
+@tasks_bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_chunked_upload(upload_id):
+    """查询分片上传进度 - 返回服务端已接收的偏移量，用于断点续传"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        return jsonify({
+            'success': True,
+            'message': '获取上传进度成功',
+            'data': ChunkedUploadService.get_status(upload_id, user.id)
+        }), 200
+        
+    except UploadSessionNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 404
+
+@tasks_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    """上传分片 - 请求体为分片原始内容，偏移量通过 Upload-Offset 请求头或 offset 参数指定"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': '请提供有效的分片偏移量（Upload-Offset）'
+            }), 400
+        
+        upload = ChunkedUploadService.write_chunk(upload_id, user.id, offset, request.stream)
+        
+        return jsonify({
+            'success': True,
+            'message': '分片上传成功',
+            'data': upload
+        }), 200
+        
+    except UploadSessionNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 404
+    except UploadOffsetMismatchError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'data': {'offset': e.offset}
+        }), 409
+    except UploadInProgressError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"分片上传失败 - 上传ID: {upload_id} - 错误: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': f'分片上传失败: {str(e)}'
+        }), 500
+
+@tasks_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_chunked_upload(upload_id):
+    """完成分片上传 - 创建任务并将文件上传到Dify，返回格式与文件上传接口一致"""
+    start_time = time.time()
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        data = request.get_json() or {}
+        task_type = data.get('task_type')
+        if not task_type:
+            return jsonify({
+                'success': False,
+                'message': '请提供任务类型'
+            }), 400
+        
+        # 验证任务类型
+        if not StandardConfigService.validate_standard_type(task_type):
+            valid_types = [t['key'] for t in StandardConfigService.get_all_standard_types()]
+            return jsonify({
+                'success': False,
+                'message': f'无效的任务类型。支持的类型: {", ".join(valid_types)}'
+            }), 400
+        
+        # 1. 校验分片完整并移入文件存储
+        file_info = ChunkedUploadService.complete_upload(upload_id, user.id)
+        
+        # 2. 创建任务并上传文件到Dify
+        task = TaskService.create_task(user.id, task_type)
+        task_file = TaskService.upload_file_to_task(task.id, None, user.id, file_info=file_info)
+        
+        elapsed_time = round((time.time() - start_time) * 1000, 2)
+        current_app.logger.info(f"[分片上传完成] 任务ID: {task.id} - 文件: {task_file.original_filename} - 用户: {user.username or user.email} - 耗时: {elapsed_time}ms")
+        
+        return jsonify({
+            'success': True,
+            'message': '文件上传成功',
+            'data': {
+                'task': task.to_dict(),
+                'file': task_file.to_dict()
+            }
+        }), 201
+        
+    except UploadSessionNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 404
+    except UploadOffsetMismatchError as e:
+        return jsonify({
+            'success': False,
+            'message': f'文件尚未上传完整: {str(e)}',
+            'data': {'offset': e.offset}
+        }), 409
+    except UploadInProgressError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 409
+    except Exception as e:
+        elapsed_time = round((time.time() - start_time) * 1000, 2)
+        current_app.logger.error(f"完成分片上传失败 - 用户: {user.username or user.email} - 错误: {str(e)} - 耗时: {elapsed_time}ms", exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': f'文件上传失败: {str(e)}'
+        }), 500
+
+@tasks_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_chunked_upload(upload_id):
+    """取消分片上传 - 删除已接收的分片"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        ChunkedUploadService.abort_upload(upload_id, user.id)
+        return jsonify({
+            'success': True,
+            'message': '上传已取消'
+        }), 200
+        
+    except UploadSessionNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 404
+
 @tasks_bp.route('/standard-processing', methods=['POST'])
 @jwt_required()
 def standard_processing():
@@ -257,6 +496,14 @@ def standard_processing():
         # 启动异步任务执行
         try:
             success = TaskService.send_dify_request_direct_async(task_id, user.id, dify_request_data)
+        except WorkerPoolFullError:
+            queue_stats = TaskService.get_queue_stats()
+            current_app.logger.warning(f"[标准处理任务排队已满] 任务: {task_id} - 用户: {user.username or user.email} - 队列深度: {queue_stats['queue_depth']}")
+            return jsonify({
+                'success': False,
+                'message': '当前排队任务过多，请稍后重试',
+                'queue_depth': queue_stats['queue_depth']
+            }), 503
         except Exception as e:
             # 如果启动异步任务失败，记录错误并返回失败响应
             current_app.logger.error(f"启动异步任务异常 - 任务: {task_id} - 用户: {user.username or user.email} - 错误: {str(e)}", exc_info=True)
@@ -295,6 +542,36 @@ def standard_processing():
             'message': '请求发送失败'
         }), 500
 
+@tasks_bp.route('/queue-status', methods=['GET'])
+@jwt_required()
+def get_queue_status():
+    """获取标准处理后台队列状态 - 队列深度、运行中任务数及按类型的并发情况"""
+    # 获取当前用户信息
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        queue_stats = TaskService.get_queue_stats()
+        
+        return jsonify({
+            'success': True,
+            'message': '获取队列状态成功',
+            'data': queue_stats
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"获取队列状态失败 - 用户: {user.username or user.email} - 错误: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': f'获取队列状态失败: {str(e)}'
+        }), 500
+
 @tasks_bp.route('', methods=['GET'])
 @jwt_required()
 def get_tasks():
@@ -320,37 +597,66 @@ def get_tasks():
         task_type = request.args.get('task_type')
         page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 20)), 100)  # 最大100条
+        # include_files=false 时只返回文件数量，不返回文件明细
+        include_files = request.args.get('include_files', 'true').lower() != 'false'
         
         # 支持多状态查询，状态参数可以是逗号分隔的字符串
         # 例如: ?status=processing,completed,failed
-        current_app.logger.info(f"查询参数 - status: {status}, task_type: {task_type}, page: {page}, per_page: {per_page}")
+        current_app.logger.info(f"查询参数 - status: {status}, task_type: {task_type}, page: {page}, per_page: {per_page}, include_files: {include_files}")
+        
+        # 传入cursor参数（首页传空值）时使用游标分页，按创建时间倒序翻页，不统计总数（include_total=true时统计）
+        use_cursor = 'cursor' in request.args
         
         # 查询任务
-        pagination = Task.find_by_user_id(user.id, status, task_type, page, per_page)
+        if use_cursor:
+            include_total = request.args.get('include_total', 'false').lower() == 'true'
+            pagination = Task.find_by_user_id_cursor(
+                user.id, status, task_type,
+                cursor=request.args.get('cursor') or None,
+                per_page=per_page,
+                with_total=include_total
+            )
+        else:
+            pagination = Task.find_by_user_id(user.id, status, task_type, page, per_page)
+        
+        # 批量加载当前页所有任务的文件信息，查询次数与每页数量无关
+        task_ids = [task.id for task in pagination.items]
+        if include_files:
+            files_by_task = TaskFile.find_by_task_ids(task_ids)
+        else:
+            file_counts = TaskFile.count_by_task_ids(task_ids)
         
         tasks_data = []
         for task in pagination.items:
             task_dict = task.to_dict()
             # 添加文件信息
-            files = TaskFile.find_by_task_id(task.id)
-            task_dict['files'] = [f.to_dict() for f in files]
-            task_dict['file_count'] = len(files)
+            if include_files:
+                files = files_by_task.get(task.id, [])
+                task_dict['files'] = [f.to_dict() for f in files]
+                task_dict['file_count'] = len(files)
+            else:
+                task_dict['file_count'] = file_counts.get(task.id, 0)
             tasks_data.append(task_dict)
         
+        if use_cursor:
+            pagination_data = pagination.to_dict()
+        else:
+            pagination_data = {
+                'page': pagination.page,
+                'per_page': pagination.per_page,
+                'total': pagination.total,
+                'pages': pagination.pages,
+                'has_prev': pagination.has_prev,
+                'has_next': pagination.has_next
+            }
+        
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         response_data = {
             'success': True,
             'message': '获取任务列表成功',
             'data': {
                 'tasks': tasks_data,
-                'pagination': {
-                    'page': pagination.page,
-                    'per_page': pagination.per_page,
-                    'total': pagination.total,
-                    'pages': pagination.pages,
-                    'has_prev': pagination.has_prev,
-                    'has_next': pagination.has_next
-                }
+                'pagination': pagination_data
             }
         }
         
@@ -358,6 +664,12 @@ def get_tasks():
         
         return jsonify(response_data), 200
         
+    except InvalidCursorError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+        
     except Exception as e:
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         current_app.logger.error(f"获取任务列表失败 - 用户: {user.username or user.email} - 错误: {str(e)} - 耗时: {elapsed_time}ms", exc_info=True)
@@ -527,37 +839,15 @@ def get_task_dashboard():
         }), 403
     
     try:
-        from sqlalchemy import func
-        from app import db
-        
-        # 统计各状态的任务数量
-        status_stats = dict(
-            db.session.query(Task.status, func.count(Task.id))
-            .filter_by(user_id=user.id)
-            .group_by(Task.status)
-            .all()
-        )
-        
-        # 统计各类型的任务数量
-        type_stats = dict(
-            db.session.query(Task.task_type, func.count(Task.id))
-            .filter_by(user_id=user.id)
-            .group_by(Task.task_type)
-            .all()
-        )
-        
-        # 总任务数
-        total_tasks = sum(status_stats.values())
+        # 读取预先汇总的用户任务计数（单行查询，与任务历史数量无关）
+        stats = UserTaskCounter.get_or_rebuild(user.id).to_stats()
+        total_tasks = stats['total_tasks']
         
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         response_data = {
             'success': True,
             'message': '获取仪表板数据成功',
-            'data': {
-                'total_tasks': total_tasks,
-                'status_stats': status_stats,
-                'type_stats': type_stats
-            }
+            'data': stats
         }
         
         current_app.logger.info(f"[获取仪表板数据成功] 用户: {user.username or user.email} - 总任务: {total_tasks} - 耗时: {elapsed_time}ms")
@@ -575,7 +865,7 @@ def get_task_dashboard():
 @tasks_bp.route('/<task_id>/files/<file_id>/preview', methods=['GET'])
 @jwt_required()
 def preview_file(task_id, file_id):
-    """预览任务文件"""
+    """预览任务文件，PDF文件可通过 pages 参数（如 pages=3-5）只预览指定页"""
     start_time = time.time()
     
     # 获取当前用户信息
@@ -603,8 +893,18 @@ def preview_file(task_id, file_id):
                 'message': '无权限访问此文件'
             }), 403
         
-        # 获取预览内容
-        preview_data = DocumentService.get_file_preview(task_file.file_path)
+        page_range = None
+        if request.args.get('pages'):
+            try:
+                page_range = DocumentService.parse_page_range(request.args.get('pages'))
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+        
+        # 获取预览内容（按文件内容哈希和预览参数缓存）
+        preview_data = PreviewCacheService.get_preview(task_file, page_range=page_range)
         
         elapsed_time = round((time.time() - start_time) * 1000, 2)
         response_data = {
@@ -659,38 +959,24 @@ def export_result(task_id, result_id):
                 'message': '无权限访问此结果'
             }), 403
         
-        # 创建导出目录（使用配置化路径）
-        from app.config.config import Config
-        export_base_dir = Config.get_export_directory()
-        export_dir = os.path.join(export_base_dir, user.id)
-        
-        current_app.logger.info(f"[PDF导出] 导出基础目录: {export_base_dir}")
-        current_app.logger.info(f"[PDF导出] 用户导出目录: {export_dir}")
+        # 结果写入后不再变化，客户端已有相同版本时直接返回304
+        etag = ExportCacheService.cache_key(result_id, 'pdf')
+        not_modified = _export_not_modified(etag)
+        if not_modified:
+            return not_modified
         
-        os.makedirs(export_dir, exist_ok=True)
-        
-        # 生成PDF文件路径
         timestamp = time.strftime('%Y%m%d_%H%M%S')
         output_filename = f"task_result_{task_id}_{timestamp}.pdf"
-        output_path = os.path.join(export_dir, output_filename)
-        
-        current_app.logger.info(f"[PDF导出] 目标文件路径: {output_path}")
-        current_app.logger.info(f"[PDF导出] 目录是否存在: {os.path.exists(export_dir)}")
         
-        # 导出PDF
-        success, pdf_path, error = DocumentService.export_task_result_to_pdf(task_result, output_path)
+        # 导出PDF（在渲染进程池中生成，按结果ID和渲染器版本缓存，命中时不再重新渲染）
+        success, pdf_path, error = ExportJobService.render(task_result, 'pdf', user.id)
         
         if success:
             elapsed_time = round((time.time() - start_time) * 1000, 2)
             current_app.logger.info(f"[PDF导出成功] 结果: {result_id} - 用户: {user.username or user.email} - 耗时: {elapsed_time}ms")
             
             # 直接返回文件，不再返回JSON响应
-            return send_file(
-                pdf_path,
-                as_attachment=True,
-                download_name=output_filename,
-                mimetype='application/pdf'
-            )
+            return send_local_file(pdf_path, output_filename, 'application/pdf', etag)
         else:
             return jsonify({
                 'success': False,
@@ -741,24 +1027,22 @@ def export_result_markdown(task_id, result_id):
         if format_type not in ['preview', 'raw']:
             format_type = 'preview'
         
-        # 创建导出目录（使用配置化路径）
-        from app.config.config import Config
-        export_base_dir = Config.get_export_directory()
-        export_dir = os.path.join(export_base_dir, user.id)
-        os.makedirs(export_dir, exist_ok=True)
+        # 结果写入后不再变化，客户端已有相同版本时直接返回304
+        export_format = f"markdown_{format_type}"
+        etag = ExportCacheService.cache_key(result_id, export_format)
+        not_modified = _export_not_modified(etag)
+        if not_modified:
+            return not_modified
         
-        # 生成文件路径
+        # 生成文件名
         timestamp = time.strftime('%Y%m%d_%H%M%S')
         file_ext = '.md' if format_type == 'raw' else '.html'
         output_filename = f"task_result_{task_id}_{format_type}_{timestamp}{file_ext}"
-        output_path = os.path.join(export_dir, output_filename)
         
         current_app.logger.info(f"[Markdown导出] 结果: {result_id} - 格式: {format_type} - 用户: {user.username or user.email}")
         
-        # 导出Markdown
-        success, file_path, error = DocumentService.export_task_result_to_markdown(
-            task_result, output_path, format_type
-        )
+        # 导出Markdown（在渲染进程池中生成，按结果ID、格式和渲染器版本缓存）
+        success, file_path, error = ExportJobService.render(task_result, export_format, user.id)
         
         if success:
             elapsed_time = round((time.time() - start_time) * 1000, 2)
@@ -771,12 +1055,7 @@ def export_result_markdown(task_id, result_id):
                 mimetype = 'text/html'
             
             # 直接返回文件
-            return send_file(
-                file_path,
-                as_attachment=True,
-                download_name=output_filename,
-                mimetype=mimetype
-            )
+            return send_local_file(file_path, output_filename, mimetype, etag)
         else:
             return jsonify({
                 'success': False,
@@ -820,14 +1099,16 @@ def download_file(task_id, file_id):
             }), 404
         
         elapsed_time = round((time.time() - start_time) * 1000, 2)
-        current_app.logger.info(f"[文件下载] 文件: {file_id} - 任务: {task_id} - 公共访问 - 耗时: {elapsed_time}ms")
+        current_app.logger.info(f"[文件下载] 文件: {file_id} - 任务: {task_id} - 公共访问 - Range: {request.headers.get('Range', '-')} - 耗时: {elapsed_time}ms")
         
-        # 直接返回文件
-        return send_file(
+        # 内容寻址存储的文件内容不变，直接用内容哈希作为ETag；?inline=1 时浏览器可直接打开（如PDF阅读器）
+        inline = request.args.get('inline', '').lower() in ('1', 'true')
+        return send_local_file(
             task_file.file_path,
-            as_attachment=True,
-            download_name=task_file.original_filename,
-            mimetype=task_file.file_type
+            task_file.original_filename,
+            task_file.file_type,
+            etag=task_file.content_hash,
+            as_attachment=not inline
         )
         
     except Exception as e:
@@ -861,18 +1142,27 @@ def get_task_results_paginated(task_id):
     sort_by = request.args.get('sort_by', 'sn')
     sort_order = request.args.get('sort_order', 'asc')
     
+    # 获取筛选参数：is_compliant 精确匹配，issue_location / reference_standard 前缀匹配，search 检索原文和问题描述
+    filters = {
+        'is_compliant': request.args.get('is_compliant', '').strip(),
+        'issue_location': request.args.get('issue_location', '').strip(),
+        'reference_standard': request.args.get('reference_standard', '').strip(),
+        'search': request.args.get('search', '').strip()
+    }
+    active_filters = {key: value for key, value in filters.items() if value}
+    
     # 验证分页参数
     if page < 1:
         page = 1
     if per_page < 1 or per_page > 100:  # 限制每页最大100条
         per_page = 20
     
-    current_app.logger.info(f"[获取分页结果] 任务: {task_id} - 用户: {user.username or user.email} (ID: {user.id}) - 页码: {page}/{per_page} - IP: {client_ip}")
+    current_app.logger.info(f"[获取分页结果] 任务: {task_id} - 用户: {user.username or user.email} (ID: {user.id}) - 页码: {page}/{per_page} - 筛选: {active_filters} - IP: {client_ip}")
     
     try:
         # 获取分页结果
         result = TaskService.get_task_results_paginated(
-            task_id, user.id, page, per_page, sort_by, sort_order
+            task_id, user.id, page, per_page, sort_by, sort_order, filters=active_filters
         )
         
         elapsed_time = round((time.time() - start_time) * 1000, 2)
@@ -921,49 +1211,34 @@ def export_task_results_to_excel(task_id):
     current_app.logger.info(f"[Excel导出请求] 任务: {task_id} - 用户: {user.username or user.email} (ID: {user.id}) - IP: {client_ip}")
     
     try:
-        # 获取完整的任务结果数据（不分页，导出全部数据）
-        result = TaskService.get_task_results_paginated(
-            task_id, user.id, page=1, per_page=10000, sort_by='sn', sort_order='asc'
-        )
-        
-        items_data = result.get('items', [])
-        task_info = result.get('task_info', {})
-        
-        if not items_data:
-            return jsonify({
-                'success': False,
-                'message': '没有可导出的数据'
-            }), 400
-        
-        # 创建导出目录（使用配置化路径）
-        from app.config.config import Config
-        export_base_dir = Config.get_export_directory()
-        export_dir = os.path.join(export_base_dir, user.id)
-        os.makedirs(export_dir, exist_ok=True)
+        # 只导出已完成任务的结果，避免处理中的任务生成并缓存不完整的文件
+        TaskService.get_completed_paginated_task(task_id, user.id)
+        
+        # 导出内容由最新结果决定，按结果ID缓存；客户端已有相同版本时直接返回304
+        latest_result = TaskResult.find_latest_by_user_and_task(user.id, task_id)
+        if not latest_result:
+            raise ValueError('没有可导出的数据')
+        etag = ExportCacheService.cache_key(latest_result.id, 'excel')
+        not_modified = _export_not_modified(etag)
+        if not_modified:
+            return not_modified
         
-        # 生成Excel文件路径
         timestamp = time.strftime('%Y%m%d_%H%M%S')
         output_filename = f"task_results_{task_id}_{timestamp}.xlsx"
-        output_path = os.path.join(export_dir, output_filename)
         
-        current_app.logger.info(f"[Excel导出] 目标文件路径: {output_path}")
-        current_app.logger.info(f"[Excel导出] 准备导出 {len(items_data)} 条记录")
-        
-        # 导出Excel
-        success, excel_path, error = DocumentService.export_task_results_to_excel(
-            items_data, task_info, output_path
-        )
+        # 导出Excel（在渲染进程池中生成，按结果ID和渲染器版本缓存）
+        success, excel_path, error = ExportJobService.render(latest_result, 'excel', user.id)
         
         if success:
             elapsed_time = round((time.time() - start_time) * 1000, 2)
-            current_app.logger.info(f"[Excel导出成功] 任务: {task_id} - 用户: {user.username or user.email} - 记录数: {len(items_data)} - 耗时: {elapsed_time}ms")
+            current_app.logger.info(f"[Excel导出成功] 任务: {task_id} - 用户: {user.username or user.email} - 耗时: {elapsed_time}ms")
             
             # 直接返回文件
-            return send_file(
+            return send_local_file(
                 excel_path,
-                as_attachment=True,
-                download_name=output_filename,
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                output_filename,
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                etag
             )
         else:
             return jsonify({
@@ -987,3 +1262,142 @@ def export_task_results_to_excel(task_id):
             'message': f'Excel导出失败: {str(e)}'
         }), 500
 
+@tasks_bp.route('/<task_id>/export-jobs', methods=['POST'])
+@jwt_required()
+def submit_export_job(task_id):
+    """提交异步导出任务 - 在渲染进程池中生成，立即返回任务ID，完成后通过下载接口获取文件"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    try:
+        data = request.get_json() or {}
+        export_format = data.get('format', 'pdf')
+        if export_format not in ExportJobService.FORMATS:
+            return jsonify({
+                'success': False,
+                'message': f'不支持的导出格式。支持的格式: {", ".join(ExportJobService.FORMATS.keys())}'
+            }), 400
+        
+        if export_format == 'excel':
+            # Excel 导出分页结果，只允许已完成的任务
+            TaskService.get_completed_paginated_task(task_id, user.id)
+        
+        # 未指定结果ID时导出最新结果
+        result_id = data.get('result_id')
+        if result_id:
+            task_result = TaskResult.query.get(result_id)
+            if task_result and (task_result.task_id != task_id or task_result.user_id != user.id):
+                return jsonify({
+                    'success': False,
+                    'message': '无权限访问此结果'
+                }), 403
+        else:
+            task_result = TaskResult.find_latest_by_user_and_task(user.id, task_id)
+        
+        if not task_result:
+            return jsonify({
+                'success': False,
+                'message': '任务结果不存在'
+            }), 404
+        
+        job = ExportJobService.submit_job(task_result, export_format, user.id)
+        
+        return jsonify({
+            'success': True,
+            'message': '导出任务已提交',
+            'data': job
+        }), 202
+        
+    except ExportJobLimitError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 429
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        current_app.logger.error(f"提交导出任务失败 - 任务: {task_id} - 用户: {user.username or user.email} - 错误: {str(e)}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'message': f'提交导出任务失败: {str(e)}'
+        }), 500
+
+@tasks_bp.route('/export-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_export_job(job_id):
+    """查询异步导出任务状态（queued / running / completed / failed）"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    job = ExportJobService.get_job(job_id, user.id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导出任务不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'message': '获取导出任务状态成功',
+        'data': ExportJobService.to_dict(job)
+    }), 200
+
+@tasks_bp.route('/export-jobs/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export_job(job_id):
+    """下载异步导出任务生成的文件"""
+    current_user_id = get_jwt_identity()
+    user = User.find_by_id(current_user_id)
+    
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': '用户验证失败'
+        }), 403
+    
+    job = ExportJobService.get_job(job_id, user.id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导出任务不存在或已过期'
+        }), 404
+    
+    if job.status != 'completed':
+        return jsonify({
+            'success': False,
+            'message': '导出任务尚未完成',
+            'data': ExportJobService.to_dict(job)
+        }), 409
+    
+    etag = ExportCacheService.cache_key(job.result_id, job.format)
+    not_modified = _export_not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    if not os.path.exists(job.file_path):
+        return jsonify({
+            'success': False,
+            'message': '导出文件已被清理，请重新提交导出任务'
+        }), 410
+    
+    return send_local_file(
+        job.file_path,
+        ExportJobService.download_name(job.task_id, job.format),
+        ExportJobService.FORMATS[job.format][1],
+        etag
+    )
@@ -0,0 +1,325 @@
+import os
+import re
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from app.config.config import Config
+from app.services.file_service import FileService
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 开发环境没有 fcntl，退化为进程内的锁
+    fcntl = None
+
+
+class UploadSessionNotFoundError(ValueError):
+    """上传会话不存在、已过期或不属于当前用户"""
+    pass
+
+
+class UploadOffsetMismatchError(ValueError):
+    """分片偏移量与服务端已接收的字节数不一致"""
+
+    def __init__(self, offset):
+        super().__init__(f"分片偏移量不匹配，服务端已接收 {offset} 字节")
+        self.offset = offset
+
+
+class UploadInProgressError(ValueError):
+    """同一上传会话正在写入其他分片"""
+
+    def __init__(self):
+        super().__init__("该上传会话正在写入其他分片，请查询上传状态后从服务端已接收的偏移量继续")
+
+
+class ChunkedUploadService:
+    """
+    分片断点续传上传服务
+
+    - 上传会话信息保存在临时目录的 <upload_id>.json 中，已接收的内容写入 <upload_id>.part
+    - 每个分片按偏移量直接写入 .part 文件，已接收字节数即 .part 文件大小，中断后从该偏移量继续
+    - 全部接收后 .part 文件改名为 .completing 认领完成流程，再直接移动到内容寻址存储，不再合并复制
+    """
+
+    UPLOAD_DIR_NAME = 'chunked_uploads'
+
+    _UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    # 没有 fcntl 时按上传ID使用进程内的锁
+    _local_locks = {}
+    _local_locks_guard = threading.Lock()
+
+    @staticmethod
+    def get_upload_directory():
+        """获取分片上传临时目录"""
+        upload_dir = os.path.join(Config.get_temp_directory(), ChunkedUploadService.UPLOAD_DIR_NAME)
+        if not os.path.exists(upload_dir):
+            os.makedirs(upload_dir, exist_ok=True)
+        return upload_dir
+
+    @staticmethod
+    def _paths(upload_id):
+        """返回 (会话信息路径, 分片数据路径)"""
+        if not upload_id or not ChunkedUploadService._UPLOAD_ID_PATTERN.match(upload_id):
+            raise UploadSessionNotFoundError("上传会话不存在")
+        upload_dir = ChunkedUploadService.get_upload_directory()
+        return os.path.join(upload_dir, f"{upload_id}.json"), os.path.join(upload_dir, f"{upload_id}.part")
+
+    @staticmethod
+    def _completing_path(part_path):
+        """完成上传时分片数据文件改名后的路径（<upload_id>.completing），改名成功的请求独占完成流程"""
+        return part_path[:-len('.part')] + '.completing'
+
+    @staticmethod
+    def _last_activity(meta_path, part_path):
+        """会话最后活动时间（会话信息或分片数据的最后修改时间）"""
+        times = [os.path.getmtime(path) for path in (meta_path, part_path) if os.path.exists(path)]
+        return max(times) if times else 0
+
+    @staticmethod
+    def _remove_session(upload_id, meta_path, part_path):
+        ChunkedUploadService._remove_files(meta_path, part_path, ChunkedUploadService._completing_path(part_path))
+        with ChunkedUploadService._local_locks_guard:
+            ChunkedUploadService._local_locks.pop(upload_id, None)
+
+    @staticmethod
+    def _remove_files(*paths):
+        for path in paths:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    @contextmanager
+    def _locked_part(upload_id, part_path):
+        """
+        以独占锁打开分片数据文件，锁定期间检查偏移量并写入，避免同一会话的并发请求交错写入
+
+        其他请求持有锁时不等待，直接抛出 UploadInProgressError
+        """
+        try:
+            part = open(part_path, 'r+b')
+        except FileNotFoundError:
+            raise UploadSessionNotFoundError("上传会话不存在或已过期")
+
+        with part:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadInProgressError()
+                # 关闭文件时释放锁
+                yield part
+                return
+
+            with ChunkedUploadService._local_locks_guard:
+                lock = ChunkedUploadService._local_locks.setdefault(upload_id, threading.Lock())
+            if not lock.acquire(blocking=False):
+                raise UploadInProgressError()
+            try:
+                yield part
+            finally:
+                lock.release()
+
+    @staticmethod
+    def create_upload(user_id, filename, file_size, content_type=None):
+        """
+        创建上传会话
+
+        Args:
+            user_id (str): 用户ID
+            filename (str): 原始文件名
+            file_size (int): 文件总字节数
+            content_type (str): 文件MIME类型
+
+        Returns:
+            dict: 上传会话状态
+        """
+        if not filename or not FileService.allowed_file(filename):
+            raise ValueError(f"不支持的文件类型。支持的类型: {', '.join(FileService.ALLOWED_EXTENSIONS)}")
+
+        try:
+            file_size = int(file_size)
+        except (TypeError, ValueError):
+            raise ValueError("请提供有效的文件大小")
+        if file_size <= 0:
+            raise ValueError("文件大小必须大于0")
+        if file_size > FileService.MAX_FILE_SIZE:
+            raise ValueError(f"文件大小超过限制（最大 {FileService.MAX_FILE_SIZE // (1024*1024)}MB）")
+
+        # 顺带清理过期的上传会话
+        ChunkedUploadService.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = ChunkedUploadService._paths(upload_id)
+        meta = {
+            'upload_id': upload_id,
+            'user_id': user_id,
+            'filename': filename,
+            'file_size': file_size,
+            'content_type': content_type or 'application/octet-stream',
+            'created_at': datetime.utcnow().isoformat()
+        }
+
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        current_app.logger.info(f"创建分片上传会话 - 用户: {user_id} - 上传ID: {upload_id} - 文件: {filename} - 大小: {file_size}字节")
+        return ChunkedUploadService._to_status(meta, 0, part_path, meta_path)
+
+    @staticmethod
+    def _load(upload_id, user_id):
+        """读取上传会话信息，会话不存在、已过期或不属于当前用户时抛出 UploadSessionNotFoundError"""
+        meta_path, part_path = ChunkedUploadService._paths(upload_id)
+        if not os.path.exists(meta_path) or not os.path.exists(part_path):
+            raise UploadSessionNotFoundError("上传会话不存在或已过期")
+
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadSessionNotFoundError("上传会话不存在或已过期")
+
+        if meta.get('user_id') != user_id:
+            raise UploadSessionNotFoundError("上传会话不存在或已过期")
+
+        if time.time() - ChunkedUploadService._last_activity(meta_path, part_path) > Config.CHUNKED_UPLOAD_TTL:
+            ChunkedUploadService._remove_session(upload_id, meta_path, part_path)
+            raise UploadSessionNotFoundError("上传会话不存在或已过期")
+
+        return meta, meta_path, part_path
+
+    @staticmethod
+    def _to_status(meta, offset, part_path, meta_path):
+        """转换为返回给客户端的会话状态"""
+        last_activity = ChunkedUploadService._last_activity(meta_path, part_path)
+        return {
+            'upload_id': meta['upload_id'],
+            'filename': meta['filename'],
+            'file_size': meta['file_size'],
+            'offset': offset,
+            'complete': offset >= meta['file_size'],
+            'chunk_size': Config.CHUNKED_UPLOAD_CHUNK_SIZE,
+            'expires_at': datetime.utcfromtimestamp(last_activity + Config.CHUNKED_UPLOAD_TTL).isoformat()
+        }
+
+    @staticmethod
+    def get_status(upload_id, user_id):
+        """获取上传会话状态（offset 为服务端已接收的字节数，客户端从该位置续传）"""
+        meta, meta_path, part_path = ChunkedUploadService._load(upload_id, user_id)
+        return ChunkedUploadService._to_status(meta, os.path.getsize(part_path), part_path, meta_path)
+
+    @staticmethod
+    def write_chunk(upload_id, user_id, offset, stream):
+        """
+        写入一个分片
+
+        Args:
+            upload_id (str): 上传会话ID
+            user_id (str): 用户ID
+            offset (int): 分片在文件中的起始偏移量，必须等于服务端已接收的字节数
+            stream: 分片内容输入流
+
+        Returns:
+            dict: 写入后的上传会话状态
+        """
+        meta, meta_path, part_path = ChunkedUploadService._load(upload_id, user_id)
+
+        max_end = min(meta['file_size'], offset + Config.CHUNKED_UPLOAD_CHUNK_SIZE)
+        position = offset
+        with ChunkedUploadService._locked_part(upload_id, part_path) as part:
+            # 持有锁后再检查偏移量，并发请求中只有一个能写入
+            received = os.fstat(part.fileno()).st_size
+            if offset != received:
+                raise UploadOffsetMismatchError(received)
+
+            part.seek(offset)
+            try:
+                while True:
+                    chunk = stream.read(FileService.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if position + len(chunk) > max_end:
+                        # 超出文件大小或单个分片上限，撤销本次写入
+                        part.truncate(offset)
+                        raise ValueError(f"分片超出限制（单个分片最大 {Config.CHUNKED_UPLOAD_CHUNK_SIZE} 字节，且不能超过文件大小）")
+                    part.write(chunk)
+                    position += len(chunk)
+            finally:
+                # 连接中断时保留已写入的内容，客户端查询状态后从已接收的偏移量继续
+                part.flush()
+
+        return ChunkedUploadService._to_status(meta, position, part_path, meta_path)
+
+    @staticmethod
+    def complete_upload(upload_id, user_id):
+        """
+        完成上传：校验已接收全部内容，将分片文件移入内容寻址存储
+
+        Returns:
+            dict: 与 FileService.save_file 相同格式的文件信息
+        """
+        meta, meta_path, part_path = ChunkedUploadService._load(upload_id, user_id)
+
+        # 先改名认领分片数据文件：并发的完成请求只有一个能改名成功，其余按会话已不存在处理
+        completing_path = ChunkedUploadService._completing_path(part_path)
+        try:
+            os.rename(part_path, completing_path)
+        except FileNotFoundError:
+            raise UploadSessionNotFoundError("上传会话不存在或已过期")
+
+        try:
+            # 正在写入分片时不完成；持有锁直到文件移入存储
+            with ChunkedUploadService._locked_part(upload_id, completing_path) as part:
+                received = os.fstat(part.fileno()).st_size
+                if received != meta['file_size']:
+                    raise UploadOffsetMismatchError(received)
+
+                success, file_info, error = FileService.save_local_file(completing_path, meta['filename'], meta['content_type'], user_id)
+                if not success:
+                    raise ValueError(error)
+        except Exception:
+            # 未能完成时恢复分片数据文件，客户端可以继续上传或重试
+            if os.path.exists(completing_path):
+                os.rename(completing_path, part_path)
+            raise
+
+        ChunkedUploadService._remove_session(upload_id, meta_path, part_path)
+        current_app.logger.info(f"分片上传完成 - 用户: {user_id} - 上传ID: {upload_id} - 文件: {meta['filename']}")
+        return file_info
+
+    @staticmethod
+    def abort_upload(upload_id, user_id):
+        """取消上传并删除已接收的分片"""
+        meta, meta_path, part_path = ChunkedUploadService._load(upload_id, user_id)
+        ChunkedUploadService._remove_session(upload_id, meta_path, part_path)
+        current_app.logger.info(f"取消分片上传 - 用户: {user_id} - 上传ID: {upload_id}")
+
+    @staticmethod
+    def cleanup_expired():
+        """清理超过有效期未活动的上传会话，返回清理数量"""
+        upload_dir = ChunkedUploadService.get_upload_directory()
+        now = time.time()
+        removed = 0
+        for name in os.listdir(upload_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            try:
+                meta_path, part_path = ChunkedUploadService._paths(upload_id)
+            except UploadSessionNotFoundError:
+                continue
+            if now - ChunkedUploadService._last_activity(meta_path, part_path) > Config.CHUNKED_UPLOAD_TTL:
+                ChunkedUploadService._remove_session(upload_id, meta_path, part_path)
+                removed += 1
+        if removed:
+            current_app.logger.info(f"清理过期分片上传会话 {removed} 个")
+        return removed
@@ -3,6 +3,7 @@ import requests
 import time
 from flask import current_app
 from app.config.config import Config
+from app.services.dify_client import DifyClient
 
 class ConversationService:
     """会话服务类 - 专门处理Dify会话列表转发"""
@@ -43,11 +44,11 @@ class ConversationService:
             current_app.logger.info(f"[会话列表转发] 用户: {user_info.get('username')} - 参数: {query_params}")
             
             # 构建请求URL
-            response = requests.get(
+            response = DifyClient.get(
                 config['api_url'],
+                api_type='conversations',
                 params=query_params,
-                headers=config['headers'],
-                timeout=30
+                headers=config['headers']
             )
             
             elapsed_time = round((time.time() - start_time) * 1000, 2)
@@ -164,11 +165,11 @@ class ConversationService:
             current_app.logger.info(f"[消息历史转发] 用户: {user_info.get('username')} - 参数: {query_params}")
             
             # 发送GET请求到Dify API
-            response = requests.get(
+            response = DifyClient.get(
                 config['api_url'],
+                api_type='messages',
                 params=query_params,
-                headers=config['headers'],
-                timeout=30
+                headers=config['headers']
             )
             
             elapsed_time = round((time.time() - start_time) * 1000, 2)
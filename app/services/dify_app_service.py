@@ -3,6 +3,7 @@ import requests
 import time
 from flask import current_app
 from app.config.config import Config
+from app.services.dify_client import DifyClient, DifyCircuitOpenError
 
 class DifyAppService:
     """Dify应用场景服务 - 管理不同页面的API配置"""
@@ -143,32 +144,31 @@ class DifyAppService:
             
             # 构建请求
             kwargs = {
-                'headers': config['headers'],
-                'timeout': 60  # 增加超时时间
+                'headers': config['headers']
             }
             
             if request_method.upper() == 'GET':
                 if query_params:
                     kwargs['params'] = query_params
                     current_app.logger.debug(f"GET参数: {query_params}")
-                response = requests.get(config['api_url'], **kwargs)
+                response = DifyClient.get(config['api_url'], api_type=api_type, circuit=scenario, **kwargs)
             elif request_method.upper() == 'POST':
                 if json_data:
                     kwargs['json'] = json_data
                     current_app.logger.debug(f"POST数据: {json_data}")
                 if stream:
                     kwargs['stream'] = True
-                response = requests.post(config['api_url'], **kwargs)
+                response = DifyClient.post(config['api_url'], api_type=api_type, circuit=scenario, **kwargs)
             elif request_method.upper() == 'PATCH':
                 if json_data:
                     kwargs['json'] = json_data
                     current_app.logger.debug(f"PATCH数据: {json_data}")
-                response = requests.patch(config['api_url'], **kwargs)
+                response = DifyClient.patch(config['api_url'], api_type=api_type, circuit=scenario, **kwargs)
             elif request_method.upper() == 'DELETE':
                 if query_params:
                     kwargs['params'] = query_params
                     current_app.logger.debug(f"DELETE参数: {query_params}")
-                response = requests.delete(config['api_url'], **kwargs)
+                response = DifyClient.delete(config['api_url'], api_type=api_type, circuit=scenario, **kwargs)
             else:
                 raise ValueError(f"不支持的请求方法: {request_method}")
             
@@ -214,6 +214,10 @@ class DifyAppService:
                 except:
                     return False, {'error': f'API返回错误: {response.status_code}', 'detail': response.text[:200]}, response.status_code
                     
+        except DifyCircuitOpenError as e:
+            current_app.logger.warning(f"[{config['name']}-{api_type}熔断] 快速失败 - {str(e)}")
+            return False, {'error': str(e)}, 503
+            
         except requests.RequestException as e:
             elapsed_time = round((time.time() - start_time) * 1000, 2)
             current_app.logger.error(
@@ -230,6 +234,48 @@ class DifyAppService:
             )
             return False, {'error': f'系统错误: {str(e)}'}, 500
     
+    @staticmethod
+    def get_stop_url(chat_url, task_id):
+        """聊天停止生成接口地址：POST /v1/chat-messages/:task_id/stop"""
+        return f"{chat_url.rstrip('/')}/{task_id}/stop"
+    
+    @classmethod
+    def stop_generation(cls, scenario, task_id, user):
+        """
+        停止Dify聊天生成（客户端断开后调用，避免Dify继续生成token）
+        
+        Args:
+            scenario (str): 应用场景
+            task_id (str): 流式响应事件中的 task_id
+            user (str): 发起聊天时的 user 标识（须与原请求一致）
+            
+        Returns:
+            bool: 是否停止成功
+        """
+        start_time = time.time()
+        try:
+            config = cls.get_app_config(scenario, 'chat')
+            response = DifyClient.post(
+                cls.get_stop_url(config['api_url'], task_id),
+                api_type='chat_stop',
+                circuit=scenario,
+                headers=config['headers'],
+                json={'user': user}
+            )
+            elapsed_time = round((time.time() - start_time) * 1000, 2)
+            if response.ok:
+                current_app.logger.info(f"[{config['name']}-停止生成] task_id: {task_id} - 用户: {user} - 耗时: {elapsed_time}ms")
+                return True
+            current_app.logger.warning(
+                f"[{config['name']}-停止生成失败] task_id: {task_id} - 状态码: {response.status_code} - "
+                f"响应: {response.text[:200]} - 耗时: {elapsed_time}ms"
+            )
+            return False
+        except Exception as e:
+            elapsed_time = round((time.time() - start_time) * 1000, 2)
+            current_app.logger.warning(f"[{scenario}-停止生成失败] task_id: {task_id} - 错误: {str(e)} - 耗时: {elapsed_time}ms")
+            return False
+    
     @classmethod
     def get_all_scenarios(cls):
         """获取所有支持的应用场景"""
@@ -0,0 +1,76 @@
+import os
+from urllib.parse import urlsplit
+import httpx
+from app.config.config import Config
+from app.services.dify_client import DifyClient
+
+class DifyAsyncClient:
+    """Dify异步HTTP客户端 - ASGI入口下流式聊天使用的 httpx 连接池（超时配置与 DifyClient 一致）"""
+
+    _clients = {}
+    _stats = {}
+    _pid = None
+
+    @classmethod
+    def get_client(cls, url):
+        """获取目标主机的共享异步客户端（只在事件循环线程中调用），进程fork后自动重建"""
+        host_key = DifyClient._host_key(url)
+
+        if cls._pid != os.getpid():
+            cls._clients = {}
+            cls._stats = {}
+            cls._pid = os.getpid()
+
+        client = cls._clients.get(host_key)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=cls.get_timeout('chat'),
+                limits=httpx.Limits(
+                    max_connections=Config.DIFY_ASYNC_MAX_STREAMS,
+                    max_keepalive_connections=DifyClient.get_pool_size(urlsplit(url).netloc)
+                )
+            )
+            cls._clients[host_key] = client
+            cls._stats[host_key] = {
+                'max_streams': Config.DIFY_ASYNC_MAX_STREAMS,
+                'streams': 0,
+                'active_streams': 0,
+                'errors': 0
+            }
+        return client
+
+    @staticmethod
+    def get_timeout(api_type):
+        """按API类型的超时配置（与 DifyClient 一致）转换为 httpx.Timeout"""
+        timeout = DifyClient.get_timeout(api_type)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return httpx.Timeout(connect_timeout, read=read_timeout)
+
+    @classmethod
+    def record(cls, url, start=False, error=False):
+        """记录流式请求开始/结束"""
+        stats = cls._stats.get(DifyClient._host_key(url))
+        if stats is None:
+            return
+        if start:
+            stats['streams'] += 1
+            stats['active_streams'] += 1
+            return
+        stats['active_streams'] -= 1
+        if error:
+            stats['errors'] += 1
+
+    @classmethod
+    async def close(cls):
+        """关闭所有客户端（ASGI应用关闭时调用）"""
+        clients = list(cls._clients.values())
+        cls._clients = {}
+        for client in clients:
+            await client.aclose()
+
+    @classmethod
+    def get_stats(cls):
+        """获取各主机异步流式请求情况"""
+        if cls._pid != os.getpid():
+            return {}
+        return {host: dict(values) for host, values in cls._stats.items()}
@@ -0,0 +1,521 @@
+import os
+import time
+import queue
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from flask import current_app, has_app_context
+from app.config.config import Config
+from app.utils.retry import RetryBudget, backoff_delay, parse_retry_after
+from app.utils.circuit_breaker import CircuitBreaker
+
+
+class DifyCircuitOpenError(requests.ConnectionError):
+    """目标Dify应用熔断打开时抛出，请求未发出"""
+
+    def __init__(self, circuit, host_key, retry_after):
+        self.circuit = circuit
+        self.host_key = host_key
+        self.retry_after = retry_after
+        super().__init__(f"Dify服务暂时不可用（{circuit} 已熔断），请约{int(retry_after) + 1}秒后重试")
+
+# 当前线程正在发送的请求建立新连接后的回调（熔断器半开探测用）
+_connect_listener = threading.local()
+
+
+def _notify_connected():
+    callback = getattr(_connect_listener, 'callback', None)
+    if callback is not None:
+        callback()
+
+
+class _NotifyingHTTPConnection(HTTPConnection):
+    def connect(self):
+        super().connect()
+        _notify_connected()
+
+
+class _NotifyingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        # TLS握手完成后才通知
+        super().connect()
+        _notify_connected()
+
+
+class _NotifyingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _NotifyingHTTPConnection
+
+
+class _NotifyingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _NotifyingHTTPSConnection
+
+
+class _DifyHTTPAdapter(HTTPAdapter):
+    """新建连接时通知当前线程的连接回调"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _NotifyingHTTPConnectionPool,
+            'https': _NotifyingHTTPSConnectionPool
+        }
+
+
+class DifyClient:
+    """Dify HTTP客户端 - 所有Dify调用共享的连接池会话层（keep-alive复用、按主机配置连接池、按API类型配置超时）"""
+
+    # 各API类型的默认超时（连接超时秒数, 读取超时秒数），可通过 DIFY_HTTP_TIMEOUTS 覆盖
+    DEFAULT_TIMEOUTS = {
+        'chat': (10, 60),               # 场景聊天（流式）
+        'chat_stop': (5, 10),           # 客户端断开后停止聊天生成
+        'conversations': (10, 60),      # 会话列表
+        'messages': (10, 60),           # 历史消息
+        'conversation_ops': (10, 60),   # 会话重命名/删除
+        'file_upload': (10, 60),        # 文件上传
+        'task_stream': (10, 60),        # 任务流式请求
+        'task_blocking': (10, 120),     # 任务阻塞请求
+        'task_direct': (30, 3600),      # 标准处理直接转发（工作流可能运行很久）
+        'default': (10, 60)
+    }
+
+    # 各API类型的默认最大尝试次数（含首次），未列出的类型不重试（如任务执行类请求），可通过 DIFY_HTTP_RETRIES 覆盖
+    DEFAULT_RETRIES = {
+        'chat_stop': 2,
+        'conversations': 3,
+        'messages': 3,
+        'conversation_ops': 2,
+        'file_upload': 3,
+        'default': 1
+    }
+
+    # 幂等请求方法：请求发出后的失败（读取超时、连接重置、502/503/504）也可以重试
+    IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+    # 可重试的状态码：非幂等请求只重试429（明确未被处理），502/503/504 时网关可能已把请求转发给上游应用
+    RETRY_STATUSES = {429}
+    IDEMPOTENT_RETRY_STATUSES = {429, 502, 503, 504}
+
+    _sessions = {}
+    _stats = {}
+    _budgets = {}
+    _breakers = {}
+    _lock = threading.Lock()
+    _pid = None
+    _timeouts = None
+    _retries = None
+    _pool_sizes = None
+
+    @staticmethod
+    def _parse_timeouts(value):
+        """解析形如 'chat=10/300,file_upload=10/120' 的超时配置"""
+        timeouts = {}
+        for part in (value or '').split(','):
+            part = part.strip()
+            if '=' not in part:
+                continue
+            api_type, timeout = part.split('=', 1)
+            try:
+                if '/' in timeout:
+                    connect, read = timeout.split('/', 1)
+                    timeouts[api_type.strip()] = (float(connect), float(read))
+                else:
+                    timeouts[api_type.strip()] = float(timeout)
+            except ValueError:
+                continue
+        return timeouts
+
+    @staticmethod
+    def _parse_retries(value):
+        """解析形如 'conversations=3,task_blocking=1' 的最大尝试次数配置"""
+        retries = {}
+        for part in (value or '').split(','):
+            part = part.strip()
+            if '=' not in part:
+                continue
+            api_type, attempts = part.split('=', 1)
+            try:
+                retries[api_type.strip()] = max(1, int(attempts))
+            except ValueError:
+                continue
+        return retries
+
+    @staticmethod
+    def _parse_pool_sizes(value):
+        """解析形如 '10.100.100.93=50,dify.example.com=20' 的按主机连接池大小配置"""
+        sizes = {}
+        for part in (value or '').split(','):
+            part = part.strip()
+            if '=' not in part:
+                continue
+            host, size = part.rsplit('=', 1)
+            try:
+                sizes[host.strip().lower()] = int(size)
+            except ValueError:
+                continue
+        return sizes
+
+    @classmethod
+    def get_timeout(cls, api_type):
+        """获取指定API类型的超时配置"""
+        if cls._timeouts is None:
+            timeouts = dict(cls.DEFAULT_TIMEOUTS)
+            timeouts.update(cls._parse_timeouts(Config.DIFY_HTTP_TIMEOUTS))
+            cls._timeouts = timeouts
+        return cls._timeouts.get(api_type, cls._timeouts['default'])
+
+    @classmethod
+    def get_max_attempts(cls, api_type):
+        """获取指定API类型的最大尝试次数（含首次）"""
+        if cls._retries is None:
+            retries = dict(cls.DEFAULT_RETRIES)
+            retries.update(cls._parse_retries(Config.DIFY_HTTP_RETRIES))
+            cls._retries = retries
+        return cls._retries.get(api_type, cls._retries['default'])
+
+    @classmethod
+    def get_pool_size(cls, host):
+        """获取指定主机的连接池大小"""
+        if cls._pool_sizes is None:
+            cls._pool_sizes = cls._parse_pool_sizes(Config.DIFY_HTTP_POOL_SIZES)
+        return cls._pool_sizes.get(host.lower(), Config.DIFY_HTTP_POOL_MAXSIZE)
+
+    @staticmethod
+    def _host_key(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    @classmethod
+    def _reset_if_forked(cls):
+        """进程fork后清空继承自父进程的会话、统计、重试预算和熔断器（调用方持有锁）"""
+        if cls._pid != os.getpid():
+            cls._sessions = {}
+            cls._stats = {}
+            cls._budgets = {}
+            cls._breakers = {}
+            cls._pid = os.getpid()
+
+    @classmethod
+    def get_session(cls, url):
+        """获取目标主机的共享会话，进程fork后自动重建，避免子进程复用父进程的连接"""
+        host_key = cls._host_key(url)
+
+        with cls._lock:
+            cls._reset_if_forked()
+
+            session = cls._sessions.get(host_key)
+            if session is None:
+                pool_size = cls.get_pool_size(urlsplit(url).netloc)
+                session = requests.Session()
+                adapter = _DifyHTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=pool_size,
+                    pool_block=False
+                )
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                cls._sessions[host_key] = session
+                cls._budgets[host_key] = RetryBudget(Config.DIFY_RETRY_BUDGET_RATIO, Config.DIFY_RETRY_BUDGET_MIN_PER_SECOND)
+                cls._stats[host_key] = {
+                    'pool_maxsize': pool_size,
+                    'requests': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'in_flight': 0,
+                    'total_time_ms': 0.0,
+                    'by_api_type': {}
+                }
+            return session
+
+    @classmethod
+    def get_breaker(cls, circuit, url):
+        """
+        获取（应用场景/任务类型, 主机）对应的熔断器，未启用熔断时返回 None
+
+        Args:
+            circuit (str): 熔断器名称（应用场景或任务类型）
+            url (str): 请求地址，按主机区分
+        """
+        if not Config.DIFY_CIRCUIT_BREAKER_ENABLED:
+            return None
+        key = (circuit, cls._host_key(url))
+        with cls._lock:
+            cls._reset_if_forked()
+            breaker = cls._breakers.get(key)
+            if breaker is None:
+                breaker = cls._breakers[key] = CircuitBreaker(
+                    failure_rate=Config.DIFY_CIRCUIT_FAILURE_RATE,
+                    min_calls=Config.DIFY_CIRCUIT_MIN_CALLS,
+                    window_seconds=Config.DIFY_CIRCUIT_WINDOW_SECONDS,
+                    open_seconds=Config.DIFY_CIRCUIT_OPEN_SECONDS,
+                    half_open_probes=Config.DIFY_CIRCUIT_HALF_OPEN_PROBES
+                )
+            return breaker
+
+    @classmethod
+    def check_breaker(cls, circuit, url):
+        """
+        申请通过熔断器，熔断打开时抛出 DifyCircuitOpenError
+
+        Returns:
+            tuple: (熔断器, 放行凭证)，未启用熔断时熔断器为 None；调用结束后须以该凭证记录结果
+        """
+        breaker = cls.get_breaker(circuit, url)
+        if breaker is None:
+            return None, None
+        permit = breaker.allow()
+        if not permit:
+            raise DifyCircuitOpenError(circuit, cls._host_key(url), breaker.retry_after)
+        return breaker, permit
+
+    @staticmethod
+    def _drop_idle_connections(session, url):
+        """
+        关闭目标主机连接池中的空闲连接，使半开探测新建连接
+
+        熔断期间留在连接池中的连接可能已失效，复用时也无法判断连接是否真正可用
+        """
+        pool = session.get_adapter(url).poolmanager.connection_from_url(url)
+        idle = []
+        while True:
+            try:
+                idle.append(pool.pool.get(block=False))
+            except (queue.Empty, AttributeError):
+                break
+        for conn in idle:
+            if conn is not None:
+                conn.close()
+            # 归还占位，保持连接池容量不变
+            pool.pool.put(None, block=False)
+
+    @classmethod
+    def get_circuit_states(cls):
+        """各熔断器状态"""
+        if cls._pid != os.getpid():
+            return []
+        with cls._lock:
+            breakers = dict(cls._breakers)
+        return [
+            dict(breaker.snapshot(), circuit=circuit, host=host_key)
+            for (circuit, host_key), breaker in sorted(breakers.items())
+        ]
+
+    @classmethod
+    def _record(cls, host_key, api_type, elapsed_ms=None, error=False, start=False, retry=False):
+        with cls._lock:
+            stats = cls._stats.get(host_key)
+            if stats is None:
+                return
+            if start:
+                stats['in_flight'] += 1
+                return
+            if retry:
+                stats['retries'] += 1
+                return
+            stats['in_flight'] -= 1
+            stats['requests'] += 1
+            stats['by_api_type'][api_type] = stats['by_api_type'].get(api_type, 0) + 1
+            if error:
+                stats['errors'] += 1
+            if elapsed_ms is not None:
+                stats['total_time_ms'] += elapsed_ms
+
+    @staticmethod
+    def _replay_positions(kwargs):
+        """
+        记录请求体中文件对象的当前位置，用于重试前回退
+
+        Returns:
+            list: [(文件对象, 位置)]，请求体无法重放（生成器、不可seek的流）时返回 None
+        """
+        data = kwargs.get('data')
+        if data is not None and not isinstance(data, (dict, list, tuple, str, bytes)):
+            return None
+
+        positions = []
+        files = kwargs.get('files') or {}
+        for value in (files.values() if isinstance(files, dict) else [item[1] for item in files]):
+            file_obj = value[1] if isinstance(value, (tuple, list)) else value
+            if isinstance(file_obj, (str, bytes)):
+                continue
+            try:
+                if not file_obj.seekable():
+                    return None
+                positions.append((file_obj, file_obj.tell()))
+            except (AttributeError, OSError, ValueError):
+                return None
+        return positions
+
+    @staticmethod
+    def _is_connect_failure(error):
+        """
+        判断请求异常是否发生在建立连接阶段（请求体尚未发出，非幂等请求也可以安全重试）
+
+        沿异常链查找连接超时、无法建立连接（含DNS解析失败）；连接重置、远端关闭等发生在请求发出之后，不视为连接失败
+        """
+        seen = set()
+        pending = [error]
+        while pending:
+            current = pending.pop()
+            if current is None or id(current) in seen:
+                continue
+            seen.add(id(current))
+            if isinstance(current, (requests.ConnectTimeout, ConnectTimeoutError, NewConnectionError)):
+                return True
+            pending.extend([getattr(current, 'reason', None), current.__cause__, current.__context__])
+            pending.extend(arg for arg in getattr(current, 'args', ()) if isinstance(arg, BaseException))
+        return False
+
+    @classmethod
+    def _log_retry(cls, method, url, api_type, attempt, reason, delay):
+        if has_app_context():
+            current_app.logger.warning(
+                f"[Dify请求重试] {method} {url} - 类型: {api_type} - 第{attempt}次失败: {reason} - {round(delay, 2)}秒后重试"
+            )
+
+    @classmethod
+    def request(cls, method, url, api_type='default', timeout=None, circuit=None, **kwargs):
+        """
+        通过共享连接池发送请求，按API类型的重试策略重试暂时性失败，按（circuit, 主机）熔断
+
+        - 非幂等请求（POST等）只在建立连接失败和429时重试，请求发出后的失败可能已被上游执行；
+          幂等请求（GET等）另外在连接重置、读取超时和502/503/504时重试
+        - 重试前按指数退避 + 随机抖动等待，上游返回 Retry-After 时按其等待（超过 DIFY_RETRY_AFTER_MAX 不再重试）
+        - 每个主机共享重试预算，额度用完后直接返回失败；请求体无法重放（流式上传）时不重试
+        - 熔断打开时不发出请求，直接抛出 DifyCircuitOpenError；
+          半开探测使用新建的连接，连接建立即视为探测成功，长时间运行的请求不会在整个执行期间占用探测名额
+
+        Args:
+            method (str): 请求方法
+            url (str): 请求地址
+            api_type (str): API类型，决定超时配置、重试策略并用于统计
+            timeout: 显式超时，优先于按API类型的配置
+            circuit (str): 熔断器名称（应用场景或任务类型），默认使用 api_type
+            **kwargs: 透传给 requests 的参数（headers/json/params/files/data/stream 等）
+
+        Returns:
+            requests.Response
+        """
+        method = method.upper()
+        session = cls.get_session(url)
+        host_key = cls._host_key(url)
+        budget = cls._budgets.get(host_key)
+        timeout = timeout if timeout is not None else cls.get_timeout(api_type)
+
+        positions = cls._replay_positions(kwargs)
+        max_attempts = cls.get_max_attempts(api_type) if positions is not None else 1
+        idempotent = method in cls.IDEMPOTENT_METHODS
+        retry_statuses = cls.IDEMPOTENT_RETRY_STATUSES if idempotent else cls.RETRY_STATUSES
+        if budget is not None:
+            budget.deposit()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker, permit = cls.check_breaker(circuit or api_type, url)
+            probing = permit is not None and permit is not True
+            if probing:
+                cls._drop_idle_connections(session, url)
+            # 每次请求都重新设置，之前请求遗留的回调不会作用于本次请求（凭证失效后 connected() 也不会生效）
+            _connect_listener.callback = (lambda: breaker.connected(permit)) if probing else None
+            cls._record(host_key, api_type, start=True)
+            start_time = time.time()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                cls._record(host_key, api_type, round((time.time() - start_time) * 1000, 2), error=True)
+                if breaker is not None:
+                    breaker.record(False, permit)
+                retryable = isinstance(e, (requests.ConnectionError, requests.Timeout)) and (
+                    idempotent or cls._is_connect_failure(e)
+                )
+                if not retryable or attempt >= max_attempts or budget is None or not budget.withdraw():
+                    raise
+                delay = backoff_delay(attempt, Config.DIFY_RETRY_BACKOFF_BASE, Config.DIFY_RETRY_BACKOFF_MAX)
+                cls._log_retry(method, url, api_type, attempt, f"{type(e).__name__}: {str(e)[:200]}", delay)
+            except BaseException:
+                # 请求体读取失败等非网络错误，不计入熔断统计
+                cls._record(host_key, api_type, round((time.time() - start_time) * 1000, 2), error=True)
+                if breaker is not None:
+                    breaker.record(None, permit)
+                raise
+            else:
+                cls._record(host_key, api_type, round((time.time() - start_time) * 1000, 2), error=response.status_code >= 500)
+                if breaker is not None:
+                    breaker.record(response.status_code < 500, permit)
+                if response.status_code not in retry_statuses or attempt >= max_attempts:
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None and retry_after > Config.DIFY_RETRY_AFTER_MAX:
+                    return response
+                if budget is None or not budget.withdraw():
+                    return response
+                delay = retry_after if retry_after is not None else backoff_delay(
+                    attempt, Config.DIFY_RETRY_BACKOFF_BASE, Config.DIFY_RETRY_BACKOFF_MAX
+                )
+                response.close()
+                cls._log_retry(method, url, api_type, attempt, f"状态码 {response.status_code}", delay)
+
+            cls._record(host_key, api_type, retry=True)
+            for file_obj, position in positions:
+                file_obj.seek(position)
+            time.sleep(delay)
+
+    @classmethod
+    def get(cls, url, api_type='default', **kwargs):
+        return cls.request('GET', url, api_type=api_type, **kwargs)
+
+    @classmethod
+    def post(cls, url, api_type='default', **kwargs):
+        return cls.request('POST', url, api_type=api_type, **kwargs)
+
+    @classmethod
+    def patch(cls, url, api_type='default', **kwargs):
+        return cls.request('PATCH', url, api_type=api_type, **kwargs)
+
+    @classmethod
+    def delete(cls, url, api_type='default', **kwargs):
+        return cls.request('DELETE', url, api_type=api_type, **kwargs)
+
+    @classmethod
+    def get_stats(cls):
+        """获取各主机连接池使用情况"""
+        with cls._lock:
+            sessions = dict(cls._sessions)
+            stats = {host: dict(values, by_api_type=dict(values['by_api_type'])) for host, values in cls._stats.items()}
+
+        for host_key, session in sessions.items():
+            host_stats = stats.get(host_key)
+            if host_stats is None:
+                continue
+
+            # urllib3 连接池统计：新建连接数、经连接池发出的请求数、当前空闲连接数
+            connections_created = 0
+            pool_requests = 0
+            idle_connections = 0
+            adapter = session.get_adapter(host_key + '/')
+            for pool in list(adapter.poolmanager.pools._container.values()):
+                connections_created += getattr(pool, 'num_connections', 0)
+                pool_requests += getattr(pool, 'num_requests', 0)
+                if getattr(pool, 'pool', None) is not None:
+                    # 队列中的None是尚未建立连接的占位
+                    idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+            host_stats['connections_created'] = connections_created
+            host_stats['idle_connections'] = idle_connections
+            host_stats['connection_reuse_ratio'] = round(1 - connections_created / pool_requests, 4) if pool_requests else 0
+            host_stats['avg_time_ms'] = round(host_stats['total_time_ms'] / host_stats['requests'], 2) if host_stats['requests'] else 0
+            host_stats['total_time_ms'] = round(host_stats['total_time_ms'], 2)
+            budget = cls._budgets.get(host_key)
+            if budget is not None:
+                host_stats['retry_budget_tokens'] = budget.tokens
+                host_stats['retries_denied'] = budget.denied
+
+        return {
+            'hosts': stats,
+            'timeouts': {api_type: cls.get_timeout(api_type) for api_type in cls.DEFAULT_TIMEOUTS},
+            'max_attempts': {api_type: cls.get_max_attempts(api_type) for api_type in cls.DEFAULT_TIMEOUTS}
+        }
@@ -1,6 +1,7 @@
 import os
 import json
 import re
+import threading
 from datetime import datetime
 from flask import current_app
 from reportlab.lib.pagesizes import letter, A4
@@ -8,11 +9,10 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib.colors import black
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 import PyPDF2
 from docx import Document as DocxDocument
 from PIL import Image
+from app.services.font_service import FontService
 import io
 import base64
 
@@ -20,6 +20,39 @@ import base64
 class DocumentService:
     """文档服务 - 处理文档预览和导出"""
     
+    # 导出渲染器版本，修改导出内容或样式后递增，使已缓存的导出文件失效
+    EXPORT_RENDERER_VERSIONS = {
+        'pdf': 2,
+        'markdown_raw': 1,
+        'markdown_preview': 2,
+        'excel': 2
+    }
+    
+    # Markdown清理：元数据行（文档类型、转换时间、源格式，可带加粗和引用标记）
+    _METADATA_LINE_RE = re.compile(r'(?:文档类型|转换时间|源格式)(?:\*\*)?：')
+    # Markdown清理：元数据块结束的分隔线
+    _SEPARATOR_LINE_RE = re.compile(r'---|\*\*\*$|___$')
+    
+    # Markdown转换：分段转换的分割点（前一行为空行的ATX标题）
+    _HEADING_LINE_RE = re.compile(r'#{1,6}(?:\s|$)')
+    _FENCE_LINE_RE = re.compile(r' {0,3}(`{3,}|~{3,})')
+    # 引用式链接、脚注、缩写定义和行首HTML块可能跨段落生效，包含时整篇转换
+    _CROSS_BLOCK_RE = re.compile(r'^ {0,3}(?:\[[^\]\n]+\]:|\*\[[^\]\n]+\]:|<[a-zA-Z])', re.MULTILINE)
+    # 分段转换的目标段大小（字符数）；Python-Markdown的耗时随文档长度超线性增长
+    MARKDOWN_CHUNK_SIZE = 8 * 1024
+    MARKDOWN_EXTENSIONS = [
+        'markdown.extensions.extra',  # 包含tables, fenced_code等
+        'markdown.extensions.codehilite',  # 代码高亮
+        'markdown.extensions.toc',  # 目录
+        'markdown.extensions.nl2br',  # 换行转换
+    ]
+    
+    # 每个线程复用一个Markdown转换器实例（转换前reset）
+    _markdown_local = threading.local()
+    
+    # 文件预览版本，修改预览内容格式后递增，使已缓存的预览失效
+    PREVIEW_VERSION = 1
+    
     # 支持预览的文件类型
     PREVIEW_SUPPORTED_TYPES = {
         'pdf', 'txt', 'md', 'json', 'xml', 'doc', 'docx', 
@@ -39,16 +72,36 @@ class DocumentService:
             return False
     
     @staticmethod
-    def get_file_preview(file_path, max_length=5000):
-        """获取文件预览内容"""
+    def parse_page_range(value):
+        """
+        解析页码范围参数（如 "3-5" 或 "3"），页码从1开始
+        
+        Returns:
+            tuple: (起始页, 结束页)
+        """
+        try:
+            parts = [int(part) for part in str(value).split('-', 1)]
+        except ValueError:
+            raise ValueError("页码范围格式错误，示例: pages=3-5")
+        start, end = parts[0], parts[-1]
+        if start < 1 or end < start:
+            raise ValueError("页码范围无效，起始页需不小于1且不大于结束页")
+        return start, end
+    
+    @staticmethod
+    def get_file_preview(file_path, max_length=5000, page_range=None):
+        """获取文件预览内容，page_range 为PDF页码范围 (起始页, 结束页)，只提取指定页"""
         try:
             if not os.path.exists(file_path):
                 return {'error': '文件不存在', 'content': None}
             
             file_extension = os.path.splitext(file_path)[1].lower().lstrip('.')
             
+            if page_range and file_extension != 'pdf':
+                return {'error': '仅PDF文件支持按页预览', 'content': None}
+            
             if file_extension == 'pdf':
-                return DocumentService._preview_pdf(file_path, max_length)
+                return DocumentService._preview_pdf(file_path, max_length, page_range)
             elif file_extension in ['txt', 'md']:
                 return DocumentService._preview_text(file_path, max_length)
             elif file_extension == 'json':
@@ -67,20 +120,27 @@ class DocumentService:
             return {'error': f'预览失败: {str(e)}', 'content': None}
     
     @staticmethod
-    def _preview_pdf(file_path, max_length):
-        """预览PDF文件"""
+    def _preview_pdf(file_path, max_length, page_range=None):
+        """预览PDF文件（指定页码范围时只提取范围内的页面）"""
         try:
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
+                total_pages = len(pdf_reader.pages)
+                
+                page_numbers = range(total_pages)
+                if page_range:
+                    if page_range[0] > total_pages:
+                        return {'error': f'页码超出范围，文件共 {total_pages} 页', 'content': None, 'pages': total_pages}
+                    page_numbers = range(page_range[0] - 1, min(page_range[1], total_pages))
                 
                 content = []
                 total_length = 0
                 
-                for page_num, page in enumerate(pdf_reader.pages):
+                for page_num in page_numbers:
                     if total_length >= max_length:
                         break
                     
-                    page_text = page.extract_text()
+                    page_text = pdf_reader.pages[page_num].extract_text()
                     if page_text:
                         remaining_length = max_length - total_length
                         if len(page_text) > remaining_length:
@@ -89,12 +149,15 @@ class DocumentService:
                         content.append(f"--- 第 {page_num + 1} 页 ---\n{page_text}")
                         total_length += len(page_text)
                 
-                return {
+                result = {
                     'content': '\n\n'.join(content),
                     'type': 'text',
-                    'pages': len(pdf_reader.pages),
+                    'pages': total_pages,
                     'truncated': total_length >= max_length
                 }
+                if page_range:
+                    result['page_range'] = [page_numbers.start + 1, page_numbers.stop]
+                return result
                 
         except Exception as e:
             return {'error': f'PDF解析失败: {str(e)}', 'content': None}
@@ -199,41 +262,50 @@ class DocumentService:
         except Exception as e:
             return {'error': f'DOCX解析失败: {str(e)}', 'content': None}
     
+    @staticmethod
+    def create_image_thumbnail(file_path, output, max_size=(800, 600)):
+        """
+        生成PNG缩略图写入 output（文件路径或文件对象），返回原图信息
+        
+        大图按缩小比例解码（JPEG），不解码完整尺寸的像素
+        """
+        with Image.open(file_path) as img:
+            # 获取图片信息
+            width, height = img.size
+            info = {
+                'width': width,
+                'height': height,
+                'format': img.format,
+                'mode': img.mode
+            }
+            
+            # 如果图片太大，创建缩略图
+            if width > max_size[0] or height > max_size[1]:
+                img.draft(None, max_size)
+                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            
+            img.save(output, format='PNG')
+        return info
+    
     @staticmethod
     def _preview_image(file_path):
         """预览图片文件"""
         try:
-            with Image.open(file_path) as img:
-                # 获取图片信息
-                width, height = img.size
-                format_name = img.format
-                mode = img.mode
-                
-                # 如果图片太大，创建缩略图
-                max_size = (800, 600)
-                if width > max_size[0] or height > max_size[1]:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                
-                # 转换为base64
-                buffer = io.BytesIO()
-                img.save(buffer, format='PNG')
-                img_data = buffer.getvalue()
-                img_base64 = base64.b64encode(img_data).decode('utf-8')
-                
-                return {
-                    'content': f"data:image/png;base64,{img_base64}",
-                    'type': 'image',
-                    'width': width,
-                    'height': height,
-                    'format': format_name,
-                    'mode': mode
-                }
+            buffer = io.BytesIO()
+            info = DocumentService.create_image_thumbnail(file_path, buffer)
+            
+            # 转换为base64
+            img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            
+            return {
+                'content': f"data:image/png;base64,{img_base64}",
+                'type': 'image',
+                **info
+            }
                 
         except Exception as e:
             return {'error': f'图片处理失败: {str(e)}', 'content': None}
     
-
-    
     @staticmethod
     def export_task_result_to_pdf(task_result, output_path=None):
         """导出任务结果为PDF - 支持Markdown预览格式转换"""
@@ -280,6 +352,17 @@ class DocumentService:
     @staticmethod
     def _export_markdown_to_pdf(task_result, output_path):
         """新方法：将Markdown内容转换为HTML，然后转换为PDF"""
+        # 先确认weasyprint可用（结果在进程内缓存），不可用时直接回退，不做无用的Markdown转换
+        try:
+            font_config = FontService.get_weasyprint_font_config()
+        except ImportError as import_error:
+            return False, None, f"weasyprint库未安装: {str(import_error)}"
+        except OSError as os_error:
+            if "gobject" in str(os_error) or "GTK" in str(os_error):
+                return False, None, f"weasyprint需要GTK库支持（Windows系统常见问题）: {str(os_error)}"
+            else:
+                return False, None, f"weasyprint系统库依赖问题: {str(os_error)}"
+        
         try:
             # 获取任务结果内容
             content = task_result.answer or "暂无处理结果"
@@ -295,27 +378,15 @@ class DocumentService:
                 f"任务结果 - {task_result.task_id}"
             )
             
-            # 使用weasyprint将HTML转换为PDF
+            # 使用weasyprint将HTML转换为PDF（复用进程内的字体配置）
             try:
-                from weasyprint import HTML, CSS
-                from weasyprint.text.fonts import FontConfiguration
-                
-                # 创建字体配置
-                font_config = FontConfiguration()
+                from weasyprint import HTML
                 
-                # 生成PDF
                 html_doc = HTML(string=full_html)
                 html_doc.write_pdf(output_path, font_config=font_config)
                 
                 return True, output_path, None
                 
-            except ImportError as import_error:
-                return False, None, f"weasyprint库未安装: {str(import_error)}"
-            except OSError as os_error:
-                if "gobject" in str(os_error) or "GTK" in str(os_error):
-                    return False, None, f"weasyprint需要GTK库支持（Windows系统常见问题）: {str(os_error)}"
-                else:
-                    return False, None, f"weasyprint系统库依赖问题: {str(os_error)}"
             except Exception as pdf_error:
                 return False, None, f"HTML转PDF失败: {str(pdf_error)}"
                 
@@ -323,124 +394,121 @@ class DocumentService:
             return False, None, f"Markdown预处理失败: {str(e)}"
     
     @staticmethod
-    def _clean_markdown_content(content):
-        """清理和格式化Markdown内容，处理数据库中存储的格式"""
-        if not content:
-            return "# 任务结果\n\n暂无处理结果"
-        
-        # 确保是字符串
-        content = str(content)
-        original_content = content
-        
-        # 移除外层的代码块标记（处理数据库中存储的格式）
-        content_stripped = content.strip()
-        
+    def _log_info(message):
+        """记录info日志，没有应用上下文时（如渲染进程）输出到标准输出"""
         try:
-            current_app.logger.info(f"原始内容前100字符: {content_stripped[:100]}...")
-            current_app.logger.info(f"内容开头检查: startswith('```markdown'): {content_stripped.startswith('```markdown')}")
-            current_app.logger.info(f"内容结尾检查: endswith('```'): {content_stripped.endswith('```')}")
+            current_app.logger.info(message)
         except RuntimeError:
-            print(f"原始内容前100字符: {content_stripped[:100]}...")
-            print(f"内容开头检查: startswith('```markdown'): {content_stripped.startswith('```markdown')}")
-            print(f"内容结尾检查: endswith('```'): {content_stripped.endswith('```')}")
-        
-        # 处理各种代码块包装情况（改进版本，更robust）
-        cleaned = False
-        
+            print(message)
+    
+    @staticmethod
+    def _unwrap_code_block(content_stripped):
+        """移除外层的代码块标记（处理数据库中存储的格式），返回 (内容, 匹配的格式)，不匹配时格式为None"""
         # 检查````markdown ... ````格式
         if content_stripped.startswith('````markdown') and content_stripped.endswith('````'):
-            content = content_stripped[12:-4].strip()
-            cleaned = True
-            try:
-                current_app.logger.info("✅ 检测到````markdown代码块格式，已自动提取内容")
-            except RuntimeError:
-                print("✅ 检测到````markdown代码块格式，已自动提取内容")
-                
+            return content_stripped[12:-4].strip(), '````markdown'
+        
         # 检查```markdown ... ```格式
-        elif content_stripped.startswith('```markdown') and content_stripped.endswith('```'):
-            content = content_stripped[11:-3].strip()
-            cleaned = True
-            try:
-                current_app.logger.info("✅ 检测到```markdown代码块格式，已自动提取内容")
-            except RuntimeError:
-                print("✅ 检测到```markdown代码块格式，已自动提取内容")
-                
+        if content_stripped.startswith('```markdown') and content_stripped.endswith('```'):
+            return content_stripped[11:-3].strip(), '```markdown'
+        
         # 检查````...````格式
-        elif content_stripped.startswith('````') and content_stripped.endswith('````'):
-            content = content_stripped[4:-4].strip()
-            cleaned = True
-            try:
-                current_app.logger.info("✅ 检测到````代码块格式，已自动提取内容")
-            except RuntimeError:
-                print("✅ 检测到````代码块格式，已自动提取内容")
-                
-        # 检查```...```格式（逐行处理，更准确）
-        elif content_stripped.startswith('```') and content_stripped.endswith('```'):
-            lines = content_stripped.split('\n')
-            if len(lines) >= 2:
-                first_line = lines[0].strip()
-                last_line = lines[-1].strip()
-                
-                # 检查第一行是否是```或```语言名
+        if content_stripped.startswith('````') and content_stripped.endswith('````'):
+            return content_stripped[4:-4].strip(), '````'
+        
+        # 检查```...```格式（首行为```或```语言名，末行为```），只定位首尾行，不拆分全文
+        if content_stripped.startswith('```') and content_stripped.endswith('```'):
+            first_break = content_stripped.find('\n')
+            last_break = content_stripped.rfind('\n')
+            if first_break != -1:
+                first_line = content_stripped[:first_break].strip()
+                last_line = content_stripped[last_break + 1:].strip()
                 if first_line.startswith('```') and last_line == '```':
-                    content = '\n'.join(lines[1:-1]).strip()
-                    cleaned = True
-                    try:
-                        current_app.logger.info(f"✅ 检测到```代码块格式（首行：{first_line}），已自动提取内容")
-                    except RuntimeError:
-                        print(f"✅ 检测到```代码块格式（首行：{first_line}），已自动提取内容")
+                    inner = content_stripped[first_break + 1:last_break] if last_break > first_break else ''
+                    return inner.strip(), f'```代码块格式（首行：{first_line}）'
         
-        # 如果没有清理，记录日志
-        if not cleaned:
-            try:
-                current_app.logger.info("ℹ️ 内容格式不匹配任何代码块模式，保持原样")
-            except RuntimeError:
-                print("ℹ️ 内容格式不匹配任何代码块模式，保持原样")
-        
-        # 基本清理
-        content = content.strip()
-        
-        # 移除元数据信息（文档类型、转换时间、源格式等）
-        content = DocumentService._remove_metadata_info(content)
+        return content_stripped, None
+    
+    @staticmethod
+    def _iter_without_metadata(lines):
+        """跳过元数据行（文档类型、转换时间、源格式等）直到其后的分隔线，逐行产出其余内容"""
+        skip_metadata_section = False
+        for line in lines:
+            line_stripped = line.strip()
+            
+            # 遇到元数据行，开始跳过模式
+            if DocumentService._METADATA_LINE_RE.search(line_stripped):
+                skip_metadata_section = True
+                continue
+            
+            if skip_metadata_section:
+                # 在跳过模式中遇到分隔线，结束跳过模式
+                if DocumentService._SEPARATOR_LINE_RE.match(line_stripped):
+                    skip_metadata_section = False
+                continue
+            
+            yield line
+    
+    @staticmethod
+    def _clean_markdown_content(content):
+        """
+        清理和格式化Markdown内容，处理数据库中存储的格式
         
-        # 如果清理后内容为空，提供默认内容
+        移除外层代码块标记后，元数据移除、补充主标题、去除行尾空白和合并连续空行在一次逐行遍历中完成
+        """
         if not content:
             return "# 任务结果\n\n暂无处理结果"
         
-        # 如果内容不是以标题开始，添加一个主标题
-        if not content.startswith('#'):
-            content = "# 任务结果\n\n" + content
+        # 移除外层的代码块标记（处理数据库中存储的格式）
+        content_stripped = str(content).strip()
+        DocumentService._log_info(f"原始内容前100字符: {content_stripped[:100]}...")
+        
+        content, wrapper = DocumentService._unwrap_code_block(content_stripped)
+        if wrapper:
+            DocumentService._log_info(f"✅ 检测到{wrapper}，已自动提取内容")
+        else:
+            DocumentService._log_info("ℹ️ 内容格式不匹配任何代码块模式，保持原样")
         
-        # 确保段落之间有适当的间距
         lines = content.split('\n')
         cleaned_lines = []
+        started = False
         prev_line_empty = False
         
-        for line in lines:
+        for line in DocumentService._iter_without_metadata(lines):
+            if not started:
+                # 移除开头的空行
+                if not line:
+                    continue
+                started = True
+                # 如果内容不是以标题开始，添加一个主标题
+                if not line.startswith('#'):
+                    cleaned_lines.extend(["# 任务结果", ""])
+                    prev_line_empty = True
+            
             line = line.rstrip()
-            is_empty = len(line) == 0
+            is_empty = not line
             
             # 避免连续的空行
             if is_empty and prev_line_empty:
                 continue
-                
+            
             cleaned_lines.append(line)
             prev_line_empty = is_empty
         
+        # 如果清理后内容为空，提供默认内容
+        if not started:
+            return "# 任务结果\n\n暂无处理结果"
+        
         cleaned_content = '\n'.join(cleaned_lines)
+        DocumentService._log_info(f"元数据清理完成，清理前行数: {len(lines)}, 清理后行数: {len(cleaned_lines)}")
         
         # 验证最终结果
-        still_has_codeblock = cleaned_content.strip().startswith('```') or cleaned_content.strip().endswith('```')
-        
-        try:
-            current_app.logger.info(f"清理后内容前100字符: {cleaned_content[:100]}...")
-            current_app.logger.info(f"清理结果验证: 是否还有代码块标记: {still_has_codeblock}")
-            if still_has_codeblock:
+        still_has_codeblock = cleaned_content.lstrip().startswith('```') or cleaned_content.rstrip().endswith('```')
+        DocumentService._log_info(f"清理后内容前100字符: {cleaned_content[:100]}...")
+        if still_has_codeblock:
+            try:
                 current_app.logger.warning("⚠️ 警告：清理后内容仍包含代码块标记，可能需要手动检查")
-        except RuntimeError:
-            print(f"清理后内容前100字符: {cleaned_content[:100]}...")
-            print(f"清理结果验证: 是否还有代码块标记: {still_has_codeblock}")
-            if still_has_codeblock:
+            except RuntimeError:
                 print("⚠️ 警告：清理后内容仍包含代码块标记，可能需要手动检查")
         
         return cleaned_content
@@ -451,70 +519,10 @@ class DocumentService:
         if not content:
             return content
         
-        lines = content.split('\n')
-        cleaned_lines = []
-        skip_metadata_section = False
-        
-        # 检测和移除元数据模式
-        for i, line in enumerate(lines):
-            line_stripped = line.strip()
-            
-            # 检测元数据开始标记
-            metadata_patterns = [
-                '> **文档类型**：',
-                '> **转换时间**：', 
-                '> **源格式**：',
-                '**文档类型**：',
-                '**转换时间**：',
-                '**源格式**：',
-                '文档类型：',
-                '转换时间：',
-                '源格式：'
-            ]
-            
-            # 检查是否是元数据行
-            is_metadata_line = any(pattern in line_stripped for pattern in metadata_patterns)
-            
-            # 检查是否是元数据分隔线
-            is_separator_line = line_stripped in ['---', '***', '___'] or line_stripped.startswith('---')
-            
-            # 如果遇到元数据行，开始跳过模式
-            if is_metadata_line:
-                skip_metadata_section = True
-                try:
-                    current_app.logger.info(f"检测到元数据行，开始跳过: {line_stripped[:50]}...")
-                except RuntimeError:
-                    print(f"检测到元数据行，开始跳过: {line_stripped[:50]}...")
-                continue
-            
-            # 如果在跳过模式中遇到分隔线，结束跳过模式
-            if skip_metadata_section and is_separator_line:
-                skip_metadata_section = False
-                try:
-                    current_app.logger.info("检测到元数据分隔线，结束跳过模式")
-                except RuntimeError:
-                    print("检测到元数据分隔线，结束跳过模式")
-                continue
-            
-            # 如果在跳过模式中，继续跳过
-            if skip_metadata_section:
-                continue
-            
-            # 保留非元数据行
-            cleaned_lines.append(line)
-        
-        # 重新组合内容
-        cleaned_content = '\n'.join(cleaned_lines)
+        cleaned_content = '\n'.join(DocumentService._iter_without_metadata(content.split('\n')))
         
         # 移除开头的多余空行
-        cleaned_content = cleaned_content.lstrip('\n')
-        
-        try:
-            current_app.logger.info(f"元数据清理完成，清理前行数: {len(lines)}, 清理后行数: {len(cleaned_lines)}")
-        except RuntimeError:
-            print(f"元数据清理完成，清理前行数: {len(lines)}, 清理后行数: {len(cleaned_lines)}")
-        
-        return cleaned_content
+        return cleaned_content.lstrip('\n')
     
     @staticmethod
     def _convert_html_to_reportlab_elements(html_content, base_style, chinese_available, chinese_font_name):
@@ -803,25 +811,69 @@ class DocumentService:
                 traceback.print_exc()
             return False, None, error_msg
     
+    @staticmethod
+    def _get_markdown_converter():
+        """获取当前线程复用的Markdown转换器，扩展只在首次创建时加载"""
+        converter = getattr(DocumentService._markdown_local, 'converter', None)
+        if converter is None:
+            import markdown
+            from app.utils.markdown_ids import ChunkHeaderIdExtension
+            converter = markdown.Markdown(extensions=DocumentService.MARKDOWN_EXTENSIONS + [ChunkHeaderIdExtension()])
+            DocumentService._markdown_local.converter = converter
+        return converter
+    
+    @staticmethod
+    def _split_markdown_chunks(markdown_content, chunk_size=None):
+        """
+        在代码块之外、前一行为空行的标题处将Markdown内容分段，每段不小于 chunk_size
+        
+        包含可能跨段生效的定义（引用式链接、脚注、缩写、行首HTML块）时不分段
+        """
+        chunk_size = chunk_size or DocumentService.MARKDOWN_CHUNK_SIZE
+        if len(markdown_content) <= chunk_size or DocumentService._CROSS_BLOCK_RE.search(markdown_content):
+            return [markdown_content]
+        
+        chunks = []
+        current = []
+        current_size = 0
+        fence = None
+        prev_line_empty = True
+        
+        for line in markdown_content.split('\n'):
+            fence_match = DocumentService._FENCE_LINE_RE.match(line)
+            if fence:
+                # 代码块结束标记：相同字符且长度不小于开始标记
+                if fence_match and fence_match.group(1).startswith(fence) and not line.strip().strip(fence[0]):
+                    fence = None
+            elif fence_match:
+                fence = fence_match.group(1)
+            elif (current_size >= chunk_size and prev_line_empty
+                  and DocumentService._HEADING_LINE_RE.match(line)):
+                chunks.append('\n'.join(current))
+                current = []
+                current_size = 0
+            
+            current.append(line)
+            current_size += len(line) + 1
+            prev_line_empty = not line.strip()
+        
+        chunks.append('\n'.join(current))
+        return chunks
+    
     @staticmethod
     def _convert_markdown_to_html(markdown_content):
-        """将Markdown内容转换为HTML"""
+        """将Markdown内容转换为HTML（复用转换器实例，长文档按标题分段转换）"""
         try:
-            import markdown
+            converter = DocumentService._get_markdown_converter()
             
-            # 配置Markdown扩展
-            extensions = [
-                'markdown.extensions.extra',  # 包含tables, fenced_code等
-                'markdown.extensions.codehilite',  # 代码高亮
-                'markdown.extensions.toc',  # 目录
-                'markdown.extensions.nl2br',  # 换行转换
-            ]
+            # 转换Markdown为HTML；reset() 不清空已使用的标题ID，分段之间的ID保持唯一
+            converter.treeprocessors['chunk_header_ids'].start_document()
+            html_parts = []
+            for chunk in DocumentService._split_markdown_chunks(markdown_content):
+                converter.reset()
+                html_parts.append(converter.convert(chunk))
             
-            # 转换Markdown为HTML
-            md = markdown.Markdown(extensions=extensions)
-            html_content = md.convert(markdown_content)
-            
-            return html_content
+            return '\n'.join(html_parts)
             
         except ImportError:
             # 如果markdown库不可用，返回基本的HTML格式
@@ -1142,98 +1194,8 @@ class DocumentService:
     def _export_text_to_pdf_legacy(task_result, output_path):
         """原有方法：使用ReportLab直接处理文本（作为备用方案）"""
         try:
-            # 注册中文字体（使用改进的策略）
-            chinese_available = False
-            chinese_font_name = 'ChineseFont'
-            
-            try:
-                # 尝试多种字体注册策略
-                font_registered = False
-                
-                # 策略1: 优先尝试系统字体（更可靠）
-                font_path = DocumentService._find_chinese_font()
-                if font_path:
-                    try:
-                        current_app.logger.info(f"正在注册系统字体: {font_path}")
-                    except RuntimeError:
-                        print(f"正在注册系统字体: {font_path}")
-                    
-                    try:
-                        # 尝试标准TTF注册
-                        pdfmetrics.registerFont(TTFont(chinese_font_name, font_path))
-                        chinese_available = True
-                        font_registered = True
-                    except Exception as ttf_error:
-                        try:
-                            # 如果是TTC文件，尝试使用子字体
-                            if font_path.endswith('.ttc'):
-                                pdfmetrics.registerFont(TTFont(chinese_font_name, font_path, subfontIndex=0))
-                                chinese_available = True
-                                font_registered = True
-                            else:
-                                raise ttf_error
-                        except:
-                            # 最后尝试强制使用subfontIndex
-                            try:
-                                pdfmetrics.registerFont(TTFont(chinese_font_name, font_path, subfontIndex=0))
-                                chinese_available = True
-                                font_registered = True
-                            except:
-                                pass
-                
-                # 策略2: 如果系统字体失败，尝试内置CID字体
-                if not font_registered:
-                    try:
-                        # 使用ReportLab的内置字体作为备选
-                        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-                        pdfmetrics.registerFont(UnicodeCIDFont('STSong-Light'))
-                        chinese_font_name = 'STSong-Light'
-                        chinese_available = True
-                        font_registered = True
-                        try:
-                            current_app.logger.info("使用内置中文字体: STSong-Light")
-                        except RuntimeError:
-                            print("使用内置中文字体: STSong-Light")
-                    except:
-                        # 尝试其他内置CID字体
-                        cid_fonts = ['STSongStd-Light', 'HeiseiMin-W3', 'HeiseiKakuGo-W5', 'MSung-Light', 'MSungStd-Light']
-                        for cid_font in cid_fonts:
-                            try:
-                                from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-                                pdfmetrics.registerFont(UnicodeCIDFont(cid_font))
-                                chinese_font_name = cid_font
-                                chinese_available = True
-                                font_registered = True
-                                try:
-                                    current_app.logger.info(f"使用内置中文字体: {cid_font}")
-                                except RuntimeError:
-                                    print(f"使用内置中文字体: {cid_font}")
-                                break
-                            except:
-                                continue
-                
-                # 策略3: 如果都失败，使用Helvetica但标记为支持中文（降级方案）
-                if not font_registered:
-                    try:
-                        current_app.logger.warning("使用Helvetica作为备选字体")
-                    except RuntimeError:
-                        print("使用Helvetica作为备选字体")
-                    chinese_font_name = 'Helvetica'
-                    chinese_available = False  # 不支持中文，但不会报错
-                
-                if font_registered:
-                    try:
-                        current_app.logger.info(f"中文字体注册成功: {chinese_font_name}")
-                    except RuntimeError:
-                        print(f"中文字体注册成功: {chinese_font_name}")
-                        
-            except Exception as e:
-                try:
-                    current_app.logger.error(f"字体注册过程失败: {str(e)}")
-                except RuntimeError:
-                    print(f"字体注册过程失败: {str(e)}")
-                chinese_font_name = 'Helvetica'
-                chinese_available = False
+            # 中文字体在进程内只查找和注册一次
+            chinese_font_name, chinese_available = FontService.get_reportlab_font()
             
             # 创建PDF文档
             doc = SimpleDocTemplate(output_path, pagesize=A4)
@@ -1356,83 +1318,6 @@ class DocumentService:
         
         return text
 
-    @staticmethod
-    def _find_chinese_font():
-        """查找中文字体"""
-        font_paths = [
-            # 我们脚本安装的字体目录（最优先）
-            '/usr/share/fonts/truetype/chinese/wqy-microhei.ttc',
-            '/usr/share/fonts/truetype/chinese/NotoSansCJK.ttc',
-            '/usr/share/fonts/truetype/chinese/NotoSansCJK.otf',
-            '/usr/share/fonts/truetype/chinese/wqy-zenhei.ttc',
-            # Windows - 优先使用.ttf文件，避免.ttc文件的兼容问题
-            'C:/Windows/Fonts/simhei.ttf',  # 黑体
-            'C:/Windows/Fonts/simsun.ttf',  # 宋体（如果有单独的ttf文件）
-            'C:/Windows/Fonts/simkai.ttf',  # 楷体
-            'C:/Windows/Fonts/msyh.ttf',    # 微软雅黑（如果有单独的ttf文件）
-            'C:/Windows/Fonts/arial.ttf',   # Arial作为备选
-            # 如果没有单独的ttf文件，再尝试ttc文件
-            'C:/Windows/Fonts/simsun.ttc',
-            'C:/Windows/Fonts/msyh.ttc',
-            # macOS  
-            '/System/Library/Fonts/Helvetica.ttc',
-            '/Library/Fonts/Arial Unicode.ttf',
-            '/System/Library/Fonts/PingFang.ttc',
-            # Linux - 大幅扩展Linux字体路径
-            '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
-            '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
-            '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
-            '/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc',
-            '/usr/share/fonts/truetype/arphic/uming.ttc',
-            '/usr/share/fonts/truetype/arphic/ukai.ttc',
-            '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',
-            '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
-            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-            # 其他可能的Linux路径
-            '/usr/share/fonts/TTF/wqy-microhei.ttc',
-            '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
-            '/usr/share/fonts/wenquanyi/wqy-microhei/wqy-microhei.ttc'
-        ]
-        
-        for path in font_paths:
-            if os.path.exists(path):
-                try:
-                    current_app.logger.info(f"找到字体文件: {path}")
-                except RuntimeError:
-                    # 在没有应用上下文时使用print
-                    print(f"找到字体文件: {path}")
-                return path
-        
-        # 如果静态路径都找不到，尝试使用系统命令查找
-        try:
-            import subprocess
-            result = subprocess.run(['fc-list', ':lang=zh', 'file'], 
-                                  capture_output=True, text=True, timeout=10)
-            if result.returncode == 0 and result.stdout:
-                # 解析fc-list输出，获取第一个字体文件路径
-                lines = result.stdout.strip().split('\n')
-                for line in lines:
-                    if ':' in line:
-                        font_path = line.split(':')[0].strip()
-                        if os.path.exists(font_path):
-                            try:
-                                current_app.logger.info(f"通过fc-list找到字体: {font_path}")
-                            except RuntimeError:
-                                print(f"通过fc-list找到字体: {font_path}")
-                            return font_path
-        except Exception as e:
-            try:
-                current_app.logger.warning(f"fc-list命令执行失败: {e}")
-            except RuntimeError:
-                print(f"fc-list命令执行失败: {e}")
-        
-        try:
-            current_app.logger.warning("未找到合适的中文字体文件")
-        except RuntimeError:
-            print("未找到合适的中文字体文件")
-        return None
-    
     @staticmethod
     def get_file_stats(file_path):
         """获取文件统计信息"""
@@ -1465,13 +1350,73 @@ class DocumentService:
             size_bytes /= 1024.0
         return f"{size_bytes:.1f} TB" 
 
+    # Excel导出各任务类型的列配置：(表头, 字段, 列宽, 长文本列序号)
+    EXCEL_COLUMNS = {
+        'standard_recommendation': (
+            ['排序序号', '项目名称', '原文内容', '参考标准'],
+            ['sn', 'projectName', 'originalText', 'referenceStandard'],
+            [10, 25, 50, 40],
+            [3, 4]  # 原文内容、参考标准
+        ),
+        'standard_compliance': (
+            ['排序序号', '项目名称', '原文内容', '是否符合标准', '建议改写内容', '参考标准'],
+            ['sn', 'projectName', 'originalText', 'isCompliant', 'suggestedRewrite', 'referenceStandard'],
+            [10, 25, 40, 15, 40, 35],
+            [3, 5, 6]  # 原文内容、建议改写内容、参考标准
+        ),
+        'standard_review': (
+            ['序号', '问题位置', '原文', '问题描述', '修改建议'],
+            ['sn', 'issueLocation', 'originalText', 'issueDescription', 'recommendedModification'],
+            [8, 20, 40, 30, 40],
+            [3, 4, 5]  # 原文、问题描述、修改建议
+        )
+    }
+
+    @staticmethod
+    def _add_excel_named_styles(wb):
+        """注册Excel共享命名样式，所有单元格引用同一样式，不再逐个单元格创建样式对象"""
+        from openpyxl.styles import NamedStyle, Font, PatternFill, Alignment, Border, Side
+
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+
+        title_style = NamedStyle(name='export_title')
+        title_style.font = Font(size=16, bold=True)
+        title_style.alignment = Alignment(horizontal="center")
+
+        header_style = NamedStyle(name='export_header')
+        header_style.font = Font(bold=True, color="FFFFFF")
+        header_style.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        header_style.alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+        header_style.border = border
+
+        content_style = NamedStyle(name='export_content')
+        content_style.alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
+        content_style.border = border
+
+        for style in (title_style, header_style, content_style):
+            wb.add_named_style(style)
+
     @staticmethod
     def export_task_results_to_excel(items_data, task_info, output_path=None):
-        """导出任务分页结果为Excel文件"""
+        """
+        导出任务分页结果为Excel文件
+
+        使用openpyxl只写模式逐行写入，items_data 可以是列表或按顺序产出条目的迭代器，
+        内存占用与行数无关；output_path 也可以是可写的文件对象（如HTTP响应流）
+
+        Returns:
+            tuple: (是否成功, 文件路径, 错误信息)
+        """
         try:
             from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+            from openpyxl.cell import WriteOnlyCell
             from openpyxl.utils import get_column_letter
+            from openpyxl.worksheet.cell_range import CellRange
             from datetime import datetime
             
             if not output_path:
@@ -1479,130 +1424,92 @@ class DocumentService:
                 output_path = f"task_results_{task_info.get('id', 'unknown')}_{timestamp}.xlsx"
             
             # 确保输出目录存在
-            output_dir = os.path.dirname(output_path)
-            if output_dir and not os.path.exists(output_dir):
-                os.makedirs(output_dir, exist_ok=True)
-            
-            # 创建工作簿
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "任务结果"
-            
-            # 定义样式
-            header_font = Font(bold=True, color="FFFFFF")
-            header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-            header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
-            
-            content_alignment = Alignment(horizontal="left", vertical="top", wrap_text=True)
-            border = Border(
-                left=Side(style='thin'), 
-                right=Side(style='thin'), 
-                top=Side(style='thin'), 
-                bottom=Side(style='thin')
-            )
-            
-            # 写入标题信息
-            ws.merge_cells('A1:E1')
-            title_cell = ws['A1']
-            title_cell.value = f"任务结果导出 - {task_info.get('title', '未命名任务')}"
-            title_cell.font = Font(size=16, bold=True)
-            title_cell.alignment = Alignment(horizontal="center")
-            
-            # 写入任务基本信息
-            info_row = 3
-            ws[f'A{info_row}'] = "任务类型："
-            ws[f'B{info_row}'] = task_info.get('task_type_display', task_info.get('task_type', ''))
-            ws[f'D{info_row}'] = "创建时间："
-            ws[f'E{info_row}'] = task_info.get('created_at', '')[:19] if task_info.get('created_at') else ''
-            
-            info_row += 1
-            ws[f'A{info_row}'] = "任务状态："
-            ws[f'B{info_row}'] = task_info.get('status_display', task_info.get('status', ''))
-            ws[f'D{info_row}'] = "导出时间："
-            ws[f'E{info_row}'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # 根据任务类型定义不同的列配置
+            if isinstance(output_path, str):
+                output_dir = os.path.dirname(output_path)
+                if output_dir and not os.path.exists(output_dir):
+                    os.makedirs(output_dir, exist_ok=True)
+            
+            # 创建只写工作簿，行写入后即序列化到临时文件，不在内存中保留单元格
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("任务结果")
+            DocumentService._add_excel_named_styles(wb)
+            
+            def styled(value, style):
+                cell = WriteOnlyCell(ws, value=value)
+                cell.style = style
+                return cell
+            
+            # 根据任务类型选择列配置（默认按标准审查）
             task_type = task_info.get('task_type', 'standard_review')
+            headers, field_keys, column_widths, long_text_columns = DocumentService.EXCEL_COLUMNS.get(
+                task_type, DocumentService.EXCEL_COLUMNS['standard_review']
+            )
             
-            if task_type == 'standard_recommendation':
-                # 标准推荐
-                headers = ['排序序号', '项目名称', '原文内容', '参考标准']
-                field_keys = ['sn', 'projectName', 'originalText', 'referenceStandard']
-                column_widths = [10, 25, 50, 40]
-                long_text_columns = [3, 4]  # 原文内容、参考标准
-            elif task_type == 'standard_compliance':
-                # 标准符合性检查
-                headers = ['排序序号', '项目名称', '原文内容', '是否符合标准', '建议改写内容', '参考标准']
-                field_keys = ['sn', 'projectName', 'originalText', 'isCompliant', 'suggestedRewrite', 'referenceStandard']
-                column_widths = [10, 25, 40, 15, 40, 35]
-                long_text_columns = [3, 5, 6]  # 原文内容、建议改写内容、参考标准
-            else:
-                # 标准审查（默认）
-                headers = ['序号', '问题位置', '原文', '问题描述', '修改建议']
-                field_keys = ['sn', 'issueLocation', 'originalText', 'issueDescription', 'recommendedModification']
-                column_widths = [8, 20, 40, 30, 40]
-                long_text_columns = [3, 4, 5]  # 原文、问题描述、修改建议
-            
-            # 写入表头（从第6行开始）
-            header_row = 6
-            
-            for col, header in enumerate(headers, 1):
-                cell = ws.cell(row=header_row, column=col)
-                cell.value = header
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.alignment = header_alignment
-                cell.border = border
-            
-            # 设置列宽
+            # 只写模式下列宽、冻结窗格和合并单元格需在写入行之前设置
             for col, width in enumerate(column_widths, 1):
                 ws.column_dimensions[get_column_letter(col)].width = width
             
-            # 写入数据
+            header_row = 6
             data_start_row = header_row + 1
+            ws.freeze_panes = f'A{data_start_row}'
+            ws.merged_cells.add(CellRange('A1:E1'))
+            
+            # 写入标题信息
+            ws.append([styled(f"任务结果导出 - {task_info.get('title', '未命名任务')}", 'export_title')])
+            ws.append([])
+            
+            # 写入任务基本信息
+            ws.append([
+                "任务类型：", task_info.get('task_type_display', task_info.get('task_type', '')), None,
+                "创建时间：", task_info.get('created_at', '')[:19] if task_info.get('created_at') else ''
+            ])
+            ws.append([
+                "任务状态：", task_info.get('status_display', task_info.get('status', '')), None,
+                "导出时间：", datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            ])
+            ws.append([])
+            
+            # 写入表头（第6行）
+            ws.append([styled(header, 'export_header') for header in headers])
+            
+            # 逐行写入数据
+            row_count = 0
             for row_idx, item in enumerate(items_data, 1):
-                current_row = data_start_row + row_idx - 1
+                row_count = row_idx
                 
-                # 根据字段配置写入数据到各列
-                data_values = []
-                for field_key in field_keys:
+                values = []
+                estimated_height = None
+                for col, field_key in enumerate(field_keys, 1):
                     value = item.get(field_key, '')
                     # 对于序号字段，如果为空则使用行号
                     if field_key == 'sn' and not value:
                         value = row_idx
-                    data_values.append(value)
-                
-                for col, value in enumerate(data_values, 1):
-                    cell = ws.cell(row=current_row, column=col)
-                    cell.value = str(value) if value is not None else ''
-                    cell.alignment = content_alignment
-                    cell.border = border
                     
-                    # 为内容较长的列设置行高
+                    # 为内容较长的列设置行高（每50个字符大约需要15磅高度）
                     if col in long_text_columns:
-                        # 根据文本长度动态调整行高
                         text_length = len(str(value)) if value else 0
                         if text_length > 50:
-                            # 估算需要的行高（每50个字符大约需要15磅高度）
-                            estimated_height = min(max(15, (text_length // 50) * 15), 100)
-                            if ws.row_dimensions[current_row].height is None or ws.row_dimensions[current_row].height < estimated_height:
-                                ws.row_dimensions[current_row].height = estimated_height
-            
-            # 冻结窗格（冻结表头）
-            ws.freeze_panes = f'A{data_start_row}'
+                            height = min(max(15, (text_length // 50) * 15), 100)
+                            estimated_height = max(estimated_height or 0, height)
+                    
+                    values.append(styled(str(value) if value is not None else '', 'export_content'))
+                
+                if estimated_height:
+                    ws.row_dimensions[header_row + row_idx].height = estimated_height
+                ws.append(values)
             
-            # 添加筛选功能
-            if items_data:
+            # 添加筛选功能（筛选范围在保存时写入）
+            if row_count:
                 last_column = get_column_letter(len(headers))
-                ws.auto_filter.ref = f'A{header_row}:{last_column}{data_start_row + len(items_data) - 1}'
+                ws.auto_filter.ref = f'A{header_row}:{last_column}{header_row + row_count}'
             
             # 保存文件
             wb.save(output_path)
             
             try:
-                current_app.logger.info(f"Excel导出成功: {output_path}, 共导出 {len(items_data)} 条记录")
+                current_app.logger.info(f"Excel导出成功: {output_path}, 共导出 {row_count} 条记录")
             except RuntimeError:
-                print(f"Excel导出成功: {output_path}, 共导出 {len(items_data)} 条记录")
+                print(f"Excel导出成功: {output_path}, 共导出 {row_count} 条记录")
             
             return True, output_path, None
             
@@ -1614,4 +1521,4 @@ class DocumentService:
                 print(error_msg)
                 import traceback
                 traceback.print_exc()
-            return False, None, error_msg
\ No newline at end of file
+            return False, None, error_msg
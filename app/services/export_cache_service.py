@@ -0,0 +1,170 @@
+import os
+import time
+import uuid
+import threading
+from flask import current_app
+from app.config.config import Config
+from app.services.document_service import DocumentService
+
+
+class ExportCacheService:
+    """
+    导出文件缓存服务
+
+    - 任务结果写入后不再变化，导出文件按 (result_id, 导出格式, 渲染器版本) 缓存在导出目录的 cache 子目录中
+    - 渲染器版本见 DocumentService.EXPORT_RENDERER_VERSIONS，修改导出样式后递增即可使旧缓存失效
+    - 缓存总大小超过 EXPORT_CACHE_MAX_SIZE 时按最近访问时间淘汰（命中时更新文件修改时间）
+    """
+
+    CACHE_DIR_NAME = 'cache'
+
+    # 按缓存键分片的渲染锁，避免并发请求重复渲染同一导出文件
+    _render_locks = [threading.Lock() for _ in range(32)]
+
+    @staticmethod
+    def get_cache_directory():
+        """获取导出缓存目录"""
+        cache_dir = os.path.join(Config.get_export_directory(), ExportCacheService.CACHE_DIR_NAME)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+
+    @staticmethod
+    def cache_key(result_id, export_format):
+        """生成缓存键，同时作为导出文件的ETag（内容只由缓存键决定）"""
+        version = DocumentService.EXPORT_RENDERER_VERSIONS[export_format]
+        return f"{result_id}_{export_format}_v{version}"
+
+    @classmethod
+    def _get_render_lock(cls, key):
+        return cls._render_locks[hash(key) % len(cls._render_locks)]
+
+    @classmethod
+    def cache_path(cls, result_id, export_format, extension):
+        """缓存文件路径"""
+        return os.path.join(cls.get_cache_directory(), f"{cls.cache_key(result_id, export_format)}{extension}")
+
+    @classmethod
+    def temp_path(cls, result_id, export_format, extension):
+        """渲染用的临时文件路径（以点开头，不计入缓存）"""
+        return os.path.join(cls.get_cache_directory(), f".{cls.cache_key(result_id, export_format)}.{uuid.uuid4().hex}{extension}")
+
+    @classmethod
+    def get_cached(cls, result_id, export_format, extension):
+        """缓存命中时更新访问时间并返回文件路径，否则返回 None"""
+        path = cls.cache_path(result_id, export_format, extension)
+        return path if cls._touch(path) else None
+
+    @classmethod
+    def store(cls, result_id, export_format, extension, rendered_path):
+        """将渲染好的文件放入缓存并按大小上限淘汰，返回缓存文件路径"""
+        path = cls.cache_path(result_id, export_format, extension)
+        os.replace(rendered_path, path)
+        # 刚写入的文件不参与本次淘汰，保证调用方可以读取
+        cls.evict(keep=path)
+        return path
+
+    @classmethod
+    def get_or_render(cls, result_id, export_format, extension, render):
+        """
+        获取导出文件，缓存未命中时调用 render 生成
+
+        Args:
+            result_id (str): 任务结果ID
+            export_format (str): 导出格式（pdf / markdown_raw / markdown_preview / excel）
+            extension (str): 文件扩展名（包含点）
+            render: 渲染函数，接收输出路径，返回 (是否成功, 文件路径, 错误信息)
+
+        Returns:
+            tuple: (是否成功, 文件路径, 错误信息)
+        """
+        key = cls.cache_key(result_id, export_format)
+
+        if Config.EXPORT_CACHE_MAX_SIZE <= 0:
+            # 未启用缓存，每次重新渲染（临时文件由淘汰时清理）
+            cls.evict()
+            return render(cls.temp_path(result_id, export_format, extension))
+
+        cached = cls.get_cached(result_id, export_format, extension)
+        if cached:
+            current_app.logger.info(f"[导出缓存命中] {key}")
+            return True, cached, None
+
+        with cls._get_render_lock(key):
+            # 等待锁期间其他请求可能已生成
+            cached = cls.get_cached(result_id, export_format, extension)
+            if cached:
+                current_app.logger.info(f"[导出缓存命中] {key}")
+                return True, cached, None
+
+            start_time = time.time()
+            success, rendered_path, error = render(cls.temp_path(result_id, export_format, extension))
+            if not success:
+                return False, None, error
+
+            path = cls.store(result_id, export_format, extension, rendered_path)
+            elapsed_time = round((time.time() - start_time) * 1000, 2)
+            current_app.logger.info(f"[导出缓存写入] {key} - 渲染耗时: {elapsed_time}ms")
+
+        return True, path, None
+
+    @staticmethod
+    def _touch(path):
+        """缓存文件存在时更新访问时间并返回True"""
+        try:
+            os.utime(path, None)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def evict(max_size=None, keep=None):
+        """按最近访问时间淘汰缓存文件，直到总大小不超过上限（keep 指定的文件不淘汰），返回删除的文件数"""
+        if max_size is None:
+            max_size = Config.EXPORT_CACHE_MAX_SIZE
+
+        removed, total_size = ExportCacheService.evict_directory(ExportCacheService.get_cache_directory(), max_size, keep)
+        if removed:
+            current_app.logger.info(f"[导出缓存淘汰] 删除 {removed} 个文件，当前缓存大小: {total_size}字节")
+        return removed
+
+    @staticmethod
+    def evict_directory(cache_dir, max_size, keep=None):
+        """
+        按最近访问时间淘汰目录中的缓存文件，以点开头的临时文件超过一小时后清理
+
+        Returns:
+            tuple: (删除的文件数, 淘汰后的缓存总大小)
+        """
+        entries = []
+        total_size = 0
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.startswith('.'):
+                # 渲染中断残留的临时文件，超过一小时后清理
+                if time.time() - stat.st_mtime > 3600:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            total_size += stat.st_size
+            if path != keep:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total_size <= max_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+                removed += 1
+            except OSError:
+                continue
+
+        return removed, total_size
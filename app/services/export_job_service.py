@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import atexit
+import threading
+import multiprocessing
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from app import db
+from app.config.config import Config
+from app.models.task import ExportJob
+from app.services.document_service import DocumentService
+from app.services.export_cache_service import ExportCacheService
+from app.services.font_service import FontService
+
+
+class ExportJobLimitError(Exception):
+    """用户同时进行的导出任务数超过上限"""
+    pass
+
+
+def _raise_render_timeout(signum, frame):
+    raise TimeoutError("导出渲染超时")
+
+
+def _init_render_process():
+    """渲染进程启动时预先完成字体查找和注册，导出时不再探测文件系统"""
+    FontService.warm_up()
+
+
+def _iter_spooled_items(items_path):
+    """逐行读取暂存的结果条目"""
+    with open(items_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _render_in_process(export_format, payload, output_path, timeout):
+    """
+    渲染进程入口：只接收可序列化的数据，不依赖应用上下文和数据库
+
+    Returns:
+        tuple: (是否成功, 文件路径, 错误信息)
+    """
+    if timeout and hasattr(signal, 'SIGALRM'):
+        # 渲染超时后在渲染进程内中断，避免进程被长期占用
+        signal.signal(signal.SIGALRM, _raise_render_timeout)
+        signal.alarm(timeout)
+    try:
+        if export_format == 'excel':
+            # 条目从暂存文件逐行读取并写入，渲染进程内存占用与条目数无关
+            return DocumentService.export_task_results_to_excel(
+                _iter_spooled_items(payload['items_path']), payload['task_info'], output_path
+            )
+
+        task_result = SimpleNamespace(task_id=payload['task_id'], answer=payload['answer'])
+        if export_format == 'pdf':
+            return DocumentService.export_task_result_to_pdf(task_result, output_path)
+        return DocumentService.export_task_result_to_markdown(task_result, output_path, export_format[len('markdown_'):])
+    finally:
+        if timeout and hasattr(signal, 'SIGALRM'):
+            signal.alarm(0)
+        if payload.get('items_path'):
+            ExportJobService.discard_payload(payload)
+
+
+class ExportJobService:
+    """
+    导出渲染服务 - PDF/Excel/Markdown 在独立的渲染进程池中生成
+
+    - 同步导出接口提交到进程池后等待结果，渲染期间Web进程不持有GIL，其他请求不受影响
+    - 异步导出任务：提交后立即返回任务ID，客户端轮询状态并在完成后下载
+    - 渲染结果统一写入导出缓存（ExportCacheService），相同结果重复导出直接命中缓存
+    - 异步任务状态保存在数据库（export_jobs）中，多工作进程部署时任意进程都可以查询和下载，每用户并发上限按数据库统计
+    """
+
+    # 导出格式：(文件扩展名, MIME类型)
+    FORMATS = {
+        'pdf': ('.pdf', 'application/pdf'),
+        'markdown_raw': ('.md', 'text/markdown'),
+        'markdown_preview': ('.html', 'text/html'),
+        'excel': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    }
+
+    # 已结束的异步任务保留时长（秒）
+    FINISHED_JOB_TTL = 3600
+
+    # 超过该时长仍未结束的任务视为失败（负责渲染的进程已退出）
+    STALE_JOB_SECONDS = 1800
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    # 本进程提交的渲染 future（用于区分排队中/渲染中）
+    _futures = {}
+
+    @classmethod
+    def get_executor(cls):
+        """获取渲染进程池（使用spawn启动，渲染进程不继承Web进程的线程和数据库连接）"""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    kwargs = {
+                        'max_workers': Config.EXPORT_PROCESS_WORKERS,
+                        'mp_context': multiprocessing.get_context('spawn'),
+                        'initializer': _init_render_process
+                    }
+                    if sys.version_info >= (3, 11) and Config.EXPORT_PROCESS_MAX_TASKS_PER_CHILD > 0:
+                        kwargs['max_tasks_per_child'] = Config.EXPORT_PROCESS_MAX_TASKS_PER_CHILD
+                    executor = ProcessPoolExecutor(**kwargs)
+                    atexit.register(executor.shutdown, wait=False, cancel_futures=True)
+                    cls._executor = executor
+        return cls._executor
+
+    @classmethod
+    def _reset_executor(cls, broken):
+        """渲染进程异常退出导致进程池不可用时重建"""
+        if broken is None:
+            return
+        with cls._executor_lock:
+            if cls._executor is broken:
+                cls._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def _submit(cls, export_format, payload, output_path):
+        executor = cls.get_executor()
+        try:
+            return executor.submit(_render_in_process, export_format, payload, output_path, Config.EXPORT_JOB_TIMEOUT)
+        except BrokenProcessPool:
+            cls._reset_executor(executor)
+            return cls.get_executor().submit(_render_in_process, export_format, payload, output_path, Config.EXPORT_JOB_TIMEOUT)
+
+    @staticmethod
+    def _build_payload(task_result, export_format, user_id):
+        """在Web进程中读取渲染所需数据"""
+        if export_format == 'excel':
+            from app.models.task import TaskResultItem
+            from app.services.task_service import TaskService
+
+            # 校验任务状态并补齐结果条目，只取一条用于获取任务信息
+            result = TaskService.get_task_results_paginated(
+                task_result.task_id, user_id, page=1, per_page=1, sort_by='sn', sort_order='asc'
+            )
+            if not result.get('items'):
+                raise ValueError('没有可导出的数据')
+
+            # 全部条目按序号分批读取并逐行写入暂存文件，由渲染进程读取，不经进程间传递大对象
+            items_path = ExportCacheService.temp_path(task_result.id, export_format, '.jsonl')
+            try:
+                with open(items_path, 'w', encoding='utf-8') as f:
+                    query = TaskResultItem.build_query(task_result.id)
+                    for item in TaskResultItem.iter_data(query, sort_by='sn', sort_order='asc'):
+                        f.write(json.dumps(item, ensure_ascii=False))
+                        f.write('\n')
+            except Exception:
+                ExportJobService.discard_payload({'items_path': items_path})
+                raise
+            return {'items_path': items_path, 'task_info': result.get('task_info', {})}
+
+        return {'task_id': task_result.task_id, 'answer': task_result.answer}
+
+    @staticmethod
+    def discard_payload(payload):
+        """删除渲染数据的暂存文件"""
+        try:
+            os.remove(payload['items_path'])
+        except (KeyError, OSError):
+            pass
+
+    @staticmethod
+    def download_name(task_id, export_format):
+        """生成下载文件名"""
+        timestamp = time.strftime('%Y%m%d_%H%M%S')
+        extension = ExportJobService.FORMATS[export_format][0]
+        if export_format == 'excel':
+            return f"task_results_{task_id}_{timestamp}{extension}"
+        if export_format == 'pdf':
+            return f"task_result_{task_id}_{timestamp}{extension}"
+        return f"task_result_{task_id}_{export_format[len('markdown_'):]}_{timestamp}{extension}"
+
+    @classmethod
+    def render(cls, task_result, export_format, user_id):
+        """
+        同步导出：缓存未命中时提交到渲染进程池并等待结果
+
+        Returns:
+            tuple: (是否成功, 文件路径, 错误信息)
+        """
+        extension = cls.FORMATS[export_format][0]
+
+        def render_in_pool(output_path):
+            payload = cls._build_payload(task_result, export_format, user_id)
+            try:
+                future = cls._submit(export_format, payload, output_path)
+            except Exception:
+                cls.discard_payload(payload)
+                raise
+            try:
+                return future.result(timeout=Config.EXPORT_JOB_TIMEOUT + 10)
+            except FutureTimeoutError:
+                future.cancel()
+                return False, None, f"导出超时（超过 {Config.EXPORT_JOB_TIMEOUT} 秒）"
+            except BrokenProcessPool as e:
+                cls._reset_executor(cls._executor)
+                return False, None, f"渲染进程异常退出: {str(e)}"
+
+        return ExportCacheService.get_or_render(task_result.id, export_format, extension, render_in_pool)
+
+    @classmethod
+    def submit_job(cls, task_result, export_format, user_id):
+        """
+        提交异步导出任务
+
+        Returns:
+            dict: 任务状态
+        """
+        extension = cls.FORMATS[export_format][0]
+        job = ExportJob(
+            user_id=user_id,
+            task_id=task_result.task_id,
+            result_id=task_result.id,
+            format=export_format,
+            owner=f"{socket.gethostname()}:{os.getpid()}"
+        )
+
+        cached = ExportCacheService.get_cached(task_result.id, export_format, extension)
+        if cached:
+            job.status = 'completed'
+            job.file_path = cached
+            job.finished_at = datetime.utcnow()
+            job.save()
+            return cls.to_dict(job)
+
+        cls._expire_jobs()
+        active = ExportJob.find_active_by_user(user_id)
+        for existing in active:
+            # 相同结果相同格式的导出正在进行，直接返回已有任务
+            if existing.result_id == task_result.id and existing.format == export_format:
+                return cls.to_dict(existing)
+        if len(active) >= Config.EXPORT_JOBS_PER_USER:
+            raise ExportJobLimitError(f"同时进行的导出任务不能超过 {Config.EXPORT_JOBS_PER_USER} 个，请稍后重试")
+
+        # 先写入任务占用名额，再复查：多个进程同时提交时超出上限的一方撤回
+        job.save()
+        if len(ExportJob.find_active_by_user(user_id)) > Config.EXPORT_JOBS_PER_USER:
+            db.session.delete(job)
+            db.session.commit()
+            raise ExportJobLimitError(f"同时进行的导出任务不能超过 {Config.EXPORT_JOBS_PER_USER} 个，请稍后重试")
+
+        payload = {}
+        try:
+            payload = cls._build_payload(task_result, export_format, user_id)
+            future = cls._submit(export_format, payload, ExportCacheService.temp_path(task_result.id, export_format, extension))
+        except Exception as e:
+            cls.discard_payload(payload)
+            db.session.rollback()
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            job.save()
+            raise
+
+        job_id = job.id
+        cls._futures[job_id] = future
+        app = current_app._get_current_object()
+        future.add_done_callback(lambda done: cls._finish_job(app, job_id, done))
+
+        current_app.logger.info(f"[导出任务提交] 任务: {job_id} - 结果: {task_result.id} - 格式: {export_format} - 用户: {user_id}")
+        return cls.to_dict(job)
+
+    @classmethod
+    def _finish_job(cls, app, job_id, future):
+        """渲染完成回调：写入导出缓存并更新任务状态"""
+        cls._futures.pop(job_id, None)
+        with app.app_context():
+            try:
+                try:
+                    success, rendered_path, error = future.result()
+                except Exception as e:
+                    success, rendered_path, error = False, None, f"渲染进程异常: {str(e)}"
+
+                job = ExportJob.find_by_id(job_id)
+                if job is None:
+                    return
+                if success:
+                    try:
+                        extension = cls.FORMATS[job.format][0]
+                        job.file_path = ExportCacheService.store(job.result_id, job.format, extension, rendered_path)
+                        job.status = 'completed'
+                    except OSError as e:
+                        job.status = 'failed'
+                        job.error = f"保存导出文件失败: {str(e)}"
+                else:
+                    job.status = 'failed'
+                    job.error = error
+
+                job.finished_at = datetime.utcnow()
+                job.save()
+                elapsed = (job.finished_at - job.created_at).total_seconds()
+                app.logger.info(f"[导出任务结束] 任务: {job_id} - 状态: {job.status} - 耗时: {elapsed:.2f}s{' - 错误: ' + job.error if job.error else ''}")
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"[导出任务结束] 更新任务状态失败 - 任务: {job_id} - 错误: {str(e)}", exc_info=True)
+            finally:
+                db.session.remove()
+
+    @classmethod
+    def _expire_jobs(cls):
+        """清理已结束超过保留时长的任务，长时间未结束的任务（渲染进程已退出）标记为失败"""
+        now = datetime.utcnow()
+        ExportJob.query.filter(
+            ExportJob.finished_at.isnot(None),
+            ExportJob.finished_at < now - timedelta(seconds=cls.FINISHED_JOB_TTL)
+        ).delete(synchronize_session=False)
+        ExportJob.query.filter(
+            ExportJob.status.in_(ExportJob.ACTIVE_STATUSES),
+            ExportJob.created_at < now - timedelta(seconds=cls.STALE_JOB_SECONDS)
+        ).update({
+            'status': 'failed',
+            'error': '导出任务未能完成（渲染进程已退出），请重新提交',
+            'finished_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+
+    @classmethod
+    def get_job(cls, job_id, user_id):
+        """获取当前用户的导出任务，不存在或已过期时返回 None"""
+        job = ExportJob.find_by_id(job_id)
+        if not job or job.user_id != user_id:
+            return None
+        if job.finished_at and (datetime.utcnow() - job.finished_at).total_seconds() > cls.FINISHED_JOB_TTL:
+            return None
+        return job
+
+    @classmethod
+    def to_dict(cls, job):
+        """转换为返回给客户端的任务状态"""
+        status = job.status
+        future = cls._futures.get(job.id)
+        if status == 'queued' and future is not None and future.running():
+            status = 'running'
+        return {
+            'job_id': job.id,
+            'task_id': job.task_id,
+            'result_id': job.result_id,
+            'format': job.format,
+            'status': status,
+            'error': job.error,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    @classmethod
+    def get_stats(cls):
+        """导出任务统计（所有进程）"""
+        stats = {'workers': Config.EXPORT_PROCESS_WORKERS}
+        stats.update(ExportJob.count_by_status())
+        stats['rendering_in_process'] = sum(1 for future in list(cls._futures.values()) if future.running())
+        return stats
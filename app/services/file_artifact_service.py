@@ -0,0 +1,192 @@
+import os
+import json
+import uuid
+import base64
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.config.config import Config
+from app.services.document_service import DocumentService
+
+
+class FileArtifactService:
+    """
+    上传文件预处理服务 - 文件保存后在后台提取预览内容
+
+    - 预览文本、页数等保存在文件旁的 <文件名>.artifacts.json，图片缩略图保存为 <文件名>.thumb.png
+    - 内容寻址存储下相同内容的文件共享同一份产物，只提取一次
+    - 预览接口直接读取产物；尚未提取完成时同步提取并写入产物
+    - 产物格式随 DocumentService.PREVIEW_VERSION 失效重建，文件删除时一并删除
+    """
+
+    ARTIFACTS_SUFFIX = '.artifacts.json'
+    THUMBNAIL_SUFFIX = '.thumb.png'
+
+    # 预处理时提取的预览文本长度（与预览接口默认参数一致）
+    PREVIEW_MAX_LENGTH = 5000
+
+    IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    # 正在后台提取的文件路径，避免重复提交
+    _pending = set()
+    _pending_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls):
+        """获取预处理线程池"""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=Config.FILE_ARTIFACT_WORKER_COUNT,
+                        thread_name_prefix='file-artifact'
+                    )
+        return cls._executor
+
+    @staticmethod
+    def artifact_paths(file_path):
+        """返回 (产物信息路径, 缩略图路径)"""
+        return file_path + FileArtifactService.ARTIFACTS_SUFFIX, file_path + FileArtifactService.THUMBNAIL_SUFFIX
+
+    @staticmethod
+    def _extension(file_path):
+        return os.path.splitext(file_path)[1].lower().lstrip('.')
+
+    @classmethod
+    def schedule(cls, file_path):
+        """提交后台提取（未启用、不支持预览或产物已存在时跳过）"""
+        if Config.FILE_ARTIFACT_WORKER_COUNT <= 0:
+            return False
+        if not DocumentService.can_preview(file_path) or cls._read_artifacts(file_path) is not None:
+            return False
+
+        with cls._pending_lock:
+            if file_path in cls._pending:
+                return False
+            cls._pending.add(file_path)
+
+        app = current_app._get_current_object()
+        try:
+            cls.get_executor().submit(cls._run, app, file_path)
+        except RuntimeError:
+            # 进程退出时线程池已关闭，预览接口会按需提取
+            with cls._pending_lock:
+                cls._pending.discard(file_path)
+            return False
+        return True
+
+    @classmethod
+    def _run(cls, app, file_path):
+        """后台线程入口"""
+        with app.app_context():
+            try:
+                cls.extract(file_path)
+            except Exception as e:
+                current_app.logger.error(f"[文件预处理失败] {file_path} - 错误: {str(e)}", exc_info=True)
+            finally:
+                with cls._pending_lock:
+                    cls._pending.discard(file_path)
+
+    @staticmethod
+    def _write_atomic(path, write):
+        """先写入同目录下的临时文件再替换"""
+        temp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @classmethod
+    def extract(cls, file_path):
+        """
+        提取文件的预览内容、页数和缩略图并写入产物文件
+
+        Returns:
+            dict: 预览内容（格式同 DocumentService.get_file_preview），提取失败时返回错误信息且不写入产物
+        """
+        artifacts_path, thumbnail_path = cls.artifact_paths(file_path)
+
+        if cls._extension(file_path) in cls.IMAGE_EXTENSIONS:
+            try:
+                info = {}
+                cls._write_atomic(
+                    thumbnail_path,
+                    lambda temp_path: info.update(DocumentService.create_image_thumbnail(file_path, temp_path))
+                )
+            except Exception as e:
+                return {'error': f'图片处理失败: {str(e)}', 'content': None}
+            # 缩略图单独保存，产物信息中不重复存储
+            preview = {'content': None, 'type': 'image', **info}
+        else:
+            preview = DocumentService.get_file_preview(file_path, cls.PREVIEW_MAX_LENGTH)
+            if preview.get('error'):
+                return preview
+
+        artifacts = {
+            'version': DocumentService.PREVIEW_VERSION,
+            'extracted_at': datetime.utcnow().isoformat(),
+            'page_count': preview.get('pages'),
+            'preview': preview
+        }
+
+        def write_artifacts(temp_path):
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(artifacts, f, ensure_ascii=False)
+
+        cls._write_atomic(artifacts_path, write_artifacts)
+        current_app.logger.info(f"[文件预处理完成] {file_path} - 类型: {preview.get('type')} - 页数: {artifacts['page_count']}")
+        return cls.load_preview(file_path) or preview
+
+    @classmethod
+    def _read_artifacts(cls, file_path):
+        """读取当前版本的产物信息，不存在、损坏或版本不一致时返回 None"""
+        artifacts_path, _ = cls.artifact_paths(file_path)
+        try:
+            with open(artifacts_path, 'r', encoding='utf-8') as f:
+                artifacts = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if artifacts.get('version') != DocumentService.PREVIEW_VERSION:
+            return None
+        return artifacts
+
+    @classmethod
+    def load_preview(cls, file_path):
+        """读取预处理好的预览内容，尚未提取时返回 None"""
+        artifacts = cls._read_artifacts(file_path)
+        if artifacts is None:
+            return None
+
+        preview = artifacts['preview']
+        if preview.get('type') == 'image':
+            _, thumbnail_path = cls.artifact_paths(file_path)
+            try:
+                with open(thumbnail_path, 'rb') as f:
+                    preview['content'] = f"data:image/png;base64,{base64.b64encode(f.read()).decode('utf-8')}"
+            except OSError:
+                return None
+        return preview
+
+    @classmethod
+    def get_preview(cls, file_path):
+        """获取默认参数的预览内容：优先读取产物，尚未提取时同步提取"""
+        preview = cls.load_preview(file_path)
+        if preview is not None:
+            return preview
+        return cls.extract(file_path)
+
+    @classmethod
+    def delete_artifacts(cls, file_path):
+        """删除文件的预处理产物"""
+        for path in cls.artifact_paths(file_path):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
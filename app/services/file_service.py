@@ -1,11 +1,101 @@
 import os
 import uuid
 import shutil
+import hashlib
+import tempfile
+import time
 from datetime import datetime
-from werkzeug.utils import secure_filename
 from flask import current_app
 import requests
 import json
+from urllib3.fields import RequestField
+from app.services.dify_client import DifyClient
+from app.config.config import Config
+
+
+class FileTooLargeError(ValueError):
+    """读取上传流时文件大小超过限制"""
+    pass
+
+
+class _UploadTee:
+    """上传流分流器：逐块读取上传内容，同时写入本地临时文件、计算SHA-256并校验大小"""
+
+    def __init__(self, stream, temp_file, max_size, chunk_size):
+        self.stream = stream
+        self.temp_file = temp_file
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.finished = False
+        self.error = None
+
+    def read_chunk(self):
+        """读取下一块内容，读完后返回空字节串"""
+        if self.finished:
+            return b''
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.finished = True
+            return b''
+        self.size += len(chunk)
+        if self.max_size and self.size > self.max_size:
+            # 记录错误，请求体迭代中抛出的异常可能被HTTP库包装
+            self.error = FileTooLargeError(f"文件大小超过限制（最大 {self.max_size // (1024*1024)}MB）")
+            raise self.error
+        self.hasher.update(chunk)
+        self.temp_file.write(chunk)
+        return chunk
+
+    def drain(self):
+        """读完剩余内容（Dify请求中途失败时保证本地文件完整）"""
+        while self.read_chunk():
+            pass
+
+    @property
+    def content_hash(self):
+        return self.hasher.hexdigest()
+
+
+class _MultipartTeeBody:
+    """Dify文件上传的multipart请求体，文件内容边从分流器读取边发送"""
+
+    def __init__(self, tee, filename, fields, file_size=None):
+        self.tee = tee
+        self.boundary = uuid.uuid4().hex
+        self.file_size = file_size
+
+        parts = []
+        for name, value in fields.items():
+            field = RequestField(name=name, data=value)
+            field.make_multipart()
+            parts.append(self._part_header(field) + str(value).encode('utf-8') + b'\r\n')
+        file_field = RequestField(name='file', data=b'', filename=filename)
+        file_field.make_multipart(content_type='application/octet-stream')
+        self.preamble = b''.join(parts) + self._part_header(file_field)
+        self.epilogue = f"\r\n--{self.boundary}--\r\n".encode('ascii')
+
+    def _part_header(self, field):
+        return f"--{self.boundary}\r\n".encode('ascii') + field.render_headers().encode('utf-8')
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __iter__(self):
+        yield self.preamble
+        while True:
+            chunk = self.tee.read_chunk()
+            if not chunk:
+                break
+            yield chunk
+        yield self.epilogue
+
+    def __len__(self):
+        # 仅在已知文件大小时使用（带Content-Length发送），否则以分块传输编码发送迭代器
+        return len(self.preamble) + self.file_size + len(self.epilogue)
+
 
 class FileService:
     """文件服务 - 处理文件上传、存储和Dify集成"""
@@ -16,8 +106,20 @@ class FileService:
         'ppt', 'pptx', 'xls', 'xlsx', 'csv', 'md', 'json', 'xml'
     }
     
-    # 最大文件大小 (50MB)
-    MAX_FILE_SIZE = 50 * 1024 * 1024
+    # 最大文件大小（默认50MB，MAX_FILE_SIZE 配置）
+    MAX_FILE_SIZE = Config.MAX_FILE_SIZE
+    
+    # 内容寻址存储子目录
+    BLOB_DIR_NAME = 'blobs'
+    
+    # 流式写入的分块大小 (1MB)
+    CHUNK_SIZE = 1024 * 1024
+    
+    # 文件被复用后多久内不删除（秒）
+    BLOB_DELETE_GRACE_SECONDS = 300
+    
+    # 待删除文件标记目录（位于存储目录下，记录因刚被复用而推迟删除的文件）
+    PENDING_DELETE_DIR_NAME = '.pending-delete'
     
     @staticmethod
     def get_valid_extension(filename):
@@ -58,38 +160,6 @@ class FileService:
             from app.config.config import Config
             return Config.get_upload_directory()
     
-    @staticmethod
-    def generate_storage_path(user_id, original_filename):
-        """生成文件存储路径 - 按时间日期用户ID分类存储"""
-        now = datetime.now()
-        year = now.strftime('%Y')
-        month = now.strftime('%m')
-        day = now.strftime('%d')
-        
-        # 创建目录结构: data/2024/01/15/user_id/
-        directory = os.path.join(
-            FileService.get_data_directory(),
-            year, month, day, user_id
-        )
-        
-        if not os.path.exists(directory):
-            os.makedirs(directory, exist_ok=True)
-        
-        # 获取有效的文件扩展名
-        file_extension = FileService.get_valid_extension(original_filename)
-        if not file_extension:
-            # 如果没有有效扩展名，默认为.txt
-            file_extension = '.txt'
-            try:
-                current_app.logger.warning(f"文件 {original_filename} 没有有效扩展名，默认使用 .txt")
-            except RuntimeError:
-                # 没有应用上下文时不记录日志
-                pass
-        
-        stored_filename = f"{uuid.uuid4().hex}{file_extension}"
-        
-        return os.path.join(directory, stored_filename), stored_filename
-    
     @staticmethod
     def allowed_file(filename):
         """检查文件类型是否允许"""
@@ -132,50 +202,168 @@ class FileService:
         
         return len(errors) == 0, errors
     
+    @staticmethod
+    def get_blob_directory():
+        """获取内容寻址存储目录（按文件内容哈希存储，相同内容只保存一份）"""
+        blob_dir = os.path.join(FileService.get_data_directory(), FileService.BLOB_DIR_NAME)
+        if not os.path.exists(blob_dir):
+            os.makedirs(blob_dir, exist_ok=True)
+        return blob_dir
+    
+    @staticmethod
+    def generate_blob_path(content_hash, file_extension):
+        """根据内容哈希生成存储路径: blobs/ab/cd/<sha256>.<ext>"""
+        directory = os.path.join(FileService.get_blob_directory(), content_hash[:2], content_hash[2:4])
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        
+        stored_filename = f"{content_hash}{file_extension}"
+        return os.path.join(directory, stored_filename), stored_filename
+    
+    @staticmethod
+    def fingerprint_dify_key(api_key, api_url=None):
+        """生成Dify应用密钥指纹，用于区分不同应用上传的文件ID（不保存密钥明文）"""
+        return hashlib.sha256(f"{api_url or ''}|{api_key or ''}".encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _remaining_size(stream):
+        """获取可定位上传流的剩余字节数，无法定位时返回 None"""
+        try:
+            position = stream.tell()
+            stream.seek(0, os.SEEK_END)
+            end = stream.tell()
+            stream.seek(position)
+            return end - position
+        except (AttributeError, OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _stream_to_temp_file(file, directory):
+        """将上传内容分块写入临时文件，同时计算SHA-256并校验大小，返回 (临时文件路径, 内容哈希, 文件大小)"""
+        fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                tee = _UploadTee(getattr(file, 'stream', file), temp_file, FileService.MAX_FILE_SIZE, FileService.CHUNK_SIZE)
+                tee.drain()
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return temp_path, tee.content_hash, tee.size
+    
+    @staticmethod
+    def _commit_temp_file(temp_path, content_hash, file_extension):
+        """将临时文件移动到内容寻址路径，相同内容已存在时复用，返回 (文件路径, 存储文件名, 是否复用)"""
+        file_path, stored_filename = FileService.generate_blob_path(content_hash, file_extension)
+        
+        if os.path.exists(file_path):
+            # 相同内容已存在，丢弃临时文件；更新修改时间，避免被并发的删除操作误删
+            os.remove(temp_path)
+            os.utime(file_path, None)
+            return file_path, stored_filename, True
+        
+        try:
+            os.replace(temp_path, file_path)
+        except OSError:
+            # 临时目录与存储目录不在同一文件系统时退化为复制
+            shutil.move(temp_path, file_path)
+        return file_path, stored_filename, False
+    
+    @staticmethod
+    def _resolve_extension(file):
+        """获取上传文件的扩展名，没有有效扩展名时使用 .txt"""
+        file_extension = FileService.get_valid_extension(file.filename)
+        
+        # 如果没有有效扩展名，使用默认扩展名
+        if not file_extension:
+            file_extension = '.txt'
+            try:
+                current_app.logger.warning(f"文件 {file.filename} 没有有效扩展名，使用默认扩展名 .txt")
+            except RuntimeError:
+                # 没有应用上下文时不记录日志
+                pass
+        return file_extension
+    
+    @staticmethod
+    def _build_file_info(original_filename, content_type, file_extension, file_path, stored_filename, file_size, content_hash):
+        """组装文件信息"""
+        # 处理文件名：确保中文文件名能正确处理
+        if not original_filename or len(original_filename.strip()) == 0:
+            # 如果文件名为空，使用基于扩展名的默认名称
+            original_filename = f"file{file_extension}"
+        
+        return {
+            'original_filename': original_filename,  # 保持原始文件名，不使用secure_filename避免中文问题
+            'stored_filename': stored_filename,
+            'file_path': file_path,
+            'file_size': file_size,
+            'file_type': content_type or 'application/octet-stream',
+            'file_extension': file_extension,
+            'content_hash': content_hash
+        }
+    
     @staticmethod
     def save_file(file, user_id):
-        """保存文件到本地"""
+        """保存文件到本地 - 边写入边计算内容哈希并校验大小，相同内容的文件只保存一份"""
         try:
             # 验证文件
             is_valid, errors = FileService.validate_file(file)
             if not is_valid:
                 return False, None, errors[0]
             
-            # 生成存储路径
-            file_path, stored_filename = FileService.generate_storage_path(user_id, file.filename)
+            file_extension = FileService._resolve_extension(file)
             
-            # 保存文件
-            file.save(file_path)
+            # 写入临时文件并计算哈希，再移动到内容寻址路径
+            temp_path, content_hash, file_size = FileService._stream_to_temp_file(file, FileService.get_blob_directory())
+            file_path, stored_filename, deduplicated = FileService._commit_temp_file(temp_path, content_hash, file_extension)
             
-            # 获取文件信息
-            file_size = os.path.getsize(file_path)
-            file_extension = FileService.get_valid_extension(file.filename)
+            file_info = FileService._build_file_info(file.filename, file.content_type, file_extension, file_path, stored_filename, file_size, content_hash)
             
-            # 如果没有有效扩展名，使用默认扩展名
-            if not file_extension:
-                file_extension = '.txt'
-                try:
-                    current_app.logger.warning(f"文件 {file.filename} 没有有效扩展名，使用默认扩展名 .txt")
-                except RuntimeError:
-                    # 没有应用上下文时不记录日志
-                    pass
+            current_app.logger.info(f"文件保存成功 - 用户: {user_id} - 文件: {file.filename} - 大小: {file_size}字节 - 哈希: {content_hash[:12]}{' - 复用已有文件' if deduplicated else ''}")
             
-            # 处理文件名：确保中文文件名能正确处理
-            original_filename = file.filename
-            if not original_filename or len(original_filename.strip()) == 0:
-                # 如果文件名为空，使用基于扩展名的默认名称
-                original_filename = f"file{file_extension}"
-            
-            file_info = {
-                'original_filename': original_filename,  # 保持原始文件名，不使用secure_filename避免中文问题
-                'stored_filename': stored_filename,
-                'file_path': file_path,
-                'file_size': file_size,
-                'file_type': file.content_type or 'application/octet-stream',
-                'file_extension': file_extension
-            }
+            return True, file_info, None
+            
+        except FileTooLargeError as e:
+            current_app.logger.warning(f"文件保存失败 - 用户: {user_id} - 文件: {file.filename} - {str(e)}")
+            return False, None, str(e)
+        except Exception as e:
+            current_app.logger.error(f"文件保存失败 - 用户: {user_id} - 错误: {str(e)}", exc_info=True)
+            return False, None, f"文件保存失败: {str(e)}"
+    
+    @staticmethod
+    def save_local_file(source_path, original_filename, content_type, user_id):
+        """
+        将已在本地的完整文件（如分片上传写好的文件）移入内容寻址存储，不复制文件内容
+        
+        Returns:
+            tuple: (是否成功, 文件信息, 错误信息)
+        """
+        try:
+            if not FileService.allowed_file(original_filename):
+                return False, None, f"不支持的文件类型。支持的类型: {', '.join(FileService.ALLOWED_EXTENSIONS)}"
+            
+            file_extension = FileService.get_valid_extension(original_filename)
             
-            current_app.logger.info(f"文件保存成功 - 用户: {user_id} - 文件: {file.filename} - 大小: {file_size}字节")
+            # 读取一遍计算内容哈希，再移动到内容寻址路径
+            hasher = hashlib.sha256()
+            file_size = 0
+            with open(source_path, 'rb') as source:
+                while True:
+                    chunk = source.read(FileService.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    file_size += len(chunk)
+            
+            if file_size > FileService.MAX_FILE_SIZE:
+                return False, None, f"文件大小超过限制（最大 {FileService.MAX_FILE_SIZE // (1024*1024)}MB）"
+            
+            content_hash = hasher.hexdigest()
+            file_path, stored_filename, deduplicated = FileService._commit_temp_file(source_path, content_hash, file_extension)
+            
+            file_info = FileService._build_file_info(original_filename, content_type, file_extension, file_path, stored_filename, file_size, content_hash)
+            
+            current_app.logger.info(f"文件保存成功 - 用户: {user_id} - 文件: {original_filename} - 大小: {file_size}字节 - 哈希: {content_hash[:12]}{' - 复用已有文件' if deduplicated else ''}")
             
             return True, file_info, None
             
@@ -184,60 +372,160 @@ class FileService:
             return False, None, f"文件保存失败: {str(e)}"
     
     @staticmethod
-    def upload_to_dify(file_path, filename, api_key, user_id, api_url=None):
-        """上传文件到Dify"""
+    def save_file_and_upload_to_dify(file, user_id, api_key, api_url=None):
+        """
+        边保存边上传到Dify - 上传流只读取一遍，每块同时写入本地临时文件、参与哈希计算并发送给Dify
+        
+        Returns:
+            tuple: (保存是否成功, 文件信息, 保存错误信息, (Dify是否成功, Dify返回数据, Dify错误信息))
+                   本地保存失败时最后一项为 None
+        """
+        temp_path = None
         try:
-            if not api_url:
-                api_url = os.getenv('DIFY_FILE_UPLOAD_URL', 'http://10.100.100.93/v1/files/upload')
+            # 验证文件
+            is_valid, errors = FileService.validate_file(file)
+            if not is_valid:
+                return False, None, errors[0], None
+            
+            file_extension = FileService._resolve_extension(file)
+            stream = getattr(file, 'stream', file)
+            
+            # 能获取剩余大小时提前拒绝超限文件，并以Content-Length发送；否则以分块传输编码发送，读取时校验
+            file_size = FileService._remaining_size(stream)
+            if file_size is not None and file_size > FileService.MAX_FILE_SIZE:
+                return False, None, f"文件大小超过限制（最大 {FileService.MAX_FILE_SIZE // (1024*1024)}MB）", None
             
-            # 验证文件名和扩展名
-            if not filename or not isinstance(filename, str):
-                raise ValueError("文件名无效")
-            
-            # 智能处理文件名和扩展名
-            valid_extension = FileService.get_valid_extension(filename)
-            
-            # 如果没有有效扩展名，检查是否整个文件名就是一个扩展名
-            if not valid_extension:
-                # 检查是否整个文件名就是一个扩展名（如'pdf', 'txt'等）
-                if filename.lower() in FileService.ALLOWED_EXTENSIONS:
-                    valid_extension = f".{filename.lower()}"
-                    filename = f"document{valid_extension}"
-                    try:
-                        current_app.logger.warning(f"上传到Dify时修正文件名（仅扩展名）: {filename}")
-                    except RuntimeError:
-                        pass
-                else:
-                    valid_extension = '.txt'
-                    filename = f"file{valid_extension}"
-                    try:
-                        current_app.logger.warning(f"上传到Dify时使用默认文件名: {filename}")
-                    except RuntimeError:
-                        pass
+            fd, temp_path = tempfile.mkstemp(prefix='.upload-', dir=FileService.get_blob_directory())
+            with os.fdopen(fd, 'wb') as temp_file:
+                tee = _UploadTee(stream, temp_file, FileService.MAX_FILE_SIZE, FileService.CHUNK_SIZE)
+                body = _MultipartTeeBody(tee, FileService._normalize_dify_filename(file.filename), {'user': user_id}, file_size)
+                
+                dify_outcome = FileService._post_to_dify(
+                    api_url,
+                    api_key,
+                    user_id,
+                    headers={'Content-Type': body.content_type},
+                    data=body if file_size is not None else iter(body)
+                )
+                if tee.error:
+                    raise tee.error
+                
+                # Dify请求中途失败时读完剩余内容，保证本地文件完整
+                tee.drain()
+            
+            file_path, stored_filename, deduplicated = FileService._commit_temp_file(temp_path, tee.content_hash, file_extension)
+            temp_path = None
+            
+            file_info = FileService._build_file_info(file.filename, file.content_type, file_extension, file_path, stored_filename, tee.size, tee.content_hash)
+            
+            current_app.logger.info(f"文件边保存边上传完成 - 用户: {user_id} - 文件: {file.filename} - 大小: {tee.size}字节 - 哈希: {tee.content_hash[:12]}{' - 复用已有文件' if deduplicated else ''}")
+            
+            return True, file_info, None, dify_outcome
+            
+        except FileTooLargeError as e:
+            current_app.logger.warning(f"文件保存失败 - 用户: {user_id} - 文件: {file.filename} - {str(e)}")
+            return False, None, str(e), None
+        except Exception as e:
+            current_app.logger.error(f"文件保存失败 - 用户: {user_id} - 错误: {str(e)}", exc_info=True)
+            return False, None, f"文件保存失败: {str(e)}", None
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    @staticmethod
+    def _normalize_dify_filename(filename):
+        """生成上传到Dify使用的文件名"""
+        # 验证文件名和扩展名
+        if not filename or not isinstance(filename, str):
+            raise ValueError("文件名无效")
+        
+        # 智能处理文件名和扩展名
+        valid_extension = FileService.get_valid_extension(filename)
+        
+        # 如果没有有效扩展名，检查是否整个文件名就是一个扩展名
+        if not valid_extension:
+            # 检查是否整个文件名就是一个扩展名（如'pdf', 'txt'等）
+            if filename.lower() in FileService.ALLOWED_EXTENSIONS:
+                valid_extension = f".{filename.lower()}"
+                filename = f"document{valid_extension}"
+                try:
+                    current_app.logger.warning(f"上传到Dify时修正文件名（仅扩展名）: {filename}")
+                except RuntimeError:
+                    pass
+            else:
+                valid_extension = '.txt'
+                filename = f"file{valid_extension}"
+                try:
+                    current_app.logger.warning(f"上传到Dify时使用默认文件名: {filename}")
+                except RuntimeError:
+                    pass
+        else:
+            # 检查文件名是否只是扩展名（secure_filename造成的问题）
+            name_without_ext = os.path.splitext(filename)[0]
+            if not name_without_ext or name_without_ext.strip() == '':
+                # 如果文件名只是扩展名，生成一个安全的文件名
+                filename = f"document{valid_extension}"
+                try:
+                    current_app.logger.warning(f"上传到Dify时修正文件名（原文件名无效）: {filename}")
+                except RuntimeError:
+                    pass
             else:
-                # 检查文件名是否只是扩展名（secure_filename造成的问题）
-                name_without_ext = os.path.splitext(filename)[0]
-                if not name_without_ext or name_without_ext.strip() == '':
-                    # 如果文件名只是扩展名，生成一个安全的文件名
-                    filename = f"document{valid_extension}"
-                    try:
-                        current_app.logger.warning(f"上传到Dify时修正文件名（原文件名无效）: {filename}")
-                    except RuntimeError:
-                        pass
-                else:
-                    # 确保文件名是安全的，对于中文文件名生成英文替代
-                    import re
-                    safe_name = re.sub(r'[^\w\-_.]', '_', name_without_ext)
-                    if not safe_name or safe_name == '_':
-                        safe_name = 'document'
-                    filename = f"{safe_name}{valid_extension}"
+                # 确保文件名是安全的，对于中文文件名生成英文替代
+                import re
+                safe_name = re.sub(r'[^\w\-_.]', '_', name_without_ext)
+                if not safe_name or safe_name == '_':
+                    safe_name = 'document'
+                filename = f"{safe_name}{valid_extension}"
+        
+        return filename
+    
+    @staticmethod
+    def _post_to_dify(api_url, api_key, user_id, headers=None, **kwargs):
+        """发送Dify文件上传请求，返回 (是否成功, Dify返回数据, 错误信息)"""
+        try:
+            if not api_url:
+                api_url = os.getenv('DIFY_FILE_UPLOAD_URL', 'http://10.100.100.93/v1/files/upload')
             
             # 准备请求头
-            headers = {
+            request_headers = {
                 "Authorization": f"Bearer {api_key}"
             }
+            request_headers.update(headers or {})
+            
+            current_app.logger.info(f"开始上传文件到Dify - 用户: {user_id} - URL: {api_url}")
+            
+            response = DifyClient.post(
+                api_url, 
+                api_type='file_upload',
+                headers=request_headers, 
+                **kwargs
+            )
+            
+            response.raise_for_status()
+            
+            result = response.json()
+            current_app.logger.info(f"文件上传到Dify成功 - Dify文件ID: {result.get('id', 'unknown')}")
+            return True, result, None
+                    
+        except FileTooLargeError:
+            # 边保存边上传时读取请求体超出大小限制，交由调用方处理
+            raise
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Dify上传请求失败: {str(e)}"
+            current_app.logger.error(error_msg, exc_info=True)
+            return False, None, error_msg
+        except Exception as e:
+            error_msg = f"上传到Dify时发生错误: {str(e)}"
+            current_app.logger.error(error_msg, exc_info=True)
+            return False, None, error_msg
+    
+    @staticmethod
+    def upload_to_dify(file_path, filename, api_key, user_id, api_url=None):
+        """上传文件到Dify"""
+        try:
+            filename = FileService._normalize_dify_filename(filename)
             
-            current_app.logger.info(f"开始上传文件到Dify - 文件: {filename} - 用户: {user_id} - URL: {api_url}")
+            current_app.logger.info(f"读取本地文件上传到Dify - 文件: {filename} - 用户: {user_id}")
             
             # 按照Dify API要求的格式上传
             with open(file_path, 'rb') as f:
@@ -247,25 +535,8 @@ class FileService:
                 data = {
                     'user': user_id  # 使用实际用户ID
                 }
-                
-                response = requests.post(
-                    api_url, 
-                    headers=headers, 
-                    files=files, 
-                    data=data,
-                    timeout=60
-                )
-                
-                response.raise_for_status()
-                
-                result = response.json()
-                current_app.logger.info(f"文件上传到Dify成功 - 文件: {filename} - Dify文件ID: {result.get('id', 'unknown')}")
-                return True, result, None
+                return FileService._post_to_dify(api_url, api_key, user_id, files=files, data=data)
                     
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Dify上传请求失败: {str(e)}"
-            current_app.logger.error(error_msg, exc_info=True)
-            return False, None, error_msg
         except Exception as e:
             error_msg = f"上传到Dify时发生错误: {str(e)}"
             current_app.logger.error(error_msg, exc_info=True)
@@ -286,6 +557,85 @@ class FileService:
             current_app.logger.error(f"删除本地文件失败: {file_path} - 错误: {str(e)}", exc_info=True)
             return False
     
+    @staticmethod
+    def delete_stored_file(file_path):
+        """
+        删除不再被引用的本地文件
+        
+        内容寻址存储下同一文件可能被多条文件记录共享，仅在没有其他记录引用时删除；
+        刚被上传复用的文件保留一段时间，避免与并发上传竞争，同时记录为待删除，由 sweep_pending_deletions 到期后再次检查
+        """
+        from app.models.task import TaskFile
+        
+        if TaskFile.count_by_file_path(file_path) > 0:
+            current_app.logger.info(f"文件仍被其他记录引用，保留: {file_path}")
+            return False
+        
+        try:
+            if os.path.exists(file_path) and time.time() - os.path.getmtime(file_path) < FileService.BLOB_DELETE_GRACE_SECONDS:
+                FileService._mark_pending_delete(file_path)
+                current_app.logger.info(f"文件刚被复用，推迟删除: {file_path}")
+                return False
+        except OSError:
+            pass
+        
+        from app.services.file_artifact_service import FileArtifactService
+        
+        deleted = FileService.delete_local_file(file_path)
+        FileArtifactService.delete_artifacts(file_path)
+        return deleted
+    
+    @staticmethod
+    def get_pending_delete_directory():
+        """获取待删除文件标记目录"""
+        pending_dir = os.path.join(FileService.get_blob_directory(), FileService.PENDING_DELETE_DIR_NAME)
+        if not os.path.exists(pending_dir):
+            os.makedirs(pending_dir, exist_ok=True)
+        return pending_dir
+    
+    @staticmethod
+    def _mark_pending_delete(file_path):
+        """记录推迟删除的文件，标记文件名为路径哈希，内容为文件路径"""
+        marker_name = hashlib.sha256(file_path.encode('utf-8')).hexdigest()
+        with open(os.path.join(FileService.get_pending_delete_directory(), marker_name), 'w', encoding='utf-8') as f:
+            f.write(file_path)
+    
+    @staticmethod
+    def sweep_pending_deletions():
+        """
+        再次检查推迟删除的文件：已被重新引用或已不存在时移除标记，超过保留期且仍无引用时删除
+        
+        Returns:
+            int: 删除的文件数
+        """
+        pending_dir = FileService.get_pending_delete_directory()
+        deleted = 0
+        for marker_name in os.listdir(pending_dir):
+            marker_path = os.path.join(pending_dir, marker_name)
+            try:
+                with open(marker_path, 'r', encoding='utf-8') as f:
+                    file_path = f.read().strip()
+            except OSError:
+                continue
+            
+            try:
+                if file_path and os.path.exists(file_path) and time.time() - os.path.getmtime(file_path) < FileService.BLOB_DELETE_GRACE_SECONDS:
+                    continue
+            except OSError:
+                pass
+            
+            # 先移除标记：仍在保留期内时 delete_stored_file 会重新写入
+            try:
+                os.remove(marker_path)
+            except FileNotFoundError:
+                continue
+            if file_path and os.path.exists(file_path) and FileService.delete_stored_file(file_path):
+                deleted += 1
+        
+        if deleted:
+            current_app.logger.info(f"清理推迟删除的文件 {deleted} 个")
+        return deleted
+    
     @staticmethod
     def get_file_info(file_path):
         """获取文件信息"""
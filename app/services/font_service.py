@@ -0,0 +1,220 @@
+import os
+import time
+import threading
+import subprocess
+from datetime import datetime
+from flask import current_app
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+
+class FontService:
+    """
+    PDF导出字体服务 - 进程内只查找和注册一次中文字体
+
+    - 中文字体文件查找（静态路径探测，必要时调用 fc-list）在首次使用时完成并缓存
+    - ReportLab字体注册和 weasyprint 的 FontConfiguration 同样只创建一次，导出时直接复用
+    - 渲染进程在启动时调用 warm_up 预先完成，导出过程中不再探测文件系统或启动子进程
+    """
+
+    # ReportLab中注册的中文字体名称
+    REPORTLAB_FONT_NAME = 'ChineseFont'
+
+    # 中文字体文件查找路径（按优先级）
+    FONT_PATHS = [
+        # 我们脚本安装的字体目录（最优先）
+        '/usr/share/fonts/truetype/chinese/wqy-microhei.ttc',
+        '/usr/share/fonts/truetype/chinese/NotoSansCJK.ttc',
+        '/usr/share/fonts/truetype/chinese/NotoSansCJK.otf',
+        '/usr/share/fonts/truetype/chinese/wqy-zenhei.ttc',
+        # Windows - 优先使用.ttf文件，避免.ttc文件的兼容问题
+        'C:/Windows/Fonts/simhei.ttf',  # 黑体
+        'C:/Windows/Fonts/simsun.ttf',  # 宋体（如果有单独的ttf文件）
+        'C:/Windows/Fonts/simkai.ttf',  # 楷体
+        'C:/Windows/Fonts/msyh.ttf',    # 微软雅黑（如果有单独的ttf文件）
+        'C:/Windows/Fonts/arial.ttf',   # Arial作为备选
+        # 如果没有单独的ttf文件，再尝试ttc文件
+        'C:/Windows/Fonts/simsun.ttc',
+        'C:/Windows/Fonts/msyh.ttc',
+        # macOS
+        '/System/Library/Fonts/Helvetica.ttc',
+        '/Library/Fonts/Arial Unicode.ttf',
+        '/System/Library/Fonts/PingFang.ttc',
+        # Linux - 大幅扩展Linux字体路径
+        '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',
+        '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',
+        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',
+        '/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc',
+        '/usr/share/fonts/truetype/arphic/uming.ttc',
+        '/usr/share/fonts/truetype/arphic/ukai.ttc',
+        '/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf',
+        '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+        '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+        # 其他可能的Linux路径
+        '/usr/share/fonts/TTF/wqy-microhei.ttc',
+        '/usr/share/fonts/wqy-microhei/wqy-microhei.ttc',
+        '/usr/share/fonts/wenquanyi/wqy-microhei/wqy-microhei.ttc'
+    ]
+
+    # 系统字体都不可用时尝试的ReportLab内置CID字体
+    CID_FONTS = ['STSong-Light', 'STSongStd-Light', 'HeiseiMin-W3', 'HeiseiKakuGo-W5', 'MSung-Light', 'MSungStd-Light']
+
+    _lock = threading.Lock()
+    _reportlab_font = None
+    _font_diagnostics = None
+    _weasyprint_font_config = None
+    _weasyprint_error = None
+
+    @staticmethod
+    def _log(message, level='info'):
+        """记录日志，没有应用上下文时（如渲染进程）输出到标准输出"""
+        try:
+            getattr(current_app.logger, level)(message)
+        except RuntimeError:
+            print(message)
+
+    @staticmethod
+    def find_chinese_font():
+        """
+        查找中文字体文件（未缓存，每次调用都会探测文件系统）
+
+        Returns:
+            tuple: (字体文件路径, 来源 static / fc-list)，未找到时为 (None, None)
+        """
+        for path in FontService.FONT_PATHS:
+            if os.path.exists(path):
+                FontService._log(f"找到字体文件: {path}")
+                return path, 'static'
+
+        # 如果静态路径都找不到，尝试使用系统命令查找
+        try:
+            result = subprocess.run(['fc-list', ':lang=zh', 'file'],
+                                    capture_output=True, text=True, timeout=10)
+            if result.returncode == 0 and result.stdout:
+                # 解析fc-list输出，获取第一个字体文件路径
+                for line in result.stdout.strip().split('\n'):
+                    if ':' in line:
+                        font_path = line.split(':')[0].strip()
+                        if os.path.exists(font_path):
+                            FontService._log(f"通过fc-list找到字体: {font_path}")
+                            return font_path, 'fc-list'
+        except Exception as e:
+            FontService._log(f"fc-list命令执行失败: {e}", 'warning')
+
+        FontService._log("未找到合适的中文字体文件", 'warning')
+        return None, None
+
+    @staticmethod
+    def _register_reportlab_font(font_path):
+        """
+        注册ReportLab中文字体：优先系统字体，失败时使用内置CID字体，都失败时降级为Helvetica
+
+        Returns:
+            tuple: (字体名称, 是否支持中文, 字体类型 ttf / cid / fallback)
+        """
+        # 策略1: 优先尝试系统字体（更可靠）
+        if font_path:
+            FontService._log(f"正在注册系统字体: {font_path}")
+            attempts = [{}]
+            # 如果是TTC文件或标准注册失败，尝试使用子字体
+            attempts.append({'subfontIndex': 0})
+            for kwargs in attempts:
+                try:
+                    pdfmetrics.registerFont(TTFont(FontService.REPORTLAB_FONT_NAME, font_path, **kwargs))
+                    return FontService.REPORTLAB_FONT_NAME, True, 'ttf'
+                except Exception:
+                    continue
+
+        # 策略2: 如果系统字体失败，尝试内置CID字体
+        from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+        for cid_font in FontService.CID_FONTS:
+            try:
+                pdfmetrics.registerFont(UnicodeCIDFont(cid_font))
+                FontService._log(f"使用内置中文字体: {cid_font}")
+                return cid_font, True, 'cid'
+            except Exception:
+                continue
+
+        # 策略3: 如果都失败，使用Helvetica（不支持中文，但不会报错）
+        FontService._log("使用Helvetica作为备选字体", 'warning')
+        return 'Helvetica', False, 'fallback'
+
+    @classmethod
+    def get_reportlab_font(cls):
+        """
+        获取已注册的ReportLab中文字体（进程内首次调用时查找并注册）
+
+        Returns:
+            tuple: (字体名称, 是否支持中文)
+        """
+        if cls._reportlab_font is None:
+            with cls._lock:
+                if cls._reportlab_font is None:
+                    start_time = time.time()
+                    font_path, source = cls.find_chinese_font()
+                    try:
+                        font_name, chinese_available, font_type = cls._register_reportlab_font(font_path)
+                    except Exception as e:
+                        cls._log(f"字体注册过程失败: {str(e)}", 'error')
+                        font_name, chinese_available, font_type = 'Helvetica', False, 'fallback'
+                    if chinese_available:
+                        cls._log(f"中文字体注册成功: {font_name}")
+
+                    cls._font_diagnostics = {
+                        'font_path': font_path,
+                        'source': source,
+                        'reportlab_font': font_name,
+                        'reportlab_font_type': font_type,
+                        'chinese_available': chinese_available,
+                        'resolve_time_ms': round((time.time() - start_time) * 1000, 2),
+                        'resolved_at': datetime.utcnow().isoformat()
+                    }
+                    cls._reportlab_font = (font_name, chinese_available)
+        return cls._reportlab_font
+
+    @classmethod
+    def get_weasyprint_font_config(cls):
+        """
+        获取复用的weasyprint FontConfiguration（进程内只创建一次）
+
+        Raises:
+            ImportError / OSError: weasyprint未安装或缺少系统库（失败结果同样缓存，不重复尝试导入）
+        """
+        if cls._weasyprint_font_config is None and cls._weasyprint_error is None:
+            with cls._lock:
+                if cls._weasyprint_font_config is None and cls._weasyprint_error is None:
+                    try:
+                        from weasyprint.text.fonts import FontConfiguration
+                        cls._weasyprint_font_config = FontConfiguration()
+                    except (ImportError, OSError) as e:
+                        cls._weasyprint_error = e
+        if cls._weasyprint_error is not None:
+            raise cls._weasyprint_error
+        return cls._weasyprint_font_config
+
+    @classmethod
+    def warm_up(cls):
+        """预先完成字体查找和注册（渲染进程启动时调用）"""
+        cls.get_reportlab_font()
+        try:
+            cls.get_weasyprint_font_config()
+        except (ImportError, OSError):
+            pass
+
+    @classmethod
+    def get_diagnostics(cls):
+        """
+        字体诊断信息：字体文件、来源、注册的ReportLab字体及weasyprint可用性
+
+        只报告本进程已缓存的结果，不触发字体查找（fc-list 可能耗时数秒）；尚未预热时 warmed 为 False
+        """
+        diagnostics = dict(cls._font_diagnostics) if cls._font_diagnostics is not None else {}
+        diagnostics['warmed'] = cls._font_diagnostics is not None
+        if cls._weasyprint_error is not None:
+            diagnostics['weasyprint_available'] = False
+            diagnostics['weasyprint_error'] = str(cls._weasyprint_error)
+        else:
+            # None 表示本进程尚未加载weasyprint
+            diagnostics['weasyprint_available'] = True if cls._weasyprint_font_config is not None else None
+        return diagnostics
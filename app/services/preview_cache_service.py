@@ -0,0 +1,112 @@
+import os
+import json
+import uuid
+import hashlib
+from flask import current_app
+from app.config.config import Config
+from app.services.document_service import DocumentService
+from app.services.export_cache_service import ExportCacheService
+from app.services.file_artifact_service import FileArtifactService
+
+
+class PreviewCacheService:
+    """
+    文件预览缓存服务
+
+    - 预览结果按 (文件内容哈希, 文件类型, 预览参数, 预览版本) 缓存为JSON，相同内容的文件共享缓存
+    - 历史文件没有内容哈希时，按文件路径、大小和修改时间生成缓存键
+    - 预览版本见 DocumentService.PREVIEW_VERSION，修改预览逻辑后递增即可使旧缓存失效
+    - 缓存总大小超过 PREVIEW_CACHE_MAX_SIZE 时按最近访问时间淘汰
+    - 默认参数的预览在上传后已由 FileArtifactService 预处理，直接读取文件旁的产物，不进入本缓存
+    """
+
+    CACHE_DIR_NAME = 'preview_cache'
+
+    @staticmethod
+    def get_cache_directory():
+        """获取预览缓存目录"""
+        cache_dir = os.path.join(Config.get_temp_directory(), PreviewCacheService.CACHE_DIR_NAME)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+
+    @staticmethod
+    def cache_key(task_file, max_length, page_range=None):
+        """生成缓存键"""
+        content_key = task_file.content_hash
+        if not content_key:
+            stat = os.stat(task_file.file_path)
+            content_key = hashlib.sha256(
+                f"{task_file.file_path}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')
+            ).hexdigest()
+        extension = os.path.splitext(task_file.file_path)[1].lower().lstrip('.')
+        pages = f"{page_range[0]}-{page_range[1]}" if page_range else 'all'
+        return f"{content_key}_{extension}_{max_length}_{pages}_v{DocumentService.PREVIEW_VERSION}"
+
+    @staticmethod
+    def _read(path):
+        """读取缓存的预览结果并更新访问时间，不存在或损坏时返回 None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                preview = json.load(f)
+            os.utime(path, None)
+            return preview
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path, preview):
+        """写入预览结果（先写临时文件再替换，并发写入不会读到不完整的内容）"""
+        temp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.json")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(preview, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            current_app.logger.warning(f"[预览缓存写入失败] {path} - 错误: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        removed, total_size = ExportCacheService.evict_directory(
+            PreviewCacheService.get_cache_directory(), Config.PREVIEW_CACHE_MAX_SIZE, keep=path
+        )
+        if removed:
+            current_app.logger.info(f"[预览缓存淘汰] 删除 {removed} 个文件，当前缓存大小: {total_size}字节")
+
+    @staticmethod
+    def get_preview(task_file, max_length=5000, page_range=None):
+        """
+        获取文件预览，缓存未命中时解析文件并缓存（解析失败的结果不缓存）
+
+        Args:
+            task_file: TaskFile对象
+            max_length (int): 预览文本最大长度
+            page_range (tuple): PDF页码范围 (起始页, 结束页)，从1开始，包含两端
+
+        Returns:
+            dict: 预览内容，格式同 DocumentService.get_file_preview
+        """
+        if not os.path.exists(task_file.file_path):
+            return DocumentService.get_file_preview(task_file.file_path, max_length, page_range)
+
+        if page_range is None and max_length == FileArtifactService.PREVIEW_MAX_LENGTH:
+            return FileArtifactService.get_preview(task_file.file_path)
+
+        if Config.PREVIEW_CACHE_MAX_SIZE <= 0:
+            return DocumentService.get_file_preview(task_file.file_path, max_length, page_range)
+
+        key = PreviewCacheService.cache_key(task_file, max_length, page_range)
+        path = os.path.join(PreviewCacheService.get_cache_directory(), f"{key}.json")
+
+        preview = PreviewCacheService._read(path)
+        if preview is not None:
+            current_app.logger.info(f"[预览缓存命中] 文件: {task_file.id} - {key}")
+            return preview
+
+        preview = DocumentService.get_file_preview(task_file.file_path, max_length, page_range)
+        if not preview.get('error'):
+            PreviewCacheService._write(path, preview)
+        return preview
@@ -0,0 +1,460 @@
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.config.config import Config
+from app.models.task import Task, TaskJob, UserTaskCounter
+from app.services.dify_client import DifyCircuitOpenError
+from app.services.file_service import FileService
+from app.utils.worker_pool import WorkerPoolFullError
+
+class TaskJobService:
+    """任务作业服务 - 基于数据库的持久化作业队列（认领/租约、心跳、过期重新入队）"""
+
+    # Web进程内的调度器（TASK_QUEUE_MODE=local 时使用）
+    _local_dispatcher = None
+    _local_dispatcher_lock = threading.Lock()
+
+    @staticmethod
+    def generate_worker_id():
+        """生成工作进程标识：主机名:进程号"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def enqueue(task_id, user_id, task_type, request_data):
+        """将标准处理请求写入作业队列"""
+        queued_count = TaskJob.query.filter_by(status='queued').count()
+        if Config.TASK_QUEUE_MAX_SIZE and queued_count >= Config.TASK_QUEUE_MAX_SIZE:
+            raise WorkerPoolFullError(f"作业队列已满（{Config.TASK_QUEUE_MAX_SIZE}），请稍后重试")
+
+        job = TaskJob(
+            task_id=task_id,
+            user_id=user_id,
+            task_type=task_type,
+            request_data=json.dumps(request_data or {}, ensure_ascii=False),
+            status='queued',
+            max_attempts=Config.TASK_JOB_MAX_ATTEMPTS
+        )
+        job.save()
+
+        current_app.logger.info(f"作业已入队 - 任务: {task_id} - 作业: {job.id} - 类型: {task_type}")
+
+        return job
+
+    @staticmethod
+    def claim_next(worker_id, lease_seconds=None, blocked_types=None):
+        """
+        认领下一个排队中的作业
+
+        使用带条件的UPDATE实现乐观认领，多个节点同时认领同一作业时只有一个会成功。
+
+        Args:
+            worker_id (str): 工作进程标识
+            lease_seconds (int): 租约时长
+            blocked_types (list): 已达到并发上限、暂不认领的任务类型
+
+        Returns:
+            TaskJob or None
+        """
+        lease_seconds = lease_seconds or Config.TASK_JOB_LEASE_SECONDS
+
+        query = TaskJob.query.filter(
+            TaskJob.status == 'queued',
+            db.or_(TaskJob.available_at.is_(None), TaskJob.available_at <= datetime.utcnow())
+        )
+        if blocked_types:
+            query = query.filter(db.or_(TaskJob.task_type.is_(None), ~TaskJob.task_type.in_(blocked_types)))
+        candidate_ids = [job.id for job in query.order_by(TaskJob.created_at.asc()).limit(5).all()]
+
+        for job_id in candidate_ids:
+            now = datetime.utcnow()
+            claimed = TaskJob.query.filter(
+                TaskJob.id == job_id,
+                TaskJob.status == 'queued'
+            ).update({
+                'status': 'running',
+                'lease_owner': worker_id,
+                'lease_expires_at': now + timedelta(seconds=lease_seconds),
+                'heartbeat_at': now,
+                'started_at': now,
+                'attempts': TaskJob.attempts + 1,
+                'updated_at': now
+            }, synchronize_session=False)
+            db.session.commit()
+
+            if claimed:
+                return TaskJob.find_by_id(job_id)
+
+        return None
+
+    @staticmethod
+    def heartbeat(job_ids, worker_id, lease_seconds=None):
+        """为当前工作进程持有的作业续约，返回续约成功的数量"""
+        if not job_ids:
+            return 0
+
+        lease_seconds = lease_seconds or Config.TASK_JOB_LEASE_SECONDS
+        now = datetime.utcnow()
+        renewed = TaskJob.query.filter(
+            TaskJob.id.in_(list(job_ids)),
+            TaskJob.status == 'running',
+            TaskJob.lease_owner == worker_id
+        ).update({
+            'heartbeat_at': now,
+            'lease_expires_at': now + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if renewed < len(job_ids):
+            current_app.logger.warning(f"部分作业租约已丢失 - 工作进程: {worker_id} - 持有: {len(job_ids)} - 续约成功: {renewed}")
+
+        return renewed
+
+    @staticmethod
+    def complete(job_id, worker_id):
+        """标记作业完成"""
+        now = datetime.utcnow()
+        TaskJob.query.filter(
+            TaskJob.id == job_id,
+            TaskJob.lease_owner == worker_id
+        ).update({
+            'status': 'completed',
+            'lease_expires_at': None,
+            'finished_at': now,
+            'updated_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def fail(job_id, worker_id, error):
+        """标记作业失败（Dify返回的错误不重试，只有租约过期才会重新入队）"""
+        now = datetime.utcnow()
+        TaskJob.query.filter(
+            TaskJob.id == job_id,
+            TaskJob.lease_owner == worker_id
+        ).update({
+            'status': 'failed',
+            'lease_expires_at': None,
+            'last_error': str(error)[:2000],
+            'finished_at': now,
+            'updated_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def defer(job_id, worker_id, delay, reason):
+        """作业暂时无法执行（如目标Dify应用熔断中），延迟 delay 秒后重新入队，本次不计入执行次数"""
+        now = datetime.utcnow()
+        deferred = TaskJob.query.filter(
+            TaskJob.id == job_id,
+            TaskJob.status == 'running',
+            TaskJob.lease_owner == worker_id
+        ).update({
+            'status': 'queued',
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'available_at': now + timedelta(seconds=delay),
+            'attempts': db.case((TaskJob.attempts > 0, TaskJob.attempts - 1), else_=0),
+            'last_error': str(reason)[:2000],
+            'updated_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        return deferred
+
+    @staticmethod
+    def release(job_ids, worker_id):
+        """释放当前工作进程持有的作业，使其立即重新入队（用于进程退出时未执行完的作业）"""
+        if not job_ids:
+            return 0
+
+        released = TaskJob.query.filter(
+            TaskJob.id.in_(list(job_ids)),
+            TaskJob.status == 'running',
+            TaskJob.lease_owner == worker_id
+        ).update({
+            'status': 'queued',
+            'lease_owner': None,
+            'lease_expires_at': None,
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+        return released
+
+    @staticmethod
+    def requeue_expired():
+        """将租约过期的作业重新入队，超过最大执行次数的作业标记为失败"""
+        now = datetime.utcnow()
+        expired_jobs = TaskJob.query.filter(
+            TaskJob.status == 'running',
+            TaskJob.lease_expires_at < now
+        ).all()
+
+        requeued = 0
+        for job in expired_jobs:
+            if job.attempts < job.max_attempts:
+                changed = TaskJob.query.filter(
+                    TaskJob.id == job.id,
+                    TaskJob.status == 'running',
+                    TaskJob.lease_expires_at < now
+                ).update({
+                    'status': 'queued',
+                    'lease_owner': None,
+                    'lease_expires_at': None,
+                    'last_error': f"租约过期（工作进程: {job.lease_owner}），重新入队",
+                    'updated_at': now
+                }, synchronize_session=False)
+                db.session.commit()
+                if changed:
+                    requeued += 1
+                    current_app.logger.warning(f"作业租约过期已重新入队 - 作业: {job.id} - 任务: {job.task_id} - 已执行次数: {job.attempts}")
+            else:
+                changed = TaskJob.query.filter(
+                    TaskJob.id == job.id,
+                    TaskJob.status == 'running',
+                    TaskJob.lease_expires_at < now
+                ).update({
+                    'status': 'failed',
+                    'lease_expires_at': None,
+                    'last_error': f"租约过期且已达到最大执行次数（{job.max_attempts}）",
+                    'finished_at': now,
+                    'updated_at': now
+                }, synchronize_session=False)
+                db.session.commit()
+                if changed:
+                    task = Task.find_by_id(job.task_id)
+                    if task:
+                        task.update_status('failed')
+                    current_app.logger.error(f"作业多次租约过期，标记为失败 - 作业: {job.id} - 任务: {job.task_id}")
+
+        return requeued
+
+    @staticmethod
+    def reconcile_task_counters(interval=None):
+        """
+        定期核对用户任务计数（多个进程共享同一间隔，最近已核对过则跳过）
+
+        Returns:
+            dict: 核对结果，本次跳过时返回None
+        """
+        interval = Config.TASK_COUNTER_RECONCILE_INTERVAL if interval is None else interval
+        if interval <= 0:
+            return None
+
+        last_reconciled = UserTaskCounter.last_reconciled_at()
+        if last_reconciled and (datetime.utcnow() - last_reconciled).total_seconds() < interval:
+            return None
+
+        result = UserTaskCounter.reconcile_all()
+        if result['corrected']:
+            current_app.logger.warning(f"用户任务计数核对完成，已修正偏差 - 用户数: {result['users']} - 修正: {result['corrected']}")
+        else:
+            current_app.logger.info(f"用户任务计数核对完成 - 用户数: {result['users']}")
+        return result
+
+    @staticmethod
+    def get_queue_stats():
+        """获取持久化队列的统计信息"""
+        status_counts = TaskJob.count_by_status()
+        oldest_queued = TaskJob.query.filter_by(status='queued').order_by(TaskJob.created_at.asc()).first()
+
+        return {
+            'mode': Config.TASK_QUEUE_MODE,
+            'status_counts': status_counts,
+            'queued': status_counts.get('queued', 0),
+            'running': status_counts.get('running', 0),
+            'oldest_queued_seconds': round((datetime.utcnow() - oldest_queued.created_at).total_seconds(), 2) if oldest_queued else 0
+        }
+
+    @classmethod
+    def ensure_local_dispatcher(cls, app):
+        """在Web进程内启动调度器（仅 TASK_QUEUE_MODE=local 时）"""
+        if Config.TASK_QUEUE_MODE != 'local':
+            return None
+
+        if cls._local_dispatcher is None:
+            with cls._local_dispatcher_lock:
+                if cls._local_dispatcher is None:
+                    from app.services.task_service import TaskService
+                    dispatcher = TaskJobDispatcher(app, cls.generate_worker_id(), TaskService.get_worker_pool())
+                    dispatcher.start()
+                    cls._local_dispatcher = dispatcher
+        return cls._local_dispatcher
+
+    @classmethod
+    def notify_enqueued(cls):
+        """通知本进程调度器有新作业，避免等待下一次轮询"""
+        if cls._local_dispatcher is not None:
+            cls._local_dispatcher.wake()
+
+    @staticmethod
+    def run_worker(app, worker_id=None):
+        """独立工作进程入口：持续认领并执行作业，收到SIGTERM/SIGINT后优雅退出"""
+        from app.services.task_service import TaskService
+
+        worker_id = worker_id or TaskJobService.generate_worker_id()
+        dispatcher = TaskJobDispatcher(app, worker_id, TaskService.get_worker_pool())
+        stop_event = threading.Event()
+
+        def handle_signal(signum, frame):
+            app.logger.info(f"工作进程收到退出信号 - 工作进程: {worker_id} - 信号: {signum}")
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+
+        app.logger.info(f"任务工作进程启动 - 工作进程: {worker_id} - 并发: {Config.TASK_WORKER_COUNT}")
+        dispatcher.start()
+
+        while not stop_event.is_set():
+            stop_event.wait(1)
+
+        dispatcher.stop(drain_timeout=Config.TASK_WORKER_DRAIN_TIMEOUT)
+        app.logger.info(f"任务工作进程已退出 - 工作进程: {worker_id}")
+
+
+class TaskJobDispatcher:
+    """作业调度器 - 从持久化队列认领作业、提交到线程池执行，并负责心跳续约和过期作业回收"""
+
+    def __init__(self, app, worker_id, pool):
+        self.app = app
+        self.worker_id = worker_id
+        self.pool = pool
+        self._active_jobs = set()
+        self._active_lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._last_heartbeat = 0
+        self._last_sweep = 0
+        self._last_reconcile = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name=f"task-dispatcher-{self.worker_id}", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake_event.set()
+
+    def stop(self, drain_timeout=None):
+        """停止认领新作业，等待执行中的作业结束，超时仍未结束的作业释放回队列"""
+        self._stopped = True
+        self._wake_event.set()
+        if self._thread:
+            self._thread.join(5)
+
+        self.pool.shutdown(wait=True, timeout=drain_timeout)
+
+        with self._active_lock:
+            remaining = list(self._active_jobs)
+        if remaining:
+            with self.app.app_context():
+                released = TaskJobService.release(remaining, self.worker_id)
+                self.app.logger.warning(f"工作进程退出时释放未完成作业 - 工作进程: {self.worker_id} - 数量: {released}")
+
+    def _free_slots(self):
+        stats = self.pool.stats()
+        return stats['max_workers'] - stats['running'] - stats['queue_depth']
+
+    def _blocked_types(self):
+        """已达到并发上限的任务类型"""
+        stats = self.pool.stats()
+        blocked = []
+        for job_type, limit in stats['type_limits'].items():
+            in_use = stats['running_by_type'].get(job_type, 0) + stats['queued_by_type'].get(job_type, 0)
+            if limit and in_use >= limit:
+                blocked.append(job_type)
+        return blocked
+
+    def _loop(self):
+        while not self._stopped:
+            try:
+                with self.app.app_context():
+                    self._tick()
+            except Exception as e:
+                self.app.logger.error(f"作业调度异常 - 工作进程: {self.worker_id} - 错误: {str(e)}", exc_info=True)
+
+            self._wake_event.wait(Config.TASK_JOB_POLL_INTERVAL)
+            self._wake_event.clear()
+
+    def _tick(self):
+        now = time.time()
+
+        # 心跳续约
+        if now - self._last_heartbeat >= Config.TASK_JOB_HEARTBEAT_INTERVAL:
+            with self._active_lock:
+                active = list(self._active_jobs)
+            TaskJobService.heartbeat(active, self.worker_id)
+            self._last_heartbeat = now
+
+        # 回收租约过期的作业，清理推迟删除的本地文件
+        if now - self._last_sweep >= Config.TASK_JOB_HEARTBEAT_INTERVAL:
+            TaskJobService.requeue_expired()
+            FileService.sweep_pending_deletions()
+            self._last_sweep = now
+
+        # 定期核对用户任务计数
+        if Config.TASK_COUNTER_RECONCILE_INTERVAL > 0 and now - self._last_reconcile >= Config.TASK_COUNTER_RECONCILE_INTERVAL:
+            self._last_reconcile = now
+            TaskJobService.reconcile_task_counters()
+
+        # 按线程池空闲容量认领作业
+        while not self._stopped and self._free_slots() > 0:
+            job = TaskJobService.claim_next(self.worker_id, blocked_types=self._blocked_types())
+            if not job:
+                break
+
+            with self._active_lock:
+                self._active_jobs.add(job.id)
+            try:
+                self.pool.submit(self._run_job, job.id, job_type=job.task_type, job_id=job.task_id)
+            except WorkerPoolFullError:
+                with self._active_lock:
+                    self._active_jobs.discard(job.id)
+                TaskJobService.release([job.id], self.worker_id)
+                break
+
+    def _run_job(self, job_id):
+        from app.services.task_service import TaskService
+
+        with self.app.app_context():
+            try:
+                job = TaskJob.find_by_id(job_id)
+                if not job:
+                    return
+                task_id, user_id = job.task_id, job.user_id
+                request_data = job.get_request_data()
+
+                current_app.logger.info(f"开始执行作业 - 作业: {job_id} - 任务: {task_id} - 第 {job.attempts} 次 - 工作进程: {self.worker_id}")
+
+                try:
+                    task = Task.find_by_id(task_id)
+                    if not task:
+                        raise ValueError(f"任务不存在: {task_id}")
+                    if task.status != 'processing':
+                        task.update_status('processing')
+
+                    TaskService.send_dify_request_direct(task_id, user_id, request_data)
+                    TaskJobService.complete(job_id, self.worker_id)
+
+                    current_app.logger.info(f"作业执行成功 - 作业: {job_id} - 任务: {task_id}")
+
+                except DifyCircuitOpenError as e:
+                    # 目标Dify应用熔断中，请求未发出：延迟到熔断进入半开后重新入队，不判定为失败
+                    delay = max(e.retry_after, Config.TASK_JOB_POLL_INTERVAL)
+                    TaskJobService.defer(job_id, self.worker_id, delay, e)
+                    current_app.logger.warning(f"作业延迟执行 - 作业: {job_id} - 任务: {task_id} - {delay:.0f}秒后重新入队 - 原因: {str(e)}")
+
+                except Exception as e:
+                    # send_dify_request_direct 内部已将任务状态更新为失败
+                    current_app.logger.error(f"作业执行失败 - 作业: {job_id} - 任务: {task_id} - 错误: {str(e)}")
+                    TaskJobService.fail(job_id, self.worker_id, e)
+            finally:
+                with self._active_lock:
+                    self._active_jobs.discard(job_id)
+                self.wake()
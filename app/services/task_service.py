@@ -1,16 +1,70 @@
 import json
-import requests
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
 from flask import current_app
-from app.models.task import Task, TaskFile, TaskResult
+from app import db
+from app.models.task import Task, TaskFile, TaskResult, TaskResultItem
 from app.services.file_service import FileService
+from app.services.file_artifact_service import FileArtifactService
+from app.services.dify_client import DifyClient, DifyCircuitOpenError
 from app.services.standard_config_service import StandardConfigService
+from app.utils.worker_pool import WorkerPool, WorkerPoolFullError, parse_type_limits
+from app.config.config import Config
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 import time
 import threading
 
 class TaskService:
     """任务服务 - 管理任务创建、状态更新和处理逻辑"""
     
+    # 标准处理后台线程池（进程内单例，首次提交时创建）
+    _worker_pool = None
+    _worker_pool_lock = threading.Lock()
+    
+    # 多文件上传线程池（进程内单例，首次并行上传时创建）
+    _upload_executor = None
+    _upload_executor_lock = threading.Lock()
+    
+    # 支持分页查询的任务类型（结果为条目列表，写入时拆分到 task_result_items 表）
+    PAGINATION_SUPPORTED_TYPES = ['standard_review', 'standard_recommendation', 'standard_compliance']
+    
+    # 各任务类型结果条目的必要字段
+    REQUIRED_ITEM_FIELDS = {
+        'standard_review': ['sn', 'issueLocation', 'originalText', 'issueDescription', 'recommendedModification'],
+        'standard_recommendation': ['sn', 'projectName', 'originalText', 'referenceStandard'],
+        'standard_compliance': ['sn', 'projectName', 'originalText', 'isCompliant', 'suggestedRewrite', 'referenceStandard']
+    }
+    
+    @classmethod
+    def get_worker_pool(cls):
+        """获取标准处理后台线程池"""
+        if cls._worker_pool is None:
+            with cls._worker_pool_lock:
+                if cls._worker_pool is None:
+                    pool = WorkerPool(
+                        'dify-task',
+                        max_workers=Config.TASK_WORKER_COUNT,
+                        max_queue_size=Config.TASK_QUEUE_MAX_SIZE,
+                        type_limits=parse_type_limits(Config.TASK_TYPE_CONCURRENCY)
+                    )
+                    # 进程退出时停止接收新任务，并在超时时间内执行完队列中的任务
+                    atexit.register(pool.shutdown, wait=True, timeout=Config.TASK_WORKER_DRAIN_TIMEOUT)
+                    cls._worker_pool = pool
+        return cls._worker_pool
+    
+    @classmethod
+    def get_queue_stats(cls):
+        """获取后台线程池和持久化作业队列的队列深度和运行状态"""
+        from app.services.task_job_service import TaskJobService
+        
+        stats = cls.get_worker_pool().stats()
+        stats['jobs'] = TaskJobService.get_queue_stats()
+        # 以持久化队列中排队的作业数作为整体队列深度（包含尚未被任何节点认领的作业）
+        stats['queue_depth'] = stats['jobs']['queued'] + stats['queue_depth']
+        return stats
+    
     @staticmethod
     def _extract_json_from_text(text):
         """从文本中提取JSON内容，处理可能的markdown格式"""
@@ -92,8 +146,14 @@ class TaskService:
             raise e
     
     @staticmethod
-    def upload_file_to_task(task_id, file, user_id):
-        """上传文件到任务"""
+    def upload_file_to_task(task_id, file, user_id, file_info=None):
+        """
+        上传文件到任务
+        
+        Args:
+            file: 上传的文件对象
+            file_info (dict): 已保存到本地的文件信息（如分片上传完成的文件），提供时忽略 file
+        """
         try:
             # 检查任务是否存在
             task = Task.find_by_id(task_id)
@@ -106,58 +166,254 @@ class TaskService:
             # 更新任务状态为上传中
             task.update_status('uploading')
             
-            # 1. 保存文件到本地
-            success, file_info, error = FileService.save_file(file, user_id)
-            if not success:
+            try:
+                task_file = TaskService._store_and_upload_file(task.id, task.task_type, file, user_id, file_info)
+            except ValueError:
                 task.update_status('failed')
-                raise ValueError(f"文件保存失败: {error}")
+                raise
             
-            # 2. 创建文件记录
-            task_file = TaskFile(
-                task_id=task.id,
-                user_id=user_id,
-                original_filename=file_info['original_filename'],
-                stored_filename=file_info['stored_filename'],
-                file_path=file_info['file_path'],
-                file_size=file_info['file_size'],
-                file_type=file_info['file_type'],
-                file_extension=file_info['file_extension'],
-                upload_status='uploading'
-            )
-            
-            task_file.save()
+            # 文件上传成功后，任务状态更新为uploaded，等待调用标准处理接口
+            task.update_status('uploaded')
+            current_app.logger.info(f"文件上传成功 - 任务: {task_id} - 文件: {task_file.original_filename} - 状态更新为uploaded")
             
-            # 3. 获取对应任务类型的Dify配置
-            dify_config = StandardConfigService.get_config_for_standard_type(task.task_type)
+            return task_file
             
-            # 4. 上传到Dify
-            dify_success, dify_result, dify_error = FileService.upload_to_dify(
-                file_info['file_path'],
-                file_info['original_filename'],
-                dify_config['api_key'],
+        except Exception as e:
+            current_app.logger.error(f"任务文件上传失败 - 任务: {task_id} - 错误: {str(e)}", exc_info=True)
+            raise e
+    
+    @classmethod
+    def get_upload_executor(cls):
+        """获取多文件上传线程池"""
+        if cls._upload_executor is None:
+            with cls._upload_executor_lock:
+                if cls._upload_executor is None:
+                    cls._upload_executor = ThreadPoolExecutor(
+                        max_workers=Config.UPLOAD_WORKER_COUNT,
+                        thread_name_prefix='file-upload'
+                    )
+        return cls._upload_executor
+    
+    @staticmethod
+    def upload_files_to_task(task_id, files, user_id):
+        """
+        并行上传多个文件到同一任务
+        
+        每个文件的本地保存和Dify上传在上传线程池中并行执行，任务状态只在当前线程中更新一次，
+        任一文件失败时任务标记为失败，其余文件的上传结果照常返回
+        
+        Returns:
+            tuple: (成功的TaskFile列表（按提交顺序）, 失败文件列表 [{'filename', 'error'}])
+        """
+        task = Task.find_by_id(task_id)
+        if not task:
+            raise ValueError(f"任务不存在: {task_id}")
+        
+        if task.user_id != user_id:
+            raise ValueError("无权限访问此任务")
+        
+        task.update_status('uploading')
+        task_type = task.task_type
+        
+        app = current_app._get_current_object()
+        
+        def upload_one(index, file):
+            # 工作线程使用独立的应用上下文和数据库会话，只返回文件ID
+            with app.app_context():
+                current_app.logger.info(f"开始上传文件 {index + 1}/{len(files)} - 任务: {task_id} - 文件名: {file.filename}")
+                return TaskService._store_and_upload_file(task_id, task_type, file, user_id).id
+        
+        outcomes = []
+        if Config.UPLOAD_WORKER_COUNT > 1 and len(files) > 1:
+            executor = TaskService.get_upload_executor()
+            futures = [executor.submit(upload_one, index, file) for index, file in enumerate(files)]
+            for file, future in zip(files, futures):
+                try:
+                    outcomes.append((file, future.result(), None))
+                except Exception as e:
+                    outcomes.append((file, None, e))
+        else:
+            for index, file in enumerate(files):
+                try:
+                    outcomes.append((file, upload_one(index, file), None))
+                except Exception as e:
+                    outcomes.append((file, None, e))
+        
+        task_files = []
+        failed_files = []
+        for file, file_id, error in outcomes:
+            if error is None:
+                task_files.append(TaskFile.find_by_id(file_id))
+            else:
+                current_app.logger.error(f"文件上传失败 - 任务: {task_id} - 文件: {file.filename} - 错误: {str(error)}")
+                failed_files.append({
+                    'filename': file.filename,
+                    'error': str(error)
+                })
+        
+        # 重新加载任务，避免使用工作线程提交前的过期状态
+        task = Task.find_by_id(task_id)
+        task.update_status('failed' if failed_files else 'uploaded')
+        
+        return task_files, failed_files
+    
+    @staticmethod
+    def _store_and_upload_file(task_id, task_type, file, user_id, file_info=None):
+        """保存单个文件到本地并上传到Dify（不修改任务状态），失败时抛出 ValueError；提供 file_info 时跳过本地保存"""
+        # 获取对应任务类型的Dify配置
+        dify_config = StandardConfigService.get_config_for_standard_type(task_type)
+        key_fingerprint = FileService.fingerprint_dify_key(dify_config['api_key'], dify_config['file_upload_url'])
+        
+        if Config.DIFY_STREAMING_UPLOAD and file_info is None:
+            # 边保存边上传：上传流只读取一遍，同时写入本地文件和Dify请求（上传前无法得知哈希，不复用Dify文件ID）
+            success, file_info, error, dify_outcome = FileService.save_file_and_upload_to_dify(
+                file,
                 user_id,
+                dify_config['api_key'],
                 dify_config['file_upload_url']
             )
+            if not success:
+                raise ValueError(f"文件保存失败: {error}")
             
-            if dify_success:
-                # 保存Dify返回信息
-                task_file.set_dify_info(dify_result.get('id'), dify_result)
-                task_file.update_status('uploaded')
-                # 文件上传成功后，任务状态更新为uploaded，等待调用标准处理接口
-                task.update_status('uploaded')
-                
-                current_app.logger.info(f"文件上传成功 - 任务: {task_id} - 文件: {file_info['original_filename']} - 状态更新为uploaded")
-                
-            else:
-                task_file.update_status('failed', dify_error)
-                task.update_status('failed')
-                raise ValueError(f"Dify文件上传失败: {dify_error}")
-            
-            return task_file
+            task_file = TaskService._create_task_file(task_id, user_id, file_info)
+            dify_success, dify_result, dify_error = dify_outcome
+        else:
+            # 1. 保存文件到本地
+            if file_info is None:
+                success, file_info, error = FileService.save_file(file, user_id)
+                if not success:
+                    raise ValueError(f"文件保存失败: {error}")
             
-        except Exception as e:
-            current_app.logger.error(f"任务文件上传失败 - 任务: {task_id} - 错误: {str(e)}", exc_info=True)
-            raise e
+            # 2. 创建文件记录
+            task_file = TaskService._create_task_file(task_id, user_id, file_info)
+            
+            # 3. 相同内容在有效期内已上传过同一Dify应用时直接复用文件ID，否则上传到Dify
+            reusable = None
+            if Config.DIFY_FILE_REUSE_TTL > 0:
+                reusable = TaskFile.find_reusable_dify_upload(
+                    file_info['content_hash'],
+                    key_fingerprint,
+                    user_id,
+                    datetime.utcnow() - timedelta(seconds=Config.DIFY_FILE_REUSE_TTL)
+                )
+            
+            if reusable:
+                dify_success, dify_error = True, None
+                try:
+                    dify_result = json.loads(reusable.dify_response_data) if reusable.dify_response_data else {'id': reusable.dify_file_id}
+                except (TypeError, ValueError):
+                    dify_result = {'id': reusable.dify_file_id}
+                current_app.logger.info(f"复用已上传的Dify文件 - 任务: {task_id} - 文件: {file_info['original_filename']} - Dify文件ID: {reusable.dify_file_id}")
+            else:
+                dify_success, dify_result, dify_error = FileService.upload_to_dify(
+                    file_info['file_path'],
+                    file_info['original_filename'],
+                    dify_config['api_key'],
+                    user_id,
+                    dify_config['file_upload_url']
+                )
+        
+        # 本地文件已保存，后台提取预览文本、页数和缩略图
+        FileArtifactService.schedule(task_file.file_path)
+        
+        if not dify_success:
+            task_file.update_status('failed', dify_error)
+            raise ValueError(f"Dify文件上传失败: {dify_error}")
+        
+        # 保存Dify返回信息
+        task_file.set_dify_info(dify_result.get('id'), dify_result, key_fingerprint)
+        task_file.update_status('uploaded')
+        
+        return task_file
+    
+    @staticmethod
+    def _create_task_file(task_id, user_id, file_info):
+        """根据本地保存结果创建文件记录"""
+        task_file = TaskFile(
+            task_id=task_id,
+            user_id=user_id,
+            original_filename=file_info['original_filename'],
+            stored_filename=file_info['stored_filename'],
+            file_path=file_info['file_path'],
+            file_size=file_info['file_size'],
+            file_type=file_info['file_type'],
+            file_extension=file_info['file_extension'],
+            content_hash=file_info['content_hash'],
+            upload_status='uploading'
+        )
+        task_file.save()
+        return task_file
+    
+    @staticmethod
+    def _is_missing_dify_file(response):
+        """判断Dify是否因为文件ID无效（过期或被清理）拒绝了请求"""
+        if response.status_code not in (400, 404):
+            return False
+        try:
+            error_data = response.json()
+        except ValueError:
+            return False
+        if not isinstance(error_data, dict):
+            return False
+        text = f"{error_data.get('code', '')} {error_data.get('message', '')}".lower()
+        return 'file' in text and any(word in text for word in ('not found', 'not exist', 'invalid', 'expired'))
+    
+    @staticmethod
+    def _collect_upload_file_ids(data):
+        """收集请求数据中所有 upload_file_id 的值"""
+        file_ids = set()
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if key == 'upload_file_id' and isinstance(value, str):
+                    file_ids.add(value)
+                else:
+                    file_ids |= TaskService._collect_upload_file_ids(value)
+        elif isinstance(data, list):
+            for item in data:
+                file_ids |= TaskService._collect_upload_file_ids(item)
+        return file_ids
+    
+    @staticmethod
+    def _replace_upload_file_ids(data, mapping):
+        """按 {旧文件ID: 新文件ID} 替换请求数据中的 upload_file_id，返回新的请求数据"""
+        if isinstance(data, dict):
+            return {
+                key: mapping.get(value, value) if key == 'upload_file_id' and isinstance(value, str)
+                else TaskService._replace_upload_file_ids(value, mapping)
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [TaskService._replace_upload_file_ids(item, mapping) for item in data]
+        return data
+    
+    @staticmethod
+    def _reupload_task_files(task_id, user_id, dify_config, file_ids):
+        """
+        重新上传任务中Dify已不再接受的文件，原文件ID不再被复用
+        
+        Returns:
+            dict: {旧文件ID: 新文件ID}，请求中的文件都不属于该任务时返回空字典
+        """
+        key_fingerprint = FileService.fingerprint_dify_key(dify_config['api_key'], dify_config['file_upload_url'])
+        mapping = {}
+        for task_file in TaskFile.find_by_task_id(task_id):
+            old_file_id = task_file.dify_file_id
+            if old_file_id not in file_ids or old_file_id in mapping:
+                continue
+            TaskFile.invalidate_dify_upload(old_file_id)
+            success, dify_result, error = FileService.upload_to_dify(
+                task_file.file_path,
+                task_file.original_filename,
+                dify_config['api_key'],
+                user_id,
+                dify_config['file_upload_url']
+            )
+            if not success:
+                raise ValueError(f"Dify文件重新上传失败: {error}")
+            task_file.set_dify_info(dify_result.get('id'), dify_result, key_fingerprint)
+            mapping[old_file_id] = task_file.dify_file_id
+            current_app.logger.info(f"Dify文件已失效，重新上传 - 任务: {task_id} - 文件: {task_file.original_filename} - 原文件ID: {old_file_id} - 新文件ID: {task_file.dify_file_id}")
+        return mapping
     
     @staticmethod
     def process_dify_response(task_id, user_id, dify_response_data, conversation_id=None):
@@ -232,6 +488,15 @@ class TaskService:
             
             task_result.save()
             
+            # 分页类任务在写入时拆分结果条目，分页查询不再重复解析
+            if task.task_type in TaskService.PAGINATION_SUPPORTED_TYPES:
+                try:
+                    TaskService.materialize_result_items(task_result, task.task_type)
+                except Exception as e:
+                    # 拆分失败不影响结果保存，首次分页查询时会重新补齐
+                    db.session.rollback()
+                    current_app.logger.warning(f"结果条目写入失败 - 任务: {task_id} - 错误: {str(e)}")
+            
             # 更新任务状态为已完成
             task.update_status('completed')
             
@@ -289,11 +554,12 @@ class TaskService:
             current_app.logger.info(f"发送Dify流式请求 - 任务: {task_id} - URL: {dify_config['api_url']}")
             
             # 发送请求到Dify
-            response = requests.post(
+            response = DifyClient.post(
                 dify_config['api_url'],
+                api_type='task_stream',
+                circuit=task.task_type,
                 headers=dify_config['headers'],
                 json=request_data,
-                timeout=60,
                 stream=True
             )
             
@@ -352,11 +618,12 @@ class TaskService:
             current_app.logger.info(f"请求头: {dify_config['headers']}")
             
             # 发送请求到Dify（不使用stream）
-            response = requests.post(
+            response = DifyClient.post(
                 dify_config['api_url'],
+                api_type='task_blocking',  # 阻塞请求可能需要更长时间
+                circuit=task.task_type,
                 headers=dify_config['headers'],
-                json=request_data,
-                timeout=120  # 阻塞请求可能需要更长时间
+                json=request_data
             )
             
             # 记录响应状态和详情
@@ -468,17 +735,19 @@ class TaskService:
             if task.user_id != user_id:
                 raise ValueError("无权限删除此任务")
             
-            # 删除本地文件
             files = TaskFile.find_by_task_id(task_id)
-            for file in files:
-                try:
-                    FileService.delete_local_file(file.file_path)
-                except:
-                    pass  # 忽略文件删除错误
+            file_paths = {file.file_path for file in files}
             
             # 删除任务（级联删除相关记录）
             task.delete()
             
+            # 删除本地文件（相同内容的文件可能被其他任务共享，仅删除不再被引用的文件）
+            for file_path in file_paths:
+                try:
+                    FileService.delete_stored_file(file_path)
+                except:
+                    pass  # 忽略文件删除错误
+            
             current_app.logger.info(f"任务删除成功 - 任务: {task_id}")
             
             return True
@@ -532,11 +801,12 @@ class TaskService:
             current_app.logger.info(f"请求头: {dify_config['headers']}")
             
             # 发送请求到Dify
-            response = requests.post(
+            response = DifyClient.post(
                 dify_config['api_url'],
+                api_type='task_blocking',
+                circuit=task.task_type,
                 headers=dify_config['headers'],
-                json=request_data,
-                timeout=120
+                json=request_data
             )
             
             # 记录响应状态和详情
@@ -617,16 +887,34 @@ class TaskService:
             current_app.logger.info(f"转发的请求数据: {request_data}")
             current_app.logger.info(f"请求头: {dify_config['headers']}")
             
-            # 直接转发前端请求数据到Dify，设置1小时超时，无重试
-            response = requests.post(
-                dify_config['api_url'],
-                headers=dify_config['headers'],
-                json=request_data,
-                timeout=(30, 3600)  # 连接超时30秒，读取超时1小时
-            )
-            
-            # 记录响应状态
-            current_app.logger.info(f"Dify响应状态码: {response.status_code} - 任务: {task_id}")
+            task_type = task.task_type
+            reuploaded = False
+            while True:
+                # 等待Dify响应期间不占用数据库连接，避免长请求耗尽连接池
+                db.session.close()
+                
+                # 直接转发前端请求数据到Dify，设置1小时超时；task_direct 默认不重试（请求发出后工作流可能已在执行，重试会重复执行）
+                response = DifyClient.post(
+                    dify_config['api_url'],
+                    api_type='task_direct',  # 默认连接超时30秒，读取超时1小时
+                    circuit=task_type,
+                    headers=dify_config['headers'],
+                    json=request_data
+                )
+                
+                # 记录响应状态
+                current_app.logger.info(f"Dify响应状态码: {response.status_code} - 任务: {task_id}")
+                
+                # 复用的Dify文件ID可能已被Dify清理：作废该ID，重新上传任务文件后再发送一次
+                if reuploaded or not TaskService._is_missing_dify_file(response):
+                    break
+                mapping = TaskService._reupload_task_files(
+                    task_id, user_id, dify_config, TaskService._collect_upload_file_ids(request_data)
+                )
+                if not mapping:
+                    break
+                request_data = TaskService._replace_upload_file_ids(request_data, mapping)
+                reuploaded = True
             
             if response.status_code != 200:
                 current_app.logger.error(f"Dify API错误 - 状态码: {response.status_code} - 响应: {response.text}")
@@ -668,6 +956,9 @@ class TaskService:
             
             return response_data
             
+        except DifyCircuitOpenError:
+            # 目标应用熔断中，请求未发出；任务保持原状态，由作业队列延迟后重新执行
+            raise
         except Exception as e:
             current_app.logger.error(f"Dify直接转发请求失败 - 任务: {task_id} - 错误: {str(e)}", exc_info=True)
             # 更新任务状态为失败
@@ -681,47 +972,34 @@ class TaskService:
     
     @staticmethod
     def send_dify_request_direct_async(task_id, user_id, request_data):
-        """异步执行 Dify API 请求的后台方法"""
-        # 在主线程中获取应用实例
-        app = current_app._get_current_object()
-        
-        def background_task():
-            with app.app_context():  # 在后台线程中使用传递的应用实例
-                try:
-                    current_app.logger.info(f"开始后台执行 Dify API 请求 - 任务: {task_id}")
-                    
-                    # 更新任务状态为处理中 - 只有在调用标准处理接口时才更新为processing
-                    task = Task.find_by_id(task_id)
-                    if task:
-                        task.update_status('processing')
-                        current_app.logger.info(f"任务状态已更新为processing - 任务: {task_id}")
-                    
-                    # 调用同步版本的方法执行实际请求
-                    TaskService.send_dify_request_direct(task_id, user_id, request_data)
-                    
-                    current_app.logger.info(f"后台 Dify API 请求执行成功 - 任务: {task_id}")
-                    
-                except Exception as e:
-                    current_app.logger.error(f"后台 Dify API 请求执行失败 - 任务: {task_id} - 错误: {str(e)}", exc_info=True)
-                    # 在异常情况下更新任务状态为失败
-                    try:
-                        task = Task.find_by_id(task_id)
-                        if task:
-                            task.update_status('failed')
-                            current_app.logger.info(f"任务状态已更新为失败 - 任务: {task_id}")
-                    except Exception as update_error:
-                        current_app.logger.error(f"更新任务状态失败 - 任务: {task_id} - 错误: {str(update_error)}")
+        """将 Dify API 请求写入持久化作业队列，由调度器认领后在后台线程池中执行"""
+        from app.services.task_job_service import TaskJobService
         
         try:
-            # 启动后台线程
-            thread = threading.Thread(target=background_task)
-            thread.daemon = True  # 设置为守护线程
-            thread.start()
+            task = Task.find_by_id(task_id)
+            if not task:
+                raise ValueError(f"任务不存在: {task_id}")
+            
+            # 写入作业队列，进程重启后作业仍可被重新认领执行
+            TaskJobService.enqueue(task_id, user_id, task.task_type, request_data)
+            
+            # 更新任务状态为处理中 - 只有在调用标准处理接口时才更新为processing
+            task.update_status('processing')
+            current_app.logger.info(f"任务状态已更新为processing - 任务: {task_id}")
+            
+            # local模式下由本进程调度执行；external模式下由独立的 worker.py 进程认领
+            TaskJobService.ensure_local_dispatcher(current_app._get_current_object())
+            TaskJobService.notify_enqueued()
             
             return True
             
+        except WorkerPoolFullError as e:
+            # 队列已满时拒绝任务，保持任务状态不变以便用户稍后重试
+            current_app.logger.warning(f"后台任务队列已满 - 任务: {task_id} - 错误: {str(e)}")
+            raise
+            
         except Exception as e:
-            # 如果启动后台线程失败，立即更新任务状态为失败
+            # 如果写入作业队列失败，立即更新任务状态为失败
             current_app.logger.error(f"启动后台任务失败 - 任务: {task_id} - 错误: {str(e)}", exc_info=True)
             try:
                 task = Task.find_by_id(task_id)
@@ -734,29 +1012,201 @@ class TaskService:
             return False
     
     @staticmethod
-    def get_task_results_paginated(task_id, user_id, page=1, per_page=20, sort_by='sn', sort_order='asc'):
-        """获取任务结果的分页数据 - 专门用于需要分页展示的任务类型"""
+    def _parse_result_items(task_result):
+        """从任务结果中解析条目列表：优先answer字段（JSON数组或多个```json代码块），其次full_response中的outputs"""
+        task_id = task_result.task_id
+        items_data = None
+        data_source = "answer"
+        
+        if task_result.answer:
+            try:
+                # 首先尝试直接解析为JSON数组
+                items_data = json.loads(task_result.answer)
+                if isinstance(items_data, list):
+                    current_app.logger.info(f"从answer字段解析到 {len(items_data)} 条数据 - 任务: {task_id}")
+                else:
+                    items_data = None  # 不是列表格式，继续尝试其他方式
+            except json.JSONDecodeError:
+                # 如果直接解析失败，尝试处理多个JSON对象的情况
+                try:
+                    # 检查是否包含多个JSON对象（用户提供的格式）
+                    raw_text = task_result.answer
+                    if '}\n```\n```json\n{' in raw_text or raw_text.count('```json') > 1:
+                        # 分割多个JSON块
+                        json_blocks = []
+                        
+                        # 移除markdown标记并分割
+                        text_lines = raw_text.split('\n')
+                        current_json = ""
+                        in_json_block = False
+                        
+                        for line in text_lines:
+                            line = line.strip()
+                            if line == '```json' or line == '```':
+                                if line == '```json':
+                                    in_json_block = True
+                                    current_json = ""
+                                elif line == '```' and in_json_block:
+                                    in_json_block = False
+                                    if current_json.strip():
+                                        try:
+                                            json_obj = json.loads(current_json)
+                                            json_blocks.append(json_obj)
+                                            current_app.logger.debug(f"成功解析JSON对象 - sn: {json_obj.get('sn', 'N/A')} - 任务: {task_id}")
+                                        except json.JSONDecodeError as e:
+                                            current_app.logger.warning(f"JSON对象解析失败 - 任务: {task_id} - 错误: {str(e)}")
+                                    current_json = ""
+                            elif in_json_block:
+                                current_json += line + "\n"
+                        
+                        # 如果还有剩余的JSON内容
+                        if current_json.strip():
+                            try:
+                                json_obj = json.loads(current_json)
+                                json_blocks.append(json_obj)
+                                current_app.logger.debug(f"成功解析剩余JSON对象 - sn: {json_obj.get('sn', 'N/A')} - 任务: {task_id}")
+                            except json.JSONDecodeError as e:
+                                current_app.logger.warning(f"剩余JSON对象解析失败 - 任务: {task_id} - 错误: {str(e)}")
+                        
+                        if json_blocks:
+                            items_data = json_blocks
+                            current_app.logger.info(f"从answer字段解析到 {len(items_data)} 个JSON对象 - 任务: {task_id}")
+                        else:
+                            items_data = None
+                    else:
+                        # 使用_extract_json_from_text处理单个JSON的情况
+                        clean_text = TaskService._extract_json_from_text(raw_text)
+                        items_data = json.loads(clean_text)
+                        if isinstance(items_data, list):
+                            current_app.logger.info(f"从answer字段解析到 {len(items_data)} 条数据 - 任务: {task_id}")
+                        else:
+                            items_data = None
+                except json.JSONDecodeError:
+                    items_data = None  # JSON解析失败，继续尝试其他方式
+        
+        # 如果answer字段为空或解析失败，尝试从full_response中的outputs提取
+        if not items_data and task_result.full_response:
+            try:
+                full_data = json.loads(task_result.full_response)
+                
+                # 尝试从不同位置提取数据
+                outputs = None
+                if 'data' in full_data and 'outputs' in full_data['data']:
+                    outputs = full_data['data']['outputs']
+                    data_source = "full_response.data.outputs"
+                elif 'outputs' in full_data:
+                    outputs = full_data['outputs']
+                    data_source = "full_response.outputs"
+                
+                if outputs:
+                    # 尝试从不同字段提取
+                    for field_name in ['审查意见', 'answer', 'result', 'content']:
+                        if field_name in outputs:
+                            try:
+                                if isinstance(outputs[field_name], str):
+                                    # 使用新的提取方法处理可能的markdown格式
+                                    clean_json = TaskService._extract_json_from_text(outputs[field_name])
+                                    items_data = json.loads(clean_json)
+                                else:
+                                    items_data = outputs[field_name]
+                                
+                                if isinstance(items_data, list):
+                                    current_app.logger.info(f"从{data_source}.{field_name}字段解析到 {len(items_data)} 条数据 - 任务: {task_id}")
+                                    break
+                                else:
+                                    items_data = None
+                            except (json.JSONDecodeError, TypeError):
+                                continue
+            except json.JSONDecodeError:
+                pass
+        
+        return items_data if isinstance(items_data, list) and items_data else None
+    
+    @staticmethod
+    def materialize_result_items(task_result, task_type):
+        """
+        将任务结果解析为条目写入 task_result_items 表
+        
+        只在结果写入时（或历史结果首次分页查询时）解析一次，之后分页直接查询条目表
+        
+        Returns:
+            int: 写入的条目数量，结果无法解析时返回0
+        """
+        items_data = TaskService._parse_result_items(task_result)
+        if not items_data:
+            return 0
+        
+        # 根据任务类型验证数据格式
+        required_fields = TaskService.REQUIRED_ITEM_FIELDS.get(task_type, ['sn'])  # 默认只要求sn字段
+        
+        now = datetime.utcnow()
+        rows = []
+        for i, item in enumerate(items_data):
+            sn = None
+            if isinstance(item, dict):
+                # 检查必要字段
+                missing_fields = [field for field in required_fields if field not in item]
+                if missing_fields:
+                    current_app.logger.warning(f"第 {i+1} 条数据缺少字段: {missing_fields} - 任务: {task_result.task_id} - 任务类型: {task_type}")
+                try:
+                    sn = int(item.get('sn', 0))
+                except (ValueError, TypeError):
+                    sn = None  # 非数字序号按原始位置排序
+            else:
+                current_app.logger.warning(f"第 {i+1} 条数据格式不正确 - 任务: {task_result.task_id}")
+            
+            row = {
+                'id': str(uuid.uuid4()),
+                'result_id': task_result.id,
+                'task_id': task_result.task_id,
+                'sn': sn,
+                'position': i,
+                'data': json.dumps(item, ensure_ascii=False),
+                'created_at': now
+            }
+            row.update(TaskResultItem.extract_columns(item))
+            rows.append(row)
+        
+        # 分批插入，避免单条语句过大
+        batch_size = 500
+        for start in range(0, len(rows), batch_size):
+            db.session.execute(TaskResultItem.__table__.insert(), rows[start:start + batch_size])
+        db.session.commit()
+        
+        current_app.logger.info(f"结果条目写入成功 - 任务: {task_result.task_id} - 结果ID: {task_result.id} - 条目数: {len(rows)}")
+        
+        return len(rows)
+    
+    @staticmethod
+    def get_completed_paginated_task(task_id, user_id):
+        """获取支持分页查询且已完成的任务，不满足条件时抛出 ValueError"""
+        # 检查任务是否存在
+        task = Task.find_by_id(task_id)
+        if not task:
+            raise ValueError(f"任务不存在: {task_id}")
+        
+        if task.user_id != user_id:
+            raise ValueError("无权限访问此任务")
+        
+        # 检查任务类型是否支持分页
+        if task.task_type not in TaskService.PAGINATION_SUPPORTED_TYPES:
+            raise ValueError(f"任务类型 '{task.get_task_type_display()}' 不支持分页查询，请使用任务详情接口获取完整结果")
+        
+        # 检查任务是否已完成
+        if task.status != 'completed':
+            raise ValueError(f"任务状态为 '{task.get_status_display()}'，只有已完成的任务才能进行分页查询")
+        
+        return task
+    
+    @staticmethod
+    def get_task_results_paginated(task_id, user_id, page=1, per_page=20, sort_by='sn', sort_order='asc', filters=None):
+        """获取任务结果的分页数据 - 专门用于需要分页展示的任务类型，filters 参见 TaskResultItem.build_query"""
         try:
-            # 检查任务是否存在
-            task = Task.find_by_id(task_id)
-            if not task:
-                raise ValueError(f"任务不存在: {task_id}")
-            
-            if task.user_id != user_id:
-                raise ValueError("无权限访问此任务")
-            
-            # 检查任务类型是否支持分页
-            pagination_supported_types = ['standard_review', 'standard_recommendation', 'standard_compliance']
-            if task.task_type not in pagination_supported_types:
-                raise ValueError(f"任务类型 '{task.get_task_type_display()}' 不支持分页查询，请使用任务详情接口获取完整结果")
+            task = TaskService.get_completed_paginated_task(task_id, user_id)
             
-            # 检查任务是否已完成
-            if task.status != 'completed':
-                raise ValueError(f"任务状态为 '{task.get_status_display()}'，只有已完成的任务才能进行分页查询")
-            
-            # 获取任务结果
-            results = TaskResult.find_by_user_and_task(user_id, task_id)
-            if not results:
+            # 获取最新的任务结果
+            latest_result = TaskResult.find_latest_by_user_and_task(user_id, task_id)
+            if not latest_result:
                 return {
                     'items': [],
                     'pagination': {
@@ -776,170 +1226,41 @@ class TaskService:
                     }
                 }
             
-            # 解析最新结果的answer字段（JSON格式）
-            latest_result = results[0]  # 按创建时间倒序，第一个是最新的
-            
-            # 尝试从answer字段获取数据
-            items_data = None
-            data_source = "answer"
-            
-            if latest_result.answer:
+            total_items = TaskResultItem.count_by_result_id(latest_result.id)
+            if total_items == 0:
+                # 历史结果尚未拆分为条目，首次查询时补齐
                 try:
-                    import json
-                    # 首先尝试直接解析为JSON数组
-                    items_data = json.loads(latest_result.answer)
-                    if isinstance(items_data, list):
-                        current_app.logger.info(f"从answer字段解析到 {len(items_data)} 条数据 - 任务: {task_id}")
-                    else:
-                        items_data = None  # 不是列表格式，继续尝试其他方式
-                except json.JSONDecodeError:
-                    # 如果直接解析失败，尝试处理多个JSON对象的情况
-                    try:
-                        # 检查是否包含多个JSON对象（用户提供的格式）
-                        raw_text = latest_result.answer
-                        if '}\n```\n```json\n{' in raw_text or raw_text.count('```json') > 1:
-                            # 分割多个JSON块
-                            json_blocks = []
-                            
-                            # 移除markdown标记并分割
-                            text_lines = raw_text.split('\n')
-                            current_json = ""
-                            in_json_block = False
-                            
-                            for line in text_lines:
-                                line = line.strip()
-                                if line == '```json' or line == '```':
-                                    if line == '```json':
-                                        in_json_block = True
-                                        current_json = ""
-                                    elif line == '```' and in_json_block:
-                                        in_json_block = False
-                                        if current_json.strip():
-                                            try:
-                                                json_obj = json.loads(current_json)
-                                                json_blocks.append(json_obj)
-                                                current_app.logger.debug(f"成功解析JSON对象 - sn: {json_obj.get('sn', 'N/A')} - 任务: {task_id}")
-                                            except json.JSONDecodeError as e:
-                                                current_app.logger.warning(f"JSON对象解析失败 - 任务: {task_id} - 错误: {str(e)}")
-                                        current_json = ""
-                                elif in_json_block:
-                                    current_json += line + "\n"
-                            
-                            # 如果还有剩余的JSON内容
-                            if current_json.strip():
-                                try:
-                                    json_obj = json.loads(current_json)
-                                    json_blocks.append(json_obj)
-                                    current_app.logger.debug(f"成功解析剩余JSON对象 - sn: {json_obj.get('sn', 'N/A')} - 任务: {task_id}")
-                                except json.JSONDecodeError as e:
-                                    current_app.logger.warning(f"剩余JSON对象解析失败 - 任务: {task_id} - 错误: {str(e)}")
-                            
-                            if json_blocks:
-                                items_data = json_blocks
-                                current_app.logger.info(f"从answer字段解析到 {len(items_data)} 个JSON对象 - 任务: {task_id}")
-                            else:
-                                items_data = None
-                        else:
-                            # 使用_extract_json_from_text处理单个JSON的情况
-                            clean_text = TaskService._extract_json_from_text(raw_text)
-                            items_data = json.loads(clean_text)
-                            if isinstance(items_data, list):
-                                current_app.logger.info(f"从answer字段解析到 {len(items_data)} 条数据 - 任务: {task_id}")
-                            else:
-                                items_data = None
-                    except json.JSONDecodeError:
-                        items_data = None  # JSON解析失败，继续尝试其他方式
-            
-            # 如果answer字段为空或解析失败，尝试从full_response中的outputs提取
-            if not items_data:
-                if latest_result.full_response:
-                    try:
-                        import json
-                        full_data = json.loads(latest_result.full_response)
-                        
-                        # 尝试从不同位置提取数据
-                        outputs = None
-                        if 'data' in full_data and 'outputs' in full_data['data']:
-                            outputs = full_data['data']['outputs']
-                            data_source = "full_response.data.outputs"
-                        elif 'outputs' in full_data:
-                            outputs = full_data['outputs']
-                            data_source = "full_response.outputs"
-                        
-                        if outputs:
-                            # 尝试从不同字段提取
-                            for field_name in ['审查意见', 'answer', 'result', 'content']:
-                                if field_name in outputs:
-                                    try:
-                                        if isinstance(outputs[field_name], str):
-                                            # 使用新的提取方法处理可能的markdown格式
-                                            clean_json = TaskService._extract_json_from_text(outputs[field_name])
-                                            items_data = json.loads(clean_json)
-                                        else:
-                                            items_data = outputs[field_name]
-                                        
-                                        if isinstance(items_data, list):
-                                            current_app.logger.info(f"从{data_source}.{field_name}字段解析到 {len(items_data)} 条数据 - 任务: {task_id}")
-                                            break
-                                        else:
-                                            items_data = None
-                                    except (json.JSONDecodeError, TypeError):
-                                        continue
-                    except json.JSONDecodeError:
-                        pass
-            
-            if not items_data:
-                raise ValueError("任务结果数据为空或无法解析")
+                    total_items = TaskService.materialize_result_items(latest_result, task.task_type)
+                except IntegrityError:
+                    # 并发请求已完成补齐
+                    db.session.rollback()
+                    total_items = TaskResultItem.count_by_result_id(latest_result.id)
             
-            if not isinstance(items_data, list):
-                raise ValueError("任务结果数据格式不正确，应为列表格式")
-            
-            current_app.logger.info(f"解析到 {len(items_data)} 条结果数据 - 任务: {task_id}")
-            
-            # 根据任务类型验证数据格式
-            task_type = task.task_type
-            required_fields_map = {
-                'standard_review': ['sn', 'issueLocation', 'originalText', 'issueDescription', 'recommendedModification'],
-                'standard_recommendation': ['sn', 'projectName', 'originalText', 'referenceStandard'],
-                'standard_compliance': ['sn', 'projectName', 'originalText', 'isCompliant', 'suggestedRewrite', 'referenceStandard']
-            }
-            
-            required_fields = required_fields_map.get(task_type, ['sn'])  # 默认只要求sn字段
-            
-            for i, item in enumerate(items_data):
-                if not isinstance(item, dict):
-                    current_app.logger.warning(f"第 {i+1} 条数据格式不正确 - 任务: {task_id}")
-                    continue
-                
-                # 检查必要字段
-                missing_fields = [field for field in required_fields if field not in item]
-                if missing_fields:
-                    current_app.logger.warning(f"第 {i+1} 条数据缺少字段: {missing_fields} - 任务: {task_id} - 任务类型: {task_type}")
+            if not total_items:
+                raise ValueError("任务结果数据为空或无法解析")
             
-            # 排序处理
-            if sort_by == 'sn':
-                # 按序号排序
-                reverse = (sort_order.lower() == 'desc')
-                try:
-                    items_data.sort(key=lambda x: int(x.get('sn', 0)), reverse=reverse)
-                except (ValueError, TypeError):
-                    # 如果sn不是数字，按字符串排序
-                    items_data.sort(key=lambda x: str(x.get('sn', '')), reverse=reverse)
+            # 应用筛选条件后重新计数
+            filters = {key: value for key, value in (filters or {}).items() if value}
+            items_query = TaskResultItem.build_query(latest_result.id, filters)
+            if filters:
+                total_items = items_query.count()
             
             # 计算分页信息
-            total_items = len(items_data)
             total_pages = (total_items + per_page - 1) // per_page  # 向上取整
             
             # 验证页码
             if page > total_pages and total_pages > 0:
                 page = total_pages
             
-            # 计算分页范围
-            start_index = (page - 1) * per_page
-            end_index = start_index + per_page
-            
-            # 获取当前页数据
-            current_page_items = items_data[start_index:end_index]
+            # 获取当前页数据（排序和分页在数据库中完成）
+            page_items = TaskResultItem.find_page(
+                items_query,
+                offset=(page - 1) * per_page,
+                limit=per_page,
+                sort_by=sort_by,
+                sort_order=sort_order
+            )
+            current_page_items = [item.get_data() for item in page_items]
             
             # 构建分页信息
             pagination_info = {
@@ -955,6 +1276,7 @@ class TaskService:
             result = {
                 'items': current_page_items,
                 'pagination': pagination_info,
+                'filters': filters,
                 'task_info': {
                     'id': task.id,
                     'task_type': task.task_type,
@@ -0,0 +1,158 @@
+"""
+熔断器模块
+- closed（正常）：统计时间窗口内的调用结果，失败率达到阈值且调用数不少于最小值时打开
+- open（熔断）：直接拒绝调用，不再等待上游的连接超时；超过打开时长后进入半开
+- half_open（半开）：只放行少量探测调用，探测成功则恢复正常，失败则重新打开；
+  长时间运行的调用（如阻塞式工作流，响应在执行结束后才返回）作为探测时，调用方在连接建立后调用 connected() 即视为探测成功，
+  不会在整个执行期间占用探测名额
+"""
+
+import time
+import threading
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Probe:
+    """半开状态放行的一次探测调用，调用方通过 record()/connected() 归还自己的探测名额"""
+    __slots__ = ()
+
+
+class CircuitBreaker:
+    """
+    单个上游目标的熔断器（线程安全）
+
+    Args:
+        failure_rate (float): 打开熔断的失败率阈值（0~1）
+        min_calls (int): 计算失败率所需的最少调用数
+        window_seconds (float): 统计窗口（秒）
+        open_seconds (float): 熔断打开后多久进入半开状态
+        half_open_probes (int): 半开状态同时放行的探测调用数
+    """
+
+    # 统计窗口内最多保留的调用结果数
+    MAX_SAMPLES = 1000
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window_seconds=60, open_seconds=30, half_open_probes=1):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.opened_at = None
+        self.rejected = 0
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=self.MAX_SAMPLES)
+        # 半开状态下进行中的探测调用
+        self._probes = set()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self.state = OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._probes = set()
+
+    def _close(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self._probes = set()
+        self._outcomes.clear()
+
+    def allow(self):
+        """
+        申请一次调用
+
+        Returns:
+            放行凭证，拒绝时返回 False；正常状态下为 True，半开状态下为 Probe。
+            放行后必须以该凭证调用 record() 记录结果
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if now - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probes = set()
+            if self.state == HALF_OPEN:
+                if len(self._probes) >= self.half_open_probes:
+                    self.rejected += 1
+                    return False
+                probe = Probe()
+                self._probes.add(probe)
+                return probe
+            return True
+
+    def connected(self, permit):
+        """
+        探测调用已与上游建立连接，视为探测成功并恢复正常，调用结果仍须通过 record() 记录
+
+        Args:
+            permit: allow() 返回的放行凭证，非探测调用时忽略
+        """
+        with self._lock:
+            if permit in self._probes:
+                self._close()
+
+    def record(self, success, permit=True):
+        """
+        记录一次调用结果
+
+        Args:
+            success (bool): True 成功，False 失败，None 表示调用未得到结果（不计入统计，只释放半开探测名额）
+            permit: allow() 返回的放行凭证
+        """
+        now = time.monotonic()
+        with self._lock:
+            if permit in self._probes:
+                self._probes.discard(permit)
+                if success is True:
+                    self._close()
+                elif success is False:
+                    self._open(now)
+                return
+            if success is None or self.state == HALF_OPEN:
+                # 半开状态只根据探测调用的结果切换，此前放行的调用结果不计入
+                return
+
+            self._outcomes.append((now, not success))
+            if self.state != CLOSED or success:
+                return
+            self._prune(now)
+            calls = len(self._outcomes)
+            if calls >= self.min_calls and sum(1 for _, failed in self._outcomes if failed) / calls >= self.failure_rate:
+                self._open(now)
+
+    @property
+    def retry_after(self):
+        """熔断打开时距离进入半开的剩余秒数"""
+        with self._lock:
+            if self.state != OPEN:
+                return 0
+            return max(0.0, round(self.open_seconds - (time.monotonic() - self.opened_at), 2))
+
+    def snapshot(self):
+        """当前状态和统计窗口内的失败率"""
+        retry_after = self.retry_after
+        with self._lock:
+            self._prune(time.monotonic())
+            calls = len(self._outcomes)
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            return {
+                'state': self.state,
+                'calls': calls,
+                'failures': failures,
+                'failure_rate': round(failures / calls, 4) if calls else 0,
+                'retry_after': retry_after,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened
+            }
@@ -0,0 +1,89 @@
+"""
+游标分页工具模块
+基于 (created_at, id) 的键集分页：按创建时间倒序翻页，不使用 OFFSET，深页与首页开销相同
+"""
+
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无法解析时抛出"""
+    pass
+
+
+def encode_cursor(created_at, record_id):
+    """将最后一条记录的 (created_at, id) 编码为URL安全的游标字符串"""
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标字符串，返回 (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, record_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), record_id
+    except (ValueError, UnicodeError):
+        raise InvalidCursorError("无效的分页游标")
+
+
+class CursorPage:
+    """游标分页结果"""
+
+    def __init__(self, items, per_page, next_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+        self.total = total
+
+    def to_dict(self):
+        """转换为分页信息字典"""
+        data = {
+            'mode': 'cursor',
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'has_next': self.has_next
+        }
+        if self.total is not None:
+            data['total'] = self.total
+        return data
+
+
+def keyset_paginate(query, created_column, id_column, cursor=None, per_page=20, with_total=False):
+    """
+    对查询进行键集分页
+
+    Args:
+        query: 已应用过滤条件、尚未排序的查询
+        created_column: 创建时间列
+        id_column: 主键列（创建时间相同时的排序依据）
+        cursor (str): 上一页返回的 next_cursor，为空表示第一页
+        per_page (int): 每页数量
+        with_total (bool): 是否额外统计总数（会多一次 COUNT 查询）
+
+    Returns:
+        CursorPage
+    """
+    total = query.order_by(None).count() if with_total else None
+
+    if cursor:
+        created_at, record_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            created_column < created_at,
+            and_(created_column == created_at, id_column < record_id)
+        ))
+
+    # 多取一条用于判断是否还有下一页
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+
+    return CursorPage(items, per_page, next_cursor=next_cursor, total=total)
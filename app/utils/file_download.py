@@ -0,0 +1,90 @@
+"""
+文件下载工具模块
+本地文件下载统一入口：支持 Range 断点续传和条件请求（ETag / Last-Modified），
+可配置为只返回 X-Accel-Redirect / X-Sendfile 头，由前置代理直接发送文件，Python 工作进程立即释放
+"""
+
+import os
+from urllib.parse import quote
+from flask import request, send_file, current_app
+from werkzeug.utils import send_file as werkzeug_send_file
+from app.config.config import Config
+
+
+def _offload_header(file_path):
+    """
+    生成交给前置代理的响应头
+
+    Returns:
+        tuple: (头名称, 头的值)，未启用或文件不在可卸载目录内时返回 None
+    """
+    mode = Config.DOWNLOAD_OFFLOAD_MODE
+    if mode not in ('x-accel', 'x-sendfile'):
+        return None
+
+    real_path = os.path.realpath(file_path)
+    data_dir = os.path.realpath(Config.get_data_directory())
+    if os.path.commonpath([real_path, data_dir]) != data_dir:
+        # 自定义到数据根目录以外的存储路径不在代理的内部location内，由Python发送
+        return None
+
+    if mode == 'x-accel':
+        relative_path = os.path.relpath(real_path, data_dir).replace(os.sep, '/')
+        return 'X-Accel-Redirect', Config.DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative_path)
+
+    if not real_path.isascii():
+        return None
+    return 'X-Sendfile', real_path
+
+
+def send_local_file(file_path, download_name, mimetype=None, etag=None,
+                    as_attachment=True, cache_control='private, no-cache'):
+    """
+    发送本地文件
+
+    - Python 发送时支持 Range（206 部分内容）、If-Range 以及 If-None-Match / If-Modified-Since（304）
+    - 启用 DOWNLOAD_OFFLOAD_MODE 时 304 仍由 Python 判断，其余请求（含 Range）交给代理处理，响应体为空
+
+    Args:
+        file_path (str): 文件路径
+        download_name (str): 下载文件名
+        mimetype (str): 文件类型，为空时按文件名推断
+        etag (str): 强ETag（如内容哈希），为空时按修改时间和大小生成
+        as_attachment (bool): 是否作为附件下载，False 时浏览器可直接打开（如内置PDF阅读器）
+        cache_control (str): Cache-Control 响应头
+
+    Returns:
+        Response: Flask响应对象
+    """
+    offload = _offload_header(file_path)
+    if offload is None:
+        response = send_file(
+            file_path,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            mimetype=mimetype,
+            etag=etag if etag else True,
+            conditional=True
+        )
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    # 只生成响应头（不打开文件），由代理读取文件并处理 Range
+    response = werkzeug_send_file(
+        file_path,
+        request.environ,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        etag=etag if etag else True,
+        conditional=False,
+        use_x_sendfile=True,
+        response_class=current_app.response_class
+    )
+    response.headers.pop('X-Sendfile', None)
+    response.headers.pop('Content-Length', None)
+    response.headers['Cache-Control'] = cache_control
+    response = response.make_conditional(request.environ)
+    if response.status_code != 304:
+        response.headers[offload[0]] = offload[1]
+    return response
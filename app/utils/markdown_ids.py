@@ -0,0 +1,58 @@
+"""
+Markdown标题ID工具模块
+长文档分段转换时每段单独生成标题ID，不同段中相同的标题文字会得到相同的ID；
+本扩展在 toc 之后运行，把与前面分段重复的ID按 toc 的规则追加序号（intro、intro_1、intro_2……），
+与整篇转换的结果一致
+"""
+
+from markdown.extensions import Extension
+from markdown.extensions.toc import unique
+from markdown.treeprocessors import Treeprocessor
+
+# toc 扩展生成的链接：目录、标题锚点和永久链接
+_TOC_LINK_CLASSES = {'toclink', 'headerlink'}
+
+
+class ChunkHeaderIdTreeprocessor(Treeprocessor):
+    """
+    记录已转换分段使用过的ID，重命名本段中与之重复的ID
+
+    转换器 reset() 不会清空已使用的ID，开始转换新文档前调用 start_document()
+    """
+
+    def __init__(self, md):
+        super().__init__(md)
+        self.used_ids = set()
+
+    def start_document(self):
+        """开始转换新文档，清空已使用的ID"""
+        self.used_ids = set()
+
+    def run(self, root):
+        chunk_ids = {el.attrib['id'] for el in root.iter() if 'id' in el.attrib}
+        renamed = {}
+        for el in root.iter():
+            element_id = el.attrib.get('id')
+            if element_id is not None and element_id in self.used_ids:
+                new_id = unique(element_id, self.used_ids | chunk_ids)
+                chunk_ids.add(new_id)
+                el.attrib['id'] = new_id
+                renamed[element_id] = new_id
+
+        if renamed:
+            # 同步更新本段中 toc 生成的链接（目录、锚点、永久链接），用户自己写的链接保持原样
+            toc_links = {id(link) for div in root.iter('div') if div.get('class') == 'toc' for link in div.iter('a')}
+            for link in root.iter('a'):
+                target = link.get('href', '')[1:]
+                if target in renamed and (id(link) in toc_links or link.get('class') in _TOC_LINK_CLASSES):
+                    link.set('href', '#' + renamed[target])
+
+        self.used_ids |= chunk_ids
+
+
+class ChunkHeaderIdExtension(Extension):
+    """分段转换时保持标题ID在整篇文档内唯一"""
+
+    def extendMarkdown(self, md):
+        # toc 的优先级为5，数值越小越晚运行
+        md.treeprocessors.register(ChunkHeaderIdTreeprocessor(md), 'chunk_header_ids', 4)
@@ -0,0 +1,90 @@
+"""
+重试工具模块
+- 指数退避 + 完全抖动（full jitter）：第 n 次重试前等待 [0, min(上限, 基数 * 2^(n-1))] 之间的随机时间，避免大量请求同时重试
+- Retry-After 响应头解析（秒数或HTTP日期）
+- 重试预算（令牌桶）：重试次数不超过正常请求的一定比例，上游故障时不会因重试把流量放大成重试风暴
+"""
+
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+def backoff_delay(retry_number, base, cap):
+    """
+    计算第 retry_number 次重试前的等待秒数（完全抖动）
+
+    Args:
+        retry_number (int): 第几次重试，从1开始
+        base (float): 退避基数（秒）
+        cap (float): 单次等待上限（秒）
+    """
+    return random.uniform(0, min(cap, base * (2 ** (retry_number - 1))))
+
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 响应头
+
+    Returns:
+        float: 需要等待的秒数，无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryBudget:
+    """
+    重试预算（令牌桶）
+
+    - 每个新请求存入 ratio 个令牌，每次重试消耗1个令牌，令牌不足时不再重试
+    - 另按 min_per_second 随时间补充，低流量时也允许少量重试
+    """
+
+    def __init__(self, ratio, min_per_second, capacity=None):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity or max(10.0, min_per_second * 10)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.denied = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """记录一次新请求"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def withdraw(self):
+        """申请一次重试，预算不足时返回 False"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.denied += 1
+            return False
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill()
+            return round(self._tokens, 2)
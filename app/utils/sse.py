@@ -0,0 +1,335 @@
+"""
+SSE流转发工具模块
+- 按事件边界（空行）切分上游字节流，每个完整事件立即发送，不在缓冲区中等待凑满固定大小
+- 上游长时间没有数据时插入注释行心跳，避免中间代理因空闲断开连接
+- 按应用场景统计首字节时间（TTFB）和生成速度（tokens/s）
+"""
+
+import re
+import json
+import time
+import queue
+import asyncio
+import threading
+from collections import deque
+
+# 心跳注释行，EventSource 和按 data: 行解析的客户端都会忽略
+HEARTBEAT = b': keep-alive\n\n'
+
+# 事件边界：LF、CRLF、CR 三种换行形式的空行
+_EVENT_BOUNDARY_RE = re.compile(rb'\r\n\r\n|\n\n|\r\r')
+_EVENT_TYPE_RE = re.compile(rb'"event"\s*:\s*"([a-z_]+)"')
+_TASK_ID_RE = re.compile(rb'"task_id"\s*:\s*"([^"]+)"')
+
+# 携带生成内容的Dify事件类型
+TOKEN_EVENTS = {b'message', b'agent_message'}
+
+# 表示本次生成已结束的Dify事件类型，之后客户端断开无需再停止生成
+END_EVENTS = {b'message_end', b'workflow_finished', b'error'}
+
+
+class SSEEventParser:
+    """增量解析SSE字节流，返回完整的事件（含结尾的空行）"""
+
+    def __init__(self):
+        self._buffer = b''
+
+    def feed(self, data):
+        """
+        追加上游数据
+
+        Returns:
+            list: 已完整的事件（bytes），不完整的部分留在缓冲区
+        """
+        buffer = self._buffer + data if self._buffer else data
+        events = []
+        start = 0
+        for match in _EVENT_BOUNDARY_RE.finditer(buffer):
+            events.append(buffer[start:match.end()])
+            start = match.end()
+        self._buffer = buffer[start:]
+        return events
+
+    def flush(self):
+        """取出缓冲区中剩余的不完整数据（上游结束时调用）"""
+        data, self._buffer = self._buffer, b''
+        return data
+
+
+def parse_event_data(event):
+    """解析事件中 data: 行的JSON内容，无法解析时返回 None"""
+    lines = [line[5:].lstrip() for line in event.splitlines() if line.startswith(b'data:')]
+    if not lines:
+        return None
+    try:
+        return json.loads(b'\n'.join(lines))
+    except ValueError:
+        return None
+
+
+class SSERelay:
+    """单个聊天流的转发状态：切分事件，记录首字节时间、token数、心跳次数以及停止生成所需的 task_id"""
+
+    def __init__(self, scenario, start_time=None):
+        self.scenario = scenario
+        self.start_time = start_time or time.time()
+        self.parser = SSEEventParser()
+        self.first_byte_time = None
+        self.first_token_time = None
+        self.last_token_time = None
+        self.token_events = 0
+        self.completion_tokens = None
+        self.heartbeats = 0
+        self.task_id = None
+        self.ended = False
+
+    def feed(self, data):
+        """返回可以立即发送的完整事件列表"""
+        events = self.parser.feed(data)
+        for event in events:
+            self._inspect(event)
+        if events and self.first_byte_time is None:
+            self.first_byte_time = time.time()
+        return events
+
+    def flush(self):
+        """上游结束时返回剩余数据（原样转发，不丢弃）"""
+        data = self.parser.flush()
+        if data and self.first_byte_time is None:
+            self.first_byte_time = time.time()
+        return data
+
+    def heartbeat(self):
+        self.heartbeats += 1
+        return HEARTBEAT
+
+    @property
+    def generating(self):
+        """上游是否仍在生成（已收到 task_id 且尚未收到结束事件）"""
+        return self.task_id is not None and not self.ended
+
+    def _inspect(self, event):
+        if self.task_id is None:
+            match = _TASK_ID_RE.search(event)
+            if match:
+                self.task_id = match.group(1).decode('utf-8', 'replace')
+
+        match = _EVENT_TYPE_RE.search(event)
+        if not match:
+            return
+        event_type = match.group(1)
+        if event_type in END_EVENTS:
+            self.ended = True
+        if event_type in TOKEN_EVENTS:
+            now = time.time()
+            if self.first_token_time is None:
+                self.first_token_time = now
+            self.last_token_time = now
+            self.token_events += 1
+        elif event_type == b'message_end':
+            # message_end 中带有模型实际输出的token数
+            if self.first_token_time is not None:
+                self.last_token_time = time.time()
+            payload = parse_event_data(event) or {}
+            usage = (payload.get('metadata') or {}).get('usage') or {}
+            if usage.get('completion_tokens'):
+                self.completion_tokens = usage['completion_tokens']
+
+    def summary(self):
+        """
+        本次流的统计
+
+        - ttfb_ms: 从收到请求到转发第一个上游事件的时间（心跳不计入）
+        - tokens: message_end 中的 completion_tokens，没有时按内容事件数估算
+        - tokens_per_second: 从第一个内容事件到生成结束的平均速度
+        """
+        ttfb_ms = round((self.first_byte_time - self.start_time) * 1000, 2) if self.first_byte_time else None
+        tokens = self.completion_tokens or self.token_events
+        tokens_per_second = None
+        if tokens and self.first_token_time and self.last_token_time > self.first_token_time:
+            tokens_per_second = round(tokens / (self.last_token_time - self.first_token_time), 2)
+        return {
+            'ttfb_ms': ttfb_ms,
+            'tokens': tokens,
+            'tokens_per_second': tokens_per_second,
+            'heartbeats': self.heartbeats,
+            'elapsed_ms': round((time.time() - self.start_time) * 1000, 2)
+        }
+
+    def finish(self, status='completed'):
+        """流结束时记录统计，返回本次流的统计信息"""
+        summary = self.summary()
+        ChatStreamMetrics.record(self.scenario, status, summary)
+        return summary
+
+
+class ChatStreamMetrics:
+    """按应用场景汇总聊天流统计（进程内，保留最近 SAMPLE_SIZE 次的样本）"""
+
+    SAMPLE_SIZE = 500
+
+    _lock = threading.Lock()
+    _scenarios = {}
+
+    @classmethod
+    def _new_stats(cls):
+        return {
+            'streams': 0,
+            'by_status': {},
+            'heartbeats': 0,
+            'stop_requests': 0,
+            'stop_failures': 0,
+            'ttfb_ms': deque(maxlen=cls.SAMPLE_SIZE),
+            'tokens_per_second': deque(maxlen=cls.SAMPLE_SIZE)
+        }
+
+    @classmethod
+    def record(cls, scenario, status, summary):
+        """记录一次流的结束，status 为 completed / error / cancelled（客户端断开）"""
+        with cls._lock:
+            stats = cls._scenarios.get(scenario)
+            if stats is None:
+                stats = cls._scenarios[scenario] = cls._new_stats()
+            stats['streams'] += 1
+            stats['by_status'][status] = stats['by_status'].get(status, 0) + 1
+            stats['heartbeats'] += summary['heartbeats']
+            if summary['ttfb_ms'] is not None:
+                stats['ttfb_ms'].append(summary['ttfb_ms'])
+            if summary['tokens_per_second'] is not None:
+                stats['tokens_per_second'].append(summary['tokens_per_second'])
+
+    @classmethod
+    def record_stop(cls, scenario, success):
+        """记录客户端断开后调用Dify停止生成接口的结果"""
+        with cls._lock:
+            stats = cls._scenarios.get(scenario)
+            if stats is None:
+                stats = cls._scenarios[scenario] = cls._new_stats()
+            stats['stop_requests'] += 1
+            if not success:
+                stats['stop_failures'] += 1
+
+    @staticmethod
+    def _percentile(values, percent):
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+    @classmethod
+    def get_stats(cls):
+        """各场景的流数量、首字节时间分位数和平均生成速度"""
+        with cls._lock:
+            snapshot = {
+                scenario: dict(stats, by_status=dict(stats['by_status']),
+                               ttfb_ms=list(stats['ttfb_ms']), tokens_per_second=list(stats['tokens_per_second']))
+                for scenario, stats in cls._scenarios.items()
+            }
+
+        result = {}
+        for scenario, stats in snapshot.items():
+            ttfb, speed = stats['ttfb_ms'], stats['tokens_per_second']
+            result[scenario] = {
+                'streams': stats['streams'],
+                'by_status': stats['by_status'],
+                'heartbeats': stats['heartbeats'],
+                'stop_requests': stats['stop_requests'],
+                'stop_failures': stats['stop_failures'],
+                'ttfb_ms': {
+                    'avg': round(sum(ttfb) / len(ttfb), 2) if ttfb else None,
+                    'p50': cls._percentile(ttfb, 50),
+                    'p95': cls._percentile(ttfb, 95)
+                },
+                'tokens_per_second_avg': round(sum(speed) / len(speed), 2) if speed else None,
+                'samples': len(ttfb)
+            }
+        return result
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._scenarios = {}
+
+
+def iter_upstream_chunks(raw, chunk_size=8192):
+    """
+    逐块读取上游响应（urllib3 原始响应），数据到达即返回，不等待凑满 chunk_size
+
+    分块传输编码时按HTTP块返回；否则使用 read1 读取当前已到达的数据
+    """
+    if raw.chunked and raw.supports_chunked_reads():
+        yield from raw.read_chunked(chunk_size, decode_content=True)
+        return
+    if not hasattr(raw, 'read1'):
+        # urllib3 1.x 没有 read1
+        yield from raw.stream(chunk_size, decode_content=True)
+        return
+    while True:
+        data = raw.read1(chunk_size, decode_content=True)
+        if not data:
+            return
+        yield data
+
+
+def iter_with_heartbeat(iterator, interval):
+    """
+    在后台线程中读取 iterator，超过 interval 秒没有数据时产出 None（调用方据此发送心跳）
+
+    iterator 结束或抛出异常后生成器随之结束/抛出；interval <= 0 时不插入心跳
+    """
+    if not interval or interval <= 0:
+        yield from iterator
+        return
+
+    items = queue.Queue()
+    end = object()
+
+    def read():
+        try:
+            for item in iterator:
+                items.put((item, None))
+            items.put((end, None))
+        except BaseException as e:
+            items.put((end, e))
+
+    threading.Thread(target=read, name='sse-reader', daemon=True).start()
+
+    while True:
+        try:
+            item, error = items.get(timeout=interval)
+        except queue.Empty:
+            yield None
+            continue
+        if item is end:
+            if error is not None:
+                raise error
+            return
+        yield item
+
+
+async def aiter_with_heartbeat(aiterator, interval):
+    """iter_with_heartbeat 的异步版本：等待下一块超过 interval 秒时产出 None"""
+    if not interval or interval <= 0:
+        async for item in aiterator:
+            yield item
+        return
+
+    iterator = aiterator.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                item = task.result()
+            except StopAsyncIteration:
+                return
+            yield item
+    finally:
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,216 @@
+"""
+后台工作线程池模块
+提供有界提交队列、按任务类型的并发限制、队列深度统计以及关闭时的优雅排空
+"""
+
+import threading
+import time
+import logging
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPoolFullError(Exception):
+    """提交队列已满或线程池已关闭时抛出"""
+    pass
+
+
+class _Job:
+    """线程池内部的待执行作业"""
+
+    __slots__ = ('fn', 'args', 'kwargs', 'job_type', 'job_id', 'submitted_at')
+
+    def __init__(self, fn, args, kwargs, job_type, job_id):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.job_type = job_type
+        self.job_id = job_id
+        self.submitted_at = time.time()
+
+
+class WorkerPool:
+    """
+    固定大小的工作线程池
+
+    - 工作线程数量固定，按需懒启动，不会随提交数量增长
+    - 等待队列有上限，队列满时拒绝提交（抛出 WorkerPoolFullError）
+    - 支持按 job_type 设置最大并发数，超出限制的作业留在队列中等待，不占用工作线程
+    - shutdown(wait=True) 会拒绝新提交，并在超时时间内执行完队列中剩余的作业
+    """
+
+    def __init__(self, name, max_workers=4, max_queue_size=100, type_limits=None):
+        if max_workers < 1:
+            raise ValueError("max_workers 必须大于0")
+
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.type_limits = dict(type_limits or {})
+
+        self._pending = deque()
+        self._running_by_type = {}
+        self._running_jobs = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+
+        # 统计信息
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args, job_type=None, job_id=None, **kwargs):
+        """提交作业到线程池，队列已满或已关闭时抛出 WorkerPoolFullError"""
+        with self._cond:
+            if self._shutdown:
+                self._rejected += 1
+                raise WorkerPoolFullError(f"线程池 {self.name} 已关闭，拒绝新的作业")
+
+            if self.max_queue_size and len(self._pending) >= self.max_queue_size:
+                self._rejected += 1
+                raise WorkerPoolFullError(
+                    f"线程池 {self.name} 等待队列已满（{self.max_queue_size}），请稍后重试"
+                )
+
+            self._pending.append(_Job(fn, args, kwargs, job_type, job_id))
+            self._submitted += 1
+            self._ensure_workers()
+            self._cond.notify_all()
+
+    def _ensure_workers(self):
+        """按需启动工作线程（调用方需持有锁）"""
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._worker_loop,
+                name=f"{self.name}-worker-{len(self._threads) + 1}",
+                daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+
+    def _type_has_capacity(self, job_type):
+        limit = self.type_limits.get(job_type)
+        if not limit:
+            return True
+        return self._running_by_type.get(job_type, 0) < limit
+
+    def _take_runnable_job(self):
+        """取出第一个未超出类型并发限制的作业（调用方需持有锁）"""
+        for index, job in enumerate(self._pending):
+            if self._type_has_capacity(job.job_type):
+                del self._pending[index]
+                return job
+        return None
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                job = self._take_runnable_job()
+                while job is None:
+                    if self._shutdown and not self._pending:
+                        return
+                    self._cond.wait()
+                    job = self._take_runnable_job()
+
+                self._running_by_type[job.job_type] = self._running_by_type.get(job.job_type, 0) + 1
+                self._running_jobs[id(job)] = job
+
+            try:
+                job.fn(*job.args, **job.kwargs)
+                succeeded = True
+            except Exception:
+                succeeded = False
+                logger.exception(f"线程池 {self.name} 作业执行失败 - 作业: {job.job_id} - 类型: {job.job_type}")
+
+            with self._cond:
+                self._running_by_type[job.job_type] -= 1
+                if self._running_by_type[job.job_type] <= 0:
+                    del self._running_by_type[job.job_type]
+                self._running_jobs.pop(id(job), None)
+                if succeeded:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._cond.notify_all()
+
+    def shutdown(self, wait=True, timeout=None):
+        """
+        关闭线程池
+
+        Args:
+            wait (bool): 是否等待队列中的作业执行完毕
+            timeout (float): 最长等待秒数，None表示一直等待
+
+        Returns:
+            bool: 所有作业是否已在超时前排空
+        """
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+            threads = list(self._threads)
+
+        if not wait:
+            return not self._pending and not self._running_jobs
+
+        deadline = None if timeout is None else time.time() + timeout
+        for thread in threads:
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            thread.join(remaining)
+
+        with self._cond:
+            return not self._pending and not self._running_jobs
+
+    @property
+    def queue_depth(self):
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self):
+        """返回线程池运行状态，用于队列深度监控"""
+        with self._cond:
+            queued_by_type = {}
+            oldest_wait = 0
+            now = time.time()
+            for job in self._pending:
+                queued_by_type[job.job_type] = queued_by_type.get(job.job_type, 0) + 1
+                oldest_wait = max(oldest_wait, now - job.submitted_at)
+
+            return {
+                'name': self.name,
+                'max_workers': self.max_workers,
+                'alive_workers': sum(1 for t in self._threads if t.is_alive()),
+                'max_queue_size': self.max_queue_size,
+                'queue_depth': len(self._pending),
+                'queued_by_type': queued_by_type,
+                'oldest_queued_seconds': round(oldest_wait, 2),
+                'running': len(self._running_jobs),
+                'running_by_type': dict(self._running_by_type),
+                'type_limits': dict(self.type_limits),
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'is_shutdown': self._shutdown
+            }
+
+
+def parse_type_limits(value):
+    """解析形如 'standard_review:2,standard_compliance:1' 的并发限制配置"""
+    limits = {}
+    if not value:
+        return limits
+    for part in value.split(','):
+        part = part.strip()
+        if not part or ':' not in part:
+            continue
+        key, limit = part.split(':', 1)
+        try:
+            limits[key.strip()] = int(limit.strip())
+        except ValueError:
+            continue
+    return limits
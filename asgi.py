@@ -0,0 +1,11 @@
+from app import create_app
+from app.asgi import create_asgi_app
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 创建Flask应用实例，聊天流式接口由异步代理处理，其余请求交给Flask
+# 启动示例: uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+flask_app = create_app()
+application = create_asgi_app(flask_app)
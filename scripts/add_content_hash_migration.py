@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：任务文件表添加内容哈希字段
+功能：为 task_files 添加 content_hash / dify_key_fingerprint 字段及索引，支持内容寻址存储和Dify文件ID复用
+说明：历史文件不回填哈希，仍按原路径访问；迁移后新上传的文件按内容哈希存储
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pymysql
+from app.config.config import Config
+
+# 需要添加的字段
+NEW_COLUMNS = [
+    ('content_hash', "VARCHAR(64) NULL COMMENT '文件内容SHA-256哈希' AFTER file_extension"),
+    ('dify_key_fingerprint', "VARCHAR(64) NULL COMMENT '上传所用Dify应用密钥指纹' AFTER dify_response_data"),
+]
+
+# 需要添加的索引：(索引名, 字段)
+NEW_INDEXES = [
+    ('idx_task_files_hash_key', '(content_hash, dify_key_fingerprint)'),
+    ('idx_task_files_file_path', '(file_path)'),
+]
+
+def setup_logger():
+    """设置日志记录器"""
+    logger = logging.getLogger('migration')
+    logger.setLevel(logging.INFO)
+
+    # 创建控制台处理器
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+
+    # 创建格式化器
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    console_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    return logger
+
+def connect_database():
+    """连接到MySQL数据库"""
+    try:
+        connection = pymysql.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USERNAME,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            charset='utf8mb4',
+            autocommit=False
+        )
+        return connection
+    except Exception as e:
+        raise Exception(f"数据库连接失败: {str(e)}")
+
+def column_exists(cursor, column_name):
+    """检查字段是否已存在"""
+    cursor.execute("""
+    SELECT COUNT(*) AS cnt
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    AND TABLE_NAME = 'task_files'
+    AND COLUMN_NAME = %s
+    """, (Config.DB_NAME, column_name))
+    return cursor.fetchone()['cnt'] > 0
+
+def index_exists(cursor, index_name):
+    """检查索引是否已存在"""
+    cursor.execute("""
+    SELECT COUNT(*) AS cnt
+    FROM INFORMATION_SCHEMA.STATISTICS
+    WHERE TABLE_SCHEMA = %s
+    AND TABLE_NAME = 'task_files'
+    AND INDEX_NAME = %s
+    """, (Config.DB_NAME, index_name))
+    return cursor.fetchone()['cnt'] > 0
+
+def add_columns_and_indexes(cursor):
+    """添加缺失的字段和索引"""
+    added = 0
+    for column_name, definition in NEW_COLUMNS:
+        if column_exists(cursor, column_name):
+            logger.info(f"字段 task_files.{column_name} 已存在，跳过")
+            continue
+        cursor.execute(f"ALTER TABLE task_files ADD COLUMN {column_name} {definition}")
+        logger.info(f"✓ 成功添加字段 task_files.{column_name}")
+        added += 1
+
+    for index_name, columns in NEW_INDEXES:
+        if index_exists(cursor, index_name):
+            logger.info(f"索引 task_files.{index_name} 已存在，跳过")
+            continue
+        cursor.execute(f"ALTER TABLE task_files ADD INDEX {index_name} {columns}")
+        logger.info(f"✓ 成功添加索引 task_files.{index_name}")
+        added += 1
+    return added
+
+def main():
+    """主函数"""
+    global logger
+    logger = setup_logger()
+
+    logger.info("=" * 60)
+    logger.info("开始执行任务文件内容哈希迁移脚本")
+    logger.info(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("=" * 60)
+
+    connection = None
+    try:
+        # 连接数据库
+        logger.info("正在连接数据库...")
+        connection = connect_database()
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+
+        logger.info(f"成功连接到数据库: {Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}")
+
+        added = add_columns_and_indexes(cursor)
+
+        logger.info("=" * 60)
+        logger.info(f"任务文件内容哈希迁移脚本执行完成，新增字段/索引 {added} 个")
+        logger.info("=" * 60)
+        return True
+
+    except Exception as e:
+        logger.error(f"执行失败: {str(e)}")
+        return False
+
+    finally:
+        if connection:
+            connection.close()
+            logger.info("数据库连接已关闭")
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
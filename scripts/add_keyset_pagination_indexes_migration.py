@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：添加游标分页复合索引
+功能：为 tasks 表添加 (user_id, created_at, id) 复合索引，支持任务列表按创建时间倒序的游标分页
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pymysql
+from app.config.config import Config
+
+# 需要添加的索引：(表名, 索引名, 字段)
+NEW_INDEXES = [
+    ('tasks', 'idx_tasks_user_created_id', '(user_id, created_at, id)'),
+]
+
+def setup_logger():
+    """设置日志记录器"""
+    logger = logging.getLogger('migration')
+    logger.setLevel(logging.INFO)
+
+    # 创建控制台处理器
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+
+    # 创建格式化器
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    console_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    return logger
+
+def connect_database():
+    """连接到MySQL数据库"""
+    try:
+        connection = pymysql.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USERNAME,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            charset='utf8mb4',
+            autocommit=False
+        )
+        return connection
+    except Exception as e:
+        raise Exception(f"数据库连接失败: {str(e)}")
+
+def index_exists(cursor, table_name, index_name):
+    """检查索引是否已存在"""
+    cursor.execute("""
+    SELECT COUNT(*) AS cnt
+    FROM INFORMATION_SCHEMA.STATISTICS
+    WHERE TABLE_SCHEMA = %s
+    AND TABLE_NAME = %s
+    AND INDEX_NAME = %s
+    """, (Config.DB_NAME, table_name, index_name))
+    return cursor.fetchone()['cnt'] > 0
+
+def add_indexes(cursor):
+    """添加缺失的复合索引"""
+    added = 0
+    for table_name, index_name, columns in NEW_INDEXES:
+        if index_exists(cursor, table_name, index_name):
+            logger.info(f"索引 {table_name}.{index_name} 已存在，跳过")
+            continue
+        logger.info(f"正在添加索引 {table_name}.{index_name} {columns} ...")
+        cursor.execute(f"ALTER TABLE {table_name} ADD INDEX {index_name} {columns}")
+        logger.info(f"✓ 成功添加索引 {table_name}.{index_name}")
+        added += 1
+    return added
+
+def main():
+    """主函数"""
+    global logger
+    logger = setup_logger()
+
+    logger.info("=" * 60)
+    logger.info("开始执行游标分页索引迁移脚本")
+    logger.info(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("=" * 60)
+
+    connection = None
+    try:
+        # 连接数据库
+        logger.info("正在连接数据库...")
+        connection = connect_database()
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+
+        logger.info(f"成功连接到数据库: {Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}")
+
+        added = add_indexes(cursor)
+
+        logger.info("=" * 60)
+        logger.info(f"游标分页索引迁移脚本执行完成，新增索引 {added} 个")
+        logger.info("=" * 60)
+        return True
+
+    except Exception as e:
+        logger.error(f"执行失败: {str(e)}")
+        return False
+
+    finally:
+        if connection:
+            connection.close()
+            logger.info("数据库连接已关闭")
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为任务结果条目表添加筛选字段和全文索引
+功能：为 task_result_items 添加 is_compliant / issue_location / reference_standard / search_text 字段、
+     对应的复合索引和 ngram 全文索引，并从已有条目的 data 字段回填
+"""
+
+import os
+import sys
+import json
+import logging
+from datetime import datetime
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pymysql
+from app.config.config import Config
+from app.models.task import TaskResultItem
+
+# 需要添加的字段
+NEW_COLUMNS = [
+    ('is_compliant', "VARCHAR(20) NULL COMMENT '是否符合（isCompliant）' AFTER position"),
+    ('issue_location', "VARCHAR(255) NULL COMMENT '问题位置（issueLocation）' AFTER is_compliant"),
+    ('reference_standard', "VARCHAR(255) NULL COMMENT '引用标准（referenceStandard）' AFTER issue_location"),
+    ('search_text', "TEXT NULL COMMENT '全文检索内容（originalText + issueDescription）' AFTER reference_standard"),
+]
+
+# 需要添加的索引
+NEW_INDEXES = [
+    ('idx_task_result_items_result_compliant', "INDEX idx_task_result_items_result_compliant (result_id, is_compliant)"),
+    ('idx_task_result_items_result_location', "INDEX idx_task_result_items_result_location (result_id, issue_location)"),
+    ('idx_task_result_items_result_reference', "INDEX idx_task_result_items_result_reference (result_id, reference_standard)"),
+    ('ft_task_result_items_search_text', "FULLTEXT INDEX ft_task_result_items_search_text (search_text) WITH PARSER ngram"),
+]
+
+# 回填时每批处理的条目数
+BATCH_SIZE = 1000
+
+def setup_logger():
+    """设置日志记录器"""
+    logger = logging.getLogger('migration')
+    logger.setLevel(logging.INFO)
+
+    # 创建控制台处理器
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+
+    # 创建格式化器
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    console_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    return logger
+
+def connect_database():
+    """连接到MySQL数据库"""
+    try:
+        connection = pymysql.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USERNAME,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            charset='utf8mb4',
+            autocommit=False
+        )
+        return connection
+    except Exception as e:
+        raise Exception(f"数据库连接失败: {str(e)}")
+
+def get_existing_columns(cursor):
+    """获取条目表现有字段"""
+    cursor.execute("""
+    SELECT COLUMN_NAME
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    AND TABLE_NAME = 'task_result_items'
+    """, (Config.DB_NAME,))
+    return {row['COLUMN_NAME'] for row in cursor.fetchall()}
+
+def get_existing_indexes(cursor):
+    """获取条目表现有索引"""
+    cursor.execute("""
+    SELECT DISTINCT INDEX_NAME
+    FROM INFORMATION_SCHEMA.STATISTICS
+    WHERE TABLE_SCHEMA = %s
+    AND TABLE_NAME = 'task_result_items'
+    """, (Config.DB_NAME,))
+    return {row['INDEX_NAME'] for row in cursor.fetchall()}
+
+def add_columns_and_indexes(cursor):
+    """添加缺失的字段和索引"""
+    existing_columns = get_existing_columns(cursor)
+    if not existing_columns:
+        raise Exception("未找到 task_result_items 表，请先启动应用或执行 complete_database_setup.sql 创建表")
+
+    for column, definition in NEW_COLUMNS:
+        if column in existing_columns:
+            logger.info(f"字段 {column} 已存在，跳过")
+            continue
+        cursor.execute(f"ALTER TABLE task_result_items ADD COLUMN {column} {definition}")
+        logger.info(f"成功添加字段 {column}")
+
+    existing_indexes = get_existing_indexes(cursor)
+    for index_name, definition in NEW_INDEXES:
+        if index_name in existing_indexes:
+            logger.info(f"索引 {index_name} 已存在，跳过")
+            continue
+        cursor.execute(f"ALTER TABLE task_result_items ADD {definition}")
+        logger.info(f"成功添加索引 {index_name}")
+
+def backfill_columns(connection, cursor):
+    """从条目内容回填筛选字段，按批提交"""
+    total = 0
+    last_id = ''
+    while True:
+        cursor.execute("""
+        SELECT id, data FROM task_result_items
+        WHERE id > %s AND search_text IS NULL AND is_compliant IS NULL
+        AND issue_location IS NULL AND reference_standard IS NULL
+        ORDER BY id LIMIT %s
+        """, (last_id, BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for row in rows:
+            try:
+                item = json.loads(row['data'])
+            except (TypeError, ValueError):
+                continue
+            columns = TaskResultItem.extract_columns(item)
+            updates.append((
+                columns['is_compliant'],
+                columns['issue_location'],
+                columns['reference_standard'],
+                columns['search_text'],
+                row['id']
+            ))
+
+        if updates:
+            cursor.executemany("""
+            UPDATE task_result_items
+            SET is_compliant = %s, issue_location = %s, reference_standard = %s, search_text = %s
+            WHERE id = %s
+            """, updates)
+        connection.commit()
+
+        total += len(updates)
+        last_id = rows[-1]['id']
+        logger.info(f"已回填 {total} 条结果条目")
+
+    return total
+
+def main():
+    """主函数"""
+    global logger
+    logger = setup_logger()
+
+    logger.info("=" * 60)
+    logger.info("开始执行结果条目筛选字段迁移脚本")
+    logger.info(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("=" * 60)
+
+    connection = None
+    try:
+        # 连接数据库
+        logger.info("正在连接数据库...")
+        connection = connect_database()
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+
+        logger.info(f"成功连接到数据库: {Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}")
+
+        # DDL语句在MySQL中会隐式提交，字段和索引添加后再分批回填数据
+        add_columns_and_indexes(cursor)
+        total = backfill_columns(connection, cursor)
+
+        logger.info("=" * 60)
+        logger.info(f"结果条目筛选字段迁移脚本执行完成，共回填 {total} 条")
+        logger.info("=" * 60)
+        return True
+
+    except Exception as e:
+        if connection:
+            connection.rollback()
+            logger.error(f"发生错误，已回滚事务: {str(e)}")
+        else:
+            logger.error(f"执行失败: {str(e)}")
+        return False
+
+    finally:
+        if connection:
+            connection.close()
+            logger.info("数据库连接已关闭")
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：任务作业表添加最早可认领时间字段
+功能：为 task_jobs 添加 available_at 字段，目标Dify应用熔断时作业延迟重新入队而不是直接失败
+说明：历史作业该字段为空，表示立即可认领
+"""
+
+import os
+import sys
+import logging
+from datetime import datetime
+
+# 添加项目根目录到路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pymysql
+from app.config.config import Config
+
+# 需要添加的字段
+NEW_COLUMNS = [
+    ('available_at', "DATETIME NULL COMMENT '最早可认领时间（延迟重新入队，为空表示立即可认领）' AFTER last_error"),
+]
+
+def setup_logger():
+    """设置日志记录器"""
+    logger = logging.getLogger('migration')
+    logger.setLevel(logging.INFO)
+
+    # 创建控制台处理器
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(logging.INFO)
+
+    # 创建格式化器
+    formatter = logging.Formatter(
+        '%(asctime)s [%(levelname)s] %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    console_handler.setFormatter(formatter)
+
+    logger.addHandler(console_handler)
+    return logger
+
+def connect_database():
+    """连接到MySQL数据库"""
+    try:
+        connection = pymysql.connect(
+            host=Config.DB_HOST,
+            port=Config.DB_PORT,
+            user=Config.DB_USERNAME,
+            password=Config.DB_PASSWORD,
+            database=Config.DB_NAME,
+            charset='utf8mb4',
+            autocommit=False
+        )
+        return connection
+    except Exception as e:
+        raise Exception(f"数据库连接失败: {str(e)}")
+
+def column_exists(cursor, column_name):
+    """检查字段是否已存在"""
+    cursor.execute("""
+    SELECT COUNT(*) AS cnt
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = %s
+    AND TABLE_NAME = 'task_jobs'
+    AND COLUMN_NAME = %s
+    """, (Config.DB_NAME, column_name))
+    return cursor.fetchone()['cnt'] > 0
+
+def add_columns(cursor):
+    """添加缺失的字段"""
+    added = 0
+    for column_name, definition in NEW_COLUMNS:
+        if column_exists(cursor, column_name):
+            logger.info(f"字段 task_jobs.{column_name} 已存在，跳过")
+            continue
+        cursor.execute(f"ALTER TABLE task_jobs ADD COLUMN {column_name} {definition}")
+        logger.info(f"✓ 成功添加字段 task_jobs.{column_name}")
+        added += 1
+    return added
+
+def main():
+    """主函数"""
+    global logger
+    logger = setup_logger()
+
+    logger.info("=" * 60)
+    logger.info("开始执行任务作业延迟入队迁移脚本")
+    logger.info(f"执行时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info("=" * 60)
+
+    connection = None
+    try:
+        # 连接数据库
+        logger.info("正在连接数据库...")
+        connection = connect_database()
+        cursor = connection.cursor(pymysql.cursors.DictCursor)
+
+        logger.info(f"成功连接到数据库: {Config.DB_HOST}:{Config.DB_PORT}/{Config.DB_NAME}")
+
+        added = add_columns(cursor)
+
+        logger.info("=" * 60)
+        logger.info(f"任务作业延迟入队迁移脚本执行完成，新增字段 {added} 个")
+        logger.info("=" * 60)
+        return True
+
+    except Exception as e:
+        logger.error(f"执行失败: {str(e)}")
+        return False
+
+    finally:
+        if connection:
+            connection.close()
+            logger.info("数据库连接已关闭")
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+导出预处理性能基准脚本
+生成 1-5MB 的模拟任务结果（代码块包装、元数据块、标题、列表、表格），
+测量 Markdown 清理和 HTML 转换耗时；指定 --max-ms-per-mb 时超出上限返回非零退出码
+
+用法:
+    python scripts/benchmark_export_preprocessing.py
+    python scripts/benchmark_export_preprocessing.py --sizes 1 5 --repeat 5 --max-ms-per-mb 5000
+"""
+
+import os
+import sys
+import time
+import argparse
+import logging
+import statistics
+from flask import Flask
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app.services.document_service import DocumentService
+
+SECTION_TEMPLATE = """## {index}. 第{index}章 技术要求
+
+> **文档类型**：标准审查报告
+> **转换时间**：2024-01-01 12:00:00
+> **源格式**：PDF
+
+---
+
+本章对标准条款进行逐条审查，审查依据为 GB/T 1.1-2020《标准化工作导则》。
+条款 {index}.1 中的术语定义与引用标准不一致，建议统一表述。
+
+- 问题位置：第{index}.1条
+- 原文：产品应满足相关要求，具体指标见表{index}。
+- 修改建议：明确引用的标准编号和年代号。
+
+```python
+value = {index}
+```
+
+
+| 序号 | 项目名称 | 是否符合 | 参考标准 |
+| --- | --- | --- | --- |
+| {index} | 尺寸偏差 | 否 | GB/T 1804-2000 |
+| {index} | 表面质量 | 是 | GB/T 3505-2009 |
+
+"""
+
+
+def build_answer(size_mb):
+    """生成指定大小的模拟任务结果（外层使用```markdown代码块包装）"""
+    target = int(size_mb * 1024 * 1024)
+    sections = []
+    length = 0
+    index = 1
+    while length < target:
+        section = SECTION_TEMPLATE.format(index=index)
+        sections.append(section)
+        length += len(section.encode('utf-8'))
+        index += 1
+    return "```markdown\n" + ''.join(sections) + "\n```"
+
+
+def measure(func, repeat):
+    """多次执行并返回耗时中位数（毫秒）"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def run_benchmark(sizes, repeat, max_ms_per_mb=None):
+    """运行基准测试，返回是否在耗时上限内"""
+    print(f"{'大小':>6} | {'清理(ms)':>10} | {'转换HTML(ms)':>12} | {'合计(ms/MB)':>12}")
+    print('-' * 52)
+
+    within_limit = True
+    for size_mb in sizes:
+        answer = build_answer(size_mb)
+        clean_ms, cleaned = measure(lambda: DocumentService._clean_markdown_content(answer), repeat)
+        convert_ms, _ = measure(lambda: DocumentService._convert_markdown_to_html(cleaned), repeat)
+        per_mb = (clean_ms + convert_ms) / size_mb
+        print(f"{size_mb:>4}MB | {clean_ms:>10.1f} | {convert_ms:>12.1f} | {per_mb:>12.1f}")
+        if max_ms_per_mb and per_mb > max_ms_per_mb:
+            within_limit = False
+
+    if max_ms_per_mb:
+        print(f"\n{'✅ 在' if within_limit else '❌ 超出'}耗时上限内: {max_ms_per_mb}ms/MB")
+    return within_limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description='导出预处理性能基准')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 2, 5], help='任务结果大小（MB）')
+    parser.add_argument('--repeat', type=int, default=3, help='每项测量的重复次数（取中位数）')
+    parser.add_argument('--max-ms-per-mb', type=float, default=None, help='每MB耗时上限（毫秒），超出时返回非零退出码')
+    args = parser.parse_args()
+
+    # 使用独立的应用上下文，不连接数据库，也不输出清理过程的info日志
+    app = Flask(__name__)
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        DocumentService._convert_markdown_to_html("# 预热")
+        return run_benchmark(args.sizes, args.repeat, args.max_ms_per_mb)
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -80,7 +80,8 @@ CREATE TABLE IF NOT EXISTS tasks (
     INDEX idx_status (status) COMMENT '任务状态索引',
     INDEX idx_created_at (created_at) COMMENT '创建时间索引',
     INDEX idx_user_status (user_id, status) COMMENT '用户+状态复合索引',
-    INDEX idx_user_type (user_id, task_type) COMMENT '用户+类型复合索引'
+    INDEX idx_user_type (user_id, task_type) COMMENT '用户+类型复合索引',
+    INDEX idx_tasks_user_created_id (user_id, created_at, id) COMMENT '用户+创建时间+ID复合索引（游标分页）'
     
 ) ENGINE=InnoDB 
   DEFAULT CHARSET=utf8mb4 
@@ -103,10 +104,12 @@ CREATE TABLE IF NOT EXISTS task_files (
     file_size BIGINT NOT NULL COMMENT '文件大小（字节）',
     file_type VARCHAR(100) NOT NULL COMMENT '文件类型/MIME类型',
     file_extension VARCHAR(20) NULL COMMENT '文件扩展名',
+    content_hash VARCHAR(64) NULL COMMENT '文件内容SHA-256哈希',
     
     -- Dify相关信息
     dify_file_id VARCHAR(100) NULL COMMENT 'Dify返回的文件ID',
     dify_response_data TEXT NULL COMMENT 'Dify返回的完整信息（JSON格式）',
+    dify_key_fingerprint VARCHAR(64) NULL COMMENT '上传所用Dify应用密钥指纹',
     
     -- 状态信息
     upload_status ENUM('pending', 'uploading', 'uploaded', 'failed') 
@@ -126,7 +129,9 @@ CREATE TABLE IF NOT EXISTS task_files (
     INDEX idx_user_id (user_id) COMMENT '用户ID索引',
     INDEX idx_dify_file_id (dify_file_id) COMMENT 'Dify文件ID索引',
     INDEX idx_upload_status (upload_status) COMMENT '上传状态索引',
-    INDEX idx_created_at (created_at) COMMENT '创建时间索引'
+    INDEX idx_created_at (created_at) COMMENT '创建时间索引',
+    INDEX idx_task_files_hash_key (content_hash, dify_key_fingerprint) COMMENT '内容哈希+密钥指纹复合索引（复用Dify文件ID）',
+    INDEX idx_task_files_file_path (file_path) COMMENT '存储路径索引（共享文件引用检查）'
     
 ) ENGINE=InnoDB 
   DEFAULT CHARSET=utf8mb4 
@@ -221,6 +226,172 @@ CREATE TABLE IF NOT EXISTS conversations (
   COLLATE=utf8mb4_unicode_ci 
   COMMENT='对话表 - 存储与Dify的对话记录';
 
+-- =====================================================
+-- 6. 任务作业表 (task_jobs)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS task_jobs (
+    -- 主键字段
+    id VARCHAR(36) NOT NULL PRIMARY KEY COMMENT '作业唯一标识符',
+    task_id VARCHAR(36) NOT NULL COMMENT '任务ID',
+    user_id VARCHAR(36) NOT NULL COMMENT '用户ID',
+    task_type VARCHAR(50) NULL COMMENT '任务类型（用于按类型限制并发）',
+    
+    -- 转发给Dify的原始请求参数
+    request_data TEXT NULL COMMENT 'Dify请求参数（JSON格式）',
+    
+    -- 作业状态
+    status ENUM('queued', 'running', 'completed', 'failed') 
+           NOT NULL DEFAULT 'queued' COMMENT '作业状态',
+    attempts INT NOT NULL DEFAULT 0 COMMENT '已认领执行次数',
+    max_attempts INT NOT NULL DEFAULT 3 COMMENT '最大执行次数',
+    
+    -- 租约信息
+    lease_owner VARCHAR(100) NULL COMMENT '持有租约的工作进程标识',
+    lease_expires_at DATETIME NULL COMMENT '租约过期时间',
+    heartbeat_at DATETIME NULL COMMENT '最近心跳时间',
+    last_error TEXT NULL COMMENT '最近一次错误信息',
+    available_at DATETIME NULL COMMENT '最早可认领时间（延迟重新入队，为空表示立即可认领）',
+    
+    -- 时间字段
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    started_at DATETIME NULL COMMENT '最近一次开始执行时间',
+    finished_at DATETIME NULL COMMENT '结束时间',
+    
+    -- 外键约束
+    FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    
+    -- 索引
+    INDEX idx_task_id (task_id) COMMENT '任务ID索引',
+    INDEX idx_user_id (user_id) COMMENT '用户ID索引',
+    INDEX idx_task_type (task_type) COMMENT '任务类型索引',
+    INDEX idx_status (status) COMMENT '作业状态索引',
+    INDEX idx_lease_expires_at (lease_expires_at) COMMENT '租约过期时间索引',
+    INDEX idx_task_jobs_status_created (status, created_at) COMMENT '状态+创建时间复合索引（认领顺序）'
+    
+) ENGINE=InnoDB 
+  DEFAULT CHARSET=utf8mb4 
+  COLLATE=utf8mb4_unicode_ci 
+  COMMENT='任务作业表 - 标准处理请求的持久化队列';
+
+-- =====================================================
+-- 7. 任务结果条目表 (task_result_items)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS task_result_items (
+    -- 主键字段
+    id VARCHAR(36) NOT NULL PRIMARY KEY COMMENT '条目唯一标识符',
+    result_id VARCHAR(36) NOT NULL COMMENT '任务结果ID',
+    task_id VARCHAR(36) NOT NULL COMMENT '任务ID',
+    
+    -- 排序字段
+    sn INT NULL COMMENT '条目序号',
+    position INT NOT NULL COMMENT '条目在原始结果中的位置',
+    
+    -- 筛选字段
+    is_compliant VARCHAR(20) NULL COMMENT '是否符合（isCompliant）',
+    issue_location VARCHAR(255) NULL COMMENT '问题位置（issueLocation）',
+    reference_standard VARCHAR(255) NULL COMMENT '引用标准（referenceStandard）',
+    search_text TEXT NULL COMMENT '全文检索内容（originalText + issueDescription）',
+    
+    -- 条目完整内容
+    data LONGTEXT NOT NULL COMMENT '条目内容（JSON格式）',
+    
+    -- 时间字段
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    
+    -- 外键约束
+    FOREIGN KEY (result_id) REFERENCES task_results(id) ON DELETE CASCADE,
+    FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
+    
+    -- 索引
+    INDEX idx_task_id (task_id) COMMENT '任务ID索引',
+    INDEX idx_task_result_items_result_sn (result_id, sn, position) COMMENT '结果+序号复合索引（分页排序）',
+    UNIQUE KEY uq_task_result_items_result_position (result_id, position) COMMENT '结果+位置唯一索引（原始顺序，防止重复拆分）',
+    INDEX idx_task_result_items_result_compliant (result_id, is_compliant) COMMENT '结果+是否符合复合索引',
+    INDEX idx_task_result_items_result_location (result_id, issue_location) COMMENT '结果+问题位置复合索引',
+    INDEX idx_task_result_items_result_reference (result_id, reference_standard) COMMENT '结果+引用标准复合索引',
+    FULLTEXT INDEX ft_task_result_items_search_text (search_text) WITH PARSER ngram COMMENT '原文和问题描述全文索引（ngram中文分词）'
+    
+) ENGINE=InnoDB 
+  DEFAULT CHARSET=utf8mb4 
+  COLLATE=utf8mb4_unicode_ci 
+  COMMENT='任务结果条目表 - 分页类任务结果的逐条存储';
+
+-- =====================================================
+-- 8. 用户任务计数表 (user_task_counters)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS user_task_counters (
+    -- 主键字段
+    user_id VARCHAR(36) NOT NULL PRIMARY KEY COMMENT '用户ID',
+    total_count INT NOT NULL DEFAULT 0 COMMENT '任务总数',
+    
+    -- 按状态计数
+    pending_count INT NOT NULL DEFAULT 0 COMMENT '待处理任务数',
+    uploading_count INT NOT NULL DEFAULT 0 COMMENT '上传中任务数',
+    uploaded_count INT NOT NULL DEFAULT 0 COMMENT '上传完成任务数',
+    processing_count INT NOT NULL DEFAULT 0 COMMENT '处理中任务数',
+    completed_count INT NOT NULL DEFAULT 0 COMMENT '已完成任务数',
+    failed_count INT NOT NULL DEFAULT 0 COMMENT '失败任务数',
+    
+    -- 按类型计数
+    standard_interpretation_count INT NOT NULL DEFAULT 0 COMMENT '标准解读任务数',
+    standard_recommendation_count INT NOT NULL DEFAULT 0 COMMENT '标准推荐任务数',
+    standard_comparison_count INT NOT NULL DEFAULT 0 COMMENT '标准对比任务数',
+    standard_international_count INT NOT NULL DEFAULT 0 COMMENT '标准国际化辅助任务数',
+    standard_compliance_count INT NOT NULL DEFAULT 0 COMMENT '标准符合性检查任务数',
+    standard_review_count INT NOT NULL DEFAULT 0 COMMENT '标准审查任务数',
+    
+    -- 时间字段
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+    reconciled_at DATETIME NULL COMMENT '最近一次与任务表核对的时间',
+    
+    -- 外键约束
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    
+    -- 索引
+    INDEX idx_reconciled_at (reconciled_at) COMMENT '核对时间索引'
+    
+) ENGINE=InnoDB 
+  DEFAULT CHARSET=utf8mb4 
+  COLLATE=utf8mb4_unicode_ci 
+  COMMENT='用户任务计数表 - 仪表板按状态/类型的任务数量';
+
+-- =====================================================
+-- 9. 异步导出任务表 (export_jobs)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS export_jobs (
+    -- 主键字段
+    id VARCHAR(36) NOT NULL PRIMARY KEY COMMENT '导出任务ID',
+    user_id VARCHAR(36) NOT NULL COMMENT '用户ID',
+    task_id VARCHAR(36) NOT NULL COMMENT '任务ID',
+    result_id VARCHAR(36) NOT NULL COMMENT '任务结果ID',
+    format VARCHAR(30) NOT NULL COMMENT '导出格式',
+    
+    -- 导出状态
+    status ENUM('queued', 'running', 'completed', 'failed') 
+           NOT NULL DEFAULT 'queued' COMMENT '导出状态',
+    error TEXT NULL COMMENT '错误信息',
+    file_path VARCHAR(500) NULL COMMENT '导出文件路径（导出缓存中）',
+    owner VARCHAR(100) NULL COMMENT '负责渲染的工作进程标识',
+    
+    -- 时间字段
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    finished_at DATETIME NULL COMMENT '结束时间',
+    
+    -- 外键约束
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    
+    -- 索引
+    INDEX idx_status (status) COMMENT '导出状态索引',
+    INDEX idx_finished_at (finished_at) COMMENT '结束时间索引（清理过期任务）',
+    INDEX idx_export_jobs_user_status (user_id, status) COMMENT '用户+状态复合索引（并发上限）'
+    
+) ENGINE=InnoDB 
+  DEFAULT CHARSET=utf8mb4 
+  COLLATE=utf8mb4_unicode_ci 
+  COMMENT='异步导出任务表 - 多工作进程共享的导出任务状态';
+
 -- =====================================================
 -- 重新启用外键检查
 -- =====================================================
@@ -239,6 +410,10 @@ DESCRIBE tasks;
 DESCRIBE task_files;
 DESCRIBE task_results;
 DESCRIBE conversations;
+DESCRIBE task_jobs;
+DESCRIBE task_result_items;
+DESCRIBE user_task_counters;
+DESCRIBE export_jobs;
 
 -- 查看外键关系
 SELECT 
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+用户任务计数核对脚本
+按任务表重新统计每个用户的状态/类型任务数，修正 user_task_counters 中的偏差（首次部署时也用于初始化计数）
+"""
+
+import os
+import sys
+import logging
+
+# 添加项目根目录到Python路径
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from app import create_app, db
+from app.models.task import UserTaskCounter
+
+def setup_logging():
+    """设置日志"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    return logging.getLogger(__name__)
+
+def reconcile_task_counters():
+    """核对所有用户的任务计数"""
+    logger = setup_logging()
+    
+    try:
+        # 创建Flask应用
+        app = create_app()
+        
+        with app.app_context():
+            # 确保计数表存在
+            db.create_all()
+            
+            logger.info("开始核对用户任务计数...")
+            result = UserTaskCounter.reconcile_all()
+            logger.info(f"✅ 核对完成 - 用户数: {result['users']} - 修正: {result['corrected']}")
+            return True
+            
+    except Exception as e:
+        logger.error(f"❌ 核对用户任务计数失败: {str(e)}")
+        return False
+
+if __name__ == '__main__':
+    success = reconcile_task_counters()
+    sys.exit(0 if success else 1)
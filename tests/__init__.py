@@ -1 +1,7 @@
-# 测试模块 
\ No newline at end of file
+# 测试模块
+import os
+import tempfile
+
+# 测试不使用 .env 中的数据目录，也不写日志文件，避免在仓库目录下留下运行数据（load_dotenv 不覆盖已设置的环境变量）
+os.environ.setdefault('DATA_ROOT_DIR', os.path.join(tempfile.gettempdir(), 'dify_python_tests'))
+os.environ.setdefault('LOG_TO_FILE', 'False')
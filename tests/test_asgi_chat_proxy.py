@@ -0,0 +1,157 @@
+import unittest
+import json
+import time
+import asyncio
+import httpx
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.asgi import create_asgi_app, ThreadPoolWsgiToAsgi
+from app.services.dify_app_service import DifyAppService
+from app.services.dify_async_client import DifyAsyncClient
+from app.services.dify_client import DifyClient
+from app.utils.sse import ChatStreamMetrics
+
+SSE_EVENTS = [b'data: {"event": "message", "answer": "a"}\n\n', b'data: {"event": "message_end"}\n\n']
+
+class AsgiChatProxyTestCase(unittest.TestCase):
+    """ASGI聊天异步流式代理测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.application = create_asgi_app(self.app)
+        self.upstream_requests = []
+
+        with self.app.app_context():
+            db.create_all()
+            user = User(email='proxy@example.com', username='proxy')
+            user.password = 'password123'
+            db.session.add(user)
+            db.session.commit()
+            self.token = create_access_token(identity=user.id)
+            self.chat_url = DifyAppService.get_app_config('multilingual_qa', 'chat')['api_url']
+
+    def tearDown(self):
+        """测试后清理"""
+        asyncio.run(DifyAsyncClient.close())
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _upstream(self, request):
+        self.upstream_requests.append(json.loads(request.content))
+        if request.url.path.endswith('/stop'):
+            return httpx.Response(200, json={'result': 'success'})
+        if json.loads(request.content).get('query') == 'slow':
+            return httpx.Response(200, headers={'content-type': 'text/event-stream'}, content=self._slow_events())
+        if json.loads(request.content).get('query') == 'fail':
+            return httpx.Response(400, json={'code': 'invalid_param'})
+        return httpx.Response(200, headers={'content-type': 'text/event-stream'}, stream=httpx.ByteStream(b''.join(SSE_EVENTS)))
+
+    async def _slow_events(self):
+        for index in range(50):
+            yield f'data: {{"event": "message", "task_id": "task-9", "answer": "{index}"}}\n\n'.encode()
+            await asyncio.sleep(0.05)
+
+    async def _mock_upstream(self):
+        """用模拟传输替换到Dify的异步连接"""
+        host_key = DifyClient._host_key(self.chat_url)
+        await DifyAsyncClient.get_client(self.chat_url).aclose()
+        DifyAsyncClient._clients[host_key] = httpx.AsyncClient(transport=httpx.MockTransport(self._upstream))
+
+    def _post(self, path, payload, token=None):
+        async def run():
+            await self._mock_upstream()
+            headers = {'Authorization': f'Bearer {token}'} if token else {}
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.application), base_url='http://test') as client:
+                return await client.post(path, json=payload, headers=headers)
+        return asyncio.run(run())
+
+    def test_stream_relayed(self):
+        """测试聊天SSE流经异步代理原样转发"""
+        response = self._post('/api/dify/v2/multilingual_qa/chat-simple', {'query': 'hi'}, self.token)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/event-stream'))
+        self.assertEqual(response.content, b''.join(SSE_EVENTS))
+        self.assertEqual(self.upstream_requests, [{'query': 'hi'}])
+
+        # 兼容路由转发到 multilingual_qa
+        self.assertEqual(self._post('/api/dify/v2/chat-simple', {'query': 'hi'}, self.token).status_code, 200)
+
+    def test_disconnect_stops_generation(self):
+        """测试客户端断开后关闭上游流，并用流中的 task_id 调用停止生成接口"""
+        ChatStreamMetrics.reset()
+        body = json.dumps({'query': 'slow', 'user': 'user-1'}).encode()
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/api/dify/v2/multilingual_qa/chat-simple', 'query_string': b'',
+            'headers': [(b'content-type', b'application/json'), (b'authorization', f'Bearer {self.token}'.encode())]
+        }
+
+        async def run():
+            await self._mock_upstream()
+            disconnected = asyncio.Event()
+            messages = []
+            requests = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+            async def receive():
+                if requests:
+                    return requests.pop()
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                # 收到两个事件后断开
+                if len([m for m in messages if m.get('body')]) == 2:
+                    disconnected.set()
+
+            await self.application(scope, receive, send)
+            await asyncio.sleep(0.1)
+            return messages
+
+        messages = asyncio.run(run())
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertLess(len(messages), 10)
+        self.assertEqual(self.upstream_requests[-1], {'user': 'user-1'})
+
+        stats = ChatStreamMetrics.get_stats()['multilingual_qa']
+        self.assertEqual(stats['by_status'], {'cancelled': 1})
+        self.assertEqual((stats['stop_requests'], stats['stop_failures']), (1, 0))
+
+    def test_errors_match_wsgi_route(self):
+        """测试未授权、场景无效和Dify返回错误时的响应与同步接口一致"""
+        response = self._post('/api/dify/v2/multilingual_qa/chat-simple', {'query': 'hi'})
+        self.assertEqual(response.status_code, 401)
+
+        response = self._post('/api/dify/v2/unknown/chat-simple', {'query': 'hi'}, self.token)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('valid_scenarios', response.json())
+
+        response = self._post('/api/dify/v2/multilingual_qa/chat-simple', {'query': 'fail'}, self.token)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details'], {'code': 'invalid_param'})
+        self.assertEqual(self.upstream_requests, [{'query': 'fail'}])
+
+    def test_wsgi_requests_run_concurrently(self):
+        """测试非聊天请求在线程池中并发执行，慢请求之间不互相阻塞"""
+        def slow_app(environ, start_response):
+            time.sleep(0.5)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [environ['PATH_INFO'].encode()]
+
+        application = ThreadPoolWsgiToAsgi(slow_app, 4)
+
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url='http://test') as client:
+                return await asyncio.gather(client.get('/a'), client.get('/b'))
+
+        start = time.time()
+        responses = asyncio.run(run())
+        application.shutdown()
+        self.assertLess(time.time() - start, 0.9)
+        self.assertEqual([response.text for response in responses], ['/a', '/b'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import io
+import os
+import hashlib
+import threading
+from unittest import mock
+from app import create_app
+from app.config.config import Config
+from app.services.file_service import FileService
+from app.services.chunked_upload_service import ChunkedUploadService, UploadOffsetMismatchError, UploadSessionNotFoundError, UploadInProgressError
+
+class ChunkedUploadTestCase(unittest.TestCase):
+    """分片断点续传测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.original_chunk_size = Config.CHUNKED_UPLOAD_CHUNK_SIZE
+        Config.CHUNKED_UPLOAD_CHUNK_SIZE = 1024
+
+    def tearDown(self):
+        """测试后清理"""
+        Config.CHUNKED_UPLOAD_CHUNK_SIZE = self.original_chunk_size
+        self.ctx.pop()
+
+    def test_resume_from_received_offset(self):
+        """测试按偏移量续传，偏移量不一致时返回服务端已接收的字节数，完成后文件内容一致"""
+        payload = os.urandom(2500)
+        upload_id = ChunkedUploadService.create_upload('user-1', '标准.pdf', len(payload))['upload_id']
+
+        status = ChunkedUploadService.write_chunk(upload_id, 'user-1', 0, io.BytesIO(payload[:1024]))
+        self.assertEqual(status['offset'], 1024)
+
+        # 重复发送已接收的分片
+        with self.assertRaises(UploadOffsetMismatchError) as ctx:
+            ChunkedUploadService.write_chunk(upload_id, 'user-1', 0, io.BytesIO(payload[:1024]))
+        self.assertEqual(ctx.exception.offset, 1024)
+
+        # 超过单个分片上限的请求不写入任何内容
+        with self.assertRaises(ValueError):
+            ChunkedUploadService.write_chunk(upload_id, 'user-1', 1024, io.BytesIO(payload[1024:]))
+        self.assertEqual(ChunkedUploadService.get_status(upload_id, 'user-1')['offset'], 1024)
+
+        with self.assertRaises(UploadOffsetMismatchError):
+            ChunkedUploadService.complete_upload(upload_id, 'user-1')
+
+        ChunkedUploadService.write_chunk(upload_id, 'user-1', 1024, io.BytesIO(payload[1024:2048]))
+        status = ChunkedUploadService.write_chunk(upload_id, 'user-1', 2048, io.BytesIO(payload[2048:]))
+        self.assertTrue(status['complete'])
+
+        file_info = ChunkedUploadService.complete_upload(upload_id, 'user-1')
+        self.assertEqual(file_info['content_hash'], hashlib.sha256(payload).hexdigest())
+        with open(file_info['file_path'], 'rb') as f:
+            self.assertEqual(f.read(), payload)
+
+        with self.assertRaises(UploadSessionNotFoundError):
+            ChunkedUploadService.get_status(upload_id, 'user-1')
+
+    def test_concurrent_chunk_rejected_while_writing(self):
+        """测试同一会话正在写入分片时，其他写入和完成请求直接失败，不会交错写入"""
+        payload = os.urandom(1024)
+        upload_id = ChunkedUploadService.create_upload('user-1', 'a.pdf', len(payload))['upload_id']
+        reading = threading.Event()
+        release = threading.Event()
+
+        class SlowStream:
+            """读到一半时阻塞，模拟仍在传输的分片"""
+
+            def __init__(self):
+                self.chunks = [payload[:512], payload[512:]]
+
+            def read(self, size=-1):
+                if len(self.chunks) == 1:
+                    reading.set()
+                    release.wait(5)
+                return self.chunks.pop(0) if self.chunks else b''
+
+        results = []
+
+        def write_slowly():
+            with self.app.app_context():
+                results.append(ChunkedUploadService.write_chunk(upload_id, 'user-1', 0, SlowStream()))
+
+        writer = threading.Thread(target=write_slowly)
+        writer.start()
+        self.assertTrue(reading.wait(5))
+
+        # 偏移量检查和写入在锁内进行，后到的请求即使偏移量相同也不能写入
+        with self.assertRaises(UploadInProgressError):
+            ChunkedUploadService.write_chunk(upload_id, 'user-1', 0, io.BytesIO(b'x' * 1024))
+        with self.assertRaises(UploadInProgressError):
+            ChunkedUploadService.complete_upload(upload_id, 'user-1')
+
+        release.set()
+        writer.join(5)
+        self.assertTrue(results[0]['complete'])
+        with self.assertRaises(UploadOffsetMismatchError):
+            ChunkedUploadService.write_chunk(upload_id, 'user-1', 0, io.BytesIO(b'x' * 1024))
+
+        file_info = ChunkedUploadService.complete_upload(upload_id, 'user-1')
+        self.assertEqual(file_info['content_hash'], hashlib.sha256(payload).hexdigest())
+
+    def test_concurrent_complete(self):
+        """测试同一会话并发完成时只有一个请求移动文件，其余按会话不存在处理；保存失败时可以重试"""
+        payload = os.urandom(1000)
+        upload_id = ChunkedUploadService.create_upload('user-1', 'a.pdf', len(payload))['upload_id']
+        ChunkedUploadService.write_chunk(upload_id, 'user-1', 0, io.BytesIO(payload))
+
+        with mock.patch('app.services.chunked_upload_service.FileService.save_local_file', return_value=(False, None, '磁盘已满')):
+            with self.assertRaises(ValueError):
+                ChunkedUploadService.complete_upload(upload_id, 'user-1')
+        self.assertTrue(ChunkedUploadService.get_status(upload_id, 'user-1')['complete'])
+
+        saving = threading.Event()
+        release = threading.Event()
+        save_local_file = FileService.save_local_file
+
+        def slow_save(*args):
+            saving.set()
+            release.wait(5)
+            return save_local_file(*args)
+
+        results = []
+
+        def complete():
+            with self.app.app_context():
+                results.append(ChunkedUploadService.complete_upload(upload_id, 'user-1'))
+
+        with mock.patch('app.services.chunked_upload_service.FileService.save_local_file', side_effect=slow_save):
+            winner = threading.Thread(target=complete)
+            winner.start()
+            self.assertTrue(saving.wait(5))
+            with self.assertRaises(UploadSessionNotFoundError):
+                ChunkedUploadService.complete_upload(upload_id, 'user-1')
+            release.set()
+            winner.join(5)
+
+        self.assertEqual(results[0]['content_hash'], hashlib.sha256(payload).hexdigest())
+        with self.assertRaises(UploadSessionNotFoundError):
+            ChunkedUploadService.complete_upload(upload_id, 'user-1')
+
+    def test_session_scoped_to_user(self):
+        """测试上传会话只能由创建者访问"""
+        upload_id = ChunkedUploadService.create_upload('user-1', 'a.pdf', 10)['upload_id']
+
+        with self.assertRaises(UploadSessionNotFoundError):
+            ChunkedUploadService.get_status(upload_id, 'user-2')
+        with self.assertRaises(UploadSessionNotFoundError):
+            ChunkedUploadService.get_status('../' + upload_id, 'user-1')
+
+        ChunkedUploadService.abort_upload(upload_id, 'user-1')
+
+if __name__ == '__main__':
+    unittest.main()
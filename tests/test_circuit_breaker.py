@@ -0,0 +1,240 @@
+import io
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import requests
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models.task import TaskJob
+from app.services.task_job_service import TaskJobService
+from app.services.dify_client import DifyClient, DifyCircuitOpenError
+from app.utils.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+URL = 'http://dify.test/v1/workflows/run'
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b'{}')
+    return response
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    """读取请求后等待一段时间再响应，模拟阻塞式工作流"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(0.5)
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    """Dify熔断器测试用例"""
+
+    def setUp(self):
+        """测试前准备：每个用例使用新的会话和熔断器"""
+        DifyClient._pid = None
+        DifyClient._retries = None
+        self.session = DifyClient.get_session(URL)
+        self.addCleanup(mock.patch.stopall)
+
+    def test_opens_on_failure_rate_and_recovers(self):
+        """测试失败率达到阈值后打开，超过打开时长后放行一个探测请求，探测成功后恢复"""
+        breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window_seconds=60, open_seconds=0.1, half_open_probes=1)
+        for success in (True, False, True):
+            self.assertTrue(breaker.allow())
+            breaker.record(success)
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.allow()
+        breaker.record(False)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.15)
+        probe = breaker.allow()
+        self.assertTrue(probe)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record(False, probe)
+        self.assertEqual(breaker.state, OPEN)
+
+        time.sleep(0.15)
+        probe = breaker.allow()
+        self.assertTrue(probe)
+        breaker.record(True, probe)
+        snapshot = breaker.snapshot()
+        self.assertEqual((snapshot['state'], snapshot['calls'], snapshot['times_opened']), (CLOSED, 0, 2))
+        self.assertEqual(snapshot['rejected'], 2)
+
+    def _half_open_breaker(self, half_open_probes=1):
+        breaker = CircuitBreaker(failure_rate=0.5, min_calls=1, window_seconds=60, open_seconds=0.05, half_open_probes=half_open_probes)
+        breaker.allow()
+        breaker.record(False)
+        time.sleep(0.1)
+        return breaker
+
+    def test_probe_failing_after_connect_timeout_reopens(self):
+        """测试探测调用在连接超时之后才失败时熔断不会提前恢复，失败后重新打开"""
+        breaker = self._half_open_breaker()
+        probe = breaker.allow()
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        # 超过连接超时后到达的请求仍被拒绝，探测未建立连接前不视为成功
+        time.sleep(0.1)
+        self.assertFalse(breaker.allow())
+        breaker.record(False, probe)
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.times_opened, 2)
+
+    def test_long_probe_succeeds_once_connected(self):
+        """测试长时间运行的探测调用建立连接即视为成功，不在整个执行期间占用探测名额"""
+        breaker = self._half_open_breaker()
+        probe = breaker.allow()
+        breaker.connected(True)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        breaker.connected(probe)
+        self.assertEqual(breaker.state, CLOSED)
+        self.assertTrue(breaker.allow())
+        # 探测调用最终结束时作为正常调用记录结果
+        breaker.record(True, probe)
+        self.assertEqual(breaker.snapshot()['calls'], 1)
+
+    def test_probe_releases_own_slot(self):
+        """测试探测调用只归还自己的名额，半开期间其他调用的结果不影响状态"""
+        breaker = self._half_open_breaker(half_open_probes=2)
+        first, second = breaker.allow(), breaker.allow()
+        self.assertFalse(breaker.allow())
+
+        breaker.record(None, second)
+        third = breaker.allow()
+        self.assertTrue(third)
+        self.assertFalse(breaker.allow())
+
+        # 熔断前放行的调用在半开期间结束
+        breaker.record(True)
+        breaker.record(False)
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        breaker.record(False, first)
+        self.assertEqual(breaker.state, OPEN)
+        # 重新打开后其余探测的结果不再改变状态
+        breaker.record(True, third)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_client_fails_fast_per_circuit(self):
+        """测试熔断打开后同一（任务类型, 主机）直接失败不发请求，其他任务类型不受影响"""
+        with mock.patch('app.services.dify_client.Config.DIFY_CIRCUIT_MIN_CALLS', 2), \
+                mock.patch.object(self.session, 'request', side_effect=requests.ConnectTimeout('down')) as request:
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectTimeout):
+                    DifyClient.post(URL, api_type='task_stream', circuit='standard_query', timeout=1)
+            calls = request.call_count
+
+            with self.assertRaises(DifyCircuitOpenError) as context:
+                DifyClient.post(URL, api_type='task_stream', circuit='standard_query')
+            self.assertEqual(request.call_count, calls)
+            self.assertIn('standard_query', str(context.exception))
+
+            with self.assertRaises(requests.ConnectTimeout):
+                DifyClient.post(URL, api_type='task_stream', circuit='translation')
+            self.assertGreater(request.call_count, calls)
+
+        # 4xx 视为上游正常，不计入失败
+        with mock.patch.object(self.session, 'request', return_value=make_response(400)):
+            self.assertEqual(DifyClient.post(URL, api_type='task_stream', circuit='translation').status_code, 400)
+
+        states = {state['circuit']: state for state in DifyClient.get_circuit_states()}
+        self.assertEqual(states['standard_query']['state'], OPEN)
+        self.assertEqual(states['translation']['state'], CLOSED)
+        self.assertEqual(states['standard_query']['host'], 'http://dify.test')
+
+    def _open_breaker(self, url, circuit):
+        with mock.patch('app.services.dify_client.Config.DIFY_CIRCUIT_MIN_CALLS', 1), \
+                mock.patch('app.services.dify_client.Config.DIFY_CIRCUIT_OPEN_SECONDS', 0.05):
+            breaker = DifyClient.get_breaker(circuit, url)
+        breaker.allow()
+        breaker.record(False)
+        time.sleep(0.1)
+        return breaker
+
+    def test_client_probe_fails_after_connect_timeout(self):
+        """测试上游不可达时探测请求在连接超时之后才失败，期间到达的请求被拒绝，探测失败后重新打开"""
+        breaker = self._open_breaker(URL, 'standard_review')
+
+        def blackholed(*args, **kwargs):
+            time.sleep(0.2)
+            raise requests.ConnectTimeout('timed out')
+
+        with mock.patch.object(self.session, 'request', side_effect=blackholed):
+            probe = threading.Thread(target=self.assertRaises, args=(requests.ConnectTimeout, DifyClient.post, URL),
+                                     kwargs={'api_type': 'task_blocking', 'circuit': 'standard_review', 'timeout': (0.1, 10)})
+            probe.start()
+            time.sleep(0.15)
+            with self.assertRaises(DifyCircuitOpenError):
+                DifyClient.post(URL, api_type='task_blocking', circuit='standard_review')
+            probe.join()
+        self.assertEqual((breaker.state, breaker.times_opened), (OPEN, 2))
+
+    def test_client_probe_connected_closes_breaker(self):
+        """测试探测请求使用新建的连接，连接建立后即恢复，不必等待阻塞请求返回"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _SlowHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}/v1/workflows/run'
+
+        # 先建立一个空闲连接留在连接池中
+        self.assertEqual(DifyClient.post(url, api_type='task_blocking').status_code, 200)
+        breaker = self._open_breaker(url, 'standard_review')
+
+        probe = threading.Thread(target=DifyClient.post, args=(url,), kwargs={'api_type': 'task_blocking', 'circuit': 'standard_review'})
+        probe.start()
+        time.sleep(0.25)
+        self.assertEqual(breaker.state, CLOSED)
+        probe.join()
+        self.assertEqual(DifyClient.get_stats()['hosts'][f'http://127.0.0.1:{server.server_port}']['connections_created'], 2)
+
+class CircuitOpenJobTestCase(unittest.TestCase):
+    """熔断中的作业延迟重新入队测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_deferred_job_not_claimed_until_available(self):
+        """测试延迟的作业回到排队状态且不计入执行次数，到期前不会被认领"""
+        job = TaskJobService.enqueue('task-1', 1, 'standard_query', {'inputs': {}})
+        claimed = TaskJobService.claim_next('worker-a')
+        self.assertEqual((claimed.id, claimed.attempts), (job.id, 1))
+
+        self.assertEqual(TaskJobService.defer(job.id, 'worker-a', 30, DifyCircuitOpenError('standard_query', 'http://dify.test', 30)), 1)
+        db.session.expire_all()
+        deferred = TaskJob.find_by_id(job.id)
+        self.assertEqual((deferred.status, deferred.attempts, deferred.lease_owner), ('queued', 0, None))
+        self.assertIsNone(TaskJobService.claim_next('worker-b'))
+
+        deferred.available_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        self.assertEqual(TaskJobService.claim_next('worker-b').id, job.id)
+
+if __name__ == '__main__':
+    unittest.main()
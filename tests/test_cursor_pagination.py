@@ -0,0 +1,90 @@
+import base64
+import unittest
+from datetime import datetime, timedelta
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.task import Task
+from app.utils.cursor_pagination import InvalidCursorError, keyset_paginate
+
+class CursorPaginationTestCase(unittest.TestCase):
+    """键集（游标）分页测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='cursor@example.com', username='cursor')
+        user.password = 'Password123'
+        user.save()
+        self.user_id = user.id
+        self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+        # 前5个任务创建时间相同，翻页时依靠ID区分先后
+        same_time = datetime(2024, 1, 1, 12, 0, 0)
+        created = [same_time] * 5 + [same_time - timedelta(minutes=1), same_time + timedelta(minutes=1)]
+        for index, created_at in enumerate(created):
+            Task(user_id=self.user_id, task_type='standard_review', title=f'任务{index}', created_at=created_at).save()
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _query(self):
+        return Task.query.filter_by(user_id=self.user_id)
+
+    def test_pages_cover_ties_without_duplicates(self):
+        """测试创建时间相同的记录跨页时不重复、不遗漏，顺序与整体排序一致"""
+        expected = [task.id for task in self._query().order_by(Task.created_at.desc(), Task.id.desc()).all()]
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            page = keyset_paginate(self._query(), Task.created_at, Task.id, cursor=cursor, per_page=2)
+            seen.extend(task.id for task in page.items)
+            pages += 1
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 4)
+
+        # 最后一页恰好取满时不返回下一页游标
+        page = keyset_paginate(self._query(), Task.created_at, Task.id, per_page=7)
+        self.assertEqual((len(page.items), page.next_cursor), (7, None))
+
+    def test_invalid_cursor_rejected(self):
+        """测试无法解析的游标抛出 InvalidCursorError，接口返回400"""
+        # 非base64、缺少分隔符、时间格式错误
+        for cursor in ('not a cursor!', base64.urlsafe_b64encode(b'2024-01-01').decode(), base64.urlsafe_b64encode(b'yesterday|id').decode()):
+            with self.assertRaises(InvalidCursorError):
+                keyset_paginate(self._query(), Task.created_at, Task.id, cursor=cursor)
+
+        response = self.client.get('/api/tasks?cursor=not-a-cursor!', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_total_only_when_requested(self):
+        """测试 with_total 时每页返回总数（不受游标影响），否则不统计总数"""
+        first = keyset_paginate(self._query(), Task.created_at, Task.id, per_page=3, with_total=True)
+        second = keyset_paginate(self._query(), Task.created_at, Task.id, cursor=first.next_cursor, per_page=3, with_total=True)
+        self.assertEqual((first.total, second.total), (7, 7))
+        self.assertEqual(first.to_dict()['total'], 7)
+
+        page = keyset_paginate(self._query(), Task.created_at, Task.id, per_page=3)
+        self.assertIsNone(page.total)
+        self.assertNotIn('total', page.to_dict())
+
+        pagination = self.client.get('/api/tasks?cursor=&per_page=3&include_total=true', headers=self.headers).get_json()['data']['pagination']
+        self.assertEqual((pagination['mode'], pagination['total'], pagination['has_next']), ('cursor', 7, True))
+
+if __name__ == '__main__':
+    unittest.main()
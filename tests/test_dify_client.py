@@ -0,0 +1,86 @@
+import io
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import requests
+from app.services.dify_client import DifyClient
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """支持keep-alive的本地HTTP服务"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{"data": []}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def make_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b'{}')
+    return response
+
+class DifyClientTestCase(unittest.TestCase):
+    """Dify HTTP客户端连接池会话测试用例"""
+
+    def setUp(self):
+        """测试前准备：每个用例使用新的会话、超时和连接池配置"""
+        DifyClient._pid = None
+        DifyClient._timeouts = None
+        DifyClient._pool_sizes = None
+        self.addCleanup(setattr, DifyClient, '_timeouts', None)
+        self.addCleanup(setattr, DifyClient, '_pool_sizes', None)
+
+    def test_session_shared_per_host(self):
+        """测试同一主机共享会话（不区分路径和大小写），不同主机使用各自的会话和连接池大小，fork后重建"""
+        with mock.patch('app.services.dify_client.Config.DIFY_HTTP_POOL_SIZES', 'other.test=5'):
+            session = DifyClient.get_session('http://dify.test/v1/chat-messages')
+            self.assertIs(DifyClient.get_session('http://DIFY.test/v1/files/upload'), session)
+
+            other = DifyClient.get_session('http://other.test/v1/chat-messages')
+            self.assertIsNot(other, session)
+            self.assertEqual(other.get_adapter('http://other.test/')._pool_maxsize, 5)
+
+        # 模拟进程fork：子进程不复用父进程的会话
+        DifyClient._pid = -1
+        self.assertIsNot(DifyClient.get_session('http://dify.test/v1/chat-messages'), session)
+
+    def test_connections_reused_across_requests(self):
+        """测试多次请求同一主机只建立一个连接"""
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_port}/v1/messages'
+
+        for _ in range(3):
+            self.assertEqual(DifyClient.get(url, api_type='messages').status_code, 200)
+
+        stats = DifyClient.get_stats()['hosts'][f'http://127.0.0.1:{server.server_port}']
+        self.assertEqual((stats['requests'], stats['connections_created']), (3, 1))
+        self.assertGreater(stats['connection_reuse_ratio'], 0.6)
+
+    def test_timeout_per_api_type(self):
+        """测试按API类型使用超时配置，DIFY_HTTP_TIMEOUTS 可覆盖，显式超时优先"""
+        with mock.patch('app.services.dify_client.Config.DIFY_HTTP_TIMEOUTS', 'chat=5/300, file_upload=20, bad=x'):
+            self.assertEqual(DifyClient.get_timeout('chat'), (5.0, 300.0))
+            self.assertEqual(DifyClient.get_timeout('file_upload'), 20.0)
+            self.assertEqual(DifyClient.get_timeout('task_direct'), DifyClient.DEFAULT_TIMEOUTS['task_direct'])
+            self.assertEqual(DifyClient.get_timeout('unknown'), DifyClient.DEFAULT_TIMEOUTS['default'])
+
+            session = DifyClient.get_session('http://dify.test/v1/chat-messages')
+            with mock.patch.object(session, 'request', return_value=make_response(200)) as request:
+                DifyClient.post('http://dify.test/v1/chat-messages', api_type='chat')
+                self.assertEqual(request.call_args.kwargs['timeout'], (5.0, 300.0))
+                DifyClient.post('http://dify.test/v1/chat-messages', api_type='chat', timeout=1)
+                self.assertEqual(request.call_args.kwargs['timeout'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import io
+import os
+import json
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+import requests
+from werkzeug.datastructures import FileStorage
+from app import create_app, db
+from app.config.config import Config
+from app.models.user import User
+from app.models.task import Task, TaskFile
+from app.services.file_service import FileService
+from app.services.task_service import TaskService
+
+def make_response(status_code, data):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(data).encode('utf-8')
+    return response
+
+class DifyFileReuseTestCase(unittest.TestCase):
+    """按内容哈希去重存储与Dify文件ID复用测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='reuse@example.com', username='reuse')
+        user.password = 'Password123'
+        user.save()
+        self.user_id = user.id
+
+        self.dify_ids = iter(f'dify-{index}' for index in range(1, 10))
+        self.upload_to_dify = mock.patch('app.services.task_service.FileService.upload_to_dify',
+                                         side_effect=lambda *args: (True, {'id': next(self.dify_ids)}, None)).start()
+        mock.patch('app.services.task_service.Config.DIFY_STREAMING_UPLOAD', False).start()
+        mock.patch('app.services.task_service.FileArtifactService.schedule').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _upload(self, content=b'same standard content'):
+        task = Task(user_id=self.user_id, task_type='standard_interpretation', title='解读任务')
+        task.save()
+        file = FileStorage(io.BytesIO(content), filename='standard.pdf', content_type='application/pdf')
+        return task.id, TaskService.upload_file_to_task(task.id, file, self.user_id)
+
+    def test_same_content_stored_once_and_dify_id_reused(self):
+        """测试相同内容只保存一份本地文件，有效期内复用Dify文件ID，不同内容重新上传"""
+        _, first = self._upload()
+        _, second = self._upload()
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual(first.file_path, second.file_path)
+        self.assertEqual((first.dify_file_id, second.dify_file_id), ('dify-1', 'dify-1'))
+        self.assertEqual(self.upload_to_dify.call_count, 1)
+
+        _, other = self._upload(b'other content')
+        self.assertNotEqual(other.file_path, first.file_path)
+        self.assertEqual(other.dify_file_id, 'dify-2')
+
+    def test_reuse_expires_after_ttl(self):
+        """测试超过复用有效期后重新上传到Dify"""
+        _, first = self._upload()
+        TaskFile.query.filter_by(id=first.id).update({
+            'created_at': datetime.utcnow() - timedelta(seconds=Config.DIFY_FILE_REUSE_TTL + 60)
+        })
+        db.session.commit()
+
+        _, second = self._upload()
+        self.assertEqual(second.dify_file_id, 'dify-2')
+        self.assertEqual(self.upload_to_dify.call_count, 2)
+
+    def test_purged_dify_file_reuploaded_once(self):
+        """测试Dify拒绝已被清理的文件ID时作废该ID、重新上传并重发一次，之后的上传不再复用旧ID"""
+        self._upload()
+        task_id, task_file = self._upload()
+        request_data = {'inputs': {'files': [{'type': 'document', 'transfer_method': 'local_file', 'upload_file_id': 'dify-1'}]}}
+        missing = make_response(400, {'code': 'invalid_param', 'message': 'Invalid upload file id'})
+
+        with mock.patch('app.services.task_service.DifyClient.post',
+                        side_effect=[missing, make_response(200, {'answer': '解读结果'})]) as post:
+            TaskService.send_dify_request_direct(task_id, self.user_id, request_data)
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(post.call_args.kwargs['json']['inputs']['files'][0]['upload_file_id'], 'dify-2')
+        self.assertEqual(TaskFile.find_by_id(task_file.id).dify_file_id, 'dify-2')
+
+        _, third = self._upload()
+        self.assertEqual(third.dify_file_id, 'dify-2')
+
+        # 重新上传后仍被拒绝时不再重试
+        with mock.patch('app.services.task_service.DifyClient.post', side_effect=[missing, missing, missing]) as post:
+            with self.assertRaises(ValueError):
+                TaskService.send_dify_request_direct(task_id, self.user_id, {'inputs': {'files': [{'upload_file_id': 'dify-2'}]}})
+        self.assertEqual(post.call_count, 2)
+
+    def test_young_blob_deletion_swept_later(self):
+        """测试刚被复用的文件删除时推迟并记录，保留期过后无引用则删除，被重新引用则保留"""
+        task_id, task_file = self._upload()
+        file_path = task_file.file_path
+        TaskService.delete_task(task_id, self.user_id)
+        self.assertTrue(os.path.exists(file_path))
+        self.assertEqual(len(os.listdir(FileService.get_pending_delete_directory())), 1)
+
+        # 保留期内不删除，标记保留
+        self.assertEqual(FileService.sweep_pending_deletions(), 0)
+        self.assertEqual(len(os.listdir(FileService.get_pending_delete_directory())), 1)
+
+        expired = time.time() - FileService.BLOB_DELETE_GRACE_SECONDS - 1
+        os.utime(file_path, (expired, expired))
+        self.assertEqual(FileService.sweep_pending_deletions(), 1)
+        self.assertFalse(os.path.exists(file_path))
+        self.assertEqual(os.listdir(FileService.get_pending_delete_directory()), [])
+
+        # 推迟删除期间相同内容再次上传，文件被重新引用后保留
+        task_id, task_file = self._upload()
+        TaskService.delete_task(task_id, self.user_id)
+        self._upload()
+        os.utime(file_path, (expired, expired))
+        self.assertEqual(FileService.sweep_pending_deletions(), 0)
+        self.assertTrue(os.path.exists(file_path))
+        self.assertEqual(os.listdir(FileService.get_pending_delete_directory()), [])
+
+if __name__ == '__main__':
+    unittest.main()
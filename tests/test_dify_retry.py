@@ -0,0 +1,133 @@
+import io
+import unittest
+from unittest import mock
+import requests
+from http.client import RemoteDisconnected
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+from app.config.config import Config
+from app.services.dify_client import DifyClient
+from app.utils.retry import RetryBudget, backoff_delay, parse_retry_after
+
+URL = 'http://dify.test/v1/messages'
+
+def make_response(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response.raw = io.BytesIO(b'{}')
+    return response
+
+class DifyRetryTestCase(unittest.TestCase):
+    """Dify请求重试策略测试用例"""
+
+    def setUp(self):
+        """测试前准备：每个用例使用新的会话、统计和重试预算"""
+        DifyClient._pid = None
+        DifyClient._retries = None
+        self.session = DifyClient.get_session(URL)
+        self.sleep = mock.patch('app.services.dify_client.time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def send(self, side_effect, method='GET', api_type='messages', **kwargs):
+        with mock.patch.object(self.session, 'request', side_effect=side_effect) as request:
+            try:
+                return DifyClient.request(method, URL, api_type=api_type, **kwargs), request.call_count
+            except requests.RequestException as e:
+                return e, request.call_count
+
+    def test_transient_failures_retried(self):
+        """测试连接失败和502后重试成功，重试次数计入统计"""
+        response, calls = self.send([requests.ConnectionError('reset'), make_response(502), make_response(200)])
+        self.assertEqual((response.status_code, calls), (200, 3))
+        self.assertEqual(self.sleep.call_count, 2)
+        self.assertEqual(DifyClient.get_stats()['hosts']['http://dify.test']['retries'], 2)
+
+        # 达到最大尝试次数后返回最后一次的响应
+        response, calls = self.send([make_response(503)] * 5)
+        self.assertEqual((response.status_code, calls), (503, 3))
+
+    def test_non_idempotent_and_unreplayable_requests(self):
+        """测试POST只在建立连接失败和429时重试，任务执行类型默认不重试，流式请求体只尝试一次"""
+        connect_failed = requests.ConnectionError(MaxRetryError(None, URL, NewConnectionError(None, 'refused')))
+        response, calls = self.send([connect_failed, make_response(200)], method='POST', api_type='conversation_ops')
+        self.assertEqual((response.status_code, calls), (200, 2))
+        response, calls = self.send([requests.ConnectTimeout('connect'), make_response(200)], method='POST', api_type='conversation_ops')
+        self.assertEqual(calls, 2)
+        response, calls = self.send([make_response(429), make_response(200)], method='POST', api_type='conversation_ops')
+        self.assertEqual((response.status_code, calls), (200, 2))
+
+        for status in (502, 503, 504):
+            response, calls = self.send([make_response(status)] * 2, method='POST', api_type='conversation_ops')
+            self.assertEqual((response.status_code, calls), (status, 1))
+        error, calls = self.send([requests.ReadTimeout('slow')] * 2, method='POST', api_type='conversation_ops')
+        self.assertIsInstance(error, requests.ReadTimeout)
+        self.assertEqual(calls, 1)
+
+        for api_type in ('task_direct', 'task_blocking'):
+            error, calls = self.send([requests.ConnectTimeout('connect')] * 2, method='POST', api_type=api_type)
+            self.assertEqual(calls, 1)
+        response, calls = self.send([make_response(429)] * 2, method='POST', api_type='chat')
+        self.assertEqual(calls, 1)
+        response, calls = self.send([make_response(429)] * 3, method='POST', api_type='file_upload', data=iter([b'x']))
+        self.assertEqual(calls, 1)
+
+    def test_post_not_retried_after_body_sent(self):
+        """测试请求体已发出后连接被关闭或重置的POST不重试（上游可能已执行），GET仍然重试"""
+        disconnected = requests.ConnectionError(ProtocolError('Connection aborted.', RemoteDisconnected('closed')))
+        reset = requests.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError(104, 'reset')))
+        for error in (disconnected, reset):
+            result, calls = self.send([error, make_response(200)], method='POST', api_type='file_upload',
+                                      files={'file': ('a.txt', io.BytesIO(b'content'), 'text/plain')})
+            self.assertIs(result, error)
+            self.assertEqual(calls, 1)
+
+        response, calls = self.send([disconnected, make_response(200)], method='GET')
+        self.assertEqual((response.status_code, calls), (200, 2))
+
+    def test_file_rewound_before_retry(self):
+        """测试重试前把上传文件回退到原位置"""
+        file_obj = io.BytesIO(b'content')
+        positions = []
+
+        def request(*args, **kwargs):
+            positions.append(kwargs['files']['file'][1].tell())
+            kwargs['files']['file'][1].read()
+            return make_response(429 if len(positions) == 1 else 201)
+
+        response, calls = self.send(request, method='POST', api_type='file_upload',
+                                    files={'file': ('a.txt', file_obj, 'text/plain')})
+        self.assertEqual((response.status_code, calls), (201, 2))
+        self.assertEqual(positions, [0, 0])
+
+    def test_retry_after_honoured(self):
+        """测试按 Retry-After 等待，超过上限时直接返回"""
+        response, calls = self.send([make_response(429, {'Retry-After': '2'}), make_response(200)])
+        self.assertEqual(calls, 2)
+        self.sleep.assert_called_once_with(2.0)
+
+        too_long = str(int(Config.DIFY_RETRY_AFTER_MAX) + 1)
+        response, calls = self.send([make_response(503, {'Retry-After': too_long}), make_response(200)])
+        self.assertEqual((response.status_code, calls), (503, 1))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_budget_limits_retries(self):
+        """测试重试预算用完后不再重试，退避时间不超过上限"""
+        budget = RetryBudget(ratio=0.5, min_per_second=0, capacity=1)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+        self.assertEqual(budget.denied, 1)
+
+        DifyClient._budgets['http://dify.test'] = RetryBudget(ratio=0, min_per_second=0, capacity=1)
+        response, calls = self.send([make_response(502)] * 3)
+        self.assertEqual(calls, 2)
+        self.assertEqual(DifyClient.get_stats()['hosts']['http://dify.test']['retries_denied'], 1)
+
+        for retry_number in range(1, 10):
+            self.assertLessEqual(backoff_delay(retry_number, 0.5, 8), 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+import os
+import tempfile
+from openpyxl import load_workbook
+from app.services.document_service import DocumentService
+
+class ExcelExportTestCase(unittest.TestCase):
+    """Excel流式导出测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.temp_dir.name, 'results.xlsx')
+
+    def tearDown(self):
+        """测试后清理"""
+        self.temp_dir.cleanup()
+
+    def test_rows_written_from_iterator(self):
+        """测试按迭代器逐行写入，表头、筛选范围和共享样式正确"""
+        def items():
+            for index in range(1, 4):
+                yield {'sn': index, 'issueLocation': f'第{index}章', 'originalText': '原文' * 40,
+                       'issueDescription': '描述', 'recommendedModification': '建议'}
+
+        task_info = {'id': 'task-1', 'title': '审查', 'task_type': 'standard_review'}
+        success, path, error = DocumentService.export_task_results_to_excel(items(), task_info, self.output_path)
+
+        self.assertTrue(success, error)
+        ws = load_workbook(path).active
+        self.assertEqual(ws['A6'].value, '序号')
+        self.assertEqual(ws['A6'].style, 'export_header')
+        self.assertEqual([ws.cell(row=row, column=2).value for row in range(7, 10)], ['第1章', '第2章', '第3章'])
+        self.assertEqual(ws['C7'].style, 'export_content')
+        self.assertEqual(ws.row_dimensions[7].height, 15)
+        self.assertEqual(ws.auto_filter.ref, 'A6:E9')
+        self.assertEqual(ws.freeze_panes, 'A7')
+        self.assertIn('A1:E1', ws.merged_cells)
+
+if __name__ == '__main__':
+    unittest.main()
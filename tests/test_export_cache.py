@@ -0,0 +1,59 @@
+import unittest
+import os
+import time
+from app import create_app
+from app.services.export_cache_service import ExportCacheService
+
+class ExportCacheTestCase(unittest.TestCase):
+    """导出文件缓存测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        ExportCacheService.evict(0)
+        self.renders = []
+
+    def tearDown(self):
+        """测试后清理"""
+        ExportCacheService.evict(0)
+        self.ctx.pop()
+
+    def _render(self, content):
+        def render(output_path):
+            self.renders.append(output_path)
+            with open(output_path, 'wb') as f:
+                f.write(content)
+            return True, output_path, None
+        return render
+
+    def test_rendered_once_then_served_from_cache(self):
+        """测试同一结果同一格式只渲染一次"""
+        first = ExportCacheService.get_or_render('result-1', 'markdown_raw', '.md', self._render(b'# a'))
+        second = ExportCacheService.get_or_render('result-1', 'markdown_raw', '.md', self._render(b'# b'))
+
+        self.assertTrue(first[0])
+        self.assertEqual(first[1], second[1])
+        self.assertEqual(len(self.renders), 1)
+        with open(second[1], 'rb') as f:
+            self.assertEqual(f.read(), b'# a')
+
+    def test_least_recently_used_evicted_first(self):
+        """测试超出大小上限时先淘汰最久未访问的文件"""
+        paths = {}
+        for index, result_id in enumerate(['old', 'recent', 'newest']):
+            _, paths[result_id], _ = ExportCacheService.get_or_render(result_id, 'excel', '.xlsx', self._render(b'x' * 100))
+            os.utime(paths[result_id], (time.time() - 100 + index, time.time() - 100 + index))
+
+        # 命中后更新访问时间，'old' 变为最近访问
+        ExportCacheService.get_or_render('old', 'excel', '.xlsx', self._render(b'x' * 100))
+
+        self.assertEqual(ExportCacheService.evict(200), 1)
+        self.assertTrue(os.path.exists(paths['old']))
+        self.assertFalse(os.path.exists(paths['recent']))
+        self.assertTrue(os.path.exists(paths['newest']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+from datetime import datetime, timedelta
+from concurrent.futures import Future
+from unittest import mock
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.task import Task, TaskResult, ExportJob
+from app.services.export_cache_service import ExportCacheService
+from app.services.export_job_service import ExportJobService
+
+class ExportJobsTestCase(unittest.TestCase):
+    """异步导出任务测试用例（渲染进程池用可控的 Future 代替）"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+        ExportCacheService.evict(0)
+
+        user = User(email='export@example.com', username='export')
+        user.password = 'Password123'
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+        task = Task(user_id=self.user_id, task_type='standard_interpretation', title='解读任务', status='completed')
+        task.save()
+        self.task_id = task.id
+        self.result_ids = []
+        for index in range(3):
+            result = TaskResult(task_id=self.task_id, user_id=self.user_id, answer=f'# 结果{index}')
+            result.save()
+            self.result_ids.append(result.id)
+
+        self.submitted = []
+        patcher = mock.patch.object(ExportJobService, '_submit', side_effect=self._submit)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """测试后清理"""
+        ExportJobService._futures.clear()
+        ExportCacheService.evict(0)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _submit(self, export_format, payload, output_path):
+        future = Future()
+        self.submitted.append((future, output_path))
+        return future
+
+    def _finish(self, index, success=True):
+        """模拟渲染进程完成第 index 个提交"""
+        future, output_path = self.submitted[index]
+        if success:
+            with open(output_path, 'wb') as f:
+                f.write(b'# rendered')
+            future.set_result((True, output_path, None))
+        else:
+            future.set_result((False, None, '渲染失败'))
+
+    def _create(self, result_index=0, export_format='markdown_raw'):
+        return self.client.post(f'/api/tasks/{self.task_id}/export-jobs', headers=self.headers,
+                                json={'format': export_format, 'result_id': self.result_ids[result_index]})
+
+    def test_create_poll_download(self):
+        """测试提交、轮询、下载；任务状态保存在数据库中，其他工作进程同样可以查询和下载"""
+        response = self._create()
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['data']['job_id']
+
+        # 相同结果相同格式重复提交返回已有任务
+        self.assertEqual(self._create().get_json()['data']['job_id'], job_id)
+        self.assertEqual(len(self.submitted), 1)
+
+        response = self.client.get(f'/api/tasks/export-jobs/{job_id}/download', headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+        self._finish(0)
+        # 清空本进程的 future，模拟请求落到其他工作进程
+        ExportJobService._futures.clear()
+        db.session.remove()
+
+        response = self.client.get(f'/api/tasks/export-jobs/{job_id}', headers=self.headers)
+        self.assertEqual(response.get_json()['data']['status'], 'completed')
+        response = self.client.get(f'/api/tasks/export-jobs/{job_id}/download', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'# rendered')
+        response.close()
+
+        # 缓存命中时直接完成，不再提交渲染
+        self.assertEqual(self._create().get_json()['data']['status'], 'completed')
+        self.assertEqual(len(self.submitted), 1)
+
+    def test_per_user_limit(self):
+        """测试进行中的任务数达到上限时拒绝提交，任务结束后释放名额"""
+        with mock.patch('app.services.export_job_service.Config.EXPORT_JOBS_PER_USER', 2):
+            self.assertEqual(self._create(0).status_code, 202)
+            self.assertEqual(self._create(1).status_code, 202)
+            response = self._create(2)
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(ExportJob.query.count(), 2)
+
+            self._finish(0)
+            db.session.remove()
+            self.assertEqual(self._create(2).status_code, 202)
+
+    def test_failed_and_stale_jobs(self):
+        """测试渲染失败、长时间未结束的任务标记为失败，其他用户的任务不可见"""
+        job_id = self._create(0).get_json()['data']['job_id']
+        self._finish(0, success=False)
+        db.session.remove()
+
+        data = self.client.get(f'/api/tasks/export-jobs/{job_id}', headers=self.headers).get_json()['data']
+        self.assertEqual((data['status'], data['error']), ('failed', '渲染失败'))
+        response = self.client.get(f'/api/tasks/export-jobs/{job_id}/download', headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+
+        # 负责渲染的进程退出后任务不会一直占用名额
+        stale_id = self._create(1).get_json()['data']['job_id']
+        ExportJob.query.filter_by(id=stale_id).update({
+            'created_at': datetime.utcnow() - timedelta(seconds=ExportJobService.STALE_JOB_SECONDS + 1)
+        })
+        db.session.commit()
+        ExportJobService._expire_jobs()
+        self.assertEqual(ExportJob.find_by_id(stale_id).status, 'failed')
+
+        other = User(email='other@example.com')
+        other.password = 'Password123'
+        other.save()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=other.id)}'}
+        self.assertEqual(self.client.get(f'/api/tasks/export-jobs/{job_id}', headers=headers).status_code, 404)
+
+    def test_excel_requires_completed_task(self):
+        """测试任务未完成时不生成Excel，已有结果也不会渲染和缓存"""
+        task = Task(user_id=self.user_id, task_type='standard_review', title='审查任务', status='processing')
+        task.save()
+        TaskResult(task_id=task.id, user_id=self.user_id, answer='{}').save()
+
+        with mock.patch.object(ExportJobService, 'render') as render:
+            response = self.client.get(f'/api/tasks/{task.id}/results/export-excel', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('只有已完成的任务', response.get_json()['message'])
+        render.assert_not_called()
+
+        response = self.client.post(f'/api/tasks/{task.id}/export-jobs', headers=self.headers, json={'format': 'excel'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.submitted, [])
+
+if __name__ == '__main__':
+    unittest.main()
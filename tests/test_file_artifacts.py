@@ -0,0 +1,68 @@
+import unittest
+import os
+import tempfile
+from PIL import Image
+from reportlab.pdfgen import canvas
+from app import create_app
+from app.services.file_artifact_service import FileArtifactService
+
+class FileArtifactTestCase(unittest.TestCase):
+    """上传文件预处理测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """测试后清理"""
+        self.temp_dir.cleanup()
+        self.ctx.pop()
+
+    def test_pdf_artifacts_served_without_reparsing(self):
+        """测试PDF提取页数和预览文本，之后直接读取产物，删除文件时一并删除产物"""
+        pdf_path = os.path.join(self.temp_dir.name, 'standard.pdf')
+        pdf = canvas.Canvas(pdf_path)
+        for page in range(1, 4):
+            pdf.drawString(100, 750, f"page {page} text")
+            pdf.showPage()
+        pdf.save()
+
+        preview = FileArtifactService.extract(pdf_path)
+        self.assertEqual(preview['pages'], 3)
+        self.assertIn('page 3 text', preview['content'])
+        self.assertEqual(FileArtifactService._read_artifacts(pdf_path)['page_count'], 3)
+
+        # 产物存在时不再解析源文件
+        with open(pdf_path, 'wb') as f:
+            f.write(b'not a pdf')
+        self.assertEqual(FileArtifactService.get_preview(pdf_path), preview)
+
+        FileArtifactService.delete_artifacts(pdf_path)
+        self.assertIsNone(FileArtifactService.load_preview(pdf_path))
+        self.assertIn('error', FileArtifactService.get_preview(pdf_path))
+        self.assertFalse(os.path.exists(FileArtifactService.artifact_paths(pdf_path)[0]))
+
+    def test_image_thumbnail(self):
+        """测试图片生成缩略图文件，预览内容为缩略图"""
+        image_path = os.path.join(self.temp_dir.name, 'photo.jpg')
+        Image.new('RGB', (3200, 2400), (200, 30, 30)).save(image_path, 'JPEG')
+
+        preview = FileArtifactService.extract(image_path)
+        self.assertEqual(preview['type'], 'image')
+        self.assertTrue(preview['content'].startswith('data:image/png;base64,'))
+        self.assertEqual((preview['width'], preview['height']), (3200, 2400))
+
+        _, thumbnail_path = FileArtifactService.artifact_paths(image_path)
+        with Image.open(thumbnail_path) as thumbnail:
+            self.assertLessEqual(thumbnail.size[0], 800)
+            self.assertLessEqual(thumbnail.size[1], 600)
+
+        FileArtifactService.delete_artifacts(image_path)
+        self.assertFalse(os.path.exists(thumbnail_path))
+
+if __name__ == '__main__':
+    unittest.main()
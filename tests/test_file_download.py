@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+from app import create_app
+from app.config.config import Config
+from app.utils.file_download import send_local_file
+
+class FileDownloadTestCase(unittest.TestCase):
+    """文件下载（Range、条件请求、代理卸载）测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.original_mode = Config.DOWNLOAD_OFFLOAD_MODE
+        self.payload = bytes(range(256)) * 40
+        fd, self.file_path = tempfile.mkstemp(suffix='.pdf', dir=Config.get_data_directory())
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.payload)
+
+    def tearDown(self):
+        """测试后清理"""
+        Config.DOWNLOAD_OFFLOAD_MODE = self.original_mode
+        os.remove(self.file_path)
+
+    def _send(self, headers=None):
+        with self.app.test_request_context(headers=headers or {}):
+            response = send_local_file(self.file_path, '标准.pdf', 'application/pdf', etag='a' * 64)
+            response.direct_passthrough = False
+            return response.status_code, response.headers, response.get_data()
+
+    def test_range_and_conditional_requests(self):
+        """测试Range请求返回部分内容，ETag匹配时返回304"""
+        status, headers, body = self._send({'Range': 'bytes=100-199'})
+        self.assertEqual(status, 206)
+        self.assertEqual(body, self.payload[100:200])
+        self.assertEqual(headers['Content-Range'], f"bytes 100-199/{len(self.payload)}")
+
+        status, headers, body = self._send({'If-None-Match': '"' + 'a' * 64 + '"'})
+        self.assertEqual(status, 304)
+
+        # ETag不一致时 If-Range 不生效，返回完整内容
+        status, _, body = self._send({'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.payload)
+
+    def test_offload_to_proxy(self):
+        """测试卸载模式只返回代理响应头，不读取文件内容"""
+        Config.DOWNLOAD_OFFLOAD_MODE = 'x-accel'
+        status, headers, body = self._send({'Range': 'bytes=0-9'})
+        relative_path = os.path.relpath(os.path.realpath(self.file_path), os.path.realpath(Config.get_data_directory()))
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['X-Accel-Redirect'], Config.DOWNLOAD_ACCEL_PREFIX.rstrip('/') + '/' + relative_path)
+        self.assertIn('attachment', headers['Content-Disposition'])
+
+        Config.DOWNLOAD_OFFLOAD_MODE = 'x-sendfile'
+        status, headers, _ = self._send()
+        self.assertEqual(headers['X-Sendfile'], os.path.realpath(self.file_path))
+
+        # 304 仍由Python判断，不再交给代理
+        status, headers, _ = self._send({'If-None-Match': '"' + 'a' * 64 + '"'})
+        self.assertEqual(status, 304)
+        self.assertNotIn('X-Sendfile', headers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import io
+import os
+import hashlib
+from werkzeug.datastructures import FileStorage
+from werkzeug.formparser import parse_form_data
+from app import create_app
+from app.services.file_service import FileService, _UploadTee, _MultipartTeeBody
+
+class _NonSeekableStream(io.RawIOBase):
+    """不可定位的上传流（无法预先获取大小）"""
+
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+class FileStreamingTestCase(unittest.TestCase):
+    """上传流式保存与multipart分流测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.original_max_size = FileService.MAX_FILE_SIZE
+
+    def tearDown(self):
+        """测试后清理"""
+        FileService.MAX_FILE_SIZE = self.original_max_size
+        self.ctx.pop()
+
+    def _temp_files(self):
+        blob_dir = FileService.get_blob_directory()
+        return [name for name in os.listdir(blob_dir) if name.startswith('.upload-')]
+
+    def test_size_limit_enforced_while_reading(self):
+        """测试无法预知大小的上传流在读取过程中超限即中止，且不残留临时文件"""
+        FileService.MAX_FILE_SIZE = 1024
+        file = FileStorage(_NonSeekableStream(b'x' * 4096), filename='big.txt')
+
+        success, file_info, error = FileService.save_file(file, 'user-1')
+
+        self.assertFalse(success)
+        self.assertIsNone(file_info)
+        self.assertIn('文件大小超过限制', error)
+        self.assertEqual(self._temp_files(), [])
+
+    def test_multipart_body_tees_to_local_file(self):
+        """测试multipart请求体可被正常解析，且本地副本与哈希与发送内容一致"""
+        payload = os.urandom(FileService.CHUNK_SIZE * 2 + 17)
+        local_copy = io.BytesIO()
+        tee = _UploadTee(io.BytesIO(payload), local_copy, FileService.MAX_FILE_SIZE, FileService.CHUNK_SIZE)
+        body = _MultipartTeeBody(tee, '标准 "v2".pdf', {'user': 'user-1'}, len(payload))
+
+        encoded = b''.join(body)
+        self.assertEqual(len(encoded), len(body))
+
+        _, form, files = parse_form_data({
+            'REQUEST_METHOD': 'POST',
+            'CONTENT_TYPE': body.content_type,
+            'CONTENT_LENGTH': str(len(encoded)),
+            'wsgi.input': io.BytesIO(encoded)
+        })
+        self.assertEqual(form['user'], 'user-1')
+        self.assertEqual(files['file'].read(), payload)
+        self.assertEqual(local_copy.getvalue(), payload)
+        self.assertEqual(tee.content_hash, hashlib.sha256(payload).hexdigest())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+from app import create_app
+from app.services.font_service import FontService
+
+class FontServiceTestCase(unittest.TestCase):
+    """PDF导出字体缓存测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+
+    def test_font_resolved_once_and_reported(self):
+        """测试字体只查找注册一次，诊断接口返回缓存的结果"""
+        FontService._reportlab_font = None
+        first = FontService.get_reportlab_font()
+        resolved_at = FontService._font_diagnostics['resolved_at']
+
+        self.assertIs(FontService.get_reportlab_font(), first)
+
+        response = self.client.get('/api/health/fonts')
+        self.assertEqual(response.status_code, 200)
+        fonts = response.get_json()['fonts']
+        self.assertEqual(fonts['reportlab_font'], first[0])
+        self.assertEqual(fonts['chinese_available'], first[1])
+        self.assertEqual(fonts['resolved_at'], resolved_at)
+        self.assertIn('weasyprint_available', fonts)
+
+    def test_diagnostics_do_not_trigger_discovery(self):
+        """测试尚未预热时诊断接口报告未预热，不触发字体查找"""
+        with mock.patch.multiple(FontService, _reportlab_font=None, _font_diagnostics=None,
+                                 _weasyprint_font_config=None, _weasyprint_error=None), \
+                mock.patch.object(FontService, 'find_chinese_font') as find_chinese_font:
+            response = self.client.get('/api/health/fonts')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json()['fonts'], {'warmed': False, 'weasyprint_available': None})
+            find_chinese_font.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import re
+import unittest
+from unittest import mock
+from app.services.document_service import DocumentService
+
+class MarkdownPipelineTestCase(unittest.TestCase):
+    """导出Markdown清理和转换测试用例"""
+
+    def test_clean_unwraps_and_removes_metadata(self):
+        """测试移除外层代码块、元数据块，补充主标题并合并连续空行"""
+        content = "```markdown\n> **文档类型**：报告\n转换时间：2024\n---\n\n\n正文第一段  \n\n\n\n第二段\n```"
+        self.assertEqual(DocumentService._clean_markdown_content(content), "# 任务结果\n\n正文第一段\n\n第二段")
+        self.assertEqual(DocumentService._clean_markdown_content("```\n```"), "# 任务结果\n\n暂无处理结果")
+
+    def test_chunks_split_only_at_headings_outside_code_blocks(self):
+        """测试长文档只在代码块之外的标题处分段，分段转换结果与整篇转换一致"""
+        section = "## 第{0}节\n\n正文 **{0}**\n\n```\n# 代码块中的注释\n```\n\n"
+        content = ''.join(section.format(index) for index in range(40))
+
+        chunks = DocumentService._split_markdown_chunks(content, chunk_size=200)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual('\n'.join(chunks), content)
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith('## 第'))
+
+        # 包含引用式链接定义时不分段
+        self.assertEqual(len(DocumentService._split_markdown_chunks(content + "[1]: http://example.com", chunk_size=200)), 1)
+
+        html = DocumentService._convert_markdown_to_html(content)
+        self.assertEqual(html.count('<h2'), 40)
+        self.assertEqual(html.count('<h1'), 0)
+
+    def test_header_ids_unique_across_chunks(self):
+        """测试不同分段中相同的标题文字生成的ID不重复，与整篇转换一致，下一篇文档重新编号"""
+        section = "## Overview\n\n" + "正文段落\n\n" * 20
+        content = section * 3
+        self.assertEqual(len(DocumentService._split_markdown_chunks(content, chunk_size=100)), 3)
+
+        with mock.patch.object(DocumentService, 'MARKDOWN_CHUNK_SIZE', 100):
+            chunked = DocumentService._convert_markdown_to_html(content)
+            self.assertEqual(re.findall(r'<h2 id="([^"]+)"', chunked), ['overview', 'overview_1', 'overview_2'])
+            self.assertEqual(re.findall(r'<h2 id="([^"]+)"', DocumentService._convert_markdown_to_html(section)), ['overview'])
+
+        whole = DocumentService._convert_markdown_to_html(content)
+        self.assertEqual(re.findall(r'<h2 id="([^"]+)"', whole), re.findall(r'<h2 id="([^"]+)"', chunked))
+
+if __name__ == '__main__':
+    unittest.main()
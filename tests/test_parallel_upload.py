@@ -0,0 +1,90 @@
+import io
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from werkzeug.datastructures import FileStorage
+from app import create_app, db
+from app.config.config import Config
+from app.models.user import User
+from app.models.task import Task, TaskFile
+from app.services.task_service import TaskService
+
+class ParallelUploadTestCase(unittest.TestCase):
+    """多文件并行上传测试用例"""
+
+    def setUp(self):
+        """测试前准备：使用文件数据库，各工作线程使用各自的连接（内存数据库只有一个共享连接）"""
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.addCleanup(os.remove, self.db_path)
+        with mock.patch.object(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{self.db_path}'):
+            self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='parallel@example.com', username='parallel')
+        user.password = 'Password123'
+        user.save()
+        self.user_id = user.id
+
+        task = Task(user_id=self.user_id, task_type='standard_comparison', title='对比任务')
+        task.save()
+        self.task_id = task.id
+
+        mock.patch('app.services.task_service.Config.UPLOAD_WORKER_COUNT', 4).start()
+        mock.patch('app.services.task_service.Config.DIFY_STREAMING_UPLOAD', False).start()
+        mock.patch('app.services.task_service.Config.DIFY_FILE_REUSE_TTL', 0).start()
+        mock.patch('app.services.task_service.FileArtifactService.schedule').start()
+        mock.patch('app.services.task_service.FileService.upload_to_dify', side_effect=self._upload_to_dify).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    @staticmethod
+    def _upload_to_dify(file_path, filename, api_key, user_id, api_url=None):
+        # 让各文件的上传在线程池中重叠执行
+        time.sleep(0.05)
+        if filename.startswith('bad'):
+            return False, None, 'Dify返回413'
+        return True, {'id': f'dify-{filename}'}, None
+
+    def _file(self, filename):
+        return FileStorage(io.BytesIO(f'content of {filename}'.encode('utf-8')), filename=filename, content_type='application/pdf')
+
+    def test_failed_file_does_not_affect_others(self):
+        """测试一个文件上传失败时其他文件的记录完整提交，失败文件标记为失败，任务状态只更新一次"""
+        filenames = ['a.pdf', 'bad.pdf', 'c.pdf', 'd.pdf']
+        task_files, failed_files = TaskService.upload_files_to_task(self.task_id, [self._file(name) for name in filenames], self.user_id)
+
+        self.assertEqual([task_file.original_filename for task_file in task_files], ['a.pdf', 'c.pdf', 'd.pdf'])
+        self.assertEqual([item['filename'] for item in failed_files], ['bad.pdf'])
+        self.assertIn('Dify返回413', failed_files[0]['error'])
+
+        # 使用新的会话读取，确认工作线程中的写入均已提交
+        db.session.remove()
+        records = {record.original_filename: record for record in TaskFile.find_by_task_id(self.task_id)}
+        self.assertEqual(set(records), set(filenames))
+        for name in ('a.pdf', 'c.pdf', 'd.pdf'):
+            self.assertEqual((records[name].upload_status, records[name].dify_file_id), ('uploaded', f'dify-{name}'))
+        self.assertEqual((records['bad.pdf'].upload_status, records['bad.pdf'].dify_file_id), ('failed', None))
+        self.assertEqual(Task.find_by_id(self.task_id).status, 'failed')
+
+    def test_all_files_uploaded(self):
+        """测试全部文件上传成功时按提交顺序返回，任务状态为已上传"""
+        task_files, failed_files = TaskService.upload_files_to_task(self.task_id, [self._file(name) for name in ('x.pdf', 'y.pdf')], self.user_id)
+
+        self.assertEqual([task_file.dify_file_id for task_file in task_files], ['dify-x.pdf', 'dify-y.pdf'])
+        self.assertEqual(failed_files, [])
+        db.session.remove()
+        self.assertEqual(Task.find_by_id(self.task_id).status, 'uploaded')
+
+if __name__ == '__main__':
+    unittest.main()
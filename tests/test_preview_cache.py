@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+from types import SimpleNamespace
+from reportlab.pdfgen import canvas
+from app import create_app
+from app.services.document_service import DocumentService
+from app.services.export_cache_service import ExportCacheService
+from app.services.preview_cache_service import PreviewCacheService
+
+class PreviewCacheTestCase(unittest.TestCase):
+    """文件预览缓存测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        ExportCacheService.evict_directory(PreviewCacheService.get_cache_directory(), 0)
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+        self.pdf_path = os.path.join(self.temp_dir.name, 'standard.pdf')
+        pdf = canvas.Canvas(self.pdf_path)
+        for page in range(1, 7):
+            pdf.drawString(100, 750, f"page {page} text")
+            pdf.showPage()
+        pdf.save()
+        self.task_file = SimpleNamespace(id='file-1', file_path=self.pdf_path, content_hash='a' * 64)
+
+    def tearDown(self):
+        """测试后清理"""
+        ExportCacheService.evict_directory(PreviewCacheService.get_cache_directory(), 0)
+        self.temp_dir.cleanup()
+        self.ctx.pop()
+
+    def test_page_range_extracts_only_requested_pages(self):
+        """测试按页码范围只提取指定页，超出总页数时截取到最后一页"""
+        preview = PreviewCacheService.get_preview(self.task_file, page_range=(3, 5))
+        self.assertEqual(preview['pages'], 6)
+        self.assertEqual(preview['page_range'], [3, 5])
+        self.assertIn('page 3 text', preview['content'])
+        self.assertIn('page 5 text', preview['content'])
+        self.assertNotIn('page 2 text', preview['content'])
+        self.assertNotIn('page 6 text', preview['content'])
+
+        self.assertEqual(PreviewCacheService.get_preview(self.task_file, page_range=(5, 99))['page_range'], [5, 6])
+        self.assertIn('error', PreviewCacheService.get_preview(self.task_file, page_range=(7, 8)))
+
+        for value in ('0-2', '5-3', 'a', '3-'):
+            with self.assertRaises(ValueError):
+                DocumentService.parse_page_range(value)
+        self.assertEqual(DocumentService.parse_page_range('4'), (4, 4))
+
+    def test_repeat_preview_served_from_cache(self):
+        """测试相同内容哈希和参数的预览直接返回缓存结果，不再解析文件"""
+        # 默认参数的预览由上传预处理产物提供，这里使用非默认长度
+        first = PreviewCacheService.get_preview(self.task_file, max_length=1000)
+        self.assertIn('page 6 text', first['content'])
+
+        # 文件内容哈希不变时不重新解析
+        with open(self.pdf_path, 'wb') as f:
+            f.write(b'not a pdf')
+        self.assertEqual(PreviewCacheService.get_preview(self.task_file, max_length=1000), first)
+
+        # 参数不同的预览单独缓存，解析失败的结果不缓存
+        self.assertIn('error', PreviewCacheService.get_preview(self.task_file, page_range=(1, 1)))
+        self.assertEqual(len(os.listdir(PreviewCacheService.get_cache_directory())), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import time
+import asyncio
+from app.utils.sse import (
+    HEARTBEAT, SSEEventParser, SSERelay, ChatStreamMetrics, iter_with_heartbeat, aiter_with_heartbeat
+)
+
+class SSERelayTestCase(unittest.TestCase):
+    """SSE事件切分、心跳和流统计测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        ChatStreamMetrics.reset()
+
+    def test_events_split_at_boundaries(self):
+        """测试跨块的事件在边界处切分，LF/CRLF空行都能识别，不完整部分保留到下一块"""
+        parser = SSEEventParser()
+        self.assertEqual(parser.feed(b'data: {"a": 1}\n\ndata: {"b"'), [b'data: {"a": 1}\n\n'])
+        self.assertEqual(parser.feed(b': 2}\r\n\r'), [])
+        self.assertEqual(parser.feed(b'\nevent: ping\n\ndata: tail'), [b'data: {"b": 2}\r\n\r\n', b'event: ping\n\n'])
+        self.assertEqual(parser.flush(), b'data: tail')
+        self.assertEqual(parser.flush(), b'')
+
+    def test_relay_records_ttfb_and_tokens(self):
+        """测试按场景记录首字节时间，token数优先取 message_end 中的 completion_tokens"""
+        relay = SSERelay('multilingual_qa', start_time=time.time() - 0.5)
+        self.assertEqual(relay.feed(b'data: {"event": "message", "answer": "a"}\n\n'
+                                    b'data: {"event": "message", "answer": "b"}\n\n'), [
+            b'data: {"event": "message", "answer": "a"}\n\n',
+            b'data: {"event": "message", "answer": "b"}\n\n'
+        ])
+        relay.first_token_time -= 2
+        relay.heartbeat()
+        relay.feed(b'data: {"event": "message_end", "metadata": {"usage": {"completion_tokens": 40}}}\n\n')
+        summary = relay.finish()
+
+        self.assertGreaterEqual(summary['ttfb_ms'], 500)
+        self.assertEqual(summary['tokens'], 40)
+        self.assertAlmostEqual(summary['tokens_per_second'], 20, delta=1)
+
+        # 没有usage时按内容事件数估算
+        relay = SSERelay('multilingual_qa')
+        relay.feed(b'data: {"event":"agent_message","answer":"x"}\n\n')
+        self.assertEqual(relay.finish('error')['tokens'], 1)
+
+        stats = ChatStreamMetrics.get_stats()['multilingual_qa']
+        self.assertEqual(stats['streams'], 2)
+        self.assertEqual(stats['by_status'], {'completed': 1, 'error': 1})
+        self.assertEqual(stats['heartbeats'], 1)
+        self.assertEqual(relay.heartbeat(), HEARTBEAT)
+
+    def test_task_id_tracked_until_end(self):
+        """测试记录流中的 task_id，收到结束事件后不再需要停止生成"""
+        relay = SSERelay('standard_query')
+        self.assertFalse(relay.generating)
+        relay.feed(b'data: {"event": "message", "task_id": "task-1", "answer": "a"}\n\n')
+        self.assertEqual(relay.task_id, 'task-1')
+        self.assertTrue(relay.generating)
+        relay.feed(b'data: {"event": "message_end", "task_id": "task-1"}\n\n')
+        self.assertFalse(relay.generating)
+
+        relay.finish('cancelled')
+        ChatStreamMetrics.record_stop('standard_query', False)
+        stats = ChatStreamMetrics.get_stats()['standard_query']
+        self.assertEqual(stats['by_status'], {'cancelled': 1})
+        self.assertEqual((stats['stop_requests'], stats['stop_failures']), (1, 1))
+
+    def test_heartbeat_during_silence(self):
+        """测试上游长时间没有数据时产出心跳占位，数据和异常原样传递"""
+        def slow():
+            yield b'a'
+            time.sleep(0.35)
+            yield b'b'
+            raise ValueError('upstream closed')
+
+        items = []
+        with self.assertRaises(ValueError):
+            for item in iter_with_heartbeat(slow(), 0.1):
+                items.append(item)
+        self.assertEqual(items[0], b'a')
+        self.assertEqual(items[-1], b'b')
+        self.assertGreaterEqual(items.count(None), 2)
+
+        async def aslow():
+            yield b'a'
+            await asyncio.sleep(0.35)
+            yield b'b'
+
+        async def collect():
+            return [item async for item in aiter_with_heartbeat(aslow(), 0.1)]
+
+        items = asyncio.run(collect())
+        self.assertEqual((items[0], items[-1]), (b'a', b'b'))
+        self.assertGreaterEqual(items.count(None), 2)
+
+if __name__ == '__main__':
+    unittest.main()
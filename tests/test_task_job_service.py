@@ -0,0 +1,118 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from app import create_app, db
+from app.models.user import User
+from app.models.task import Task, TaskJob, UserTaskCounter
+from app.services.task_job_service import TaskJobService
+from app.utils.worker_pool import WorkerPoolFullError
+
+class TaskJobServiceTestCase(unittest.TestCase):
+    """持久化作业队列测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='jobs@example.com', username='jobs')
+        user.password = 'Password123'
+        user.save()
+        self.user_id = user.id
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _enqueue(self):
+        task = Task(user_id=self.user_id, task_type='standard_review', title='审查任务', status='processing')
+        task.save()
+        return TaskJobService.enqueue(task.id, self.user_id, task.task_type, {'inputs': {}})
+
+    def _job(self, job_id):
+        db.session.expire_all()
+        return TaskJob.find_by_id(job_id)
+
+    def test_concurrent_claimers_get_distinct_jobs(self):
+        """测试两个工作进程读到相同的候选作业时只有一个认领成功，另一个继续认领下一个"""
+        first = self._enqueue()
+        second = self._enqueue()
+        claimed_by_a = []
+        calls = []
+        utcnow = datetime.utcnow
+
+        def interleaved_utcnow():
+            # worker-b 读取候选列表之后、认领之前，worker-a 抢先认领同一作业
+            calls.append(1)
+            if len(calls) == 2:
+                claimed_by_a.append(TaskJobService.claim_next('worker-a'))
+            return utcnow()
+
+        with mock.patch('app.services.task_job_service.datetime') as patched:
+            patched.utcnow.side_effect = interleaved_utcnow
+            claimed_by_b = TaskJobService.claim_next('worker-b')
+
+        self.assertEqual(claimed_by_a[0].id, first.id)
+        self.assertEqual(claimed_by_b.id, second.id)
+        self.assertEqual((self._job(first.id).lease_owner, self._job(first.id).attempts), ('worker-a', 1))
+        self.assertEqual((self._job(second.id).lease_owner, self._job(second.id).attempts), ('worker-b', 1))
+        self.assertIsNone(TaskJobService.claim_next('worker-c'))
+
+    def test_expired_lease_requeued_until_max_attempts(self):
+        """测试租约过期的作业重新入队，达到最大执行次数后作业和任务标记为失败"""
+        job = self._enqueue()
+        job.max_attempts = 2
+        db.session.commit()
+
+        for attempt in (1, 2):
+            claimed = TaskJobService.claim_next('worker-a')
+            self.assertEqual((claimed.id, claimed.attempts), (job.id, attempt))
+            # 续约只对仍持有租约的工作进程生效
+            self.assertEqual(TaskJobService.heartbeat([job.id], 'worker-b'), 0)
+            TaskJob.query.filter_by(id=job.id).update({'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)})
+            db.session.commit()
+            TaskJobService.requeue_expired()
+
+            if attempt == 1:
+                requeued = self._job(job.id)
+                self.assertEqual((requeued.status, requeued.lease_owner), ('queued', None))
+                self.assertIn('worker-a', requeued.last_error)
+
+        failed = self._job(job.id)
+        self.assertEqual(failed.status, 'failed')
+        self.assertEqual(Task.find_by_id(failed.task_id).status, 'failed')
+        self.assertIsNone(TaskJobService.claim_next('worker-a'))
+
+    def test_queue_size_limit(self):
+        """测试排队作业数达到 TASK_QUEUE_MAX_SIZE 后拒绝入队，被认领后释放名额"""
+        with mock.patch('app.services.task_job_service.Config.TASK_QUEUE_MAX_SIZE', 1):
+            self._enqueue()
+            with self.assertRaises(WorkerPoolFullError):
+                self._enqueue()
+            self.assertEqual(TaskJob.query.count(), 1)
+
+            TaskJobService.claim_next('worker-a')
+            self._enqueue()
+            self.assertEqual(TaskJobService.get_queue_stats()['status_counts'], {'queued': 1, 'running': 1})
+
+    def test_reconcile_task_counters_interval(self):
+        """测试计数核对修正偏差，间隔内其他进程再次核对时跳过"""
+        self._enqueue()
+        counter = UserTaskCounter.query.get(self.user_id)
+        counter.total_count = 5
+        db.session.commit()
+
+        self.assertIsNone(TaskJobService.reconcile_task_counters(interval=0))
+        result = TaskJobService.reconcile_task_counters(interval=3600)
+        self.assertEqual(result['corrected'], 1)
+        db.session.expire_all()
+        self.assertEqual(UserTaskCounter.query.get(self.user_id).total_count, 1)
+        self.assertIsNone(TaskJobService.reconcile_task_counters(interval=3600))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.models.user import User
+from app.models.task import Task, TaskFile
+
+class TaskListTestCase(unittest.TestCase):
+    """任务列表批量加载文件测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='list@example.com', username='list')
+        user.password = 'Password123'
+        user.save()
+        self.user_id = user.id
+        self.headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+
+        for index in range(6):
+            task = Task(user_id=self.user_id, task_type='standard_review', title=f'任务{index}')
+            task.save()
+            # 最后一个任务没有文件
+            for file_index in range(2 if index < 5 else 0):
+                TaskFile(task_id=task.id, user_id=self.user_id, original_filename=f'{index}-{file_index}.pdf',
+                         stored_filename=f'{index}-{file_index}.pdf', file_path=f'/tmp/{index}-{file_index}.pdf',
+                         file_size=10, file_type='application/pdf', file_extension='.pdf').save()
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _get_tasks(self, query_string):
+        """请求任务列表，返回 (响应数据, 查询 task_files 表的SQL数)"""
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.client.get(f'/api/tasks?{query_string}', headers=self.headers)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()['data'], sum(1 for statement in statements if 'FROM task_files' in statement)
+
+    def test_files_loaded_in_one_query(self):
+        """测试当前页所有任务的文件只用一次查询加载，查询次数与每页数量无关"""
+        for per_page in (2, 6):
+            data, file_queries = self._get_tasks(f'per_page={per_page}')
+            self.assertEqual(len(data['tasks']), per_page)
+            self.assertEqual(file_queries, 1)
+
+        data, _ = self._get_tasks('per_page=6')
+        file_counts = sorted(task['file_count'] for task in data['tasks'])
+        self.assertEqual(file_counts, [0, 2, 2, 2, 2, 2])
+        for task in data['tasks']:
+            self.assertEqual(len(task['files']), task['file_count'])
+            self.assertTrue(all(file['task_id'] == task['id'] for file in task['files']))
+
+    def test_file_counts_without_details(self):
+        """测试 include_files=false 时只用一次分组统计返回文件数量"""
+        data, file_queries = self._get_tasks('per_page=6&include_files=false')
+        self.assertEqual(file_queries, 1)
+        self.assertEqual(sorted(task['file_count'] for task in data['tasks']), [0, 2, 2, 2, 2, 2])
+        self.assertTrue(all('files' not in task for task in data['tasks']))
+
+if __name__ == '__main__':
+    unittest.main()
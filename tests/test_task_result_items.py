@@ -0,0 +1,98 @@
+import unittest
+import json
+from app import create_app, db
+from app.models.user import User
+from app.models.task import Task, TaskResult, TaskResultItem
+from app.services.task_service import TaskService
+
+class TaskResultItemsTestCase(unittest.TestCase):
+    """任务结果条目拆分与分页测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='items@example.com')
+        user.password = 'Password123'
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+        task = Task(user_id=self.user_id, task_type='standard_review', title='审查任务', status='processing')
+        task.save()
+        self.task_id = task.id
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _make_items(self, count):
+        return [
+            {
+                'sn': sn,
+                'issueLocation': f'位置{sn}',
+                'originalText': '原文',
+                'issueDescription': '问题',
+                'recommendedModification': '建议'
+            }
+            for sn in range(count, 0, -1)
+        ]
+
+    def test_items_materialized_when_result_stored(self):
+        """测试保存结果时写入条目，分页按sn排序"""
+        items = self._make_items(45)
+        TaskService.process_dify_response(self.task_id, self.user_id, {'answer': json.dumps(items)})
+
+        result = TaskResult.find_latest_by_user_and_task(self.user_id, self.task_id)
+        self.assertEqual(TaskResultItem.count_by_result_id(result.id), 45)
+
+        page = TaskService.get_task_results_paginated(self.task_id, self.user_id, page=3, per_page=20)
+        self.assertEqual(page['pagination']['total_items'], 45)
+        self.assertEqual(page['pagination']['total_pages'], 3)
+        self.assertEqual([item['sn'] for item in page['items']], [41, 42, 43, 44, 45])
+
+        page = TaskService.get_task_results_paginated(self.task_id, self.user_id, page=1, per_page=3, sort_order='desc')
+        self.assertEqual([item['sn'] for item in page['items']], [45, 44, 43])
+
+    def test_filters_and_search(self):
+        """测试按字段筛选和关键词检索，计数随筛选变化"""
+        items = [
+            {'sn': 1, 'issueLocation': '第3.1条', 'originalText': '应设置防护栏杆', 'issueDescription': '高度不足', 'isCompliant': False},
+            {'sn': 2, 'issueLocation': '第3.2条', 'originalText': '照明系统', 'issueDescription': '照度偏低', 'isCompliant': True},
+            {'sn': 3, 'issueLocation': '第4.1条', 'originalText': '防护栏杆材料', 'issueDescription': '100%_覆盖', 'isCompliant': False}
+        ]
+        TaskService.process_dify_response(self.task_id, self.user_id, {'answer': json.dumps(items, ensure_ascii=False)})
+
+        def sns(**filters):
+            page = TaskService.get_task_results_paginated(self.task_id, self.user_id, per_page=10, filters=filters)
+            self.assertEqual(page['pagination']['total_items'], len(page['items']))
+            return [item['sn'] for item in page['items']]
+
+        self.assertEqual(sns(), [1, 2, 3])
+        self.assertEqual(sns(is_compliant='false'), [1, 3])
+        self.assertEqual(sns(issue_location='第3'), [1, 2])
+        self.assertEqual(sns(search='防护栏杆'), [1, 3])
+        self.assertEqual(sns(search='照度'), [2])
+        self.assertEqual(sns(search='%_'), [3])
+        self.assertEqual(sns(search='防护', is_compliant='true'), [])
+
+    def test_legacy_result_backfilled_on_first_page(self):
+        """测试历史结果在首次分页查询时补齐条目（多个```json代码块格式）"""
+        answer = '\n'.join(f"```json\n{json.dumps(item, ensure_ascii=False)}\n```" for item in self._make_items(3))
+        TaskResult(task_id=self.task_id, user_id=self.user_id, answer=answer).save()
+        Task.find_by_id(self.task_id).update_status('completed')
+
+        page = TaskService.get_task_results_paginated(self.task_id, self.user_id, page=1, per_page=10)
+        self.assertEqual([item['sn'] for item in page['items']], [1, 2, 3])
+
+        result = TaskResult.find_latest_by_user_and_task(self.user_id, self.task_id)
+        self.assertEqual(TaskResultItem.count_by_result_id(result.id), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest import mock
+from app import create_app, db
+from app.models.user import User
+from app.models.task import Task, UserTaskCounter
+
+class UserTaskCounterTestCase(unittest.TestCase):
+    """用户任务计数测试用例"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        db.create_all()
+
+        user = User(email='counter@example.com')
+        user.password = 'Password123'
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+
+    def tearDown(self):
+        """测试后清理"""
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def _create_task(self, task_type='standard_review'):
+        task = Task(user_id=self.user_id, task_type=task_type, title='任务')
+        task.save()
+        return task
+
+    def _stats(self):
+        db.session.expire_all()
+        return UserTaskCounter.get_or_rebuild(self.user_id).to_stats()
+
+    def test_counters_follow_save_update_delete(self):
+        """测试创建、状态变更、删除任务时计数同步更新"""
+        first = self._create_task()
+        second = self._create_task('standard_compliance')
+        self._create_task()
+
+        first.update_status('processing')
+        first.update_status('completed')
+        second.update_status('failed')
+        second.delete()
+
+        self.assertEqual(self._stats(), {
+            'total_tasks': 2,
+            'status_stats': {'pending': 1, 'completed': 1},
+            'type_stats': {'standard_review': 2}
+        })
+
+    def test_missing_row_rebuilt_and_drift_reconciled(self):
+        """测试计数行缺失时按任务表重建，偏差由核对修正"""
+        self._create_task()
+        self._create_task()
+        UserTaskCounter.query.delete()
+        db.session.commit()
+
+        # 计数行缺失时，下一次变更按任务表重建（包含本次变更）
+        self._create_task('standard_review').update_status('completed')
+        self.assertEqual(self._stats()['status_stats'], {'pending': 2, 'completed': 1})
+
+        counter = UserTaskCounter.query.get(self.user_id)
+        counter.pending_count = 10
+        counter.total_count = 99
+        db.session.commit()
+
+        result = UserTaskCounter.reconcile_all()
+        self.assertEqual(result['corrected'], 1)
+        self.assertEqual(self._stats()['total_tasks'], 3)
+        self.assertEqual(self._stats()['status_stats'], {'pending': 2, 'completed': 1})
+
+    def test_reconcile_keeps_concurrent_deltas(self):
+        """测试核对开始后其他请求提交的计数增量不会被核对结果覆盖"""
+        self._create_task()
+        reconcile_user = UserTaskCounter.reconcile_user
+
+        def concurrent_change(user_id):
+            # 模拟核对列出用户之后、锁定计数行之前，其他请求创建任务并累加计数
+            self._create_task('standard_compliance')
+            return reconcile_user(user_id)
+
+        with mock.patch.object(UserTaskCounter, 'reconcile_user', side_effect=concurrent_change):
+            result = UserTaskCounter.reconcile_all()
+        self.assertEqual(result, {'users': 1, 'corrected': 0})
+        self.assertEqual(self._stats(), {
+            'total_tasks': 2,
+            'status_stats': {'pending': 2},
+            'type_stats': {'standard_review': 1, 'standard_compliance': 1}
+        })
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import threading
+import time
+from app.utils.worker_pool import WorkerPool, WorkerPoolFullError, parse_type_limits
+
+class WorkerPoolTestCase(unittest.TestCase):
+    """后台工作线程池测试用例"""
+
+    def test_runs_all_jobs_with_bounded_workers(self):
+        """测试作业全部执行且线程数不超过上限"""
+        pool = WorkerPool('test', max_workers=3, max_queue_size=100)
+        results = []
+        lock = threading.Lock()
+
+        def job(n):
+            time.sleep(0.01)
+            with lock:
+                results.append(n)
+
+        for i in range(20):
+            pool.submit(job, i, job_id=str(i))
+
+        self.assertTrue(pool.shutdown(wait=True, timeout=5))
+        self.assertEqual(sorted(results), list(range(20)))
+        stats = pool.stats()
+        self.assertEqual(stats['completed'], 20)
+        self.assertLessEqual(stats['alive_workers'], 3)
+
+    def test_rejects_when_queue_full(self):
+        """测试等待队列满时拒绝提交"""
+        pool = WorkerPool('test', max_workers=1, max_queue_size=2)
+        release = threading.Event()
+
+        pool.submit(release.wait)
+        time.sleep(0.05)  # 等待第一个作业被工作线程取走
+        pool.submit(lambda: None)
+        pool.submit(lambda: None)
+
+        with self.assertRaises(WorkerPoolFullError):
+            pool.submit(lambda: None)
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+        release.set()
+        self.assertTrue(pool.shutdown(wait=True, timeout=5))
+
+    def test_type_concurrency_limit(self):
+        """测试按任务类型限制并发"""
+        pool = WorkerPool('test', max_workers=4, max_queue_size=100, type_limits={'standard_review': 1})
+        lock = threading.Lock()
+        running = {'current': 0, 'peak': 0}
+
+        def job():
+            with lock:
+                running['current'] += 1
+                running['peak'] = max(running['peak'], running['current'])
+            time.sleep(0.02)
+            with lock:
+                running['current'] -= 1
+
+        for _ in range(5):
+            pool.submit(job, job_type='standard_review')
+
+        self.assertTrue(pool.shutdown(wait=True, timeout=5))
+        self.assertEqual(running['peak'], 1)
+
+    def test_shutdown_drains_queue_and_rejects_new_jobs(self):
+        """测试关闭时排空队列并拒绝新作业"""
+        pool = WorkerPool('test', max_workers=1, max_queue_size=100)
+        done = []
+
+        for i in range(5):
+            pool.submit(lambda n=i: done.append(n))
+
+        self.assertTrue(pool.shutdown(wait=True, timeout=5))
+        self.assertEqual(len(done), 5)
+        with self.assertRaises(WorkerPoolFullError):
+            pool.submit(lambda: None)
+
+    def test_failed_job_does_not_stop_worker(self):
+        """测试作业异常不会导致工作线程退出"""
+        pool = WorkerPool('test', max_workers=1, max_queue_size=10)
+        done = []
+
+        def boom():
+            raise RuntimeError('boom')
+
+        pool.submit(boom)
+        pool.submit(lambda: done.append(1))
+
+        self.assertTrue(pool.shutdown(wait=True, timeout=5))
+        self.assertEqual(done, [1])
+        self.assertEqual(pool.stats()['failed'], 1)
+
+    def test_parse_type_limits(self):
+        """测试并发限制配置解析"""
+        self.assertEqual(
+            parse_type_limits('standard_review:2, standard_compliance:1,bad,x:y'),
+            {'standard_review': 2, 'standard_compliance': 1}
+        )
+        self.assertEqual(parse_type_limits(''), {})
+
+if __name__ == '__main__':
+    unittest.main()
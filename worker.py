@@ -0,0 +1,15 @@
+from app import create_app
+from app.services.task_job_service import TaskJobService
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 创建Flask应用实例（仅用于数据库和配置上下文，不启动HTTP服务）
+app = create_app()
+
+if __name__ == '__main__':
+    # 独立的标准处理任务工作进程，可在多台节点上同时运行
+    # 配合 TASK_QUEUE_MODE=external 使用时，Web进程只负责入队
+    print("启动任务工作进程")
+    TaskJobService.run_worker(app)